@@ -7,13 +7,266 @@ fBm capabilities) and Perlin simplex noise. Also contains a fast
 Copyright (c) 2008, Casey Duncan (casey dot duncan at gmail dot com)
 """
 
-__version__ = "1.2.3"
+__version__ = "1.3.0"
+
+import os as _os
 
 from . import _perlin, _simplex
 
 snoise2 = _simplex.noise2
 snoise3 = _simplex.noise3
 snoise4 = _simplex.noise4
+snoise2_array = _simplex.noise2_array
+snoise3_array = _simplex.noise3_array
+snoise2_grad = _simplex.noise2_grad
+snoise3_grad = _simplex.noise3_grad
+snoise2_grad_array = _simplex.noise2_grad_array
+snoise3_grad_array = _simplex.noise3_grad_array
+snoise3_above = _simplex.noise3_above
+snoise3_above_array = _simplex.noise3_above_array
+sbounds3 = _simplex.bounds3
+sgrid2 = _simplex.grid2
+sgrid3 = _simplex.grid3
+ssample = _simplex.sample
+snoise3_volume = _simplex.volume3
 pnoise1 = _perlin.noise1
 pnoise2 = _perlin.noise2
 pnoise3 = _perlin.noise3
+pnoise1_array = _perlin.noise1_array
+pnoise2_array = _perlin.noise2_array
+pnoise3_array = _perlin.noise3_array
+pnoise3_grad = _perlin.noise3_grad
+pnoise3_grad_array = _perlin.noise3_grad_array
+pnoise3_above = _perlin.noise3_above
+pnoise3_above_array = _perlin.noise3_above_array
+pbounds3 = _perlin.bounds3
+pgrid2 = _perlin.grid2
+pgrid3 = _perlin.grid3
+psample = _perlin.sample
+PerlinFBM = _perlin.PerlinFBM
+
+def enable_stats(enabled=True):
+	"""Enable (or disable) counting the calls of the native noise functions,
+	the samples and octaves they evaluate and the time spent in them, as
+	returned by stats(). Returns whether counting was enabled before.
+
+	Counting is disabled by default, or enabled when the module is imported
+	with NOISE_STATS=1 set in the environment.
+	"""
+	previous = _perlin._enable_stats(bool(enabled))
+	_simplex._enable_stats(bool(enabled))
+	return previous
+
+def stats():
+	"""Return the counters of the native noise functions called while
+	counting was enabled, since the last reset_stats(), as a dict of
+	function name to a dict of:
+
+	calls -- the number of calls
+	samples -- the number of noise values computed
+	octaves -- the number of octaves evaluated, the samples times octaves
+	except for the *_above functions, which count the octaves actually
+	evaluated and skip those not needed to decide a sample
+	seconds -- the wall time spent in the calls
+
+	The methods of seeded Noise objects are counted with the module
+	functions of the same name.
+	"""
+	counters = dict(_perlin._stats())
+	counters.update(_simplex._stats())
+	return dict((name, {'calls': calls, 'samples': samples, 'octaves': octaves,
+			'seconds': ns * 1e-9})
+		for name, (calls, samples, octaves, ns) in counters.items())
+
+def reset_stats():
+	"""Zero the counters returned by stats()"""
+	_perlin._reset_stats()
+	_simplex._reset_stats()
+
+if _os.environ.get('NOISE_STATS', '') not in ('', '0'):
+	enable_stats()
+
+_GRID2 = {'simplex': sgrid2, 'perlin': pgrid2}
+_GRID3 = {'simplex': sgrid3, 'perlin': pgrid3}
+_BOUNDS3 = {'simplex': sbounds3, 'perlin': pbounds3}
+_SAMPLE = {'simplex2': (ssample, 2), 'simplex3': (ssample, 3), 'simplex4': (ssample, 4),
+	'perlin1': (psample, 1), 'perlin2': (psample, 2), 'perlin3': (psample, 3)}
+
+def _kernel(table, kernel):
+	try:
+		return table[kernel]
+	except KeyError:
+		raise ValueError('Unknown noise kernel %r, expected one of %s'
+			% (kernel, ', '.join(sorted(table))))
+
+def grid2(width, height, origin=(0.0, 0.0), step=(1.0, 1.0), kernel='simplex', **kwargs):
+	"""Return 2D noise sampled over a width x height grid as a float memoryview
+	of shape (height, width), computed in a single native call.
+
+	kernel -- 'simplex' (see sgrid2) or 'perlin' (see pgrid2). Other
+	keyword arguments are passed through to the kernel's grid function.
+	"""
+	return _kernel(_GRID2, kernel)(width, height, origin, step, **kwargs)
+
+def grid3(width, height, depth, origin=(0.0, 0.0, 0.0), step=(1.0, 1.0, 1.0),
+	kernel='simplex', **kwargs):
+	"""Return 3D noise sampled over a width x height x depth grid as a float
+	memoryview of shape (depth, height, width), computed in a single native
+	call.
+
+	kernel -- 'simplex' (see sgrid3) or 'perlin' (see pgrid3). Other
+	keyword arguments are passed through to the kernel's grid function.
+	"""
+	return _kernel(_GRID3, kernel)(width, height, depth, origin, step, **kwargs)
+
+def bounds3(box, kernel='simplex', **kwargs):
+	"""Return (lo, hi), conservative bounds of 3D fBm noise over the box
+	((x0, y0, z0), (x1, y1, z1)): every value of the noise in the box is
+	within them. Regions such as voxel chunks whose bounds are all above or
+	all below a threshold can be skipped without evaluating the noise.
+
+	kernel -- 'simplex' (see sbounds3) or 'perlin' (see pbounds3). Other
+	keyword arguments, octaves, persistence etc., are passed through to the
+	kernel's bounds function and must match those the noise is evaluated with.
+	"""
+	return _kernel(_BOUNDS3, kernel)(box, **kwargs)
+
+def sample(points, kernel='simplex3', **kwargs):
+	"""Return noise evaluated at scattered points, as a float memoryview of N
+	values, computed in a single native call.
+
+	points -- a buffer of C floats or doubles of shape (N, D), or a flat
+	buffer of N * D coordinates, e.g. an array of x, y, z triples.
+
+	kernel -- the kernel and the dimension D of the noise, 'simplex2',
+	'simplex3', 'simplex4' (see ssample) or 'perlin1', 'perlin2', 'perlin3'
+	(see psample). Other keyword arguments are passed through to the
+	kernel's sample function.
+	"""
+	func, dim = _kernel(_SAMPLE, kernel)
+	return func(points, dim=dim, **kwargs)
+
+_BLENDS = ('linear', 'smooth', 'step')
+
+def color_ramp(stops, size=256, blend='linear'):
+	"""Return a colour table for the lut argument of the array, grid and
+	sample functions, as a uint8 memoryview of shape (size, channels). The
+	noise is then written as RGB or RGBA texels as it is computed.
+
+	stops -- (value, color) pairs in increasing order of value, where value
+	is a noise value and color an (r, g, b) or (r, g, b, a) tuple of floats
+	in [0, 1]. The colour is constant below the first stop and above the
+	last.
+
+	size -- the number of colours. Entry i is the colour at the middle of
+	the i-th of size equal intervals of [-1, 1], which is how the lut
+	argument maps noise values by default.
+
+	blend -- how the colours between two stops are blended: 'linear',
+	'smooth' (easing in and out of each stop, with smoothstep) or 'step',
+	the colour of the stop below.
+	"""
+	if blend not in _BLENDS:
+		raise ValueError('Unknown blend %r, expected one of %s' % (blend, ', '.join(_BLENDS)))
+	if not 1 <= size <= 65536:
+		raise ValueError('Expected size from 1 to 65536')
+	stops = [(float(value), [float(c) for c in color]) for value, color in stops]
+	if not stops:
+		raise ValueError('Expected at least one stop')
+	channels = len(stops[0][1])
+	if channels not in (3, 4) or any(len(color) != channels for value, color in stops):
+		raise ValueError('Expected all colors to be (r, g, b) or all (r, g, b, a)')
+	if any(a[0] > b[0] for a, b in zip(stops, stops[1:])):
+		raise ValueError('Expected stops in increasing order of value')
+	table = bytearray(size * channels)
+	k = 0
+	for i in range(size):
+		value = -1.0 + (i + 0.5) * 2.0 / size
+		# stops[k - 1] is the last stop at or below value
+		while k < len(stops) and stops[k][0] <= value:
+			k += 1
+		if k == 0:
+			color = stops[0][1]
+		elif k == len(stops) or blend == 'step':
+			color = stops[k - 1][1]
+		else:
+			(v0, c0), (v1, c1) = stops[k - 1], stops[k]
+			t = (value - v0) / (v1 - v0)
+			if blend == 'smooth':
+				t = t * t * (3.0 - 2.0 * t)
+			color = [a + (b - a) * t for a, b in zip(c0, c1)]
+		table[i * channels:(i + 1) * channels] = bytes(
+			min(max(int(c * 255.0 + 0.5), 0), 255) for c in color)
+	return memoryview(table).cast('B', (size, channels))
+
+class Noise(object):
+	"""Noise functions using their own permutation table, shuffled from seed,
+	so that each seed generates a different noise pattern at native speed.
+	The same seed always generates the same noise. If seed is None, the noise
+	is the same as the module functions'.
+
+	The snoise*, pnoise*, *_array and *grid* attributes are the native
+	methods of the underlying _simplex.Simplex and _perlin.Perlin objects,
+	taking the same arguments as the module functions of the same name.
+	"""
+
+	def __init__(self, seed=None):
+		self.seed = seed
+		self.simplex = simplex = _simplex.Simplex(seed)
+		self.perlin = perlin = _perlin.Perlin(seed)
+		self.snoise2 = simplex.noise2
+		self.snoise3 = simplex.noise3
+		self.snoise4 = simplex.noise4
+		self.snoise2_array = simplex.noise2_array
+		self.snoise3_array = simplex.noise3_array
+		self.snoise2_grad = simplex.noise2_grad
+		self.snoise3_grad = simplex.noise3_grad
+		self.snoise2_grad_array = simplex.noise2_grad_array
+		self.snoise3_grad_array = simplex.noise3_grad_array
+		self.snoise3_above = simplex.noise3_above
+		self.snoise3_above_array = simplex.noise3_above_array
+		self.sbounds3 = simplex.bounds3
+		self.sgrid2 = simplex.grid2
+		self.sgrid3 = simplex.grid3
+		self.ssample = simplex.sample
+		self.snoise3_volume = simplex.volume3
+		self.pnoise1 = perlin.noise1
+		self.pnoise2 = perlin.noise2
+		self.pnoise3 = perlin.noise3
+		self.pnoise1_array = perlin.noise1_array
+		self.pnoise2_array = perlin.noise2_array
+		self.pnoise3_array = perlin.noise3_array
+		self.pnoise3_grad = perlin.noise3_grad
+		self.pnoise3_grad_array = perlin.noise3_grad_array
+		self.pnoise3_above = perlin.noise3_above
+		self.pnoise3_above_array = perlin.noise3_above_array
+		self.pbounds3 = perlin.bounds3
+		self.pgrid2 = perlin.grid2
+		self.pgrid3 = perlin.grid3
+		self.psample = perlin.sample
+
+	def grid2(self, width, height, origin=(0.0, 0.0), step=(1.0, 1.0), kernel='simplex',
+		**kwargs):
+		"""Same as the module grid2 function, using this object's table"""
+		table = {'simplex': self.sgrid2, 'perlin': self.pgrid2}
+		return _kernel(table, kernel)(width, height, origin, step, **kwargs)
+
+	def grid3(self, width, height, depth, origin=(0.0, 0.0, 0.0), step=(1.0, 1.0, 1.0),
+		kernel='simplex', **kwargs):
+		"""Same as the module grid3 function, using this object's table"""
+		table = {'simplex': self.sgrid3, 'perlin': self.pgrid3}
+		return _kernel(table, kernel)(width, height, depth, origin, step, **kwargs)
+
+	def bounds3(self, box, kernel='simplex', **kwargs):
+		"""Same as the module bounds3 function, using this object's table"""
+		table = {'simplex': self.sbounds3, 'perlin': self.pbounds3}
+		return _kernel(table, kernel)(box, **kwargs)
+
+	def sample(self, points, kernel='simplex3', **kwargs):
+		"""Same as the module sample function, using this object's table"""
+		func, dim = _kernel(_SAMPLE, kernel)
+		func = self.ssample if func is ssample else self.psample
+		return func(points, dim=dim, **kwargs)
+
+	def __repr__(self):
+		return '%s(seed=%r)' % (type(self).__name__, self.seed)
@@ -0,0 +1,1246 @@
+// Copyright (c) 2008, Casey Duncan (casey dot duncan at gmail dot com)
+// see LICENSE.txt for details
+
+// Buffer helpers shared by the batch (array and grid) entry points of the
+// native noise modules. Coordinates may be passed as any contiguous buffer
+// of C floats or doubles, results are written as C floats.
+
+#include "Python.h"
+
+typedef struct {
+	Py_buffer view;
+	char kind; // 'f' or 'd'
+	Py_ssize_t len;
+	const char *buf; // the first coordinate
+	Py_ssize_t stride; // in items, 1 unless the coordinates are a column of points
+} CoordBuffer;
+
+typedef struct {
+	Py_buffer view;
+	PyObject *result;
+	float *data; // the values if they are C floats
+	char *bytes; // the values of any type
+	Py_ssize_t len;
+} OutBuffer;
+
+// Return the struct format character of a buffer if it is a native
+// single item format, or 0 otherwise
+static char
+native_format(const Py_buffer *view)
+{
+	const char *fmt = view->format;
+	const int one = 1;
+	const int little = *(const char *) &one;
+
+	if (fmt == NULL)
+		return 'B';
+	if (fmt[0] == '@' || fmt[0] == '=') {
+		fmt++;
+	} else if (fmt[0] == '<' || fmt[0] == '>' || fmt[0] == '!') {
+		if ((fmt[0] == '<') != little)
+			return 0;
+		fmt++;
+	}
+	if (fmt[0] == '\0' || fmt[1] != '\0')
+		return 0;
+	return fmt[0];
+}
+
+// Types of the values the batch functions write. Values are remapped as
+// value * scale + offset and optionally clamped, integer values are always
+// clamped to the range of the type and then truncated toward zero, like
+// int(). float16 values are IEEE half floats, rounded to nearest even.
+// Values may instead be looked up in a colour table (lut) by their
+// truncated index, writing the colour's bytes.
+#define VALUE_FLOAT32 0
+#define VALUE_FLOAT16 1
+#define VALUE_UINT8 2
+#define VALUE_INT8 3
+#define VALUE_UINT16 4
+#define VALUE_LUT 5 // not a dtype, set by the lut argument
+
+static const char *value_dtypes[] = {"float32", "float16", "uint8", "int8", "uint16", NULL};
+static const char value_format_chars[] = {'f', 'e', 'B', 'b', 'H', 'B'};
+static const Py_ssize_t value_itemsizes[] = {sizeof(float), 2, 1, 1, 2, 1};
+static const float value_min[] = {0.0f, 0.0f, 0.0f, -128.0f, 0.0f, 0.0f};
+static const float value_max[] = {0.0f, 0.0f, 255.0f, 127.0f, 65535.0f, 0.0f};
+
+#define VALUE_INTEGER(dtype) ((dtype) >= VALUE_UINT8)
+
+// The most colours of a lut
+#define VALUE_LUT_MAX 65536
+
+typedef struct {
+	int dtype;
+	float scale;
+	float offset;
+	int clamp; // whether values are clamped to [lo, hi]
+	float lo;
+	float hi;
+	Py_buffer lut; // the colours of a VALUE_LUT format, lut.obj is NULL if none
+	int channels; // the bytes per colour
+} ValueFormat;
+
+#define VALUE_FORMAT_INIT {VALUE_FLOAT32, 1.0f, 0.0f, 0, 0.0f, 0.0f}
+
+// PyArg_Parse "O&" converter of a dtype name to its VALUE_* value
+static int
+value_dtype_converter(PyObject *obj, void *dtype)
+{
+	int i;
+
+	if (PyUnicode_Check(obj)) {
+		for (i = 0; value_dtypes[i] != NULL; i++) {
+			if (PyUnicode_CompareWithASCIIString(obj, value_dtypes[i]) == 0) {
+				*(int *) dtype = i;
+				return 1;
+			}
+		}
+	}
+	PyErr_Format(PyExc_ValueError,
+		"Unknown dtype %R, expected one of float32, float16, uint8, int8, uint16", obj);
+	return 0;
+}
+
+// Use the colour table lut, a buffer of shape (N, 3) or (N, 4) of uint8
+// RGB or RGBA colours, for the values of f
+static int
+value_lut_setup(ValueFormat *f, PyObject *lut)
+{
+	const Py_buffer *view = &f->lut;
+
+	if (f->dtype != VALUE_FLOAT32) {
+		PyErr_SetString(PyExc_ValueError, "lut can not be combined with dtype");
+		return -1;
+	}
+	if (PyObject_GetBuffer(lut, &f->lut, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0)
+		return -1;
+	if (native_format(view) != 'B' || view->ndim != 2 || (view->shape[1] != 3
+		&& view->shape[1] != 4) || view->shape[0] < 1 || view->shape[0] > VALUE_LUT_MAX) {
+		PyErr_SetString(PyExc_ValueError,
+			"lut must be a buffer of shape (N, 3) or (N, 4) of uint8 colours, N <= 65536");
+		PyBuffer_Release(&f->lut);
+		return -1;
+	}
+	f->dtype = VALUE_LUT;
+	f->channels = (int) view->shape[1];
+	return 0;
+}
+
+// Set the remapping of a value format from the value_scale, value_offset,
+// clamp and lut arguments. If None, integer types map [-1, 1] onto their
+// whole range, a lut of N colours maps it onto N equal intervals, and float
+// values are unchanged. clamp is a (low, high) tuple of the remapped
+// values, narrowed to the range of integer types and colour indices.
+// Returns -1 with an exception set on error, after which
+// value_format_free() need not be called.
+static int
+value_format_setup(ValueFormat *f, PyObject *scale, PyObject *offset, PyObject *clamp,
+	PyObject *lut)
+{
+	float lo, hi;
+	double v, clamp_lo, clamp_hi;
+
+	if (lut != NULL && lut != Py_None && value_lut_setup(f, lut) < 0)
+		return -1;
+	lo = value_min[f->dtype];
+	hi = value_max[f->dtype];
+	f->scale = VALUE_INTEGER(f->dtype) ? (hi - lo) * 0.5f : 1.0f;
+	f->offset = VALUE_INTEGER(f->dtype) ? (hi + lo) * 0.5f : 0.0f;
+	if (f->dtype == VALUE_LUT) {
+		hi = (float) (f->lut.shape[0] - 1);
+		f->scale = f->offset = (float) f->lut.shape[0] * 0.5f;
+	}
+	f->clamp = VALUE_INTEGER(f->dtype);
+	f->lo = lo;
+	f->hi = hi;
+	if (scale != NULL && scale != Py_None) {
+		if ((v = PyFloat_AsDouble(scale)) == -1.0 && PyErr_Occurred())
+			goto error;
+		f->scale = (float) v;
+	}
+	if (offset != NULL && offset != Py_None) {
+		if ((v = PyFloat_AsDouble(offset)) == -1.0 && PyErr_Occurred())
+			goto error;
+		f->offset = (float) v;
+	}
+	if (clamp != NULL && clamp != Py_None) {
+		if (!PyTuple_Check(clamp) || !PyArg_ParseTuple(clamp, "dd", &clamp_lo, &clamp_hi)) {
+			PyErr_SetString(PyExc_TypeError, "clamp must be a (low, high) tuple");
+			goto error;
+		}
+		if (!(clamp_lo <= clamp_hi)) {
+			PyErr_SetString(PyExc_ValueError, "Expected clamp low <= high");
+			goto error;
+		}
+		if (f->clamp) {
+			clamp_lo = clamp_lo < lo ? lo : (clamp_lo > hi ? hi : clamp_lo);
+			clamp_hi = clamp_hi < lo ? lo : (clamp_hi > hi ? hi : clamp_hi);
+		}
+		f->clamp = 1;
+		f->lo = (float) clamp_lo;
+		f->hi = (float) clamp_hi;
+	}
+	return 0;
+
+error:
+	if (f->lut.obj != NULL)
+		PyBuffer_Release(&f->lut);
+	return -1;
+}
+
+// Release the colour table of a value format
+static void
+value_format_free(ValueFormat *f)
+{
+	if (f->lut.obj != NULL)
+		PyBuffer_Release(&f->lut);
+}
+
+// The bytes written per value
+#define VALUE_ITEMSIZE(f) ((f)->dtype == VALUE_LUT ? (Py_ssize_t) (f)->channels \
+	: value_itemsizes[(f)->dtype])
+
+// Whether values are written unchanged as C floats
+#define VALUE_DIRECT(f) ((f)->dtype == VALUE_FLOAT32 && (f)->scale == 1.0f \
+	&& (f)->offset == 0.0f && !(f)->clamp)
+
+// Return the bits of the IEEE half float nearest to value, ties to even.
+// Values too large for a half become infinite.
+static inline unsigned short
+float_to_half(float value)
+{
+	// Normal halves are computed by rounding the float's mantissa to 10
+	// bits, subnormal ones by adding a power of two that aligns the value's
+	// bits with the half mantissa, letting the float addition round it
+	union { unsigned int u; float f; } v, magic;
+	unsigned int sign;
+	unsigned short h;
+
+	v.f = value;
+	sign = (v.u >> 16) & 0x8000u;
+	v.u &= 0x7fffffffu;
+	if (v.u >= (127u + 16u) << 23) {
+		// 65536 and beyond, infinity or nan
+		h = v.u > 0x7f800000u ? 0x7e00u : 0x7c00u;
+	} else if (v.u < 113u << 23) {
+		magic.u = 126u << 23;
+		v.f += magic.f;
+		h = (unsigned short) (v.u - magic.u);
+	} else {
+		const unsigned int odd = (v.u >> 13) & 1u;
+		v.u += ((unsigned int) (15 - 127) << 23) + 0xfffu + odd;
+		h = (unsigned short) (v.u >> 13);
+	}
+	return (unsigned short) (h | sign);
+}
+
+// Write count values to out in a value format
+static void
+values_store(const ValueFormat *f, const float *values, char *out, Py_ssize_t count)
+{
+	const float scale = f->scale;
+	const float offset = f->offset;
+	const float lo = f->lo;
+	const float hi = f->hi;
+	Py_ssize_t i;
+
+#define VALUE_CLAMP(v) ((v) > lo ? ((v) < hi ? (v) : hi) : lo)
+	switch (f->dtype) {
+	case VALUE_UINT8:
+		for (i = 0; i < count; i++) {
+			const float v = values[i] * scale + offset;
+			((unsigned char *) out)[i] = (unsigned char) VALUE_CLAMP(v);
+		}
+		break;
+	case VALUE_INT8:
+		for (i = 0; i < count; i++) {
+			const float v = values[i] * scale + offset;
+			((signed char *) out)[i] = (signed char) VALUE_CLAMP(v);
+		}
+		break;
+	case VALUE_UINT16:
+		for (i = 0; i < count; i++) {
+			const float v = values[i] * scale + offset;
+			((unsigned short *) out)[i] = (unsigned short) VALUE_CLAMP(v);
+		}
+		break;
+	case VALUE_FLOAT16:
+		for (i = 0; i < count; i++) {
+			const float v = values[i] * scale + offset;
+			((unsigned short *) out)[i] = float_to_half(f->clamp ? VALUE_CLAMP(v) : v);
+		}
+		break;
+	case VALUE_LUT:
+		for (i = 0; i < count; i++) {
+			const float v = values[i] * scale + offset;
+			const unsigned char *color = (const unsigned char *) f->lut.buf
+				+ (Py_ssize_t) VALUE_CLAMP(v) * f->channels;
+			unsigned char *texel = (unsigned char *) out + i * f->channels;
+			texel[0] = color[0];
+			texel[1] = color[1];
+			texel[2] = color[2];
+			if (f->channels == 4)
+				texel[3] = color[3];
+		}
+		break;
+	default:
+		for (i = 0; i < count; i++) {
+			const float v = values[i] * scale + offset;
+			((float *) out)[i] = f->clamp ? VALUE_CLAMP(v) : v;
+		}
+	}
+#undef VALUE_CLAMP
+}
+
+// Where the values of a batch are written. C floats are computed straight
+// into the output buffer, other value formats in spans of up to VALUE_SPAN
+// floats that are then converted into it.
+typedef struct {
+	float *data;
+	char *bytes;
+	const ValueFormat *fmt; // NULL for C floats
+} ValueOut;
+
+#define VALUE_SPAN 256
+
+// The number of values to compute at once, of remaining values left
+static inline Py_ssize_t
+value_span_len(const ValueOut *o, Py_ssize_t remaining)
+{
+	return o->fmt == NULL || remaining <= VALUE_SPAN ? remaining : VALUE_SPAN;
+}
+
+// Return where to compute the values starting at index: the output buffer
+// itself for C floats, otherwise span
+static inline float *
+value_span(const ValueOut *o, Py_ssize_t index, float *span)
+{
+	return o->fmt == NULL ? o->data + index : span;
+}
+
+// Write count values computed in the buffer returned by value_span()
+static inline void
+value_store(const ValueOut *o, Py_ssize_t index, const float *values, Py_ssize_t count)
+{
+	if (o->fmt != NULL)
+		values_store(o->fmt, values, o->bytes + index * VALUE_ITEMSIZE(o->fmt), count);
+}
+
+// Computes the values [start, start + count) of a batch into out
+typedef void (*span_func)(const void *args, Py_ssize_t start, float *out, Py_ssize_t count);
+
+// Compute the values [start, stop) of a batch one span at a time
+static inline void
+value_spans(const ValueOut *o, span_func func, const void *args, Py_ssize_t start,
+	Py_ssize_t stop)
+{
+	float span[VALUE_SPAN];
+	Py_ssize_t n, count;
+
+	for (n = start; n < stop; n += count) {
+		float *out = value_span(o, n, span);
+		count = value_span_len(o, stop - n);
+		func(args, n, out, count);
+		value_store(o, n, out, count);
+	}
+}
+
+static int
+coords_get(PyObject *obj, CoordBuffer *cb, const char *name)
+{
+	if (PyObject_GetBuffer(obj, &cb->view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0)
+		return -1;
+	cb->kind = native_format(&cb->view);
+	if ((cb->kind != 'f' || cb->view.itemsize != sizeof(float))
+		&& (cb->kind != 'd' || cb->view.itemsize != sizeof(double))) {
+		PyErr_Format(PyExc_TypeError,
+			"%s must be a buffer of C floats or doubles", name);
+		PyBuffer_Release(&cb->view);
+		return -1;
+	}
+	cb->len = cb->view.len / cb->view.itemsize;
+	cb->buf = (const char *) cb->view.buf;
+	cb->stride = 1;
+	return 0;
+}
+
+static inline float
+coords_at(const CoordBuffer *cb, Py_ssize_t i)
+{
+	if (cb->kind == 'f')
+		return ((const float *) cb->buf)[i * cb->stride];
+	return (float) ((const double *) cb->buf)[i * cb->stride];
+}
+
+// Acquire a buffer of points of shape (N, D) as the D coordinate buffers of
+// its columns, storing D in dim. A flat buffer of N * D coordinates is also
+// accepted if expected_dim is given, otherwise D must be between min_dim and
+// max_dim. Only the first buffer holds the view, release it with
+// coords_release_all(cbs, 1).
+static int
+coords_get_points(PyObject *obj, CoordBuffer *cbs, int *dim, int expected_dim,
+	int min_dim, int max_dim)
+{
+	CoordBuffer *cb = &cbs[0];
+	Py_ssize_t count;
+	int d;
+
+	if (PyObject_GetBuffer(obj, &cb->view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0)
+		return -1;
+	cb->kind = native_format(&cb->view);
+	if ((cb->kind != 'f' || cb->view.itemsize != sizeof(float))
+		&& (cb->kind != 'd' || cb->view.itemsize != sizeof(double))) {
+		PyErr_SetString(PyExc_TypeError, "points must be a buffer of C floats or doubles");
+		goto fail;
+	}
+	count = cb->view.len / cb->view.itemsize;
+	if (cb->view.ndim == 2) {
+		*dim = (int) cb->view.shape[1];
+		if (expected_dim != 0) {
+			min_dim = max_dim = expected_dim;
+		}
+		if (*dim < min_dim || *dim > max_dim) {
+			if (min_dim == max_dim)
+				PyErr_Format(PyExc_ValueError, "points must have shape (N, %d), got (%zd, %zd)",
+					min_dim, cb->view.shape[0], cb->view.shape[1]);
+			else
+				PyErr_Format(PyExc_ValueError,
+					"points must have shape (N, D) with D from %d to %d, got (%zd, %zd)",
+					min_dim, max_dim, cb->view.shape[0], cb->view.shape[1]);
+			goto fail;
+		}
+	} else if (cb->view.ndim <= 1 && expected_dim != 0) {
+		*dim = expected_dim;
+		if (count % expected_dim != 0) {
+			PyErr_Format(PyExc_ValueError,
+				"points must have a multiple of %d coordinates, got %zd", expected_dim, count);
+			goto fail;
+		}
+	} else {
+		PyErr_SetString(PyExc_ValueError,
+			"points must have shape (N, D), or dim must be given for a flat buffer");
+		goto fail;
+	}
+	for (d = 0; d < *dim; d++) {
+		if (d > 0) {
+			cbs[d].kind = cb->kind;
+			cbs[d].view.obj = NULL;
+		}
+		cbs[d].len = count / *dim;
+		cbs[d].buf = (const char *) cb->view.buf + d * cb->view.itemsize;
+		cbs[d].stride = *dim;
+	}
+	return 0;
+fail:
+	PyBuffer_Release(&cb->view);
+	return -1;
+}
+
+// Acquire all coordinate buffers, which must have the same length.
+// On failure, any buffers already acquired are released.
+static int
+coords_get_all(PyObject **objs, CoordBuffer *cbs, int count, const char **names)
+{
+	int c;
+
+	for (c = 0; c < count; c++) {
+		if (coords_get(objs[c], &cbs[c], names[c]) < 0)
+			goto fail;
+		if (c > 0 && cbs[c].len != cbs[0].len) {
+			PyErr_Format(PyExc_ValueError, "%s and %s must have the same length",
+				names[0], names[c]);
+			PyBuffer_Release(&cbs[c].view);
+			goto fail;
+		}
+	}
+	return 0;
+fail:
+	while (--c >= 0)
+		PyBuffer_Release(&cbs[c].view);
+	return -1;
+}
+
+// Parse the repeat argument of the point functions into dim intervals,
+// either a single interval for all axes or a sequence of one per axis.
+// None leaves the intervals unchanged. Returns -1 with an exception set on
+// error.
+static int
+points_repeat(PyObject *obj, float *repeat, int dim)
+{
+	PyObject *seq;
+	int d;
+
+	if (obj == NULL || obj == Py_None)
+		return 0;
+	if (PyNumber_Check(obj) && !PySequence_Check(obj)) {
+		double r = PyFloat_AsDouble(obj);
+		if (r == -1.0 && PyErr_Occurred())
+			return -1;
+		for (d = 0; d < dim; d++)
+			repeat[d] = (float) r;
+		return 0;
+	}
+	seq = PySequence_Fast(obj, "repeat must be a number or a sequence of numbers");
+	if (seq == NULL)
+		return -1;
+	if (PySequence_Fast_GET_SIZE(seq) != dim) {
+		PyErr_Format(PyExc_ValueError, "repeat must have %d intervals, got %zd",
+			dim, PySequence_Fast_GET_SIZE(seq));
+		Py_DECREF(seq);
+		return -1;
+	}
+	for (d = 0; d < dim; d++) {
+		double r = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(seq, d));
+		if (r == -1.0 && PyErr_Occurred()) {
+			Py_DECREF(seq);
+			return -1;
+		}
+		repeat[d] = (float) r;
+	}
+	Py_DECREF(seq);
+	return 0;
+}
+
+static void
+coords_release_all(CoordBuffer *cbs, int count)
+{
+	int c;
+
+	for (c = 0; c < count; c++)
+		PyBuffer_Release(&cbs[c].view);
+}
+
+// Prepare the output buffer for len results of a VALUE_* type. If out is
+// None or NULL a new memoryview with the given shape (or flat, if empty) is
+// allocated and returned as the result, otherwise out must be a writable
+// buffer of exactly len values of the type and is returned itself.
+static int
+out_get_values(PyObject *out, OutBuffer *ob, Py_ssize_t len, int ndim, const Py_ssize_t *shape,
+	int dtype)
+{
+	const Py_ssize_t itemsize = value_itemsizes[dtype];
+	char format[2] = {value_format_chars[dtype], '\0'};
+	char found;
+
+#if PY_VERSION_HEX < 0x030C0000
+	// memoryview supports half floats from Python 3.12, before that the
+	// bits of float16 values are returned as unsigned shorts
+	if (dtype == VALUE_FLOAT16)
+		format[0] = 'H';
+#endif
+
+	ob->len = len;
+	ob->view.obj = NULL;
+	if (out == NULL || out == Py_None) {
+		PyObject *bytes, *mem, *shape_tuple;
+		int d;
+
+		if (len == 0) {
+			// memoryview can not cast empty buffers, use an empty array instead
+			PyObject *array = PyImport_ImportModule("array");
+			PyObject *empty;
+
+			if (array == NULL)
+				return -1;
+			empty = PyObject_CallMethod(array, "array", "s", format);
+			Py_DECREF(array);
+			if (empty == NULL)
+				return -1;
+			ob->result = PyMemoryView_FromObject(empty);
+			Py_DECREF(empty);
+			ob->data = NULL;
+			ob->bytes = NULL;
+			return ob->result == NULL ? -1 : 0;
+		}
+		bytes = PyByteArray_FromStringAndSize(NULL, len * itemsize);
+		if (bytes == NULL)
+			return -1;
+		ob->bytes = PyByteArray_AS_STRING(bytes);
+		ob->data = (float *) ob->bytes;
+		mem = PyMemoryView_FromObject(bytes);
+		Py_DECREF(bytes);
+		if (mem == NULL)
+			return -1;
+		shape_tuple = PyTuple_New(ndim);
+		if (shape_tuple == NULL) {
+			Py_DECREF(mem);
+			return -1;
+		}
+		for (d = 0; d < ndim; d++)
+			PyTuple_SET_ITEM(shape_tuple, d, PyLong_FromSsize_t(shape[d]));
+		ob->result = PyObject_CallMethod(mem, "cast", "sO", format, shape_tuple);
+		Py_DECREF(shape_tuple);
+		Py_DECREF(mem);
+		return ob->result == NULL ? -1 : 0;
+	}
+	if (PyObject_GetBuffer(out, &ob->view,
+		PyBUF_C_CONTIGUOUS | PyBUF_FORMAT | PyBUF_WRITABLE) < 0)
+		return -1;
+	// float16 values may also be written to unsigned shorts as bits
+	found = native_format(&ob->view);
+	if ((found != value_format_chars[dtype] && !(dtype == VALUE_FLOAT16 && found == 'H'))
+		|| ob->view.itemsize != itemsize) {
+		if (dtype == VALUE_FLOAT32)
+			PyErr_SetString(PyExc_TypeError, "out must be a writable buffer of C floats");
+		else
+			PyErr_Format(PyExc_TypeError, "out must be a writable buffer of %s values",
+				value_dtypes[dtype]);
+		PyBuffer_Release(&ob->view);
+		return -1;
+	}
+	if (ob->view.len / ob->view.itemsize != len) {
+		PyErr_Format(PyExc_ValueError, "out must have room for exactly %zd values", len);
+		PyBuffer_Release(&ob->view);
+		return -1;
+	}
+	ob->bytes = (char *) ob->view.buf;
+	ob->data = (float *) ob->bytes;
+	Py_INCREF(out);
+	ob->result = out;
+	return 0;
+}
+
+// Prepare the output buffer for len values of a format, NULL for C floats,
+// and set vo to write them
+static int
+out_get_format(PyObject *out, OutBuffer *ob, ValueOut *vo, const ValueFormat *fmt,
+	Py_ssize_t len, int ndim, const Py_ssize_t *shape)
+{
+	Py_ssize_t texels[PyBUF_MAX_NDIM + 1];
+	int d;
+
+	if (fmt != NULL && VALUE_DIRECT(fmt))
+		fmt = NULL;
+	if (fmt != NULL && fmt->dtype == VALUE_LUT) {
+		if (ndim >= PyBUF_MAX_NDIM) {
+			PyErr_SetString(PyExc_ValueError, "too many dimensions for colours");
+			return -1;
+		}
+		// Colours are rows of bytes
+		for (d = 0; d < ndim; d++)
+			texels[d] = shape[d];
+		texels[ndim] = fmt->channels;
+		if (out_get_values(out, ob, len * fmt->channels, ndim + 1, texels, VALUE_UINT8) < 0)
+			return -1;
+	} else if (out_get_values(out, ob, len, ndim, shape,
+		fmt != NULL ? fmt->dtype : VALUE_FLOAT32) < 0) {
+		return -1;
+	}
+	vo->data = ob->data;
+	vo->bytes = ob->bytes;
+	vo->fmt = fmt;
+	return 0;
+}
+
+// Prepare the output buffer for one value per coordinate, shaped like the
+// coordinate buffer
+static int
+out_get_like(PyObject *out, OutBuffer *ob, ValueOut *vo, const ValueFormat *fmt,
+	const CoordBuffer *cb)
+{
+	if (cb->view.ndim == 0)
+		return out_get_format(out, ob, vo, fmt, cb->len, 1, &cb->len);
+	return out_get_format(out, ob, vo, fmt, cb->len, cb->view.ndim, cb->view.shape);
+}
+
+// Prepare the output buffer for width C floats per coordinate, as rows of
+// shape (len, width)
+static int
+out_get_rows(PyObject *out, OutBuffer *ob, ValueOut *vo, const CoordBuffer *cb, int width)
+{
+	const Py_ssize_t shape[2] = {cb->len, width};
+
+	if (cb->len > PY_SSIZE_T_MAX / (Py_ssize_t) sizeof(float) / width) {
+		PyErr_SetString(PyExc_OverflowError, "too many coordinates");
+		return -1;
+	}
+	return out_get_format(out, ob, vo, NULL, cb->len * width, 2, shape);
+}
+
+// Release the output buffer, returning the result object, or NULL after
+// discarding it if failed is true
+static PyObject *
+out_finish(OutBuffer *ob, int failed)
+{
+	if (ob->view.obj != NULL)
+		PyBuffer_Release(&ob->view);
+	if (failed) {
+		Py_CLEAR(ob->result);
+		return NULL;
+	}
+	return ob->result;
+}
+
+// A regular lattice of sample points. Coordinates along each axis are
+// computed as origin + index * step, in double precision so that they do
+// not drift over long rows. The grid is evaluated one row (along x) at a
+// time, rows are numbered over all y and z indices.
+typedef struct {
+	int ndim;
+	Py_ssize_t size[3]; // width, height, depth
+	double origin[3];
+	double step[3];
+	Py_ssize_t rows;
+	float *xs; // x coordinate of each column
+	const ValueFormat *fmt; // the format of the values, NULL for C floats
+	ValueOut out;
+} GridSpec;
+
+// Validate the grid size, allocate the output buffer and column
+// coordinates. Returns -1 with an exception set on failure, after which
+// grid_finish() must still be called.
+static int
+grid_setup(GridSpec *g, OutBuffer *ob, PyObject *out)
+{
+	Py_ssize_t shape[3];
+	Py_ssize_t len = 1;
+	Py_ssize_t i;
+	int d;
+
+	g->xs = NULL;
+	ob->result = NULL;
+	ob->view.obj = NULL;
+	for (d = 0; d < g->ndim; d++) {
+		if (g->size[d] < 0) {
+			PyErr_SetString(PyExc_ValueError, "grid dimensions must not be negative");
+			return -1;
+		}
+		if (g->size[d] > 0 && len > PY_SSIZE_T_MAX / (Py_ssize_t) sizeof(float) / g->size[d]) {
+			PyErr_SetString(PyExc_OverflowError, "grid is too large");
+			return -1;
+		}
+		len *= g->size[d];
+		shape[g->ndim - d - 1] = g->size[d];
+	}
+	g->rows = g->size[0] > 0 ? len / g->size[0] : 0;
+	if (out_get_format(out, ob, &g->out, g->fmt, len, g->ndim, shape) < 0)
+		return -1;
+	g->xs = (float *) PyMem_Malloc((g->size[0] + 1) * sizeof(float));
+	if (g->xs == NULL) {
+		PyErr_NoMemory();
+		return -1;
+	}
+	for (i = 0; i < g->size[0]; i++)
+		g->xs[i] = (float) (g->origin[0] + i * g->step[0]);
+	return 0;
+}
+
+// Return the y coordinate of a grid row
+static inline float
+grid_y(const GridSpec *g, Py_ssize_t row)
+{
+	return (float) (g->origin[1] + (row % g->size[1]) * g->step[1]);
+}
+
+// Return the z coordinate of a grid row
+static inline float
+grid_z(const GridSpec *g, Py_ssize_t row)
+{
+	return (float) (g->origin[2] + (row / g->size[1]) * g->step[2]);
+}
+
+// The number of columns of a row to compute at once, starting at col
+static inline Py_ssize_t
+grid_span_len(const GridSpec *g, Py_ssize_t col)
+{
+	return value_span_len(&g->out, g->size[0] - col);
+}
+
+// Return where to compute the values of a row starting at col, see
+// value_span()
+static inline float *
+grid_span(const GridSpec *g, Py_ssize_t row, Py_ssize_t col, float *span)
+{
+	return value_span(&g->out, row * g->size[0] + col, span);
+}
+
+// Write count values computed in the buffer returned by grid_span()
+static inline void
+grid_store(const GridSpec *g, Py_ssize_t row, Py_ssize_t col, const float *values,
+	Py_ssize_t count)
+{
+	value_store(&g->out, row * g->size[0] + col, values, count);
+}
+
+// Release the grid's scratch memory and the output buffer. Returns the
+// result object or NULL if failed is true.
+static PyObject *
+grid_finish(GridSpec *g, OutBuffer *ob, int failed)
+{
+	PyMem_Free(g->xs);
+	g->xs = NULL;
+	return out_finish(ob, failed || ob->result == NULL);
+}
+
+// Fractal modes, the ways the octaves of noise are combined
+#define FRACTAL_FBM 0        // sum of the octaves
+#define FRACTAL_TURBULENCE 1 // sum of the absolute octaves, billowy noise in [0, 1]
+#define FRACTAL_RIDGED 2     // ridged multifractal, sharp crests in [0, 1]
+#define FRACTAL_HYBRID 3     // hybrid multifractal, smooth valleys and rough peaks
+
+static const char *fractal_modes[] = {"fbm", "turbulence", "ridged", "hybrid", NULL};
+
+// PyArg_Parse "O&" converter of a fractal mode name to its FRACTAL_* value
+static int
+fractal_mode_converter(PyObject *obj, void *mode)
+{
+	int i;
+
+	if (PyUnicode_Check(obj)) {
+		for (i = 0; fractal_modes[i] != NULL; i++) {
+			if (PyUnicode_CompareWithASCIIString(obj, fractal_modes[i]) == 0) {
+				*(int *) mode = i;
+				return 1;
+			}
+		}
+	}
+	PyErr_Format(PyExc_ValueError,
+		"Unknown fractal mode %R, expected one of fbm, turbulence, ridged, hybrid", obj);
+	return 0;
+}
+
+// Running combination of the octaves of fractal noise, in order of
+// increasing frequency
+typedef struct {
+	float total;
+	float weight; // ridged and hybrid: weight of the next octave
+} Fractal;
+
+#define FRACTAL_INIT {0.0f, 1.0f}
+
+// Offset of the noise in hybrid multifractals, the result is shifted back
+// by it so that a single octave is the same as fbm
+#define HYBRID_OFFSET 0.7f
+
+static inline void
+fractal_add(Fractal *f, int mode, float n, float amp)
+{
+	float s;
+
+	switch (mode) {
+	case FRACTAL_TURBULENCE:
+		f->total += fabsf(n) * amp;
+		break;
+	case FRACTAL_RIDGED:
+		// Crests where the noise crosses zero, sharpened and weighted by
+		// the previous octave so that detail accumulates on the ridges
+		s = 1.0f - fabsf(n);
+		s = s * s * f->weight;
+		f->weight = s * 2.0f > 1.0f ? 1.0f : s * 2.0f;
+		f->total += s * amp;
+		break;
+	case FRACTAL_HYBRID:
+		// Each octave is weighted by the octaves below it, so that low
+		// areas stay smooth
+		s = (n + HYBRID_OFFSET) * amp;
+		f->total += f->weight * s;
+		f->weight *= s;
+		f->weight = f->weight > 1.0f ? 1.0f : (f->weight < 0.0f ? 0.0f : f->weight);
+		break;
+	default:
+		f->total += n * amp;
+	}
+}
+
+// The combined noise, given the sum of the octave amplitudes
+static inline float
+fractal_result(const Fractal *f, int mode, float max)
+{
+	if (mode == FRACTAL_HYBRID)
+		return f->total / max - HYBRID_OFFSET;
+	return f->total / max;
+}
+
+// Domain warping displaces each point by fBm noise, sampled at these
+// offsets from the point for each axis so that the displacements along
+// the axes are not correlated
+static const float WARP_OFFSET[3][3] = {
+	{5.2f, 1.3f, 9.7f}, {12.8f, 7.4f, 3.1f}, {2.9f, 16.3f, 11.6f}};
+
+// The octaves of fBm noise: the frequency and amplitude of each octave and
+// the sum of the amplitudes, computed once for all samples of a batch
+typedef struct {
+	float freq;
+	float amp;
+	int repeat[3];
+	float frepeat[3];
+	float rest; // sum of the magnitudes of the amplitudes of the octaves after this one
+} Octave;
+
+typedef struct {
+	int octaves;
+	float max; // sum of the amplitudes, which the total is divided by
+	Octave *octave;
+	int mode; // FRACTAL_* combination of the octaves
+	float warp; // amount of domain warping, 0 for none
+} OctavePlan;
+
+// Compute the octaves the same way the fbm_noise functions do, so that
+// the results are identical. repeat and frepeat are the integer and float
+// repeat intervals along up to 3 axes to scale by each octave's frequency,
+// either may be NULL if not used. Returns -1 with an exception set on error.
+static int
+plan_init(OctavePlan *plan, int octaves, float persistence, float lacunarity,
+	const int *repeat, const float *frepeat)
+{
+	float freq = 1.0f;
+	float amp = 1.0f;
+	int i, c;
+
+	if (octaves <= 0) {
+		PyErr_SetString(PyExc_ValueError, "Expected octaves value > 0");
+		return -1;
+	}
+	plan->octave = PyMem_New(Octave, octaves);
+	if (plan->octave == NULL) {
+		PyErr_NoMemory();
+		return -1;
+	}
+	plan->octaves = octaves;
+	plan->max = 0.0f;
+	plan->mode = FRACTAL_FBM;
+	plan->warp = 0.0f;
+	for (i = 0; i < octaves; i++) {
+		Octave *o = &plan->octave[i];
+		o->freq = freq;
+		o->amp = amp;
+		for (c = 0; c < 3; c++) {
+			o->repeat[c] = repeat != NULL ? (const int)(repeat[c] * freq) : 0;
+			o->frepeat[c] = frepeat != NULL ? frepeat[c] * freq : 0.0f;
+		}
+		plan->max += amp;
+		freq *= lacunarity;
+		amp *= persistence;
+	}
+	plan->octave[octaves - 1].rest = 0.0f;
+	for (i = octaves - 1; i > 0; i--)
+		plan->octave[i - 1].rest = plan->octave[i].rest + fabsf(plan->octave[i].amp);
+	return 0;
+}
+
+static void
+plan_free(OctavePlan *plan)
+{
+	PyMem_Free(plan->octave);
+	plan->octave = NULL;
+}
+
+// Testing whether fBm noise is above a threshold, stopping at the first
+// octave that decides it. Each octave is a noise value of magnitude at most
+// bound times its amplitude, so once the total of the octaves so far is
+// further from threshold * max than the rest of them can add up to, the
+// remaining octaves can not change the outcome.
+typedef struct {
+	float threshold;
+	float target; // threshold * max, what the total of the octaves is compared with
+	float bound;
+	float slack; // allowance for the rounding of the totals and of the division by max
+} Threshold;
+
+// The results of the threshold tests, 1 if above and 0 if not, as uint8
+#define VALUE_FORMAT_ABOVE {VALUE_UINT8, 1.0f, 0.0f, 0, 0.0f, 255.0f}
+
+static inline void
+threshold_init(Threshold *t, const OctavePlan *plan, float threshold, float bound)
+{
+	const float sum = fabsf(plan->octave[0].amp) + plan->octave[0].rest;
+
+	t->threshold = threshold;
+	t->target = threshold * plan->max;
+	t->bound = bound;
+	t->slack = 1e-5f * (sum * bound + fabsf(t->target));
+	// A sum of amplitudes <= 0 flips or breaks the comparison, evaluate all
+	// the octaves then
+	if (!(plan->max > 0.0f))
+		t->slack = HUGE_VALF;
+}
+
+// Whether the noise is above the threshold given total, the sum of the
+// octaves up to and including octave i: 1 if it is whatever the remaining
+// octaves are, 0 if it can not be, -1 if they have to be evaluated
+static inline int
+threshold_decided(const Threshold *t, const OctavePlan *plan, int i, float total)
+{
+	const float margin = plan->octave[i].rest * t->bound + t->slack;
+
+	if (total - margin > t->target)
+		return 1;
+	if (total + margin < t->target)
+		return 0;
+	return -1;
+}
+
+// Bounds of fBm noise over an axis-aligned box. The noise of each octave is
+// bounded by interval arithmetic over sub-boxes of the box scaled to its
+// frequency, then the octave bounds are summed with their amplitudes.
+typedef struct {
+	double lo;
+	double hi;
+} Interval;
+
+// An octave's box is split into at most BOUNDS_BOXES sub-boxes, as close to
+// cubes as possible
+#define BOUNDS_BOXES 512
+
+static inline void
+interval_union(Interval *a, const Interval *b)
+{
+	a->lo = b->lo < a->lo ? b->lo : a->lo;
+	a->hi = b->hi > a->hi ? b->hi : a->hi;
+}
+
+// The product of a with w, where w >= 0
+static inline Interval
+interval_scale(Interval a, double wlo, double whi)
+{
+	Interval r;
+
+	r.lo = a.lo < 0.0 ? a.lo * whi : a.lo * wlo;
+	r.hi = a.hi > 0.0 ? a.hi * whi : a.hi * wlo;
+	return r;
+}
+
+// Widen the box [lo, hi] for the rounding of the float coordinates the
+// noise is evaluated at
+static inline void
+bounds_widen(double *lo, double *hi)
+{
+	int c;
+
+	for (c = 0; c < 3; c++) {
+		lo[c] -= 1e-5 * (fabs(lo[c]) + 1.0);
+		hi[c] += 1e-5 * (fabs(hi[c]) + 1.0);
+	}
+}
+
+// The number of sub-boxes to split the box [lo, hi] into along each axis,
+// stored in n. Returns 0 if they would have to be wider than a lattice cell
+// to stay within BOUNDS_BOXES, then the octave is not worth bounding.
+static int
+bounds_split(const double *lo, const double *hi, int *n)
+{
+	double step = 0.0;
+	double count;
+	int c;
+
+	for (c = 0; c < 3; c++)
+		step = hi[c] - lo[c] > step ? hi[c] - lo[c] : step;
+	if (step == 0.0) {
+		n[0] = n[1] = n[2] = 1;
+		return 1;
+	}
+	for (step /= 8.0; step <= 1.0; step *= 1.25) {
+		count = 1.0;
+		for (c = 0; c < 3; c++) {
+			const double k = ceil((hi[c] - lo[c]) / step);
+			n[c] = k < 1.0 ? 1 : (k > BOUNDS_BOXES ? BOUNDS_BOXES + 1 : (int) k);
+			count *= n[c];
+		}
+		if (count <= BOUNDS_BOXES)
+			return 1;
+	}
+	return 0;
+}
+
+// The bounds of fBm noise given the bounds of each of the octaves of plan,
+// each within [-bound, bound], widened for rounding
+static Interval
+plan_bounds(const OctavePlan *plan, const Interval *octave, float bound)
+{
+	Interval r = {0.0, 0.0};
+	double sum = 0.0;
+	double slack, t;
+	int i;
+
+	for (i = 0; i < plan->octaves; i++) {
+		const double amp = plan->octave[i].amp;
+		r.lo += amp < 0.0 ? octave[i].hi * amp : octave[i].lo * amp;
+		r.hi += amp < 0.0 ? octave[i].lo * amp : octave[i].hi * amp;
+		sum += fabs(amp);
+	}
+	slack = 1e-5 * (sum * bound + fabs(r.lo) + fabs(r.hi));
+	if (plan->max == 0.0f || !isfinite(plan->max)) {
+		r.lo = -HUGE_VAL;
+		r.hi = HUGE_VAL;
+		return r;
+	}
+	r.lo = (r.lo - slack) / plan->max;
+	r.hi = (r.hi + slack) / plan->max;
+	if (r.lo > r.hi) {
+		t = r.lo;
+		r.lo = r.hi;
+		r.hi = t;
+	}
+	return r;
+}
+
+// PyArg_Parse "O&" converter of a ((x0, y0, z0), (x1, y1, z1)) box to an
+// array of the 6 coordinates
+static int
+bounds_box_converter(PyObject *obj, void *box)
+{
+	double *b = (double *) box;
+	int c;
+
+	if (!PyArg_Parse(obj, "((ddd)(ddd));box must be ((x0, y0, z0), (x1, y1, z1))",
+		&b[0], &b[1], &b[2], &b[3], &b[4], &b[5]))
+		return 0;
+	for (c = 0; c < 3; c++) {
+		if (!(b[c] <= b[c + 3]) || !isfinite(b[c]) || !isfinite(b[c + 3])) {
+			PyErr_SetString(PyExc_ValueError,
+				"Expected finite box coordinates with x0 <= x1, y0 <= y1 and z0 <= z1");
+			return 0;
+		}
+	}
+	return 1;
+}
+
+// Batch work is split into contiguous ranges of rows (or array elements)
+// that are evaluated concurrently by native threads without holding the
+// GIL. The noise kernels only read constant tables, so no locking is
+// needed, and the result is the same for any number of threads.
+
+#ifdef _WIN32
+#include <windows.h>
+#include <process.h>
+#else
+#include <pthread.h>
+#include <unistd.h>
+#endif
+
+typedef void (*batch_func)(const void *args, Py_ssize_t start, Py_ssize_t stop);
+
+typedef struct {
+	batch_func func;
+	const void *args;
+	Py_ssize_t start;
+	Py_ssize_t stop;
+} BatchTask;
+
+#ifdef _WIN32
+typedef HANDLE batch_thread_t;
+
+static unsigned __stdcall
+batch_thread_main(void *arg)
+{
+	BatchTask *task = (BatchTask *) arg;
+	task->func(task->args, task->start, task->stop);
+	return 0;
+}
+
+static int
+batch_thread_start(batch_thread_t *thread, BatchTask *task)
+{
+	*thread = (HANDLE) _beginthreadex(NULL, 0, batch_thread_main, task, 0, NULL);
+	return *thread != 0 ? 0 : -1;
+}
+
+static void
+batch_thread_join(batch_thread_t thread)
+{
+	WaitForSingleObject(thread, INFINITE);
+	CloseHandle(thread);
+}
+
+static int
+batch_cpu_count(void)
+{
+	SYSTEM_INFO info;
+	GetSystemInfo(&info);
+	return (int) info.dwNumberOfProcessors;
+}
+#else
+typedef pthread_t batch_thread_t;
+
+static void *
+batch_thread_main(void *arg)
+{
+	BatchTask *task = (BatchTask *) arg;
+	task->func(task->args, task->start, task->stop);
+	return NULL;
+}
+
+static int
+batch_thread_start(batch_thread_t *thread, BatchTask *task)
+{
+	return pthread_create(thread, NULL, batch_thread_main, task) == 0 ? 0 : -1;
+}
+
+static void
+batch_thread_join(batch_thread_t thread)
+{
+	pthread_join(thread, NULL);
+}
+
+static int
+batch_cpu_count(void)
+{
+	long count = sysconf(_SC_NPROCESSORS_ONLN);
+	return count > 0 ? (int) count : 1;
+}
+#endif
+
+#define BATCH_MAX_THREADS 256
+
+// Add n to a counter that the threads of a batch update concurrently
+static inline void
+batch_count(long long *counter, long long n)
+{
+#ifdef _WIN32
+	InterlockedExchangeAdd64((volatile LONG64 *) counter, n);
+#else
+	__atomic_fetch_add(counter, n, __ATOMIC_RELAXED);
+#endif
+}
+
+// Check the threads argument of a batch function, mapping 0 to the number
+// of processors. Returns -1 with an exception set if invalid.
+static int
+batch_threads(int threads)
+{
+	if (threads < 0) {
+		PyErr_SetString(PyExc_ValueError, "Expected threads value >= 0");
+		return -1;
+	}
+	if (threads == 0)
+		threads = batch_cpu_count();
+	return threads < BATCH_MAX_THREADS ? threads : BATCH_MAX_THREADS;
+}
+
+// Evaluate func over the range [0, count) using up to threads threads.
+// Must be called without holding the GIL. If a thread can not be started,
+// its share of the work is done by the calling thread instead.
+static void
+batch_run(batch_func func, const void *args, Py_ssize_t count, int threads)
+{
+	BatchTask tasks[BATCH_MAX_THREADS];
+	batch_thread_t handles[BATCH_MAX_THREADS];
+	int started[BATCH_MAX_THREADS];
+	Py_ssize_t chunk;
+	int t;
+
+	if (threads > count)
+		threads = (int) count;
+	if (threads <= 1) {
+		func(args, 0, count);
+		return;
+	}
+	chunk = count / threads;
+	for (t = 0; t < threads; t++) {
+		tasks[t].func = func;
+		tasks[t].args = args;
+		tasks[t].start = t * chunk + (t < count % threads ? t : count % threads);
+		tasks[t].stop = tasks[t].start + chunk + (t < count % threads);
+	}
+	// The calling thread takes the first range itself
+	for (t = 1; t < threads; t++)
+		started[t] = batch_thread_start(&handles[t], &tasks[t]) == 0;
+	func(args, tasks[0].start, tasks[0].stop);
+	for (t = 1; t < threads; t++) {
+		if (started[t])
+			batch_thread_join(handles[t]);
+		else
+			func(args, tasks[t].start, tasks[t].stop);
+	}
+}
@@ -60,6 +60,55 @@ const unsigned char PERM[] = {
   205, 93, 222, 114, 67, 29, 24, 72, 243, 141, 128, 195, 78, 66, 215, 61, 156,
   180};
 
+// A permutation table, either a copy of PERM or shuffled from a seed.
+// perm12 holds perm[i] % 12, the gradient index used by simplex noise.
+typedef struct {
+	unsigned char perm[512];
+	unsigned char perm12[512];
+} PermTable;
+
+static void
+perm_table_init(PermTable *t, const unsigned char *perm)
+{
+	int i;
+
+	for (i = 0; i < 512; i++) {
+		t->perm[i] = perm[i];
+		t->perm12[i] = perm[i] % 12;
+	}
+}
+
+// splitmix64, so the same seed gives the same table on every platform
+static unsigned long long
+perm_random(unsigned long long *state)
+{
+	unsigned long long z = (*state += 0x9E3779B97F4A7C15ULL);
+	z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL;
+	z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL;
+	return z ^ (z >> 31);
+}
+
+// Fill the table with a Fisher-Yates shuffle of 0..255, repeated twice
+static void
+perm_table_seed(PermTable *t, unsigned long long seed)
+{
+	unsigned char perm[512];
+	int i, j;
+	unsigned char tmp;
+
+	for (i = 0; i < 256; i++)
+		perm[i] = i;
+	for (i = 255; i > 0; i--) {
+		j = (int) (perm_random(&seed) % (i + 1));
+		tmp = perm[i];
+		perm[i] = perm[j];
+		perm[j] = tmp;
+	}
+	for (i = 0; i < 256; i++)
+		perm[i + 256] = perm[i];
+	perm_table_init(t, perm);
+}
+
 const unsigned char SIMPLEX[][4] = {
     {0,1,2,3},{0,1,3,2},{0,0,0,0},{0,2,3,1},{0,0,0,0},{0,0,0,0},{0,0,0,0},
     {1,2,3,0},{0,2,1,3},{0,0,0,0},{0,3,1,2},{0,3,2,1},{0,0,0,0},{0,0,0,0},
@@ -6,6 +6,9 @@
 #include <math.h>
 #include <stdio.h>
 #include "_noise.h"
+#include "_batch.h"
+#include "_perm.h"
+#include "_stats.h"
 
 #ifdef _MSC_VER
 #define inline __inline
@@ -13,6 +16,32 @@
 
 #define lerp(t, a, b) ((a) + (t) * ((b) - (a)))
 
+// PerlinFBM objects are called through the vectorcall protocol where
+// available, skipping the argument tuple
+#if PY_VERSION_HEX >= 0x03090000
+#define USE_VECTORCALL 1
+#define FBM_TPFLAGS Py_TPFLAGS_HAVE_VECTORCALL
+#else
+#define USE_VECTORCALL 0
+#define FBM_TPFLAGS 0
+#endif
+
+static PyTypeObject PerlinType;
+
+// The permutation table of a Perlin object, or PERM for the module functions
+static inline const unsigned char *
+self_perm(PyObject *self)
+{
+	const PermTable *t = SELF_TABLE(self, &PerlinType);
+	return t != NULL ? t->perm : PERM;
+}
+
+// Evaluates the fractal modes and domain warping of the scalar functions,
+// defined with the octave plans below
+static PyObject *perlin_fractal(const unsigned char *perm, int dim, const float *c, int octaves,
+	float persistence, float lacunarity, const int *repeat, const float *frepeat, int base,
+	int mode, float warp);
+
 static inline float
 grad1(const int hash, const float x)
 {
@@ -23,7 +52,7 @@ grad1(const int hash, const float x)
 }
 
 float
-noise1(float x, const int repeat, const int base)
+noise1(const unsigned char *perm, float x, const int repeat, const int base)
 {
 	float fx;
 	int i = (int)floorf(x) % repeat;
@@ -34,7 +63,26 @@ noise1(float x, const int repeat, const int base)
 	x -= floorf(x);
 	fx = x*x*x * (x * (x * 6 - 15) + 10);
 
-	return lerp(fx, grad1(PERM[i], x), grad1(PERM[ii], x - 1)) * 0.4f;
+	return lerp(fx, grad1(perm[i], x), grad1(perm[ii], x - 1)) * 0.4f;
+}
+
+static inline float
+fbm_noise1(const unsigned char *perm, float x, int octaves, float persistence, float lacunarity,
+	int repeat, int base)
+{
+	float freq = 1.0f;
+	float amp = 1.0f;
+	float max = 0.0f;
+	float total = 0.0f;
+	int i;
+
+	for (i = 0; i < octaves; i++) {
+		total += noise1(perm, x * freq, (const int)(repeat * freq), base) * amp;
+		max += amp;
+		freq *= lacunarity;
+		amp *= persistence;
+	}
+	return total / max;
 }
 
 static PyObject *
@@ -46,36 +94,65 @@ py_noise1(PyObject *self, PyObject *args, PyObject *kwargs)
     float lacunarity = 2.0f;
 	int repeat = 1024; // arbitrary
 	int base = 0;
+	int mode = FRACTAL_FBM;
+	float warp = 0.0f;
 
-	static char *kwlist[] = {"x", "octaves", "persistence", "lacunarity", "repeat", "base", NULL};
+	static char *kwlist[] = {"x", "octaves", "persistence", "lacunarity", "repeat", "base",
+		"mode", "warp", NULL};
 
-	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "f|iffii:noise1", kwlist,
-		&x, &octaves, &persistence, &lacunarity, &repeat, &base))
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "f|iffiiO&f:noise1", kwlist,
+		&x, &octaves, &persistence, &lacunarity, &repeat, &base,
+		fractal_mode_converter, &mode, &warp))
 		return NULL;
 	
-	if (octaves == 1) {
+	if (mode != FRACTAL_FBM || warp != 0.0f) {
+		return perlin_fractal(self_perm(self), 1, &x, octaves, persistence, lacunarity,
+			&repeat, NULL, base, mode, warp);
+	} else if (octaves == 1) {
 		// Single octave, return simple noise
-		return (PyObject *) PyFloat_FromDouble((double) noise1(x, repeat, base));
+		return (PyObject *) PyFloat_FromDouble((double) noise1(self_perm(self), x, repeat, base));
 	} else if (octaves > 1) {
-		int i;
-		float freq = 1.0f;
-		float amp = 1.0f;
-		float max = 0.0f;
-		float total = 0.0f;
-
-		for (i = 0; i < octaves; i++) {
-			total += noise1(x * freq, (const int)(repeat * freq), base) * amp;
-			max += amp;
-			freq *= lacunarity;
-			amp *= persistence;
-		}
-		return (PyObject *) PyFloat_FromDouble((double) (total / max));
+		return (PyObject *) PyFloat_FromDouble(
+			(double) fbm_noise1(self_perm(self), x, octaves, persistence, lacunarity, repeat, base));
 	} else {
 		PyErr_SetString(PyExc_ValueError, "Expected octaves value > 0");
 		return NULL;
 	}
 }
 
+// Wrap the lattice cell of x, and the cell after it, to the repeat interval
+// r, storing their permutation table indices (before adding base) in i and
+// ii. Integer intervals use integer arithmetic on floor(x): none at all if r
+// is a multiple of the table size, a mask if it is a power of two, or a
+// floor modulo otherwise, so that the noise also tiles across negative
+// coordinates. Other intervals fall back to fmodf().
+static inline void
+wrap_lattice(float x, float r, int *i, int *ii)
+{
+	const int ri = (int) r;
+
+	if (ri >= 1 && (float) ri == r && fabsf(x) < 2147483648.0f) {
+		const int fi = (int) floorf(x);
+		if ((ri & 255) == 0) {
+			*i = fi & 255;
+			*ii = (fi + 1) & 255;
+		} else if ((ri & (ri - 1)) == 0) {
+			*i = fi & (ri - 1);
+			*ii = (*i + 1) & (ri - 1);
+		} else {
+			int m = fi % ri;
+			if (m < 0)
+				m += ri;
+			*i = m & 255;
+			*ii = (m + 1 < ri ? m + 1 : 0) & 255;
+		}
+	} else {
+		const int fi = (int) floorf(fmodf(x, r));
+		*i = fi & 255;
+		*ii = (int) fmodf(fi + 1, r) & 255;
+	}
+}
+
 static inline float
 grad2(const int hash, const float x, const float y)
 {
@@ -84,34 +161,54 @@ grad2(const int hash, const float x, const float y)
 }
 
 float
-noise2(float x, float y, const float repeatx, const float repeaty, const int base)
+noise2(const unsigned char *perm, float x, float y, const float repeatx, const float repeaty,
+	const int base)
 {
 	float fx, fy;
 	int A, AA, AB, B, BA, BB;
-	int i = (int)floorf(fmodf(x, repeatx));
-	int j = (int)floorf(fmodf(y, repeaty));
-	int ii = (int)fmodf(i + 1, repeatx);
-	int jj = (int)fmodf(j + 1, repeaty);
-	i = (i & 255) + base;
-	j = (j & 255) + base;
-	ii = (ii & 255) + base;
-	jj = (jj & 255) + base;
+	int i, j, ii, jj;
+
+	wrap_lattice(x, repeatx, &i, &ii);
+	wrap_lattice(y, repeaty, &j, &jj);
+	i += base;
+	j += base;
+	ii += base;
+	jj += base;
 
 	x -= floorf(x); y -= floorf(y);
 	fx = x*x*x * (x * (x * 6 - 15) + 10);
 	fy = y*y*y * (y * (y * 6 - 15) + 10);
 
-	A = PERM[i];
-	AA = PERM[A + j];
-	AB = PERM[A + jj];
-	B = PERM[ii];
-	BA = PERM[B + j];
-	BB = PERM[B + jj];
+	A = perm[i];
+	AA = perm[A + j];
+	AB = perm[A + jj];
+	B = perm[ii];
+	BA = perm[B + j];
+	BB = perm[B + jj];
 		
-	return lerp(fy, lerp(fx, grad2(PERM[AA], x, y),
-							 grad2(PERM[BA], x - 1, y)),
-					lerp(fx, grad2(PERM[AB], x, y - 1),
-							 grad2(PERM[BB], x - 1, y - 1)));
+	return lerp(fy, lerp(fx, grad2(perm[AA], x, y),
+							 grad2(perm[BA], x - 1, y)),
+					lerp(fx, grad2(perm[AB], x, y - 1),
+							 grad2(perm[BB], x - 1, y - 1)));
+}
+
+static inline float
+fbm_noise2(const unsigned char *perm, float x, float y, int octaves, float persistence,
+	float lacunarity, float repeatx, float repeaty, int base)
+{
+	float freq = 1.0f;
+	float amp = 1.0f;
+	float max = 0.0f;
+	float total = 0.0f;
+	int i;
+
+	for (i = 0; i < octaves; i++) {
+		total += noise2(perm, x * freq, y * freq, repeatx * freq, repeaty * freq, base) * amp;
+		max += amp;
+		freq *= lacunarity;
+		amp *= persistence;
+	}
+	return total / max;
 }
 
 static PyObject *
@@ -124,30 +221,28 @@ py_noise2(PyObject *self, PyObject *args, PyObject *kwargs)
 	float repeatx = 1024; // arbitrary
 	float repeaty = 1024; // arbitrary
 	int base = 0;
+	int mode = FRACTAL_FBM;
+	float warp = 0.0f;
 
-	static char *kwlist[] = {"x", "y", "octaves", "persistence", "lacunarity", "repeatx", "repeaty", "base", NULL};
+	static char *kwlist[] = {"x", "y", "octaves", "persistence", "lacunarity", "repeatx", "repeaty", "base",
+		"mode", "warp", NULL};
 
-	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ff|iffffi:noise2", kwlist,
-		&x, &y, &octaves, &persistence, &lacunarity, &repeatx, &repeaty, &base))
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ff|iffffiO&f:noise2", kwlist,
+		&x, &y, &octaves, &persistence, &lacunarity, &repeatx, &repeaty, &base,
+		fractal_mode_converter, &mode, &warp))
 		return NULL;
 	
-	if (octaves == 1) {
+	if (mode != FRACTAL_FBM || warp != 0.0f) {
+		const float c[2] = {x, y};
+		const float frepeat[3] = {repeatx, repeaty, 0.0f};
+		return perlin_fractal(self_perm(self), 2, c, octaves, persistence, lacunarity,
+			NULL, frepeat, base, mode, warp);
+	} else if (octaves == 1) {
 		// Single octave, return simple noise
-		return (PyObject *) PyFloat_FromDouble((double) noise2(x, y, repeatx, repeaty, base));
+		return (PyObject *) PyFloat_FromDouble((double) noise2(self_perm(self), x, y, repeatx, repeaty, base));
 	} else if (octaves > 1) {
-		int i;
-		float freq = 1.0f;
-		float amp = 1.0f;
-		float max = 0.0f;
-		float total = 0.0f;
-
-		for (i = 0; i < octaves; i++) {
-			total += noise2(x * freq, y * freq, repeatx * freq, repeaty * freq, base) * amp;
-			max += amp;
-			freq *= lacunarity;
-			amp *= persistence;
-		}
-		return (PyObject *) PyFloat_FromDouble((double) (total / max));
+		return (PyObject *) PyFloat_FromDouble((double) fbm_noise2(
+			self_perm(self), x, y, octaves, persistence, lacunarity, repeatx, repeaty, base));
 	} else {
 		PyErr_SetString(PyExc_ValueError, "Expected octaves value > 0");
 		return NULL;
@@ -161,45 +256,123 @@ grad3(const int hash, const float x, const float y, const float z)
 	return x * GRAD3[h][0] + y * GRAD3[h][1] + z * GRAD3[h][2];
 }
 
-float
-noise3(float x, float y, float z, const int repeatx, const int repeaty, const int repeatz, 
-	const int base)
+// Derivative of the fade curve
+#define dfade(t) ((t) * (t) * ((t) * ((t) * 30 - 60) + 30))
+
+// Trilinear interpolation of the values at the 8 corners of a cell, in
+// x, y, z bit order
+static inline float
+trilerp(float fx, float fy, float fz, const float *v)
+{
+	return lerp(fz, lerp(fy, lerp(fx, v[0], v[1]), lerp(fx, v[2], v[3])),
+					lerp(fy, lerp(fx, v[4], v[5]), lerp(fx, v[6], v[7])));
+}
+
+// 3D perlin noise. If grad is not NULL, the partial derivatives of the
+// noise are stored in it.
+static inline float
+noise3_grad(const unsigned char *perm, float x, float y, float z, const int repeatx,
+	const int repeaty, const int repeatz, const int base, float *grad)
 {
 	float fx, fy, fz;
 	int A, AA, AB, B, BA, BB;
-	int i = (int)floorf(fmodf(x, repeatx));
-	int j = (int)floorf(fmodf(y, repeaty));
-	int k = (int)floorf(fmodf(z, repeatz));
-	int ii = (int)fmodf(i + 1,  repeatx);
-	int jj = (int)fmodf(j + 1, repeaty);
-	int kk = (int)fmodf(k + 1, repeatz);
-	i = (i & 255) + base;
-	j = (j & 255) + base;
-	k = (k & 255) + base;
-	ii = (ii & 255) + base;
-	jj = (jj & 255) + base;
-	kk = (kk & 255) + base;
+	int i, j, k, ii, jj, kk;
+
+	wrap_lattice(x, repeatx, &i, &ii);
+	wrap_lattice(y, repeaty, &j, &jj);
+	wrap_lattice(z, repeatz, &k, &kk);
+	i += base;
+	j += base;
+	k += base;
+	ii += base;
+	jj += base;
+	kk += base;
 
 	x -= floorf(x); y -= floorf(y); z -= floorf(z);
 	fx = x*x*x * (x * (x * 6 - 15) + 10);
 	fy = y*y*y * (y * (y * 6 - 15) + 10);
 	fz = z*z*z * (z * (z * 6 - 15) + 10);
 
-	A = PERM[i];
-	AA = PERM[A + j];
-	AB = PERM[A + jj];
-	B = PERM[ii];
-	BA = PERM[B + j];
-	BB = PERM[B + jj];
+	A = perm[i];
+	AA = perm[A + j];
+	AB = perm[A + jj];
+	B = perm[ii];
+	BA = perm[B + j];
+	BB = perm[B + jj];
+
+	if (grad != NULL) {
+		// The derivative of the interpolated corner values: the interpolated
+		// corner gradients, plus the change of the fade weights
+		const int h[8] = {perm[AA + k], perm[BA + k], perm[AB + k], perm[BB + k],
+			perm[AA + kk], perm[BA + kk], perm[AB + kk], perm[BB + kk]};
+		float d[8], g[8];
+		int c, a;
+
+		for (c = 0; c < 8; c++)
+			d[c] = grad3(h[c], x - (c & 1), y - ((c >> 1) & 1), z - (c >> 2));
+		for (a = 0; a < 3; a++) {
+			for (c = 0; c < 8; c++)
+				g[c] = GRAD3[h[c] & 15][a];
+			grad[a] = trilerp(fx, fy, fz, g);
+		}
+		grad[0] += dfade(x) * lerp(fz, lerp(fy, d[1] - d[0], d[3] - d[2]),
+			lerp(fy, d[5] - d[4], d[7] - d[6]));
+		grad[1] += dfade(y) * lerp(fz, lerp(fx, d[2] - d[0], d[3] - d[1]),
+			lerp(fx, d[6] - d[4], d[7] - d[5]));
+		grad[2] += dfade(z) * lerp(fy, lerp(fx, d[4] - d[0], d[5] - d[1]),
+			lerp(fx, d[6] - d[2], d[7] - d[3]));
+	}
 		
-	return lerp(fz, lerp(fy, lerp(fx, grad3(PERM[AA + k], x, y, z),
-									  grad3(PERM[BA + k], x - 1, y, z)),
-							 lerp(fx, grad3(PERM[AB + k], x, y - 1, z),
-									  grad3(PERM[BB + k], x - 1, y - 1, z))),
-					lerp(fy, lerp(fx, grad3(PERM[AA + kk], x, y, z - 1),
-									  grad3(PERM[BA + kk], x - 1, y, z - 1)),
-							 lerp(fx, grad3(PERM[AB + kk], x, y - 1, z - 1),
-									  grad3(PERM[BB + kk], x - 1, y - 1, z - 1))));
+	return lerp(fz, lerp(fy, lerp(fx, grad3(perm[AA + k], x, y, z),
+									  grad3(perm[BA + k], x - 1, y, z)),
+							 lerp(fx, grad3(perm[AB + k], x, y - 1, z),
+									  grad3(perm[BB + k], x - 1, y - 1, z))),
+					lerp(fy, lerp(fx, grad3(perm[AA + kk], x, y, z - 1),
+									  grad3(perm[BA + kk], x - 1, y, z - 1)),
+							 lerp(fx, grad3(perm[AB + kk], x, y - 1, z - 1),
+									  grad3(perm[BB + kk], x - 1, y - 1, z - 1))));
+}
+
+float
+noise3(const unsigned char *perm, float x, float y, float z, const int repeatx, const int repeaty,
+	const int repeatz, const int base)
+{
+	return noise3_grad(perm, x, y, z, repeatx, repeaty, repeatz, base, NULL);
+}
+
+// fBm 3D perlin noise. If grad is not NULL, the partial derivatives of
+// the noise are stored in it.
+static inline float
+fbm_noise3(const unsigned char *perm, float x, float y, float z, int octaves,
+	float persistence, float lacunarity, int repeatx, int repeaty, int repeatz, int base,
+	float *grad)
+{
+	float freq = 1.0f;
+	float amp = 1.0f;
+	float max = 0.0f;
+	float total = 0.0f;
+	float d[3];
+	int i, c;
+
+	if (grad != NULL)
+		grad[0] = grad[1] = grad[2] = 0.0f;
+	for (i = 0; i < octaves; i++) {
+		total += noise3_grad(perm, x * freq, y * freq, z * freq,
+			(const int)(repeatx*freq), (const int)(repeaty*freq), (const int)(repeatz*freq), base,
+			grad != NULL ? d : NULL) * amp;
+		if (grad != NULL) {
+			for (c = 0; c < 3; c++)
+				grad[c] += d[c] * amp * freq;
+		}
+		max += amp;
+		freq *= lacunarity;
+		amp *= persistence;
+	}
+	if (grad != NULL) {
+		for (c = 0; c < 3; c++)
+			grad[c] /= max;
+	}
+	return total / max;
 }
 
 static PyObject *
@@ -213,49 +386,1200 @@ py_noise3(PyObject *self, PyObject *args, PyObject *kwargs)
 	int repeaty = 1024; // arbitrary
 	int repeatz = 1024; // arbitrary
 	int base = 0;
+	int mode = FRACTAL_FBM;
+	float warp = 0.0f;
 
 	static char *kwlist[] = {"x", "y", "z", "octaves", "persistence", "lacunarity",
-		"repeatx", "repeaty", "repeatz", "base", NULL};
+		"repeatx", "repeaty", "repeatz", "base", "mode", "warp", NULL};
 
-	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "fff|iffiiii:noise3", kwlist,
-		&x, &y, &z, &octaves, &persistence, &lacunarity, &repeatx, &repeaty, &repeatz, &base))
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "fff|iffiiiiO&f:noise3", kwlist,
+		&x, &y, &z, &octaves, &persistence, &lacunarity, &repeatx, &repeaty, &repeatz, &base,
+		fractal_mode_converter, &mode, &warp))
 		return NULL;
 	
-	if (octaves == 1) {
+	if (mode != FRACTAL_FBM || warp != 0.0f) {
+		const float c[3] = {x, y, z};
+		const int repeat[3] = {repeatx, repeaty, repeatz};
+		return perlin_fractal(self_perm(self), 3, c, octaves, persistence, lacunarity,
+			repeat, NULL, base, mode, warp);
+	} else if (octaves == 1) {
 		// Single octave, return simple noise
-		return (PyObject *) PyFloat_FromDouble((double) noise3(x, y, z, 
+		return (PyObject *) PyFloat_FromDouble((double) noise3(self_perm(self), x, y, z, 
 			repeatx, repeaty, repeatz, base));
 	} else if (octaves > 1) {
-		int i;
-		float freq = 1.0f;
-		float amp = 1.0f;
-		float max = 0.0f;
-		float total = 0.0f;
-
-		for (i = 0; i < octaves; i++) {
-			total += noise3(x * freq, y * freq, z * freq, 
-				(const int)(repeatx*freq), (const int)(repeaty*freq), (const int)(repeatz*freq), base) * amp;
-			max += amp;
-			freq *= lacunarity;
-			amp *= persistence;
-		}
-		return (PyObject *) PyFloat_FromDouble((double) (total / max));
+		return (PyObject *) PyFloat_FromDouble((double) fbm_noise3(self_perm(self), x, y, z,
+			octaves, persistence, lacunarity, repeatx, repeaty, repeatz, base, NULL));
 	} else {
 		PyErr_SetString(PyExc_ValueError, "Expected octaves value > 0");
 		return NULL;
 	}
 }
 
+static PyObject *
+py_noise3_grad(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	float x, y, z, value, grad[3];
+	int octaves = 1;
+	float persistence = 0.5f;
+	float lacunarity = 2.0f;
+	int repeatx = 1024; // arbitrary
+	int repeaty = 1024; // arbitrary
+	int repeatz = 1024; // arbitrary
+	int base = 0;
+
+	static char *kwlist[] = {"x", "y", "z", "octaves", "persistence", "lacunarity",
+		"repeatx", "repeaty", "repeatz", "base", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "fff|iffiiii:noise3_grad", kwlist,
+		&x, &y, &z, &octaves, &persistence, &lacunarity, &repeatx, &repeaty, &repeatz, &base))
+		return NULL;
+	if (octaves <= 0) {
+		PyErr_SetString(PyExc_ValueError, "Expected octaves value > 0");
+		return NULL;
+	}
+	value = fbm_noise3(self_perm(self), x, y, z, octaves, persistence, lacunarity,
+		repeatx, repeaty, repeatz, base, grad);
+	return Py_BuildValue("(dddd)", (double) value,
+		(double) grad[0], (double) grad[1], (double) grad[2]);
+}
+
+static inline float
+plan_noise1(const OctavePlan *plan, const unsigned char *perm, float x, int base)
+{
+	float total = 0.0f;
+	int i;
+
+	for (i = 0; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		total += noise1(perm, x * o->freq, o->repeat[0], base) * o->amp;
+	}
+	return total / plan->max;
+}
+
+static inline float
+plan_noise2(const OctavePlan *plan, const unsigned char *perm, float x, float y, int base)
+{
+	float total = 0.0f;
+	int i;
+
+	for (i = 0; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		total += noise2(perm, x * o->freq, y * o->freq, o->frepeat[0], o->frepeat[1], base) * o->amp;
+	}
+	return total / plan->max;
+}
+
+static inline float
+plan_noise3(const OctavePlan *plan, const unsigned char *perm, float x, float y, float z,
+	int base, float *grad)
+{
+	float total = 0.0f;
+	float d[3];
+	int i, c;
+
+	if (grad != NULL)
+		grad[0] = grad[1] = grad[2] = 0.0f;
+	for (i = 0; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		total += noise3_grad(perm, x * o->freq, y * o->freq, z * o->freq,
+			o->repeat[0], o->repeat[1], o->repeat[2], base, grad != NULL ? d : NULL) * o->amp;
+		if (grad != NULL) {
+			for (c = 0; c < 3; c++)
+				grad[c] += d[c] * o->amp * o->freq;
+		}
+	}
+	if (grad != NULL) {
+		for (c = 0; c < 3; c++)
+			grad[c] /= plan->max;
+	}
+	return total / plan->max;
+}
+
+// Fractal noise in any of the FRACTAL_* modes, fbm being plan_noise1()
+static inline float
+plan_fractal1(const OctavePlan *plan, int mode, const unsigned char *perm, float x, int base)
+{
+	Fractal f = FRACTAL_INIT;
+	int i;
+
+	if (mode == FRACTAL_FBM)
+		return plan_noise1(plan, perm, x, base);
+	for (i = 0; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		fractal_add(&f, mode, noise1(perm, x * o->freq, o->repeat[0], base), o->amp);
+	}
+	return fractal_result(&f, mode, plan->max);
+}
+
+static inline float
+plan_fractal2(const OctavePlan *plan, int mode, const unsigned char *perm, float x, float y,
+	int base)
+{
+	Fractal f = FRACTAL_INIT;
+	int i;
+
+	if (mode == FRACTAL_FBM)
+		return plan_noise2(plan, perm, x, y, base);
+	for (i = 0; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		fractal_add(&f, mode, noise2(perm, x * o->freq, y * o->freq,
+			o->frepeat[0], o->frepeat[1], base), o->amp);
+	}
+	return fractal_result(&f, mode, plan->max);
+}
+
+static inline float
+plan_fractal3(const OctavePlan *plan, int mode, const unsigned char *perm, float x, float y,
+	float z, int base)
+{
+	Fractal f = FRACTAL_INIT;
+	int i;
+
+	if (mode == FRACTAL_FBM)
+		return plan_noise3(plan, perm, x, y, z, base, NULL);
+	for (i = 0; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		fractal_add(&f, mode, noise3(perm, x * o->freq, y * o->freq, z * o->freq,
+			o->repeat[0], o->repeat[1], o->repeat[2], base), o->amp);
+	}
+	return fractal_result(&f, mode, plan->max);
+}
+
+// The noise of a plan at a point in its fractal mode. If the plan warps
+// the domain, the point is first displaced along each axis by the plan's
+// fBm noise at an offset from it.
+static inline float
+plan_point1(const OctavePlan *plan, const unsigned char *perm, float x, int base)
+{
+	if (plan->warp != 0.0f)
+		x += plan->warp * plan_noise1(plan, perm, x + WARP_OFFSET[0][0], base);
+	return plan_fractal1(plan, plan->mode, perm, x, base);
+}
+
+static inline float
+plan_point2(const OctavePlan *plan, const unsigned char *perm, float x, float y, int base)
+{
+	if (plan->warp != 0.0f) {
+		const float dx = plan_noise2(plan, perm, x + WARP_OFFSET[0][0], y + WARP_OFFSET[0][1], base);
+		const float dy = plan_noise2(plan, perm, x + WARP_OFFSET[1][0], y + WARP_OFFSET[1][1], base);
+		x += plan->warp * dx;
+		y += plan->warp * dy;
+	}
+	return plan_fractal2(plan, plan->mode, perm, x, y, base);
+}
+
+static inline float
+plan_point3(const OctavePlan *plan, const unsigned char *perm, float x, float y, float z,
+	int base)
+{
+	if (plan->warp != 0.0f) {
+		float d[3];
+		int c;
+		for (c = 0; c < 3; c++) {
+			d[c] = plan_noise3(plan, perm, x + WARP_OFFSET[c][0], y + WARP_OFFSET[c][1],
+				z + WARP_OFFSET[c][2], base, NULL);
+		}
+		x += plan->warp * d[0];
+		y += plan->warp * d[1];
+		z += plan->warp * d[2];
+	}
+	return plan_fractal3(plan, plan->mode, perm, x, y, z, base);
+}
+
+// Bound of the magnitude of noise3(). The noise is the fade weighted sum
+// over the corners of the cell of gradient . offset, at most the sum of the
+// two largest offset components per corner whatever the gradients, which
+// peaks at 1.0364 within the cell.
+#define NOISE3_BOUND 1.04f
+
+// Whether plan_noise3() is above the threshold of t, evaluating only the
+// octaves needed to decide it, which are added to evaluated
+static inline int
+plan_above3(const OctavePlan *plan, const Threshold *t, const unsigned char *perm, float x,
+	float y, float z, int base, long long *evaluated)
+{
+	float total = 0.0f;
+	int i, above;
+
+	for (i = 0; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		total += noise3(perm, x * o->freq, y * o->freq, z * o->freq,
+			o->repeat[0], o->repeat[1], o->repeat[2], base) * o->amp;
+		if ((above = threshold_decided(t, plan, i, total)) >= 0) {
+			*evaluated += i + 1;
+			return above;
+		}
+	}
+	*evaluated += plan->octaves;
+	return total / plan->max > t->threshold;
+}
+
+#define FADE(t) ((t) * (t) * (t) * ((t) * ((t) * 6 - 15) + 10))
+
+// The largest sum of w[c] * v[c] over the 8 corners of a cell, where each
+// weight is within [wlo[c], whi[c]] and the weights sum to 1: the remaining
+// weight goes to the largest values first.
+static double
+blend_max(const double *wlo, const double *whi, const double *v)
+{
+	double sum = 0.0;
+	double rest = 1.0;
+	int used = 0;
+	int c, best;
+
+	for (c = 0; c < 8; c++) {
+		sum += wlo[c] * v[c];
+		rest -= wlo[c];
+	}
+	while (rest > 0.0 && used != 255) {
+		best = -1;
+		for (c = 0; c < 8; c++) {
+			if (!(used & (1 << c)) && (best < 0 || v[c] > v[best]))
+				best = c;
+		}
+		used |= 1 << best;
+		if (whi[best] - wlo[best] < rest) {
+			sum += (whi[best] - wlo[best]) * v[best];
+			rest -= whi[best] - wlo[best];
+		} else {
+			sum += rest * v[best];
+			rest = 0.0;
+		}
+	}
+	return sum;
+}
+
+// Bounds of noise3() over the part of the box [lo, hi] within the lattice
+// cell at (i, j, k). The noise is a blend of the dot products of the corner
+// gradients with the offsets from the corners, which are linear, by fade
+// weights that increase or decrease along each axis and sum to 1, so both
+// have exact bounds.
+static Interval
+cell_bounds3(const unsigned char *perm, int i, int j, int k, const double *lo, const double *hi,
+	const int *repeat, int base)
+{
+	const int cell[3] = {i, j, k};
+	double w[3][2][2]; // bounds of the weight of the low and high corner along each axis
+	double a[3], b[3];
+	int A, AA, AB, B, BA, BB, ii, jj, kk, c, d;
+	Interval r;
+
+	for (d = 0; d < 3; d++) {
+		a[d] = lo[d] - cell[d] > 0.0 ? lo[d] - cell[d] : 0.0;
+		b[d] = hi[d] - cell[d] < 1.0 ? hi[d] - cell[d] : 1.0;
+		w[d][1][0] = FADE(a[d]);
+		w[d][1][1] = FADE(b[d]);
+		w[d][0][0] = 1.0 - w[d][1][1];
+		w[d][0][1] = 1.0 - w[d][1][0];
+	}
+	// The permutation table indices of the corners, as in noise3()
+	wrap_lattice((float) i + 0.5f, repeat[0], &i, &ii);
+	wrap_lattice((float) j + 0.5f, repeat[1], &j, &jj);
+	wrap_lattice((float) k + 0.5f, repeat[2], &k, &kk);
+	A = perm[i + base];
+	AA = perm[A + j + base];
+	AB = perm[A + jj + base];
+	B = perm[ii + base];
+	BA = perm[B + j + base];
+	BB = perm[B + jj + base];
+	{
+		const int h[8] = {perm[AA + k + base], perm[BA + k + base], perm[AB + k + base],
+			perm[BB + k + base], perm[AA + kk + base], perm[BA + kk + base],
+			perm[AB + kk + base], perm[BB + kk + base]};
+
+		double wlo[8], whi[8], dlo[8], dhi[8];
+
+		for (c = 0; c < 8; c++) {
+			const float *g = GRAD3[h[c] & 15];
+			const int corner[3] = {c & 1, (c >> 1) & 1, c >> 2};
+			dlo[c] = dhi[c] = 0.0;
+			for (d = 0; d < 3; d++) {
+				const double ga = g[d] * (a[d] - corner[d]);
+				const double gb = g[d] * (b[d] - corner[d]);
+				dlo[c] -= ga < gb ? ga : gb;
+				dhi[c] += ga < gb ? gb : ga;
+			}
+			wlo[c] = w[0][corner[0]][0] * w[1][corner[1]][0] * w[2][corner[2]][0];
+			whi[c] = w[0][corner[0]][1] * w[1][corner[1]][1] * w[2][corner[2]][1];
+		}
+		r.lo = -blend_max(wlo, whi, dlo);
+		r.hi = blend_max(wlo, whi, dhi);
+	}
+	return r;
+}
+
+// Bounds of noise3() over the box [lo, hi] in lattice units, the union of
+// the bounds of its sub-boxes in each cell they overlap
+static Interval
+noise3_bounds(const unsigned char *perm, const double *lo, const double *hi, const int *repeat,
+	int base)
+{
+	Interval r = {-NOISE3_BOUND, NOISE3_BOUND};
+	Interval cell;
+	double sub_lo[3], sub_hi[3], step[3];
+	int n[3], s[3], first[3], last[3], i, j, k, c;
+
+	for (c = 0; c < 3; c++) {
+		if (!(fabs(lo[c]) < 1e9 && fabs(hi[c]) < 1e9))
+			return r;
+	}
+	if (!bounds_split(lo, hi, n))
+		return r;
+	r.lo = HUGE_VAL;
+	r.hi = -HUGE_VAL;
+	for (c = 0; c < 3; c++)
+		step[c] = (hi[c] - lo[c]) / n[c];
+	for (s[2] = 0; s[2] < n[2]; s[2]++) {
+		for (s[1] = 0; s[1] < n[1]; s[1]++) {
+			for (s[0] = 0; s[0] < n[0]; s[0]++) {
+				for (c = 0; c < 3; c++) {
+					sub_lo[c] = lo[c] + s[c] * step[c];
+					sub_hi[c] = s[c] == n[c] - 1 ? hi[c] : lo[c] + (s[c] + 1) * step[c];
+					first[c] = (int) floor(sub_lo[c]);
+					last[c] = (int) floor(sub_hi[c]);
+					if (last[c] > first[c] && sub_hi[c] == last[c])
+						last[c]--;
+				}
+				for (k = first[2]; k <= last[2]; k++) {
+					for (j = first[1]; j <= last[1]; j++) {
+						for (i = first[0]; i <= last[0]; i++) {
+							cell = cell_bounds3(perm, i, j, k, sub_lo, sub_hi, repeat, base);
+							interval_union(&r, &cell);
+						}
+					}
+				}
+				// The rest of the box can not widen the bounds further
+				if (r.lo <= -NOISE3_BOUND && r.hi >= NOISE3_BOUND) {
+					r.lo = -NOISE3_BOUND;
+					r.hi = NOISE3_BOUND;
+					return r;
+				}
+			}
+		}
+	}
+	r.lo = r.lo > -NOISE3_BOUND ? r.lo : -NOISE3_BOUND;
+	r.hi = r.hi < NOISE3_BOUND ? r.hi : NOISE3_BOUND;
+	return r;
+}
+
+static PyObject *
+perlin_fractal(const unsigned char *perm, int dim, const float *c, int octaves,
+	float persistence, float lacunarity, const int *repeat, const float *frepeat, int base,
+	int mode, float warp)
+{
+	OctavePlan plan;
+	float value;
+
+	if (plan_init(&plan, octaves, persistence, lacunarity, repeat, frepeat) < 0)
+		return NULL;
+	plan.mode = mode;
+	plan.warp = warp;
+	switch (dim) {
+	case 1:
+		value = plan_point1(&plan, perm, c[0], base);
+		break;
+	case 2:
+		value = plan_point2(&plan, perm, c[0], c[1], base);
+		break;
+	default:
+		value = plan_point3(&plan, perm, c[0], c[1], c[2], base);
+	}
+	plan_free(&plan);
+	return PyFloat_FromDouble((double) value);
+}
+
+// Parameters of the array and grid entry points, shared by the threads
+// evaluating them
+typedef struct {
+	int octaves;
+	float persistence;
+	float lacunarity;
+	int repeat[3];
+	float frepeat[3]; // noise2 takes float repeat intervals
+	int base;
+	int mode;
+	float warp;
+	CoordBuffer cb[3];
+	GridSpec g;
+	ValueOut out;
+	const unsigned char *perm;
+	OctavePlan plan;
+	float threshold; // of the above functions
+	long long *evaluated; // the octaves evaluated by the above functions
+} PerlinBatch;
+
+#define PERLIN_BATCH_INIT {1, 0.5f, 2.0f, {1024, 1024, 1024}, {1024.0f, 1024.0f, 1024.0f}, 0, \
+	FRACTAL_FBM, 0.0f}
+
+static void
+perlin_values1(const void *arg, Py_ssize_t start, float *out, Py_ssize_t count)
+{
+	const PerlinBatch *b = (const PerlinBatch *) arg;
+	Py_ssize_t i;
+
+	for (i = 0; i < count; i++)
+		out[i] = plan_point1(&b->plan, b->perm, coords_at(&b->cb[0], start + i), b->base);
+}
+
+static void
+perlin_values2(const void *arg, Py_ssize_t start, float *out, Py_ssize_t count)
+{
+	const PerlinBatch *b = (const PerlinBatch *) arg;
+	Py_ssize_t i, n;
+
+	for (i = 0; i < count; i++) {
+		n = start + i;
+		out[i] = plan_point2(&b->plan, b->perm,
+			coords_at(&b->cb[0], n), coords_at(&b->cb[1], n), b->base);
+	}
+}
+
+static void
+perlin_values3(const void *arg, Py_ssize_t start, float *out, Py_ssize_t count)
+{
+	const PerlinBatch *b = (const PerlinBatch *) arg;
+	Py_ssize_t i, n;
+
+	for (i = 0; i < count; i++) {
+		n = start + i;
+		out[i] = plan_point3(&b->plan, b->perm,
+			coords_at(&b->cb[0], n), coords_at(&b->cb[1], n), coords_at(&b->cb[2], n), b->base);
+	}
+}
+
+// 1 where the fBm noise is above the batch threshold, 0 elsewhere
+static void
+perlin_above_values3(const void *arg, Py_ssize_t start, float *out, Py_ssize_t count)
+{
+	const PerlinBatch *b = (const PerlinBatch *) arg;
+	Threshold t;
+	Py_ssize_t i, n;
+	long long evaluated = 0;
+
+	threshold_init(&t, &b->plan, b->threshold, NOISE3_BOUND);
+	for (i = 0; i < count; i++) {
+		n = start + i;
+		out[i] = (float) plan_above3(&b->plan, &t, b->perm, coords_at(&b->cb[0], n),
+			coords_at(&b->cb[1], n), coords_at(&b->cb[2], n), b->base, &evaluated);
+	}
+	batch_count(b->evaluated, evaluated);
+}
+
+static void
+perlin_array1(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	value_spans(&((const PerlinBatch *) arg)->out, perlin_values1, arg, start, stop);
+}
+
+static void
+perlin_array2(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	value_spans(&((const PerlinBatch *) arg)->out, perlin_values2, arg, start, stop);
+}
+
+static void
+perlin_array3(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	value_spans(&((const PerlinBatch *) arg)->out, perlin_values3, arg, start, stop);
+}
+
+static void
+perlin_above_array3(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	value_spans(&((const PerlinBatch *) arg)->out, perlin_above_values3, arg, start, stop);
+}
+
+// noise3_grad() for arrays, writing rows of (value, dx, dy, dz)
+static void
+perlin_grad_array3(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	const PerlinBatch *b = (const PerlinBatch *) arg;
+	Py_ssize_t n;
+
+	for (n = start; n < stop; n++) {
+		float *row = b->out.data + n * 4;
+		row[0] = plan_noise3(&b->plan, b->perm,
+			coords_at(&b->cb[0], n), coords_at(&b->cb[1], n), coords_at(&b->cb[2], n), b->base,
+			row + 1);
+	}
+}
+
+static void
+perlin_grid2(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	const PerlinBatch *b = (const PerlinBatch *) arg;
+	Py_ssize_t row, col;
+
+	float span[VALUE_SPAN];
+	Py_ssize_t i, n;
+
+	for (row = start; row < stop; row++) {
+		const float y = grid_y(&b->g, row);
+		for (col = 0; col < b->g.size[0]; col += n) {
+			float *out = grid_span(&b->g, row, col, span);
+			n = grid_span_len(&b->g, col);
+			for (i = 0; i < n; i++)
+				out[i] = plan_point2(&b->plan, b->perm, b->g.xs[col + i], y, b->base);
+			grid_store(&b->g, row, col, out, n);
+		}
+	}
+}
+
+static void
+perlin_grid3(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	const PerlinBatch *b = (const PerlinBatch *) arg;
+	Py_ssize_t row, col;
+
+	float span[VALUE_SPAN];
+	Py_ssize_t i, n;
+
+	for (row = start; row < stop; row++) {
+		const float y = grid_y(&b->g, row);
+		const float z = grid_z(&b->g, row);
+		for (col = 0; col < b->g.size[0]; col += n) {
+			float *out = grid_span(&b->g, row, col, span);
+			n = grid_span_len(&b->g, col);
+			for (i = 0; i < n; i++)
+				out[i] = plan_point3(&b->plan, b->perm, b->g.xs[col + i], y, z, b->base);
+			grid_store(&b->g, row, col, out, n);
+		}
+	}
+}
+
+// Validate the common batch arguments and compute the octave plan,
+// returning the number of threads to use or -1 on error. The plan must be
+// freed with plan_free() after a successful call.
+static int
+perlin_batch_setup(PerlinBatch *b, int threads)
+{
+	if ((threads = batch_threads(threads)) < 0)
+		return -1;
+	if (plan_init(&b->plan, b->octaves, b->persistence, b->lacunarity,
+		b->repeat, b->frepeat) < 0)
+		return -1;
+	b->plan.mode = b->mode;
+	b->plan.warp = b->warp;
+	return threads;
+}
+
+// noise1 wraps its lattice with an integer modulo, so every octave needs a
+// positive repeat interval. Returns -1 with an exception set if not.
+static int
+plan_check_repeat1(const OctavePlan *plan)
+{
+	int i;
+
+	for (i = 0; i < plan->octaves; i++) {
+		if (plan->octave[i].repeat[0] <= 0) {
+			PyErr_SetString(PyExc_ValueError, "Expected repeat value > 0 for every octave");
+			return -1;
+		}
+	}
+	return 0;
+}
+
+// Evaluate an array entry point over count coordinate buffers, writing
+// width results per coordinate. Single values are written in format fmt,
+// rows of values as C floats.
+static PyObject *
+perlin_array_run(PerlinBatch *b, batch_func func, PyObject **coords, int count, int width,
+	const ValueFormat *fmt, PyObject *out, int threads)
+{
+	static const char *names[] = {"xs", "ys", "zs"};
+	OutBuffer ob;
+
+	if ((threads = perlin_batch_setup(b, threads)) < 0)
+		return NULL;
+	if (func == perlin_array1 && plan_check_repeat1(&b->plan) < 0) {
+		plan_free(&b->plan);
+		return NULL;
+	}
+	if (coords_get_all(coords, b->cb, count, names) < 0) {
+		plan_free(&b->plan);
+		return NULL;
+	}
+	if ((width == 1 ? out_get_like(out, &ob, &b->out, fmt, &b->cb[0])
+		: out_get_rows(out, &ob, &b->out, &b->cb[0], width)) < 0) {
+		coords_release_all(b->cb, count);
+		plan_free(&b->plan);
+		return NULL;
+	}
+	Py_BEGIN_ALLOW_THREADS
+	batch_run(func, b, b->cb[0].len, threads);
+	Py_END_ALLOW_THREADS
+	coords_release_all(b->cb, count);
+	plan_free(&b->plan);
+	return out_finish(&ob, 0);
+}
+
+// Evaluate a grid entry point
+static PyObject *
+perlin_grid_run(PerlinBatch *b, batch_func func, PyObject *out, int threads)
+{
+	OutBuffer ob;
+
+	if ((threads = perlin_batch_setup(b, threads)) < 0)
+		return NULL;
+	if (grid_setup(&b->g, &ob, out) < 0) {
+		plan_free(&b->plan);
+		return grid_finish(&b->g, &ob, 1);
+	}
+	Py_BEGIN_ALLOW_THREADS
+	batch_run(func, b, b->g.rows, threads);
+	Py_END_ALLOW_THREADS
+	plan_free(&b->plan);
+	return grid_finish(&b->g, &ob, 0);
+}
+
+// Evaluate noise of dim dimensions at points, a buffer of shape (N, dim)
+static PyObject *
+perlin_points_run(PerlinBatch *b, PyObject *points, int dim, PyObject *repeat,
+	const ValueFormat *fmt, PyObject *out, int threads)
+{
+	static const batch_func funcs[] = {perlin_array1, perlin_array2, perlin_array3};
+	float frepeat[3] = {1024.0f, 1024.0f, 1024.0f};
+	OutBuffer ob;
+	int d;
+
+	if (coords_get_points(points, b->cb, &dim, dim, 1, 3) < 0)
+		return NULL;
+	if (points_repeat(repeat, frepeat, dim) < 0) {
+		coords_release_all(b->cb, 1);
+		return NULL;
+	}
+	for (d = 0; d < dim; d++) {
+		if (!(frepeat[d] > 0.0f)) {
+			PyErr_SetString(PyExc_ValueError, "Expected repeat values > 0");
+			coords_release_all(b->cb, 1);
+			return NULL;
+		}
+		b->repeat[d] = (int) frepeat[d];
+		b->frepeat[d] = frepeat[d];
+	}
+	if ((threads = perlin_batch_setup(b, threads)) < 0) {
+		coords_release_all(b->cb, 1);
+		return NULL;
+	}
+	if (dim == 1 && plan_check_repeat1(&b->plan) < 0) {
+		coords_release_all(b->cb, 1);
+		plan_free(&b->plan);
+		return NULL;
+	}
+	if (out_get_format(out, &ob, &b->out, fmt, b->cb[0].len, 1, &b->cb[0].len) < 0) {
+		coords_release_all(b->cb, 1);
+		plan_free(&b->plan);
+		return NULL;
+	}
+	Py_BEGIN_ALLOW_THREADS
+	batch_run(funcs[dim - 1], b, b->cb[0].len, threads);
+	Py_END_ALLOW_THREADS
+	coords_release_all(b->cb, 1);
+	plan_free(&b->plan);
+	return out_finish(&ob, 0);
+}
+
+static PyObject *
+py_noise1_array(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	PerlinBatch b = PERLIN_BATCH_INIT;
+	PyObject *coords[1];
+	ValueFormat fmt = VALUE_FORMAT_INIT;
+	PyObject *result;
+	PyObject *value_scale = NULL;
+	PyObject *value_offset = NULL;
+	PyObject *clamp = NULL;
+	PyObject *lut = NULL;
+	PyObject *out = NULL;
+	int threads = 1;
+
+	static char *kwlist[] = {"xs", "octaves", "persistence", "lacunarity", "repeat", "base",
+		"mode", "warp", "dtype", "value_scale", "value_offset", "clamp", "lut", "out", "threads",
+		NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|iffiiO&fO&OOOOOi:noise1_array", kwlist,
+		&coords[0], &b.octaves, &b.persistence, &b.lacunarity, &b.repeat[0], &b.base,
+		fractal_mode_converter, &b.mode, &b.warp, value_dtype_converter, &fmt.dtype,
+		&value_scale, &value_offset, &clamp, &lut, &out, &threads)
+		|| value_format_setup(&fmt, value_scale, value_offset, clamp, lut) < 0)
+		return NULL;
+	b.perm = self_perm(self);
+	result = perlin_array_run(&b, perlin_array1, coords, 1, 1, &fmt, out, threads);
+	value_format_free(&fmt);
+	return result;
+}
+
+static PyObject *
+py_noise2_array(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	PerlinBatch b = PERLIN_BATCH_INIT;
+	PyObject *coords[2];
+	ValueFormat fmt = VALUE_FORMAT_INIT;
+	PyObject *result;
+	PyObject *value_scale = NULL;
+	PyObject *value_offset = NULL;
+	PyObject *clamp = NULL;
+	PyObject *lut = NULL;
+	PyObject *out = NULL;
+	int threads = 1;
+
+	static char *kwlist[] = {"xs", "ys", "octaves", "persistence", "lacunarity",
+		"repeatx", "repeaty", "base", "mode", "warp", "dtype", "value_scale", "value_offset",
+		"clamp", "lut", "out", "threads", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|iffffiO&fO&OOOOOi:noise2_array", kwlist,
+		&coords[0], &coords[1], &b.octaves, &b.persistence, &b.lacunarity,
+		&b.frepeat[0], &b.frepeat[1], &b.base, fractal_mode_converter, &b.mode, &b.warp,
+		value_dtype_converter, &fmt.dtype, &value_scale, &value_offset, &clamp, &lut, &out,
+		&threads)
+		|| value_format_setup(&fmt, value_scale, value_offset, clamp, lut) < 0)
+		return NULL;
+	b.perm = self_perm(self);
+	result = perlin_array_run(&b, perlin_array2, coords, 2, 1, &fmt, out, threads);
+	value_format_free(&fmt);
+	return result;
+}
+
+static PyObject *
+py_noise3_array(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	PerlinBatch b = PERLIN_BATCH_INIT;
+	PyObject *coords[3];
+	ValueFormat fmt = VALUE_FORMAT_INIT;
+	PyObject *result;
+	PyObject *value_scale = NULL;
+	PyObject *value_offset = NULL;
+	PyObject *clamp = NULL;
+	PyObject *lut = NULL;
+	PyObject *out = NULL;
+	int threads = 1;
+
+	static char *kwlist[] = {"xs", "ys", "zs", "octaves", "persistence", "lacunarity",
+		"repeatx", "repeaty", "repeatz", "base", "mode", "warp", "dtype", "value_scale",
+		"value_offset", "clamp", "lut", "out", "threads", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OOO|iffiiiiO&fO&OOOOOi:noise3_array", kwlist,
+		&coords[0], &coords[1], &coords[2], &b.octaves, &b.persistence, &b.lacunarity,
+		&b.repeat[0], &b.repeat[1], &b.repeat[2], &b.base, fractal_mode_converter, &b.mode,
+		&b.warp, value_dtype_converter, &fmt.dtype, &value_scale, &value_offset, &clamp, &lut,
+		&out, &threads)
+		|| value_format_setup(&fmt, value_scale, value_offset, clamp, lut) < 0)
+		return NULL;
+	b.perm = self_perm(self);
+	result = perlin_array_run(&b, perlin_array3, coords, 3, 1, &fmt, out, threads);
+	value_format_free(&fmt);
+	return result;
+}
+
+static PyObject *
+py_noise3_grad_array(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	PerlinBatch b = PERLIN_BATCH_INIT;
+	PyObject *coords[3];
+	PyObject *out = NULL;
+	int threads = 1;
+
+	static char *kwlist[] = {"xs", "ys", "zs", "octaves", "persistence", "lacunarity",
+		"repeatx", "repeaty", "repeatz", "base", "out", "threads", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OOO|iffiiiiOi:noise3_grad_array", kwlist,
+		&coords[0], &coords[1], &coords[2], &b.octaves, &b.persistence, &b.lacunarity,
+		&b.repeat[0], &b.repeat[1], &b.repeat[2], &b.base, &out, &threads))
+		return NULL;
+	b.perm = self_perm(self);
+	return perlin_array_run(&b, perlin_grad_array3, coords, 3, 4, NULL, out, threads);
+}
+
+static PyObject *
+py_noise3_above(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	float x, y, z, threshold;
+	int octaves = 1;
+	float persistence = 0.5f;
+	float lacunarity = 2.0f;
+	int repeat[3] = {1024, 1024, 1024};
+	int base = 0;
+	OctavePlan plan;
+	Threshold t;
+	long long evaluated = 0;
+	int above;
+
+	static char *kwlist[] = {"x", "y", "z", "threshold", "octaves", "persistence", "lacunarity",
+		"repeatx", "repeaty", "repeatz", "base", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ffff|iffiiii:noise3_above", kwlist,
+		&x, &y, &z, &threshold, &octaves, &persistence, &lacunarity,
+		&repeat[0], &repeat[1], &repeat[2], &base))
+		return NULL;
+	if (plan_init(&plan, octaves, persistence, lacunarity, repeat, NULL) < 0)
+		return NULL;
+	threshold_init(&t, &plan, threshold, NOISE3_BOUND);
+	above = plan_above3(&plan, &t, self_perm(self), x, y, z, base, &evaluated);
+	plan_free(&plan);
+	stats_report_octaves(evaluated);
+	return PyBool_FromLong(above);
+}
+
+static PyObject *
+py_bounds3(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	double box[6];
+	int octaves = 1;
+	float persistence = 0.5f;
+	float lacunarity = 2.0f;
+	int repeat[3] = {1024, 1024, 1024};
+	int base = 0;
+	const unsigned char *perm = self_perm(self);
+	OctavePlan plan;
+	Interval *octave;
+	Interval r;
+	int i, c;
+
+	static char *kwlist[] = {"box", "octaves", "persistence", "lacunarity",
+		"repeatx", "repeaty", "repeatz", "base", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O&|iffiiii:bounds3", kwlist,
+		bounds_box_converter, box, &octaves, &persistence, &lacunarity,
+		&repeat[0], &repeat[1], &repeat[2], &base))
+		return NULL;
+	if (plan_init(&plan, octaves, persistence, lacunarity, repeat, NULL) < 0)
+		return NULL;
+	octave = PyMem_New(Interval, octaves);
+	if (octave == NULL) {
+		plan_free(&plan);
+		return PyErr_NoMemory();
+	}
+	Py_BEGIN_ALLOW_THREADS
+	for (i = 0; i < octaves; i++) {
+		const Octave *o = &plan.octave[i];
+		double lo[3], hi[3];
+		for (c = 0; c < 3; c++) {
+			lo[c] = box[c] * o->freq;
+			hi[c] = box[c + 3] * o->freq;
+			if (lo[c] > hi[c]) {
+				const double t = lo[c];
+				lo[c] = hi[c];
+				hi[c] = t;
+			}
+		}
+		bounds_widen(lo, hi);
+		octave[i] = noise3_bounds(perm, lo, hi, o->repeat, base);
+	}
+	Py_END_ALLOW_THREADS
+	r = plan_bounds(&plan, octave, NOISE3_BOUND);
+	PyMem_Free(octave);
+	plan_free(&plan);
+	return Py_BuildValue("(dd)", r.lo, r.hi);
+}
+
+static PyObject *
+py_noise3_above_array(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	static const ValueFormat fmt = VALUE_FORMAT_ABOVE;
+	PerlinBatch b = PERLIN_BATCH_INIT;
+	PyObject *coords[3];
+	PyObject *out = NULL;
+	PyObject *result;
+	long long evaluated = 0;
+	int threads = 1;
+
+	static char *kwlist[] = {"xs", "ys", "zs", "threshold", "octaves", "persistence",
+		"lacunarity", "repeatx", "repeaty", "repeatz", "base", "out", "threads", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OOOf|iffiiiiOi:noise3_above_array", kwlist,
+		&coords[0], &coords[1], &coords[2], &b.threshold, &b.octaves, &b.persistence,
+		&b.lacunarity, &b.repeat[0], &b.repeat[1], &b.repeat[2], &b.base, &out, &threads))
+		return NULL;
+	b.perm = self_perm(self);
+	b.evaluated = &evaluated;
+	result = perlin_array_run(&b, perlin_above_array3, coords, 3, 1, &fmt, out, threads);
+	stats_report_octaves(evaluated);
+	return result;
+}
+
+static PyObject *
+py_sample(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	PerlinBatch b = PERLIN_BATCH_INIT;
+	PyObject *points;
+	PyObject *repeat = NULL;
+	ValueFormat fmt = VALUE_FORMAT_INIT;
+	PyObject *result;
+	PyObject *value_scale = NULL;
+	PyObject *value_offset = NULL;
+	PyObject *clamp = NULL;
+	PyObject *lut = NULL;
+	PyObject *out = NULL;
+	int dim = 0;
+	int threads = 1;
+
+	static char *kwlist[] = {"points", "octaves", "persistence", "lacunarity", "repeat", "base",
+		"mode", "warp", "dim", "dtype", "value_scale", "value_offset", "clamp", "lut", "out",
+		"threads", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|iffOiO&fiO&OOOOOi:sample", kwlist,
+		&points, &b.octaves, &b.persistence, &b.lacunarity, &repeat, &b.base,
+		fractal_mode_converter, &b.mode, &b.warp, &dim, value_dtype_converter, &fmt.dtype,
+		&value_scale, &value_offset, &clamp, &lut, &out, &threads))
+		return NULL;
+	if (dim < 0 || dim > 3) {
+		PyErr_SetString(PyExc_ValueError, "Expected dim 1, 2 or 3");
+		return NULL;
+	}
+	if (value_format_setup(&fmt, value_scale, value_offset, clamp, lut) < 0)
+		return NULL;
+	b.perm = self_perm(self);
+	result = perlin_points_run(&b, points, dim, repeat, &fmt, out, threads);
+	value_format_free(&fmt);
+	return result;
+}
+
+static PyObject *
+py_grid2(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	PerlinBatch b = PERLIN_BATCH_INIT;
+	ValueFormat fmt = VALUE_FORMAT_INIT;
+	PyObject *result;
+	PyObject *value_scale = NULL;
+	PyObject *value_offset = NULL;
+	PyObject *clamp = NULL;
+	PyObject *lut = NULL;
+	PyObject *out = NULL;
+	int threads = 1;
+
+	static char *kwlist[] = {"width", "height", "origin", "step", "octaves", "persistence",
+		"lacunarity", "repeatx", "repeaty", "base", "mode", "warp", "dtype", "value_scale",
+		"value_offset", "clamp", "lut", "out", "threads", NULL};
+
+	b.g.ndim = 2;
+	b.g.step[0] = b.g.step[1] = 1.0;
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "nn|(dd)(dd)iffffiO&fO&OOOOOi:grid2", kwlist,
+		&b.g.size[0], &b.g.size[1], &b.g.origin[0], &b.g.origin[1], &b.g.step[0], &b.g.step[1],
+		&b.octaves, &b.persistence, &b.lacunarity, &b.frepeat[0], &b.frepeat[1], &b.base,
+		fractal_mode_converter, &b.mode, &b.warp, value_dtype_converter, &fmt.dtype,
+		&value_scale, &value_offset, &clamp, &lut, &out, &threads)
+		|| value_format_setup(&fmt, value_scale, value_offset, clamp, lut) < 0)
+		return NULL;
+	b.g.fmt = &fmt;
+	b.perm = self_perm(self);
+	result = perlin_grid_run(&b, perlin_grid2, out, threads);
+	value_format_free(&fmt);
+	return result;
+}
+
+static PyObject *
+py_grid3(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	PerlinBatch b = PERLIN_BATCH_INIT;
+	ValueFormat fmt = VALUE_FORMAT_INIT;
+	PyObject *result;
+	PyObject *value_scale = NULL;
+	PyObject *value_offset = NULL;
+	PyObject *clamp = NULL;
+	PyObject *lut = NULL;
+	PyObject *out = NULL;
+	int threads = 1;
+
+	static char *kwlist[] = {"width", "height", "depth", "origin", "step", "octaves",
+		"persistence", "lacunarity", "repeatx", "repeaty", "repeatz", "base", "mode", "warp",
+		"dtype", "value_scale", "value_offset", "clamp", "lut", "out", "threads", NULL};
+
+	b.g.ndim = 3;
+	b.g.step[0] = b.g.step[1] = b.g.step[2] = 1.0;
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "nnn|(ddd)(ddd)iffiiiiO&fO&OOOOOi:grid3", kwlist,
+		&b.g.size[0], &b.g.size[1], &b.g.size[2], &b.g.origin[0], &b.g.origin[1], &b.g.origin[2],
+		&b.g.step[0], &b.g.step[1], &b.g.step[2], &b.octaves, &b.persistence, &b.lacunarity,
+		&b.repeat[0], &b.repeat[1], &b.repeat[2], &b.base, fractal_mode_converter, &b.mode,
+		&b.warp, value_dtype_converter, &fmt.dtype, &value_scale, &value_offset, &clamp, &lut,
+		&out, &threads)
+		|| value_format_setup(&fmt, value_scale, value_offset, clamp, lut) < 0)
+		return NULL;
+	b.g.fmt = &fmt;
+	b.perm = self_perm(self);
+	result = perlin_grid_run(&b, perlin_grid3, out, threads);
+	value_format_free(&fmt);
+	return result;
+}
+
+// The two channel texture of shader_noise.ShaderNoiseTexture, filled one
+// row of texels at a time
+typedef struct {
+	int width;
+	int freq;
+	double scale;
+	unsigned short *out;
+	const unsigned char *perm;
+} ShaderTexture;
+
+// Quantize noise to an unsigned 16 bit channel the way ShaderNoiseTexture
+// always has, int((n + 1.0) * 32767)
+#define TEXEL16(n) ((unsigned short) (long) (((double) (n) + 1.0) * 32767))
+
+static void
+perlin_shader_texture3(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	const ShaderTexture *t = (const ShaderTexture *) arg;
+	const int r = t->freq;
+	Py_ssize_t row;
+	int x;
+
+	for (row = start; row < stop; row++) {
+		// The coordinates are rounded to floats like the arguments of noise3
+		const float y = (float) ((row % t->width) * t->scale);
+		const float z = (float) ((row / t->width) * t->scale);
+		unsigned short *out = t->out + row * t->width * 2;
+		for (x = 0; x < t->width; x++) {
+			const float fx = (float) (x * t->scale);
+			out[x * 2] = TEXEL16(noise3(t->perm, fx, y, z, r, r, r, 0));
+			out[x * 2 + 1] = TEXEL16(noise3(t->perm, fx, y, z, r, r, r, r + 1));
+		}
+	}
+}
+
+static PyObject *
+py_shader_texture3(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	ShaderTexture t;
+	PyObject *out = Py_None;
+	PyObject *result;
+	Py_buffer view;
+	Py_ssize_t len;
+	int threads = 1;
+
+	static char *kwlist[] = {"width", "freq", "out", "threads", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ii|Oi:shader_texture3", kwlist,
+		&t.width, &t.freq, &out, &threads))
+		return NULL;
+	if (t.width <= 0 || t.freq <= 0) {
+		PyErr_SetString(PyExc_ValueError, "Expected width and freq > 0");
+		return NULL;
+	}
+	if ((threads = batch_threads(threads)) < 0)
+		return NULL;
+	if ((size_t) t.width * t.width * t.width > PY_SSIZE_T_MAX / 4) {
+		PyErr_SetString(PyExc_OverflowError, "texture is too large");
+		return NULL;
+	}
+	len = (Py_ssize_t) t.width * t.width * t.width * 2;
+	if (out == Py_None) {
+		PyObject *bytes = PyByteArray_FromStringAndSize(NULL, len * 2);
+		if (bytes == NULL)
+			return NULL;
+		result = PyMemoryView_FromObject(bytes);
+		Py_DECREF(bytes);
+		if (result == NULL)
+			return NULL;
+		Py_SETREF(result, PyObject_CallMethod(result, "cast", "s(iiii)", "H",
+			t.width, t.width, t.width, 2));
+		if (result == NULL)
+			return NULL;
+	} else {
+		Py_INCREF(out);
+		result = out;
+	}
+	if (PyObject_GetBuffer(result, &view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT | PyBUF_WRITABLE) < 0) {
+		Py_DECREF(result);
+		return NULL;
+	}
+	if (native_format(&view) != 'H' || view.itemsize != 2 || view.len / 2 != len) {
+		PyErr_Format(PyExc_ValueError,
+			"out must be a writable buffer of exactly %zd unsigned shorts", len);
+		PyBuffer_Release(&view);
+		Py_DECREF(result);
+		return NULL;
+	}
+	t.scale = (double) t.freq / t.width;
+	t.out = (unsigned short *) view.buf;
+	t.perm = self_perm(self);
+	Py_BEGIN_ALLOW_THREADS
+	batch_run(perlin_shader_texture3, &t, (Py_ssize_t) t.width * t.width, threads);
+	Py_END_ALLOW_THREADS
+	PyBuffer_Release(&view);
+	return result;
+}
+
+// Instrumentation counters of the entry points, named as in the noise module
+enum {
+	STAT_NOISE1,
+	STAT_NOISE2,
+	STAT_NOISE3,
+	STAT_NOISE3_GRAD,
+	STAT_NOISE3_ABOVE,
+	STAT_NOISE1_ARRAY,
+	STAT_NOISE2_ARRAY,
+	STAT_NOISE3_ARRAY,
+	STAT_NOISE3_GRAD_ARRAY,
+	STAT_NOISE3_ABOVE_ARRAY,
+	STAT_BOUNDS3,
+	STAT_SAMPLE,
+	STAT_GRID2,
+	STAT_GRID3,
+	STAT_SHADER_TEXTURE3,
+	STAT_PERLIN_FBM,
+};
+
+static StatCounter perlin_stats[] = {
+	STAT_COUNTER("pnoise1", 1, 1),
+	STAT_COUNTER("pnoise2", 2, 1),
+	STAT_COUNTER("pnoise3", 3, 1),
+	STAT_COUNTER("pnoise3_grad", 3, 4),
+	STAT_COUNTER("pnoise3_above", STATS_REPORTED, 1),
+	STAT_COUNTER_LUT("pnoise1_array", 1, 1, 12),
+	STAT_COUNTER_LUT("pnoise2_array", 2, 1, 14),
+	STAT_COUNTER_LUT("pnoise3_array", 3, 1, 16),
+	STAT_COUNTER("pnoise3_grad_array", 3, 4),
+	STAT_COUNTER("pnoise3_above_array", STATS_REPORTED, 1),
+	STAT_COUNTER("pbounds3", 1, 1),
+	STAT_COUNTER_LUT("psample", 1, 1, 13),
+	STAT_COUNTER_LUT("pgrid2", 4, 1, 16),
+	STAT_COUNTER_LUT("pgrid3", 5, 1, 18),
+	STAT_COUNTER("shader_texture3", -1, 1),
+	STAT_COUNTER("PerlinFBM", -1, 1),
+	{NULL}
+};
+
+STATS_WRAP(perlin_stats, STAT_NOISE1, py_noise1)
+STATS_WRAP(perlin_stats, STAT_NOISE2, py_noise2)
+STATS_WRAP(perlin_stats, STAT_NOISE3, py_noise3)
+STATS_WRAP(perlin_stats, STAT_NOISE3_GRAD, py_noise3_grad)
+STATS_WRAP(perlin_stats, STAT_NOISE3_ABOVE, py_noise3_above)
+STATS_WRAP(perlin_stats, STAT_NOISE1_ARRAY, py_noise1_array)
+STATS_WRAP(perlin_stats, STAT_NOISE2_ARRAY, py_noise2_array)
+STATS_WRAP(perlin_stats, STAT_NOISE3_ARRAY, py_noise3_array)
+STATS_WRAP(perlin_stats, STAT_NOISE3_GRAD_ARRAY, py_noise3_grad_array)
+STATS_WRAP(perlin_stats, STAT_NOISE3_ABOVE_ARRAY, py_noise3_above_array)
+STATS_WRAP(perlin_stats, STAT_BOUNDS3, py_bounds3)
+STATS_WRAP(perlin_stats, STAT_SAMPLE, py_sample)
+STATS_WRAP(perlin_stats, STAT_GRID2, py_grid2)
+STATS_WRAP(perlin_stats, STAT_GRID3, py_grid3)
+STATS_WRAP(perlin_stats, STAT_SHADER_TEXTURE3, py_shader_texture3)
+
+static PyObject *
+py_stats(PyObject *self, PyObject *unused)
+{
+	return stats_dict(perlin_stats);
+}
+
+static PyObject *
+py_reset_stats(PyObject *self, PyObject *unused)
+{
+	stats_reset(perlin_stats);
+	Py_RETURN_NONE;
+}
+
 static PyMethodDef perlin_functions[] = {
-	{"noise1", (PyCFunction) py_noise1, METH_VARARGS | METH_KEYWORDS, 
-		"noise1(x, octaves=1, persistence=0.5, lacunarity=2.0, repeat=1024, base=0.0)\n\n"
+	{"noise1", (PyCFunction) STATS_FUNC(py_noise1), METH_VARARGS | METH_KEYWORDS, 
+		"noise1(x, octaves=1, persistence=0.5, lacunarity=2.0, repeat=1024, base=0.0, "
+			"mode='fbm', warp=0.0)\n\n"
 		"1 dimensional perlin improved noise function (see noise3 for more info)"},
-	{"noise2", (PyCFunction) py_noise2, METH_VARARGS | METH_KEYWORDS, 
-		"noise2(x, y, octaves=1, persistence=0.5, lacunarity=2.0, repeatx=1024, repeaty=1024, base=0.0)\n\n"
+	{"noise2", (PyCFunction) STATS_FUNC(py_noise2), METH_VARARGS | METH_KEYWORDS, 
+		"noise2(x, y, octaves=1, persistence=0.5, lacunarity=2.0, repeatx=1024, repeaty=1024, base=0.0, "
+			"mode='fbm', warp=0.0)\n\n"
 		"2 dimensional perlin improved noise function (see noise3 for more info)"},
-	{"noise3", (PyCFunction) py_noise3, METH_VARARGS | METH_KEYWORDS, 
+	{"noise3", (PyCFunction) STATS_FUNC(py_noise3), METH_VARARGS | METH_KEYWORDS, 
 		"noise3(x, y, z, octaves=1, persistence=0.5, lacunarity=2.0, "
-			"repeatx=1024, repeaty=1024, repeatz=1024, base=0.0)\n\n"
+			"repeatx=1024, repeaty=1024, repeatz=1024, base=0.0, mode='fbm', warp=0.0)\n\n"
 		"return perlin \"improved\" noise value for specified coordinate\n\n"
 		"octaves -- specifies the number of passes for generating fBm noise,\n"
 		"defaults to 1 (simple noise).\n\n"
@@ -268,13 +1592,488 @@ static PyMethodDef perlin_functions[] = {
 		"the noise values repeat. This can be used as the tile size for creating \n"
 		"tileable textures\n\n"
 		"base -- specifies a fixed offset for the input coordinates. Useful for\n"
-		"generating different noise textures with the same repeat interval"},
+		"generating different noise textures with the same repeat interval\n\n"
+		"mode -- how the octaves are combined: 'fbm' sums them, 'turbulence'\n"
+		"sums their absolute values for billowy noise in [0, 1], 'ridged' gives\n"
+		"ridged multifractal noise in [0, 1] with sharp crests, and 'hybrid' a\n"
+		"hybrid multifractal with smooth valleys and rough peaks.\n\n"
+		"warp -- if not 0, each coordinate is first displaced by warp times the\n"
+		"fBm noise at a fixed offset from it, warping the domain in a single pass.\n"
+		"The noise still repeats with the repeat intervals."},
+	{"noise3_grad", (PyCFunction) STATS_FUNC(py_noise3_grad), METH_VARARGS | METH_KEYWORDS,
+		"noise3_grad(x, y, z, octaves=1, persistence=0.5, lacunarity=2.0, "
+			"repeatx=1024, repeaty=1024, repeatz=1024, base=0)\n\n"
+		"return a tuple of the perlin \"improved\" noise value for specified\n"
+		"coordinate and its partial derivatives (value, dx, dy, dz), computed\n"
+		"analytically in a single evaluation. The arguments are the same as for\n"
+		"noise3."},
+	{"noise3_above", (PyCFunction) STATS_FUNC(py_noise3_above), METH_VARARGS | METH_KEYWORDS,
+		"noise3_above(x, y, z, threshold, octaves=1, persistence=0.5, lacunarity=2.0, "
+			"repeatx=1024, repeaty=1024, repeatz=1024, base=0)\n\n"
+		"return whether noise3(x, y, z) > threshold, evaluating only as many\n"
+		"octaves as needed to decide it: once the octaves so far are further from\n"
+		"the threshold than the remaining ones can add up to, the rest are\n"
+		"skipped. The result is always the same as comparing the noise3 value.\n"
+		"The arguments are the same as for noise3, the noise is always fBm."},
+	{"noise1_array", (PyCFunction) STATS_FUNC(py_noise1_array), METH_VARARGS | METH_KEYWORDS,
+		"noise1_array(xs, octaves=1, persistence=0.5, lacunarity=2.0, repeat=1024, base=0, "
+			"mode='fbm', warp=0.0, dtype='float32', value_scale=None, value_offset=None, "
+			"clamp=None, lut=None, out=None, threads=1)\n\n"
+		"1 dimensional perlin improved noise for an array of coordinates (see noise3_array)"},
+	{"noise2_array", (PyCFunction) STATS_FUNC(py_noise2_array), METH_VARARGS | METH_KEYWORDS,
+		"noise2_array(xs, ys, octaves=1, persistence=0.5, lacunarity=2.0, "
+			"repeatx=1024, repeaty=1024, base=0, mode='fbm', warp=0.0, dtype='float32', "
+			"value_scale=None, value_offset=None, clamp=None, lut=None, out=None, threads=1)\n\n"
+		"2 dimensional perlin improved noise for arrays of coordinates (see noise3_array)"},
+	{"noise3_array", (PyCFunction) STATS_FUNC(py_noise3_array), METH_VARARGS | METH_KEYWORDS,
+		"noise3_array(xs, ys, zs, octaves=1, persistence=0.5, lacunarity=2.0, "
+			"repeatx=1024, repeaty=1024, repeatz=1024, base=0, mode='fbm', warp=0.0, "
+			"dtype='float32', value_scale=None, value_offset=None, clamp=None, lut=None, "
+			"out=None, threads=1)\n\n"
+		"return perlin \"improved\" noise values for arrays of coordinates in a\n"
+		"single call. The remaining arguments are the same as for noise3.\n\n"
+		"xs, ys, zs -- contiguous buffers (array.array, numpy arrays, etc.) of\n"
+		"C floats or doubles, all of the same length.\n\n"
+		"dtype -- the type of the values: 'float32', 'float16', 'uint8', 'int8'\n"
+		"or 'uint16'. float16 results are returned as unsigned shorts of the\n"
+		"half float bits before Python 3.12.\n\n"
+		"value_scale, value_offset -- the values written are noise * value_scale\n"
+		"+ value_offset, for integer types clamped to the range of the type and\n"
+		"truncated like int(). By default integer types map [-1, 1] onto their\n"
+		"whole range.\n\n"
+		"clamp -- optional (low, high) range to clamp the values to after\n"
+		"value_scale and value_offset are applied.\n\n"
+		"lut -- optional colour table, a buffer of shape (N, 3) or (N, 4) of\n"
+		"uint8 RGB or RGBA colours such as returned by noise.color_ramp(). Each\n"
+		"value is replaced by the colour at its index, truncated and clamped to\n"
+		"the table, and the result has an extra axis of the colour channels. By\n"
+		"default [-1, 1] maps onto the N colours in equal intervals. Can not be\n"
+		"combined with dtype.\n\n"
+		"out -- optional writable buffer of the dtype with one element per\n"
+		"coordinate to write the results into. If omitted, a new memoryview\n"
+		"shaped like xs is returned.\n\n"
+		"threads -- number of native threads to split the work across, 0 uses\n"
+		"one thread per processor. The GIL is released while computing."},
+	{"noise3_grad_array", (PyCFunction) STATS_FUNC(py_noise3_grad_array), METH_VARARGS | METH_KEYWORDS,
+		"noise3_grad_array(xs, ys, zs, octaves=1, persistence=0.5, lacunarity=2.0, "
+			"repeatx=1024, repeaty=1024, repeatz=1024, base=0, out=None, threads=1)\n\n"
+		"return noise3_grad values for arrays of coordinates in a single call, as a\n"
+		"float memoryview of shape (len(xs), 4) with a row of (value, dx, dy, dz)\n"
+		"per coordinate. out, if specified, must have room for 4 floats per\n"
+		"coordinate. The remaining arguments are the same as for noise3_array,\n"
+		"the noise is always fBm."},
+	{"noise3_above_array", (PyCFunction) STATS_FUNC(py_noise3_above_array),
+		METH_VARARGS | METH_KEYWORDS,
+		"noise3_above_array(xs, ys, zs, threshold, octaves=1, persistence=0.5, "
+			"lacunarity=2.0, repeatx=1024, repeaty=1024, repeatz=1024, base=0, out=None, "
+			"threads=1)\n\n"
+		"return noise3_above for arrays of coordinates in a single call, as a\n"
+		"uint8 memoryview shaped like xs of 1 where the noise is above threshold\n"
+		"and 0 elsewhere. out, if specified, must be a writable buffer of uint8\n"
+		"with one element per coordinate. The remaining arguments are the same as\n"
+		"for noise3_array."},
+	{"bounds3", (PyCFunction) STATS_FUNC(py_bounds3), METH_VARARGS | METH_KEYWORDS,
+		"bounds3(box, octaves=1, persistence=0.5, lacunarity=2.0, repeatx=1024, "
+			"repeaty=1024, repeatz=1024, base=0)\n\n"
+		"return (lo, hi), bounds of the values of noise3 fBm over the box\n"
+		"((x0, y0, z0), (x1, y1, z1)). They are conservative, every value of the\n"
+		"noise in the box is within them, but not necessarily tight: they are\n"
+		"tighter for boxes spanning fewer lattice cells, and octaves whose cells\n"
+		"are much smaller than the box contribute their whole range. The other\n"
+		"arguments are the same as for noise3."},
+	{"sample", (PyCFunction) STATS_FUNC(py_sample), METH_VARARGS | METH_KEYWORDS,
+		"sample(points, octaves=1, persistence=0.5, lacunarity=2.0, repeat=1024, base=0,\n"
+		"mode='fbm', warp=0.0, dim=0, dtype='float32', value_scale=None, value_offset=None,\n"
+		"clamp=None, lut=None, out=None, threads=1)\n\n"
+		"return perlin \"improved\" noise values for a buffer of scattered points\n"
+		"of shape (N, D), of C floats or doubles, as a memoryview of N values.\n"
+		"D is 1 to 3, the dimension of the noise. A flat buffer of N * D\n"
+		"coordinates may be passed with dim=D.\n\n"
+		"repeat -- the interval along each axis when the noise values repeat,\n"
+		"a single interval for all axes or a sequence of D intervals.\n\n"
+		"The remaining arguments are the same as for noise3_array."},
+	{"grid2", (PyCFunction) STATS_FUNC(py_grid2), METH_VARARGS | METH_KEYWORDS,
+		"grid2(width, height, origin=(0, 0), step=(1, 1), octaves=1, persistence=0.5, "
+			"lacunarity=2.0, repeatx=1024, repeaty=1024, base=0, mode='fbm', warp=0.0, "
+			"dtype='float32', value_scale=None, value_offset=None, clamp=None, lut=None, out=None, "
+			"threads=1)\n\n"
+		"2 dimensional perlin improved noise over a regular grid (see grid3)"},
+	{"grid3", (PyCFunction) STATS_FUNC(py_grid3), METH_VARARGS | METH_KEYWORDS,
+		"grid3(width, height, depth, origin=(0, 0, 0), step=(1, 1, 1), octaves=1, "
+			"persistence=0.5, lacunarity=2.0, repeatx=1024, repeaty=1024, repeatz=1024, "
+			"base=0, mode='fbm', warp=0.0, dtype='float32', value_scale=None, "
+			"value_offset=None, clamp=None, lut=None, out=None, threads=1)\n\n"
+		"return perlin \"improved\" noise values sampled over a regular grid.\n"
+		"The noise is evaluated at x = origin[0] + i * step[0] for i in\n"
+		"range(width), and likewise along y and z. The remaining arguments are\n"
+		"the same as for noise3, and dtype, value_scale, value_offset, clamp and\n"
+		"lut as for noise3_array.\n\n"
+		"out -- optional writable buffer of width * height * depth values of the\n"
+		"dtype to write the results into. If omitted, a new memoryview of shape\n"
+		"(depth, height, width) is returned.\n\n"
+		"threads -- number of native threads to split the rows across, 0 uses\n"
+		"one thread per processor. The GIL is released while computing."},
+	{"shader_texture3", (PyCFunction) STATS_FUNC(py_shader_texture3), METH_VARARGS | METH_KEYWORDS,
+		"shader_texture3(width, freq, out=None, threads=1)\n\n"
+		"return the texels of a width x width x width shader_noise texture of\n"
+		"noise tiling with frequency freq, as unsigned shorts of shape (width,\n"
+		"width, width, 2). The two interleaved channels are noise3 with\n"
+		"base=0 and base=freq + 1, quantized to int((n + 1.0) * 32767).\n\n"
+		"out -- optional writable buffer of width**3 * 2 C unsigned shorts, such\n"
+		"as a ctypes array, to write the texels into.\n\n"
+		"threads -- number of native threads to split the rows across, 0 uses\n"
+		"one thread per processor. The GIL is released while computing."},
 	{NULL}
 };
 
-PyDoc_STRVAR(module_doc, "Native-code tileable Perlin \"improved\" noise functions");
+// Module only functions, not methods of Perlin objects
+static PyMethodDef perlin_module_functions[] = {
+	{"_stats", (PyCFunction) py_stats, METH_NOARGS,
+		"_stats() return a dict of (calls, samples, octaves, nanoseconds) per\n"
+		"entry point called while the instrumentation was enabled"},
+	{"_reset_stats", (PyCFunction) py_reset_stats, METH_NOARGS,
+		"_reset_stats() zero the instrumentation counters"},
+	{"_enable_stats", (PyCFunction) py_enable_stats, METH_VARARGS,
+		"_enable_stats(enabled=True) enable or disable the instrumentation\n"
+		"counters, returning whether they were enabled"},
+	{NULL}
+};
+
+PyDoc_STRVAR(perlin_type_doc,
+	"Perlin(seed=None) perlin \"improved\" noise functions using their own\n"
+	"permutation table.\n\n"
+	"The methods are the same as the module functions. The table is shuffled\n"
+	"from the integer seed, giving a different noise pattern for each seed and\n"
+	"the same one on every platform. If seed is None, the module functions'\n"
+	"table is used.");
+
+static PyTypeObject PerlinType = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	"noise._perlin.Perlin",            /* tp_name */
+	sizeof(PermObject),                /* tp_basicsize */
+	0,                                 /* tp_itemsize */
+	(destructor) perm_object_dealloc,  /* tp_dealloc */
+	0,                                 /* tp_print */
+	0,                                 /* tp_getattr */
+	0,                                 /* tp_setattr */
+	0,                                 /* tp_compare */
+	0,                                 /* tp_repr */
+	0,                                 /* tp_as_number */
+	0,                                 /* tp_as_sequence */
+	0,                                 /* tp_as_mapping */
+	0,                                 /* tp_hash */
+	0,                                 /* tp_call */
+	0,                                 /* tp_str */
+	0,                                 /* tp_getattro */
+	0,                                 /* tp_setattro */
+	0,                                 /* tp_as_buffer */
+	Py_TPFLAGS_DEFAULT,                /* tp_flags */
+	perlin_type_doc,                   /* tp_doc */
+	0,                                 /* tp_traverse */
+	0,                                 /* tp_clear */
+	0,                                 /* tp_richcompare */
+	0,                                 /* tp_weaklistoffset */
+	0,                                 /* tp_iter */
+	0,                                 /* tp_iternext */
+	perlin_functions,                  /* tp_methods */
+	perm_object_members,               /* tp_members */
+	perm_object_getset,                /* tp_getset */
+	0,                                 /* tp_base */
+	0,                                 /* tp_dict */
+	0,                                 /* tp_descr_get */
+	0,                                 /* tp_descr_set */
+	0,                                 /* tp_dictoffset */
+	0,                                 /* tp_init */
+	0,                                 /* tp_alloc */
+	perm_object_new,                   /* tp_new */
+};
+
+// fBm noise generator with fixed parameters, called with coordinates only
+typedef struct {
+	PyObject_HEAD
+#if USE_VECTORCALL
+	vectorcallfunc vectorcall;
+#endif
+	OctavePlan plan;
+	float persistence;
+	float lacunarity;
+	int repeat[3];
+	float frepeat[3];
+	int base;
+	PyObject *seed;
+	PermTable table;
+} PerlinFBMObject;
+
+static PyObject *
+perlin_fbm_value(PerlinFBMObject *self, PyObject *const *args, Py_ssize_t nargs)
+{
+	float c[3];
+	Py_ssize_t i;
+
+	if (nargs < 1 || nargs > 3) {
+		PyErr_Format(PyExc_TypeError,
+			"PerlinFBM expected 1 to 3 coordinates, got %zd", nargs);
+		return NULL;
+	}
+	for (i = 0; i < nargs; i++) {
+		c[i] = (float) PyFloat_AsDouble(args[i]);
+		if (c[i] == -1.0f && PyErr_Occurred())
+			return NULL;
+	}
+	switch (nargs) {
+	case 1:
+		return PyFloat_FromDouble((double) plan_point1(
+			&self->plan, self->table.perm, c[0], self->base));
+	case 2:
+		return PyFloat_FromDouble((double) plan_point2(
+			&self->plan, self->table.perm, c[0], c[1], self->base));
+	default:
+		return PyFloat_FromDouble((double) plan_point3(
+			&self->plan, self->table.perm, c[0], c[1], c[2], self->base));
+	}
+}
+
+static PyObject *
+perlin_fbm_eval(PerlinFBMObject *self, PyObject *const *args, Py_ssize_t nargs)
+{
+#ifndef NOISE_NO_STATS
+	if (stats_enabled) {
+		unsigned long long start = stats_now();
+		PyObject *result = perlin_fbm_value(self, args, nargs);
+		stats_add(&perlin_stats[STAT_PERLIN_FBM], start, result != NULL,
+			(unsigned long long) self->plan.octaves);
+		return result;
+	}
+#endif
+	return perlin_fbm_value(self, args, nargs);
+}
+
+#if USE_VECTORCALL
+static PyObject *
+perlin_fbm_vectorcall(PyObject *self, PyObject *const *args, size_t nargsf, PyObject *kwnames)
+{
+	if (kwnames != NULL && PyTuple_GET_SIZE(kwnames) > 0) {
+		PyErr_SetString(PyExc_TypeError, "PerlinFBM takes no keyword arguments");
+		return NULL;
+	}
+	return perlin_fbm_eval((PerlinFBMObject *) self, args, PyVectorcall_NARGS(nargsf));
+}
+#endif
+
+static PyObject *
+perlin_fbm_call(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	if (kwargs != NULL && PyDict_Size(kwargs) > 0) {
+		PyErr_SetString(PyExc_TypeError, "PerlinFBM takes no keyword arguments");
+		return NULL;
+	}
+	return perlin_fbm_eval((PerlinFBMObject *) self,
+		&PyTuple_GET_ITEM(args, 0), PyTuple_GET_SIZE(args));
+}
+
+// Parse repeat, either a single interval for all axes or a sequence of up
+// to 3 intervals
+static int
+perlin_fbm_repeat(PyObject *obj, PerlinFBMObject *self)
+{
+	PyObject *seq;
+	Py_ssize_t n, i;
+
+	if (obj == NULL)
+		return 1;
+	if (PyNumber_Check(obj) && !PySequence_Check(obj)) {
+		double r = PyFloat_AsDouble(obj);
+		if (r == -1.0 && PyErr_Occurred())
+			return 0;
+		for (i = 0; i < 3; i++)
+			self->frepeat[i] = (float) r;
+		return 1;
+	}
+	seq = PySequence_Fast(obj, "repeat must be a number or a sequence of numbers");
+	if (seq == NULL)
+		return 0;
+	n = PySequence_Fast_GET_SIZE(seq);
+	if (n < 1 || n > 3) {
+		PyErr_SetString(PyExc_ValueError, "repeat must have 1 to 3 intervals");
+		Py_DECREF(seq);
+		return 0;
+	}
+	for (i = 0; i < n; i++) {
+		double r = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(seq, i));
+		if (r == -1.0 && PyErr_Occurred()) {
+			Py_DECREF(seq);
+			return 0;
+		}
+		self->frepeat[i] = (float) r;
+	}
+	Py_DECREF(seq);
+	return 1;
+}
+
+static PyObject *
+perlin_fbm_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
+{
+	PerlinFBMObject *self;
+	int octaves = 1;
+	PyObject *repeat = NULL;
+	PyObject *seed = Py_None;
+	int mode = FRACTAL_FBM;
+	float warp = 0.0f;
+	int i;
+
+	static char *kwlist[] = {"octaves", "persistence", "lacunarity", "repeat", "base", "seed",
+		"mode", "warp", NULL};
+
+	self = (PerlinFBMObject *) type->tp_alloc(type, 0);
+	if (self == NULL)
+		return NULL;
+	self->persistence = 0.5f;
+	self->lacunarity = 2.0f;
+	self->frepeat[0] = self->frepeat[1] = self->frepeat[2] = 1024.0f;
+	Py_INCREF(Py_None);
+	self->seed = Py_None;
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|iffOiOO&f:PerlinFBM", kwlist,
+		&octaves, &self->persistence, &self->lacunarity, &repeat, &self->base, &seed,
+		fractal_mode_converter, &mode, &warp)
+		|| !perlin_fbm_repeat(repeat, self))
+		goto error;
+	// noise1 and noise3 take integer intervals, noise2 float intervals
+	for (i = 0; i < 3; i++) {
+		if (!(self->frepeat[i] > 0.0f)) {
+			PyErr_SetString(PyExc_ValueError, "Expected repeat values > 0");
+			goto error;
+		}
+		self->repeat[i] = (int) self->frepeat[i];
+	}
+	if (plan_init(&self->plan, octaves, self->persistence, self->lacunarity,
+		self->repeat, self->frepeat) < 0)
+		goto error;
+	if (plan_check_repeat1(&self->plan) < 0)
+		goto error;
+	self->plan.mode = mode;
+	self->plan.warp = warp;
+	if (perm_table_from_seed(&self->table, seed) < 0)
+		goto error;
+	Py_INCREF(seed);
+	Py_SETREF(self->seed, seed);
+#if USE_VECTORCALL
+	self->vectorcall = perlin_fbm_vectorcall;
+#endif
+	return (PyObject *) self;
+
+error:
+	Py_DECREF(self);
+	return NULL;
+}
+
+static void
+perlin_fbm_dealloc(PerlinFBMObject *self)
+{
+	plan_free(&self->plan);
+	Py_XDECREF(self->seed);
+	Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+static PyObject *
+perlin_fbm_get_octaves(PerlinFBMObject *self, void *closure)
+{
+	return PyLong_FromLong(self->plan.octaves);
+}
+
+static PyObject *
+perlin_fbm_get_mode(PerlinFBMObject *self, void *closure)
+{
+	return PyUnicode_FromString(fractal_modes[self->plan.mode]);
+}
+
+static PyObject *
+perlin_fbm_get_warp(PerlinFBMObject *self, void *closure)
+{
+	return PyFloat_FromDouble((double) self->plan.warp);
+}
+
+static PyObject *
+perlin_fbm_get_repeat(PerlinFBMObject *self, void *closure)
+{
+	return Py_BuildValue("(ddd)", (double) self->frepeat[0], (double) self->frepeat[1],
+		(double) self->frepeat[2]);
+}
+
+static PyMemberDef perlin_fbm_members[] = {
+	{"persistence", T_FLOAT, offsetof(PerlinFBMObject, persistence), READONLY, NULL},
+	{"lacunarity", T_FLOAT, offsetof(PerlinFBMObject, lacunarity), READONLY, NULL},
+	{"base", T_INT, offsetof(PerlinFBMObject, base), READONLY, NULL},
+	{"seed", T_OBJECT, offsetof(PerlinFBMObject, seed), READONLY, NULL},
+	{NULL}
+};
 
-#if PY_MAJOR_VERSION >= 3
+static PyGetSetDef perlin_fbm_getset[] = {
+	{"octaves", (getter) perlin_fbm_get_octaves, NULL, NULL, NULL},
+	{"repeat", (getter) perlin_fbm_get_repeat, NULL, "the (x, y, z) repeat intervals", NULL},
+	{"mode", (getter) perlin_fbm_get_mode, NULL, "the fractal mode", NULL},
+	{"warp", (getter) perlin_fbm_get_warp, NULL, "the amount of domain warping", NULL},
+	{NULL}
+};
+
+PyDoc_STRVAR(perlin_fbm_doc,
+	"PerlinFBM(octaves=1, persistence=0.5, lacunarity=2.0, repeat=1024, base=0, seed=None, "
+		"mode='fbm', warp=0.0)\n\n"
+	"perlin \"improved\" fBm noise with fixed parameters. Calling it with 1, 2\n"
+	"or 3 coordinates returns the same value as noise1, noise2 or noise3 with\n"
+	"these parameters, without parsing them again on each call. The octave\n"
+	"frequencies, amplitudes and repeat intervals are computed once.\n\n"
+	"repeat -- the interval for all axes, or a sequence of up to 3 intervals\n"
+	"for x, y and z.\n\n"
+	"seed -- if not None, use a permutation table shuffled from this integer\n"
+	"(see Perlin).\n\n"
+	"mode, warp -- the fractal mode and domain warping (see noise3).");
+
+static PyTypeObject PerlinFBMType = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	"noise._perlin.PerlinFBM",         /* tp_name */
+	sizeof(PerlinFBMObject),           /* tp_basicsize */
+	0,                                 /* tp_itemsize */
+	(destructor) perlin_fbm_dealloc,   /* tp_dealloc */
+#if USE_VECTORCALL
+	offsetof(PerlinFBMObject, vectorcall), /* tp_vectorcall_offset */
+#else
+	0,                                 /* tp_print */
+#endif
+	0,                                 /* tp_getattr */
+	0,                                 /* tp_setattr */
+	0,                                 /* tp_compare */
+	0,                                 /* tp_repr */
+	0,                                 /* tp_as_number */
+	0,                                 /* tp_as_sequence */
+	0,                                 /* tp_as_mapping */
+	0,                                 /* tp_hash */
+	perlin_fbm_call,                   /* tp_call */
+	0,                                 /* tp_str */
+	0,                                 /* tp_getattro */
+	0,                                 /* tp_setattro */
+	0,                                 /* tp_as_buffer */
+	Py_TPFLAGS_DEFAULT | FBM_TPFLAGS,  /* tp_flags */
+	perlin_fbm_doc,                    /* tp_doc */
+	0,                                 /* tp_traverse */
+	0,                                 /* tp_clear */
+	0,                                 /* tp_richcompare */
+	0,                                 /* tp_weaklistoffset */
+	0,                                 /* tp_iter */
+	0,                                 /* tp_iternext */
+	0,                                 /* tp_methods */
+	perlin_fbm_members,                /* tp_members */
+	perlin_fbm_getset,                 /* tp_getset */
+	0,                                 /* tp_base */
+	0,                                 /* tp_dict */
+	0,                                 /* tp_descr_get */
+	0,                                 /* tp_descr_set */
+	0,                                 /* tp_dictoffset */
+	0,                                 /* tp_init */
+	0,                                 /* tp_alloc */
+	perlin_fbm_new,                    /* tp_new */
+};
+
+PyDoc_STRVAR(module_doc, "Native-code tileable Perlin \"improved\" noise functions");
 
 static struct PyModuleDef moduledef = {
 	PyModuleDef_HEAD_INIT,
@@ -291,15 +2090,28 @@ static struct PyModuleDef moduledef = {
 PyObject *
 PyInit__perlin(void)
 {
-    return PyModule_Create(&moduledef);
-}
-
-#else
+	PyObject *module;
 
-void
-init_perlin(void)
-{
-	Py_InitModule3("_perlin", perlin_functions, module_doc);
+	if (PyType_Ready(&PerlinType) < 0 || PyType_Ready(&PerlinFBMType) < 0)
+		return NULL;
+	module = PyModule_Create(&moduledef);
+	if (module == NULL)
+		return NULL;
+	if (PyModule_AddFunctions(module, perlin_module_functions) < 0) {
+		Py_DECREF(module);
+		return NULL;
+	}
+	Py_INCREF(&PerlinType);
+	if (PyModule_AddObject(module, "Perlin", (PyObject *) &PerlinType) < 0) {
+		Py_DECREF(&PerlinType);
+		Py_DECREF(module);
+		return NULL;
+	}
+	Py_INCREF(&PerlinFBMType);
+	if (PyModule_AddObject(module, "PerlinFBM", (PyObject *) &PerlinFBMType) < 0) {
+		Py_DECREF(&PerlinFBMType);
+		Py_DECREF(module);
+		return NULL;
+	}
+	return module;
 }
-
-#endif
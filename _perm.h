@@ -0,0 +1,90 @@
+// Copyright (c) 2008, Casey Duncan (casey dot duncan at gmail dot com)
+// see LICENSE.txt for details
+
+// Base of the seeded noise types of the native noise modules. Each object
+// owns a permutation table, shuffled from its seed, which its methods use
+// in place of the global PERM table. Requires _noise.h.
+
+#include "Python.h"
+#include "structmember.h"
+
+typedef struct {
+	PyObject_HEAD
+	PyObject *seed;
+	PermTable table;
+} PermObject;
+
+// Fill a table from a seed object, an integer or None for the default
+// table. Returns -1 and sets an exception on error.
+static int
+perm_table_from_seed(PermTable *t, PyObject *seed)
+{
+	unsigned long long value;
+
+	if (seed == Py_None) {
+		// The same noise as the module functions
+		perm_table_init(t, PERM);
+		return 0;
+	}
+	if (!PyLong_Check(seed)) {
+		PyErr_SetString(PyExc_TypeError, "seed must be an integer or None");
+		return -1;
+	}
+	value = PyLong_AsUnsignedLongLongMask(seed);
+	if (value == (unsigned long long) -1 && PyErr_Occurred())
+		return -1;
+	perm_table_seed(t, value);
+	return 0;
+}
+
+static PyObject *
+perm_object_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
+{
+	PermObject *self;
+	PyObject *seed = Py_None;
+
+	static char *kwlist[] = {"seed", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|O", kwlist, &seed))
+		return NULL;
+	self = (PermObject *) type->tp_alloc(type, 0);
+	if (self == NULL)
+		return NULL;
+	Py_INCREF(seed);
+	self->seed = seed;
+	if (perm_table_from_seed(&self->table, seed) < 0) {
+		Py_DECREF(self);
+		return NULL;
+	}
+	return (PyObject *) self;
+}
+
+static void
+perm_object_dealloc(PermObject *self)
+{
+	Py_XDECREF(self->seed);
+	Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+static PyObject *
+perm_object_permutation(PermObject *self, void *closure)
+{
+	return PyBytes_FromStringAndSize((const char *) self->table.perm, 256);
+}
+
+static PyMemberDef perm_object_members[] = {
+	{"seed", T_OBJECT, offsetof(PermObject, seed), READONLY,
+		"the seed the permutation table was shuffled from, None for the default table"},
+	{NULL}
+};
+
+static PyGetSetDef perm_object_getset[] = {
+	{"permutation", (getter) perm_object_permutation, NULL,
+		"the 256 byte permutation table used by this object", NULL},
+	{NULL}
+};
+
+// The permutation table for a noise function called as a method of a
+// seeded noise object, or the global table when called as a module function
+#define SELF_TABLE(self, type) \
+	((self) != NULL && PyObject_TypeCheck((self), (type)) ? &((PermObject *) (self))->table : NULL)
@@ -6,14 +6,40 @@
 #include <math.h>
 #include <float.h>
 #include "_noise.h"
+#include "_batch.h"
+#include "_perm.h"
+#include "_stats.h"
+
+// The permutation table of the module functions, a copy of PERM filled
+// in when the module is initialized
+static PermTable default_table;
+
+static PyTypeObject SimplexType;
+
+// Evaluates the fractal modes and domain warping of the scalar functions,
+// defined with the batch functions below
+static PyObject *simplex_fractal(const PermTable *table, int dim, const float *c, int octaves,
+	float persistence, float lacunarity, const float *repeat, float base, int mode, float warp);
+
+// The permutation table of a Simplex object, or the default table for the
+// module functions
+static inline const PermTable *
+self_table(PyObject *self)
+{
+	const PermTable *t = SELF_TABLE(self, &SimplexType);
+	return t != NULL ? t : &default_table;
+}
 
 // 2D simplex skew factors
 #define F2 0.3660254037844386f  // 0.5 * (sqrt(3.0) - 1.0)
 #define G2 0.21132486540518713f // (3.0 - sqrt(3.0)) / 6.0
 
-float 
-noise2(float x, float y) 
+// 2D simplex noise. If grad is not NULL, the partial derivatives of the
+// noise are stored in it.
+static inline float
+noise2_grad(const PermTable *table, float x, float y, float *grad)
 {
+	const unsigned char *perm = table->perm;
 	int i1, j1, I, J, c;
 	float s = (x + y) * F2;
 	float i = floorf(x + s);
@@ -37,9 +63,9 @@ noise2(float x, float y)
 
 	I = (int) i & 255;
 	J = (int) j & 255;
-	g[0] = PERM[I + PERM[J]] % 12;
-	g[1] = PERM[I + i1 + PERM[J + j1]] % 12;
-	g[2] = PERM[I + 1 + PERM[J + 1]] % 12;
+	g[0] = table->perm12[I + perm[J]];
+	g[1] = table->perm12[I + i1 + perm[J + j1]];
+	g[2] = table->perm12[I + 1 + perm[J + 1]];
 
 	for (c = 0; c <= 2; c++)
 		f[c] = 0.5f - xx[c]*xx[c] - yy[c]*yy[c];
@@ -47,10 +73,30 @@ noise2(float x, float y)
 	for (c = 0; c <= 2; c++)
 		if (f[c] > 0)
 			noise[c] = f[c]*f[c]*f[c]*f[c] * (GRAD3[g[c]][0]*xx[c] + GRAD3[g[c]][1]*yy[c]);
-	
+
+	if (grad != NULL) {
+		// d/dp f^4 (g . p) = f^4 g - 8 f^3 (g . p) p
+		grad[0] = grad[1] = 0.0f;
+		for (c = 0; c <= 2; c++) {
+			if (f[c] > 0) {
+				const float f3 = f[c]*f[c]*f[c];
+				const float dot = GRAD3[g[c]][0]*xx[c] + GRAD3[g[c]][1]*yy[c];
+				grad[0] += f3 * (f[c] * GRAD3[g[c]][0] - 8.0f * dot * xx[c]);
+				grad[1] += f3 * (f[c] * GRAD3[g[c]][1] - 8.0f * dot * yy[c]);
+			}
+		}
+		grad[0] *= 70.0f;
+		grad[1] *= 70.0f;
+	}
 	return (noise[0] + noise[1] + noise[2]) * 70.0f;
 }
 
+float 
+noise2(const PermTable *table, float x, float y) 
+{
+	return noise2_grad(table, x, y, NULL);
+}
+
 #define dot3(v1, v2) ((v1)[0]*(v2)[0] + (v1)[1]*(v2)[1] + (v1)[2]*(v2)[2])
 
 #define ASSIGN(a, v0, v1, v2) (a)[0] = v0; (a)[1] = v1; (a)[2] = v2;
@@ -58,9 +104,91 @@ noise2(float x, float y)
 #define F3 (1.0f / 3.0f)
 #define G3 (1.0f / 6.0f)
 
-float 
-noise3(float x, float y, float z) 
+// Lattice periodic tiling of 3D simplex noise. Translating a point by 3m
+// along x shifts its skewed lattice coordinates by (4m, m, m), which is
+// itself a lattice vector, so the noise repeats if the simplex corners are
+// hashed modulo these vectors (likewise (m, 4m, m) along y and (m, m, 4m)
+// along z). The repeat interval of each axis is snapped to a multiple of 3
+// lattice units by scaling its coordinates.
+typedef struct {
+	int m[3];       // lattice period / 3 along each axis, 0 if not tiled
+	float scale[3]; // lattice units per unit of the point coordinates
+	int base;       // offset into the permutation table
+} Tiling3;
+
+// Periods beyond this are never reached by float coordinates
+#define TILE_MAX 16777216.0f
+
+static inline void
+tiling3_init(Tiling3 *tile, const float *repeat, float freq, int base)
+{
+	int c;
+
+	for (c = 0; c < 3; c++) {
+		if (repeat[c] == FLT_MAX) {
+			tile->m[c] = 0;
+			tile->scale[c] = freq;
+		} else {
+			float m = roundf(repeat[c] * freq / 3.0f);
+			m = m < 1.0f ? 1.0f : (m > TILE_MAX ? TILE_MAX : m);
+			tile->m[c] = (int) m;
+			tile->scale[c] = 3.0f * m / repeat[c];
+		}
+	}
+	tile->base = base;
+}
+
+// Check the repeat intervals of tiled 3D noise, returning -1 with an
+// exception set if any is not positive
+static int
+tiling3_check(const float *repeat)
+{
+	int c;
+
+	for (c = 0; c < 3; c++) {
+		if (!(repeat[c] > 0.0f)) {
+			PyErr_SetString(PyExc_ValueError, "Expected repeat values > 0");
+			return -1;
+		}
+	}
+	return 0;
+}
+
+// Gradient index of the lattice point (i, j, k), reduced modulo the period
+// vectors of tile. The reduction brings each unskewed coordinate into
+// [0, 3m), which makes it the same for every translate of the point.
+static inline int
+tiling3_hash(const PermTable *table, const Tiling3 *tile, int i, int j, int k)
 {
+	const unsigned char *perm = table->perm;
+	const long long v[3] = {i, j, k};
+	const long long s = v[0] + v[1] + v[2];
+	long long d[3], sum;
+	int c;
+
+	for (c = 0; c < 3; c++) {
+		d[c] = 0;
+		if (tile->m[c] > 0) {
+			// 6 times the unskewed coordinate, divided by 6 times the period
+			const long long u = 6 * v[c] - s;
+			const long long p = 18LL * tile->m[c];
+			d[c] = (u / p - (u % p < 0)) * tile->m[c];
+		}
+	}
+	sum = d[0] + d[1] + d[2];
+	i = (int) (v[0] - 3 * d[0] - sum) + tile->base;
+	j = (int) (v[1] - 3 * d[1] - sum) + tile->base;
+	k = (int) (v[2] - 3 * d[2] - sum) + tile->base;
+	return table->perm12[(i & 255) + perm[(j & 255) + perm[k & 255]]];
+}
+
+// 3D simplex noise, tiled if tile is not NULL. If grad is not NULL, the
+// partial derivatives of the noise are stored in it.
+static inline float
+noise3_lattice(const PermTable *table, const Tiling3 *tile, float x, float y, float z,
+	float *grad)
+{
+	const unsigned char *perm = table->perm;
 	int c, o1[3], o2[3], g[4], I, J, K;
 	float f[4], noise[4] = {0.0f, 0.0f, 0.0f, 0.0f};
 	float s = (x + y + z) * F3;
@@ -105,13 +233,23 @@ noise3(float x, float y, float z)
 		pos[1][c] = pos[0][c] - o1[c] + G3;
 	}
 
-	I = (int) i & 255; 
-	J = (int) j & 255; 
-	K = (int) k & 255;
-	g[0] = PERM[I + PERM[J + PERM[K]]] % 12;
-	g[1] = PERM[I + o1[0] + PERM[J + o1[1] + PERM[o1[2] + K]]] % 12;
-	g[2] = PERM[I + o2[0] + PERM[J + o2[1] + PERM[o2[2] + K]]] % 12;
-	g[3] = PERM[I + 1 + PERM[J + 1 + PERM[K + 1]]] % 12; 
+	if (tile == NULL) {
+		I = (int) i & 255; 
+		J = (int) j & 255; 
+		K = (int) k & 255;
+		g[0] = table->perm12[I + perm[J + perm[K]]];
+		g[1] = table->perm12[I + o1[0] + perm[J + o1[1] + perm[o1[2] + K]]];
+		g[2] = table->perm12[I + o2[0] + perm[J + o2[1] + perm[o2[2] + K]]];
+		g[3] = table->perm12[I + 1 + perm[J + 1 + perm[K + 1]]];
+	} else {
+		I = (int) i;
+		J = (int) j;
+		K = (int) k;
+		g[0] = tiling3_hash(table, tile, I, J, K);
+		g[1] = tiling3_hash(table, tile, I + o1[0], J + o1[1], K + o1[2]);
+		g[2] = tiling3_hash(table, tile, I + o2[0], J + o2[1], K + o2[2]);
+		g[3] = tiling3_hash(table, tile, I + 1, J + 1, K + 1);
+	}
 
 	for (c = 0; c <= 3; c++) {
 		f[c] = 0.6f - pos[c][0]*pos[c][0] - pos[c][1]*pos[c][1] - pos[c][2]*pos[c][2];
@@ -122,34 +260,117 @@ noise3(float x, float y, float z)
 			noise[c] = f[c]*f[c]*f[c]*f[c] * dot3(pos[c], GRAD3[g[c]]);
 		}
 	}
-	
+
+	if (grad != NULL) {
+		int d;
+		grad[0] = grad[1] = grad[2] = 0.0f;
+		for (c = 0; c <= 3; c++) {
+			if (f[c] > 0) {
+				const float f3 = f[c]*f[c]*f[c];
+				const float dot = dot3(pos[c], GRAD3[g[c]]);
+				for (d = 0; d <= 2; d++)
+					grad[d] += f3 * (f[c] * GRAD3[g[c]][d] - 8.0f * dot * pos[c][d]);
+			}
+		}
+		for (d = 0; d <= 2; d++)
+			grad[d] *= 32.0f;
+	}
 	return (noise[0] + noise[1] + noise[2] + noise[3]) * 32.0f;
 }
 
+float 
+noise3(const PermTable *table, float x, float y, float z) 
+{
+	return noise3_lattice(table, NULL, x, y, z, NULL);
+}
+
+// fBm 3D simplex noise. If grad is not NULL, the partial derivatives of
+// the noise are stored in it.
 static inline float
-fbm_noise3(float x, float y, float z, int octaves, float persistence, float lacunarity) {
+fbm_noise3(const PermTable *table, float x, float y, float z, int octaves, float persistence,
+	float lacunarity, float *grad) {
     float freq = 1.0f;
     float amp = 1.0f;
     float max = 1.0f;
-    float total = noise3(x, y, z);
-    int i;
+    float total = noise3_lattice(table, NULL, x, y, z, grad);
+    float d[3];
+    int i, c;
 
     for (i = 1; i < octaves; ++i) {
         freq *= lacunarity;
         amp *= persistence;
         max += amp;
-        total += noise3(x * freq, y * freq, z * freq) * amp;
+        total += noise3_lattice(table, NULL, x * freq, y * freq, z * freq,
+            grad != NULL ? d : NULL) * amp;
+        if (grad != NULL) {
+            for (c = 0; c < 3; c++)
+                grad[c] += d[c] * amp * freq;
+        }
+    }
+    if (grad != NULL) {
+        for (c = 0; c < 3; c++)
+            grad[c] /= max;
     }
     return total / max;
 }
 
+// Wrap a coordinate into [0, repeat), so that all of its repeats are
+// evaluated at exactly the same point
+static inline float
+tile_wrap(float x, float repeat)
+{
+	if (repeat == FLT_MAX)
+		return x;
+	x = fmodf(x, repeat);
+	return x < 0.0f ? x + repeat : x;
+}
+
+// fbm_noise3() tiled along the axes whose repeat interval is not FLT_MAX.
+// Each octave is snapped to its own lattice period, so all of them repeat.
+static inline float
+fbm_noise3_tiled(const PermTable *table, float x, float y, float z, int octaves,
+	float persistence, float lacunarity, const float *repeat, int base, float *grad)
+{
+	Tiling3 tile;
+	float freq = 1.0f;
+	float amp = 1.0f;
+	float max = 0.0f;
+	float total = 0.0f;
+	float d[3];
+	int i, c;
+
+	if (grad != NULL)
+		grad[0] = grad[1] = grad[2] = 0.0f;
+	x = tile_wrap(x, repeat[0]);
+	y = tile_wrap(y, repeat[1]);
+	z = tile_wrap(z, repeat[2]);
+	for (i = 0; i < octaves; i++) {
+		tiling3_init(&tile, repeat, freq, base);
+		total += noise3_lattice(table, &tile, x * tile.scale[0], y * tile.scale[1],
+			z * tile.scale[2], grad != NULL ? d : NULL) * amp;
+		if (grad != NULL) {
+			for (c = 0; c < 3; c++)
+				grad[c] += d[c] * amp * tile.scale[c];
+		}
+		max += amp;
+		freq *= lacunarity;
+		amp *= persistence;
+	}
+	if (grad != NULL) {
+		for (c = 0; c < 3; c++)
+			grad[c] /= max;
+	}
+	return total / max;
+}
+
 #define dot4(v1, x, y, z, w) ((v1)[0]*(x) + (v1)[1]*(y) + (v1)[2]*(z) + (v1)[3]*(w))
 
 #define F4 0.30901699437494745f /* (sqrt(5.0) - 1.0) / 4.0 */
 #define G4 0.1381966011250105f /* (5.0 - sqrt(5.0)) / 20.0 */
 
 float 
-noise4(float x, float y, float z, float w) {
+noise4(const PermTable *table, float x, float y, float z, float w, int base) {
+    const unsigned char *perm = table->perm;
     float noise[5] = {0.0f, 0.0f, 0.0f, 0.0f, 0.0f};
 
     float s = (x + y + z + w) * F4;
@@ -195,15 +416,15 @@ noise4(float x, float y, float z, float w) {
     float z4 = z0 - 1.0f + 4.0f*G4;
     float w4 = w0 - 1.0f + 4.0f*G4;
 
-    int I = (int)i & 255;
-    int J = (int)j & 255;
-    int K = (int)k & 255;
-    int L = (int)l & 255;
-    int gi0 = PERM[I + PERM[J + PERM[K + PERM[L]]]] & 0x1f;
-    int gi1 = PERM[I + i1 + PERM[J + j1 + PERM[K + k1 + PERM[L + l1]]]] & 0x1f; 
-    int gi2 = PERM[I + i2 + PERM[J + j2 + PERM[K + k2 + PERM[L + l2]]]] & 0x1f; 
-    int gi3 = PERM[I + i3 + PERM[J + j3 + PERM[K + k3 + PERM[L + l3]]]] & 0x1f; 
-    int gi4 = PERM[I + 1 + PERM[J + 1 + PERM[K + 1 + PERM[L + 1]]]] & 0x1f;
+    int I = ((int)i + base) & 255;
+    int J = ((int)j + base) & 255;
+    int K = ((int)k + base) & 255;
+    int L = ((int)l + base) & 255;
+    int gi0 = perm[I + perm[J + perm[K + perm[L]]]] & 0x1f;
+    int gi1 = perm[I + i1 + perm[J + j1 + perm[K + k1 + perm[L + l1]]]] & 0x1f; 
+    int gi2 = perm[I + i2 + perm[J + j2 + perm[K + k2 + perm[L + l2]]]] & 0x1f; 
+    int gi3 = perm[I + i3 + perm[J + j3 + perm[K + k3 + perm[L + l3]]]] & 0x1f; 
+    int gi4 = perm[I + 1 + perm[J + 1 + perm[K + 1 + perm[L + 1]]]] & 0x1f;
     float t0, t1, t2, t3, t4;
 
     t0 = 0.6f - x0*x0 - y0*y0 - z0*z0 - w0*w0;
@@ -236,207 +457,2322 @@ noise4(float x, float y, float z, float w) {
 }
 
 static inline float
-fbm_noise4(float x, float y, float z, float w, int octaves, float persistence, float lacunarity) {
+fbm_noise4(const PermTable *table, float x, float y, float z, float w, int octaves,
+	float persistence, float lacunarity, int base) {
     float freq = 1.0f;
     float amp = 1.0f;
     float max = 1.0f;
-    float total = noise4(x, y, z, w);
+    float total = noise4(table, x, y, z, w, base);
     int i;
 
     for (i = 1; i < octaves; ++i) {
         freq *= lacunarity;
         amp *= persistence;
         max += amp;
-        total += noise4(x * freq, y * freq, z * freq, w * freq) * amp;
+        total += noise4(table, x * freq, y * freq, z * freq, w * freq, base) * amp;
     }
     return total / max;
 }
 
 
-static PyObject *
-py_noise2(PyObject *self, PyObject *args, PyObject *kwargs)
+// Map a point of tiled 2D noise onto circles in 3D or 4D noise, so that it
+// repeats along x and/or y. Returns the number of dimensions of the mapped
+// point p.
+static inline int
+tile_noise2(float x, float y, float repeatx, float repeaty, float z, float *p)
 {
-	float x, y;
-	int octaves = 1;
-	float persistence = 0.5f;
-    float lacunarity = 2.0f;
-    float repeatx = FLT_MAX;
-    float repeaty = FLT_MAX;
-    float z = 0.0f;
-	static char *kwlist[] = {"x", "y", "octaves", "persistence", "lacunarity", 
-        "repeatx", "repeaty", "base", NULL};
+    float w = z;
+    if (repeaty != FLT_MAX) {
+        float yf = y * 2.0 / repeaty;
+        float yr = repeaty * M_1_PI * 0.5;
+        float vy = fast_sin(yf);
+        float vyz = fast_cos(yf);
+        y = vy * yr;
+        w += vyz * yr;
+        if (repeatx == FLT_MAX) {
+            p[0] = x; p[1] = y; p[2] = w;
+            return 3;
+        }
+    }
+    if (repeatx != FLT_MAX) {
+        float xf = x * 2.0 / repeatx;
+        float xr = repeatx * M_1_PI * 0.5;
+        float vx = fast_sin(xf);
+        float vxz = fast_cos(xf);
+        x = vx * xr;
+        z += vxz * xr;
+        if (repeaty == FLT_MAX) {
+            p[0] = x; p[1] = y; p[2] = z;
+            return 3;
+        }
+    }
+    p[0] = x; p[1] = y; p[2] = z; p[3] = w;
+    return 4;
+}
 
-	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ff|ifffff:snoise2", kwlist,
-		&x, &y, &octaves, &persistence, &lacunarity, &repeatx, &repeaty, &z)) {
-		return NULL;
+// Flat fBm 2D noise, without tiling. If grad is not NULL, the partial
+// derivatives of the noise are stored in it.
+static inline float
+fbm_noise2_flat(const PermTable *table, float x, float y, int octaves, float persistence,
+	float lacunarity, float z, float *grad)
+{
+    float freq = 1.0f;
+    float amp = 1.0f;
+    float max = 1.0f;
+    float total = noise2_grad(table, x + z, y + z, grad);
+    float d[2];
+    int i;
+
+    for (i = 1; i < octaves; i++) {
+        freq *= lacunarity;
+        amp *= persistence;
+        max += amp;
+        total += noise2_grad(table, x * freq + z, y * freq + z, grad != NULL ? d : NULL) * amp;
+        if (grad != NULL) {
+            grad[0] += d[0] * amp * freq;
+            grad[1] += d[1] * amp * freq;
+        }
     }
-    if (octaves <= 0) {
-        PyErr_SetString(PyExc_ValueError, "Expected octaves value > 0");
-        return NULL;
+    if (grad != NULL) {
+        grad[0] /= max;
+        grad[1] /= max;
     }
-	
+    return total / max;
+}
+
+static inline float
+fbm_noise2(const PermTable *table, float x, float y, int octaves, float persistence,
+	float lacunarity, float repeatx, float repeaty, float z)
+{
     if (repeatx == FLT_MAX && repeaty == FLT_MAX) {
         // Flat noise, no tiling
-        float freq = 1.0f;
-        float amp = 1.0f;
-        float max = 1.0f;
-        float total = noise2(x + z, y + z);
-        int i;
-
-        for (i = 1; i < octaves; i++) {
-            freq *= lacunarity;
-            amp *= persistence;
-            max += amp;
-            total += noise2(x * freq + z, y * freq + z) * amp;
-        }
-        return (PyObject *) PyFloat_FromDouble((double) (total / max));
+        return fbm_noise2_flat(table, x, y, octaves, persistence, lacunarity, z, NULL);
     } else { // Tiled noise
-        float w = z;
-        if (repeaty != FLT_MAX) {
-            float yf = y * 2.0 / repeaty;
-            float yr = repeaty * M_1_PI * 0.5;
-            float vy = fast_sin(yf);
-            float vyz = fast_cos(yf);
-            y = vy * yr;
-            w += vyz * yr;
-            if (repeatx == FLT_MAX) {
-                return (PyObject *) PyFloat_FromDouble(
-                    (double) fbm_noise3(x, y, w, octaves, persistence, lacunarity));
-            }
-        }
-        if (repeatx != FLT_MAX) {
-            float xf = x * 2.0 / repeatx;
-            float xr = repeatx * M_1_PI * 0.5;
-            float vx = fast_sin(xf);
-            float vxz = fast_cos(xf);
-            x = vx * xr;
-            z += vxz * xr;
-            if (repeaty == FLT_MAX) {
-                return (PyObject *) PyFloat_FromDouble(
-                    (double) fbm_noise3(x, y, z, octaves, persistence, lacunarity));
-            }
-        }
-        return (PyObject *) PyFloat_FromDouble(
-            (double) fbm_noise4(x, y, z, w, octaves, persistence, lacunarity));
+        float p[4];
+        if (tile_noise2(x, y, repeatx, repeaty, z, p) == 3)
+            return fbm_noise3(table, p[0], p[1], p[2], octaves, persistence, lacunarity, NULL);
+        return fbm_noise4(table, p[0], p[1], p[2], p[3], octaves, persistence, lacunarity, 0);
     }
 }
 
-static PyObject *
-py_noise3(PyObject *self, PyObject *args, PyObject *kwargs)
+// fbm_noise3() and fbm_noise4() with the octaves of an OctavePlan. The
+// first octave has a frequency and amplitude of 1.
+static inline float
+plan_noise3(const OctavePlan *plan, const PermTable *table, float x, float y, float z,
+	float *grad)
 {
-	float x, y, z;
-	int octaves = 1;
-	float persistence = 0.5f;
-    float lacunarity = 2.0f;
+	float total = noise3_lattice(table, NULL, x, y, z, grad);
+	float d[3];
+	int i, c;
+
+	for (i = 1; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		total += noise3_lattice(table, NULL, x * o->freq, y * o->freq, z * o->freq,
+			grad != NULL ? d : NULL) * o->amp;
+		if (grad != NULL) {
+			for (c = 0; c < 3; c++)
+				grad[c] += d[c] * o->amp * o->freq;
+		}
+	}
+	if (grad != NULL) {
+		for (c = 0; c < 3; c++)
+			grad[c] /= plan->max;
+	}
+	return total / plan->max;
+}
 
-	static char *kwlist[] = {"x", "y", "z", "octaves", "persistence", "lacunarity", NULL};
+static inline float
+plan_noise4(const OctavePlan *plan, const PermTable *table, float x, float y, float z, float w,
+	int base)
+{
+	float total = noise4(table, x, y, z, w, base);
+	int i;
 
-	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "fff|iff:snoise3", kwlist,
-		&x, &y, &z, &octaves, &persistence, &lacunarity))
-		return NULL;
-	
-	if (octaves == 1) {
-		// Single octave, return simple noise
-		return (PyObject *) PyFloat_FromDouble((double) noise3(x, y, z));
-	} else if (octaves > 1) {
-		return (PyObject *) PyFloat_FromDouble(
-            (double) fbm_noise3(x, y, z, octaves, persistence, lacunarity));
-	} else {
-		PyErr_SetString(PyExc_ValueError, "Expected octaves value > 0");
-		return NULL;
+	for (i = 1; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		total += noise4(table, x * o->freq, y * o->freq, z * o->freq, w * o->freq, base)
+			* o->amp;
 	}
+	return total / plan->max;
 }
 
-static PyObject *
-py_noise4(PyObject *self, PyObject *args, PyObject *kwargs)
+// fbm_noise2_flat() with the octaves of an OctavePlan
+static inline float
+plan_noise2(const OctavePlan *plan, const PermTable *table, float x, float y, float z,
+	float *grad)
 {
-	float x, y, z, w;
-	int octaves = 1;
-	float persistence = 0.5f;
-	float lacunarity = 2.0f;
+	float total = noise2_grad(table, x + z, y + z, grad);
+	float d[2];
+	int i;
 
-	static char *kwlist[] = {"x", "y", "z", "w", "octaves", "persistence", "lacunarity", NULL};
+	for (i = 1; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		total += noise2_grad(table, x * o->freq + z, y * o->freq + z,
+			grad != NULL ? d : NULL) * o->amp;
+		if (grad != NULL) {
+			grad[0] += d[0] * o->amp * o->freq;
+			grad[1] += d[1] * o->amp * o->freq;
+		}
+	}
+	if (grad != NULL) {
+		grad[0] /= plan->max;
+		grad[1] /= plan->max;
+	}
+	return total / plan->max;
+}
 
-	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ffff|iff:snoise4", kwlist,
-		&x, &y, &z, &w, &octaves, &persistence, &lacunarity))
-		return NULL;
-	
-	if (octaves == 1) {
-		// Single octave, return simple noise
-		return (PyObject *) PyFloat_FromDouble((double) noise4(x, y, z, w));
-	} else if (octaves > 1) {
-		return (PyObject *) PyFloat_FromDouble(
-            (double) fbm_noise4(x, y, z, w, octaves, persistence, lacunarity));
-	} else {
-		PyErr_SetString(PyExc_ValueError, "Expected octaves value > 0");
-		return NULL;
+// fbm_noise3_tiled() with the octaves of an OctavePlan and their tilings
+static inline float
+plan_noise3_tiled(const OctavePlan *plan, const Tiling3 *tiles, const float *repeat,
+	const PermTable *table, float x, float y, float z, float *grad)
+{
+	float total = 0.0f;
+	float d[3];
+	int i, c;
+
+	if (grad != NULL)
+		grad[0] = grad[1] = grad[2] = 0.0f;
+	x = tile_wrap(x, repeat[0]);
+	y = tile_wrap(y, repeat[1]);
+	z = tile_wrap(z, repeat[2]);
+	for (i = 0; i < plan->octaves; i++) {
+		const Tiling3 *t = &tiles[i];
+		const float amp = plan->octave[i].amp;
+		total += noise3_lattice(table, t, x * t->scale[0], y * t->scale[1], z * t->scale[2],
+			grad != NULL ? d : NULL) * amp;
+		if (grad != NULL) {
+			for (c = 0; c < 3; c++)
+				grad[c] += d[c] * amp * t->scale[c];
+		}
 	}
+	if (grad != NULL) {
+		for (c = 0; c < 3; c++)
+			grad[c] /= plan->max;
+	}
+	return total / plan->max;
 }
 
-static PyMethodDef simplex_functions[] = {
-	{"noise2", (PyCFunction)py_noise2, METH_VARARGS | METH_KEYWORDS, 
-		"noise2(x, y, octaves=1, persistence=0.5, lacunarity=2.0, repeatx=None, repeaty=None, base=0.0) "
-        "return simplex noise value for specified 2D coordinate.\n\n"
-		"octaves -- specifies the number of passes, defaults to 1 (simple noise).\n\n"
-		"persistence -- specifies the amplitude of each successive octave relative\n"
-		"to the one below it. Defaults to 0.5 (each higher octave's amplitude\n"
-		"is halved). Note the amplitude of the first pass is always 1.0.\n\n"
-        "lacunarity -- specifies the frequency of each successive octave relative\n"
-        "to the one below it, similar to persistence. Defaults to 2.0.\n\n"
-        "repeatx, repeaty -- specifies the interval along each axis when \n"
-		"the noise values repeat. This can be used as the tile size for creating \n"
-		"tileable textures\n\n"
-		"base -- specifies a fixed offset for the noise coordinates. Useful for\n"
-		"generating different noise textures with the same repeat interval"},
-	{"noise3", (PyCFunction)py_noise3, METH_VARARGS | METH_KEYWORDS, 
-		"noise3(x, y, z, octaves=1, persistence=0.5, lacunarity=2.0) return simplex noise value for "
-		"specified 3D coordinate\n\n"
-		"octaves -- specifies the number of passes, defaults to 1 (simple noise).\n\n"
-		"persistence -- specifies the amplitude of each successive octave relative\n"
-		"to the one below it. Defaults to 0.5 (each higher octave's amplitude\n"
-		"is halved). Note the amplitude of the first pass is always 1.0.\n\n"
-        "lacunarity -- specifies the frequency of each successive octave relative\n"
-        "to the one below it, similar to persistence. Defaults to 2.0."},
-	{"noise4", (PyCFunction)py_noise4, METH_VARARGS | METH_KEYWORDS, 
-		"noise4(x, y, z, w, octaves=1, persistence=0.5, lacunarity=2.0) return simplex noise value for "
-		"specified 4D coordinate\n\n"
-		"octaves -- specifies the number of passes, defaults to 1 (simple noise).\n\n"
-		"persistence -- specifies the amplitude of each successive octave relative\n"
-		"to the one below it. Defaults to 0.5 (each higher octave's amplitude\n"
-		"is halved). Note the amplitude of the first pass is always 1.0.\n\n"
-        "lacunarity -- specifies the frequency of each successive octave relative\n"
-        "to the one below it, similar to persistence. Defaults to 2.0."},
-	{NULL}
-};
+// Bound of the magnitude of noise3(). Whatever the gradients, each corner
+// of the simplex adds at most 32 f^4 times the sum of its two largest
+// offset components, which add up to at most 0.979 over the simplex.
+#define NOISE3_BOUND 1.0f
 
-PyDoc_STRVAR(module_doc, "Native-code simplex noise functions");
+// Whether plan_noise3(), or plan_noise3_tiled() if tiles is not NULL, is
+// above the threshold of t, evaluating only the octaves needed to decide it,
+// which are added to evaluated
+static inline int
+plan_above3(const OctavePlan *plan, const Threshold *t, const Tiling3 *tiles,
+	const float *repeat, const PermTable *table, float x, float y, float z,
+	long long *evaluated)
+{
+	float total = 0.0f;
+	int i, above;
 
-#if PY_MAJOR_VERSION >= 3
+	if (tiles != NULL) {
+		x = tile_wrap(x, repeat[0]);
+		y = tile_wrap(y, repeat[1]);
+		z = tile_wrap(z, repeat[2]);
+	}
+	for (i = 0; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		if (tiles != NULL) {
+			const Tiling3 *tile = &tiles[i];
+			total += noise3_lattice(table, tile, x * tile->scale[0], y * tile->scale[1],
+				z * tile->scale[2], NULL) * o->amp;
+		} else {
+			total += noise3_lattice(table, NULL, x * o->freq, y * o->freq, z * o->freq, NULL)
+				* o->amp;
+		}
+		if ((above = threshold_decided(t, plan, i, total)) >= 0) {
+			*evaluated += i + 1;
+			return above;
+		}
+	}
+	*evaluated += plan->octaves;
+	return total / plan->max > t->threshold;
+}
 
-static struct PyModuleDef moduledef = {
-	PyModuleDef_HEAD_INIT,
-	"_simplex",
-	module_doc,
-	-1,                 /* m_size */
-	simplex_functions,  /* m_methods */
-	NULL,               /* m_reload (unused) */
-	NULL,               /* m_traverse */
-	NULL,               /* m_clear */
-	NULL                /* m_free */
-};
+// The corners after the first of the simplices of a skewed cell, for each
+// order of the offsets from its origin, largest first, as in noise3_lattice()
+static const int SIMPLEX3_ORDER[6][3] = {
+	{0, 1, 2}, {0, 2, 1}, {2, 0, 1}, {2, 1, 0}, {1, 2, 0}, {1, 0, 2}};
 
-PyObject *
-PyInit__simplex(void)
+// Bounds of noise3_lattice() over the part of the box [lo, hi] within the
+// simplices of the skewed cell at (i, j, k) it may overlap. Each corner adds
+// f^4 times the dot product of its gradient with the offset from it, where
+// f = 0.6 less the squared distance, and the squared offset components and
+// the dot product have exact bounds over the box.
+static Interval
+cell_bounds3(const PermTable *table, const Tiling3 *tile, int i, int j, int k,
+	const double *lo, const double *hi)
+{
+	const int cell[3] = {i, j, k};
+	const double t = (i + j + k) * (double) G3;
+	Interval term[8];
+	Interval r = {HUGE_VAL, -HUGE_VAL};
+	Interval sum;
+	int v, c, o;
+
+	for (v = 0; v < 8; v++) {
+		const int corner[3] = {v & 1, (v >> 1) & 1, v >> 2};
+		const double q = t + (corner[0] + corner[1] + corner[2]) * (double) G3;
+		double r2lo = 0.0, r2hi = 0.0, f;
+		Interval dot = {0.0, 0.0};
+		const float *g;
+		int hash;
+
+		if (tile == NULL) {
+			const unsigned char *perm = table->perm;
+			const int I = i & 255, J = j & 255, K = k & 255;
+			hash = table->perm12[I + corner[0] + perm[J + corner[1] + perm[K + corner[2]]]];
+		} else {
+			hash = tiling3_hash(table, tile, i + corner[0], j + corner[1], k + corner[2]);
+		}
+		g = GRAD3[hash];
+		for (c = 0; c < 3; c++) {
+			const double a = lo[c] - (cell[c] + corner[c] - q);
+			const double b = hi[c] - (cell[c] + corner[c] - q);
+			const double aa = a * a, bb = b * b;
+			r2lo += a > 0.0 ? aa : (b < 0.0 ? bb : 0.0);
+			r2hi += aa > bb ? aa : bb;
+			dot.lo += g[c] * a < g[c] * b ? g[c] * a : g[c] * b;
+			dot.hi += g[c] * a < g[c] * b ? g[c] * b : g[c] * a;
+		}
+		f = 0.6 - r2lo;
+		if (f <= 0.0) {
+			term[v].lo = term[v].hi = 0.0;
+		} else {
+			const double fmin = 0.6 - r2hi > 0.0 ? 0.6 - r2hi : 0.0;
+			term[v] = interval_scale(dot, fmin * fmin * fmin * fmin, f * f * f * f);
+		}
+	}
+	// The simplices of the cell with an order of the offsets that some point
+	// of the box may have, allowing for rounding
+	for (o = 0; o < 6; o++) {
+		const int *order = SIMPLEX3_ORDER[o];
+		const int v1 = 1 << order[0];
+		const int v2 = v1 | 1 << order[1];
+		for (c = 0; c < 2; c++) {
+			const int a = order[c], b = order[c + 1];
+			if (hi[a] - lo[b] - (cell[a] - cell[b]) < -1e-6)
+				break;
+		}
+		if (c < 2)
+			continue;
+		sum.lo = term[0].lo + term[7].lo + term[v1].lo + term[v2].lo;
+		sum.hi = term[0].hi + term[7].hi + term[v1].hi + term[v2].hi;
+		interval_union(&r, &sum);
+	}
+	return r;
+}
+
+// Bounds of noise3_lattice() over the box [lo, hi] in lattice units, the
+// union of the bounds of its sub-boxes in each skewed cell they overlap
+static Interval
+noise3_bounds(const PermTable *table, const Tiling3 *tile, const double *lo, const double *hi)
+{
+	Interval r = {-NOISE3_BOUND, NOISE3_BOUND};
+	Interval cell;
+	double sub_lo[3], sub_hi[3], step[3];
+	int n[3], s[3], first[3], last[3], i, j, k, c;
+
+	for (c = 0; c < 3; c++) {
+		if (!(fabs(lo[c]) < 1e9 && fabs(hi[c]) < 1e9))
+			return r;
+	}
+	if (!bounds_split(lo, hi, n))
+		return r;
+	r.lo = HUGE_VAL;
+	r.hi = -HUGE_VAL;
+	for (c = 0; c < 3; c++)
+		step[c] = (hi[c] - lo[c]) / n[c];
+	for (s[2] = 0; s[2] < n[2]; s[2]++) {
+		for (s[1] = 0; s[1] < n[1]; s[1]++) {
+			for (s[0] = 0; s[0] < n[0]; s[0]++) {
+				double sum_lo = 0.0, sum_hi = 0.0;
+				for (c = 0; c < 3; c++) {
+					sub_lo[c] = lo[c] + s[c] * step[c];
+					sub_hi[c] = s[c] == n[c] - 1 ? hi[c] : lo[c] + (s[c] + 1) * step[c];
+					sum_lo += sub_lo[c];
+					sum_hi += sub_hi[c];
+				}
+				// The skewed cells, widened for the rounding of the skew
+				for (c = 0; c < 3; c++) {
+					const double u0 = sub_lo[c] + sum_lo * F3;
+					const double u1 = sub_hi[c] + sum_hi * F3;
+					first[c] = (int) floor(u0 - 1e-6 * (fabs(u0) + 1.0));
+					last[c] = (int) floor(u1 + 1e-6 * (fabs(u1) + 1.0));
+				}
+				for (k = first[2]; k <= last[2]; k++) {
+					for (j = first[1]; j <= last[1]; j++) {
+						for (i = first[0]; i <= last[0]; i++) {
+							cell = cell_bounds3(table, tile, i, j, k, sub_lo, sub_hi);
+							interval_union(&r, &cell);
+						}
+					}
+				}
+				// The rest of the box can not widen the bounds further
+				if (r.lo * 32.0 <= -NOISE3_BOUND && r.hi * 32.0 >= NOISE3_BOUND) {
+					r.lo = -NOISE3_BOUND;
+					r.hi = NOISE3_BOUND;
+					return r;
+				}
+			}
+		}
+	}
+	r.lo = r.lo * 32.0 > -NOISE3_BOUND ? r.lo * 32.0 : -NOISE3_BOUND;
+	r.hi = r.hi * 32.0 < NOISE3_BOUND ? r.hi * 32.0 : NOISE3_BOUND;
+	return r;
+}
+
+// Fractal noise in any of the FRACTAL_* modes over the octaves of an
+// OctavePlan, fbm being the plan_noise functions above
+static inline float
+plan_fractal2(const OctavePlan *plan, int mode, const PermTable *table, float x, float y,
+	float z)
+{
+	Fractal f = FRACTAL_INIT;
+	int i;
+
+	if (mode == FRACTAL_FBM)
+		return plan_noise2(plan, table, x, y, z, NULL);
+	for (i = 0; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		fractal_add(&f, mode, noise2(table, x * o->freq + z, y * o->freq + z), o->amp);
+	}
+	return fractal_result(&f, mode, plan->max);
+}
+
+static inline float
+plan_fractal3(const OctavePlan *plan, int mode, const PermTable *table, float x, float y,
+	float z)
 {
-    return PyModule_Create(&moduledef);
+	Fractal f = FRACTAL_INIT;
+	int i;
+
+	if (mode == FRACTAL_FBM)
+		return plan_noise3(plan, table, x, y, z, NULL);
+	for (i = 0; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		fractal_add(&f, mode, noise3(table, x * o->freq, y * o->freq, z * o->freq), o->amp);
+	}
+	return fractal_result(&f, mode, plan->max);
+}
+
+static inline float
+plan_fractal4(const OctavePlan *plan, int mode, const PermTable *table, float x, float y,
+	float z, float w, int base)
+{
+	Fractal f = FRACTAL_INIT;
+	int i;
+
+	if (mode == FRACTAL_FBM)
+		return plan_noise4(plan, table, x, y, z, w, base);
+	for (i = 0; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		fractal_add(&f, mode, noise4(table, x * o->freq, y * o->freq, z * o->freq, w * o->freq,
+			base), o->amp);
+	}
+	return fractal_result(&f, mode, plan->max);
+}
+
+static inline float
+plan_fractal3_tiled(const OctavePlan *plan, int mode, const Tiling3 *tiles, const float *repeat,
+	const PermTable *table, float x, float y, float z)
+{
+	Fractal f = FRACTAL_INIT;
+	int i;
+
+	if (mode == FRACTAL_FBM)
+		return plan_noise3_tiled(plan, tiles, repeat, table, x, y, z, NULL);
+	x = tile_wrap(x, repeat[0]);
+	y = tile_wrap(y, repeat[1]);
+	z = tile_wrap(z, repeat[2]);
+	for (i = 0; i < plan->octaves; i++) {
+		const Tiling3 *t = &tiles[i];
+		fractal_add(&f, mode, noise3_lattice(table, t,
+			x * t->scale[0], y * t->scale[1], z * t->scale[2], NULL), plan->octave[i].amp);
+	}
+	return fractal_result(&f, mode, plan->max);
+}
+
+// Tiled fbm_noise2() with the octaves of an OctavePlan, in any fractal mode
+static inline float
+plan_fractal2_tiled(const OctavePlan *plan, int mode, const PermTable *table, float x, float y,
+	float repeatx, float repeaty, float z)
+{
+	float p[4];
+
+	if (tile_noise2(x, y, repeatx, repeaty, z, p) == 3)
+		return plan_fractal3(plan, mode, table, p[0], p[1], p[2]);
+	return plan_fractal4(plan, mode, table, p[0], p[1], p[2], p[3], 0);
+}
+
+// Block kernels evaluate noise2 or noise3 for n points at a time. The
+// vectorized versions are selected when the module is initialized,
+// according to the instruction sets supported by the CPU. They produce
+// exactly the same results as the scalar ones.
+
+typedef void (*noise2_block_func)(const PermTable *table, const float *x, const float *y,
+	float *out, int n);
+typedef void (*noise3_block_func)(const PermTable *table, const float *x, const float *y,
+	const float *z, float *out, int n);
+
+static void
+noise2_block_scalar(const PermTable *table, const float *x, const float *y, float *out, int n)
+{
+	int i;
+	for (i = 0; i < n; i++)
+		out[i] = noise2(table, x[i], y[i]);
 }
 
+static void
+noise3_block_scalar(const PermTable *table, const float *x, const float *y, const float *z,
+	float *out, int n)
+{
+	int i;
+	for (i = 0; i < n; i++)
+		out[i] = noise3(table, x[i], y[i], z[i]);
+}
+
+#if defined(_MSC_VER)
+#define SIMD_ALIGN __declspec(align(32))
 #else
+#define SIMD_ALIGN __attribute__((aligned(32)))
+#endif
 
-void
-init_simplex(void)
+#if defined(__x86_64__) || defined(_M_X64)
+#include <emmintrin.h>
+#define SIMD_SSE2 1
+
+// floorf() for SSE2, which has no rounding instruction. Lanes that are
+// already integral (including -0.0), too large to have a fraction or NaN
+// are passed through unchanged, like floorf() does.
+static inline __m128
+sse2_floor(__m128 v)
 {
-	Py_InitModule3("_simplex", simplex_functions, module_doc);
+	const __m128 limit = _mm_set1_ps(8388608.0f); // 2**23
+	const __m128 abs_mask = _mm_castsi128_ps(_mm_set1_epi32(0x7fffffff));
+	__m128 t = _mm_cvtepi32_ps(_mm_cvttps_epi32(v));
+	__m128 r = _mm_sub_ps(t, _mm_and_ps(_mm_cmpgt_ps(t, v), _mm_set1_ps(1.0f)));
+	__m128 keep = _mm_or_ps(_mm_cmpeq_ps(t, v), _mm_cmpnlt_ps(_mm_and_ps(v, abs_mask), limit));
+	return _mm_or_ps(_mm_and_ps(keep, v), _mm_andnot_ps(keep, r));
 }
 
+#define SIMD_FUNC static
+#define SIMD_NAME(name) name##_sse2
+#define SIMD_WIDTH 4
+#define VF __m128
+#define V_SET1 _mm_set1_ps
+#define V_LOAD _mm_loadu_ps
+#define V_STORE _mm_storeu_ps
+#define V_STORE_INT(p, v) _mm_storeu_si128((__m128i *) (p), _mm_cvttps_epi32(v))
+#define V_ADD _mm_add_ps
+#define V_SUB _mm_sub_ps
+#define V_MUL _mm_mul_ps
+#define V_FLOOR sse2_floor
+#define V_GT _mm_cmpgt_ps
+#define V_GE _mm_cmpge_ps
+#define V_LE _mm_cmple_ps
+#define V_AND _mm_and_ps
+#define V_OR _mm_or_ps
+#define V_ANDNOT _mm_andnot_ps
+#include "_simplex_simd.h"
+#undef SIMD_FUNC
+#undef SIMD_NAME
+#undef SIMD_WIDTH
+#undef VF
+#undef V_SET1
+#undef V_LOAD
+#undef V_STORE
+#undef V_STORE_INT
+#undef V_ADD
+#undef V_SUB
+#undef V_MUL
+#undef V_FLOOR
+#undef V_GT
+#undef V_GE
+#undef V_LE
+#undef V_AND
+#undef V_OR
+#undef V_ANDNOT
+
+#if defined(__GNUC__) || defined(_MSC_VER)
+#include <immintrin.h>
+#define SIMD_AVX 1
+
+#if defined(_MSC_VER)
+#include <intrin.h>
+#define SIMD_FUNC static
+#else
+#define SIMD_FUNC static __attribute__((target("avx")))
 #endif
+
+#define SIMD_NAME(name) name##_avx
+#define SIMD_WIDTH 8
+#define VF __m256
+#define V_SET1 _mm256_set1_ps
+#define V_LOAD _mm256_loadu_ps
+#define V_STORE _mm256_storeu_ps
+#define V_STORE_INT(p, v) _mm256_storeu_si256((__m256i *) (p), _mm256_cvttps_epi32(v))
+#define V_ADD _mm256_add_ps
+#define V_SUB _mm256_sub_ps
+#define V_MUL _mm256_mul_ps
+#define V_FLOOR _mm256_floor_ps
+#define V_GT(a, b) _mm256_cmp_ps(a, b, _CMP_GT_OQ)
+#define V_GE(a, b) _mm256_cmp_ps(a, b, _CMP_GE_OQ)
+#define V_LE(a, b) _mm256_cmp_ps(a, b, _CMP_LE_OQ)
+#define V_AND _mm256_and_ps
+#define V_OR _mm256_or_ps
+#define V_ANDNOT _mm256_andnot_ps
+#include "_simplex_simd.h"
+#undef SIMD_FUNC
+#undef SIMD_NAME
+#undef SIMD_WIDTH
+#undef VF
+#undef V_SET1
+#undef V_LOAD
+#undef V_STORE
+#undef V_STORE_INT
+#undef V_ADD
+#undef V_SUB
+#undef V_MUL
+#undef V_FLOOR
+#undef V_GT
+#undef V_GE
+#undef V_LE
+#undef V_AND
+#undef V_OR
+#undef V_ANDNOT
+
+static int
+avx_available(void)
+{
+#if defined(_MSC_VER)
+	int info[4];
+	__cpuid(info, 1);
+	// AVX supported by the CPU and its registers saved by the OS
+	return (info[2] & (1 << 28)) && (info[2] & (1 << 27)) && (_xgetbv(0) & 6) == 6;
+#else
+	return __builtin_cpu_supports("avx");
+#endif
+}
+#endif
+
+#elif defined(__aarch64__) || defined(_M_ARM64)
+#include <arm_neon.h>
+#define SIMD_NEON 1
+
+#define SIMD_FUNC static
+#define SIMD_NAME(name) name##_neon
+#define SIMD_WIDTH 4
+#define VF float32x4_t
+#define V_SET1 vdupq_n_f32
+#define V_LOAD vld1q_f32
+#define V_STORE vst1q_f32
+#define V_STORE_INT(p, v) vst1q_s32((p), vcvtq_s32_f32(v))
+#define V_ADD vaddq_f32
+#define V_SUB vsubq_f32
+#define V_MUL vmulq_f32
+#define V_FLOOR vrndmq_f32
+#define V_GT(a, b) vreinterpretq_f32_u32(vcgtq_f32(a, b))
+#define V_GE(a, b) vreinterpretq_f32_u32(vcgeq_f32(a, b))
+#define V_LE(a, b) vreinterpretq_f32_u32(vcleq_f32(a, b))
+#define V_AND(a, b) vreinterpretq_f32_u32(vandq_u32( \
+	vreinterpretq_u32_f32(a), vreinterpretq_u32_f32(b)))
+#define V_OR(a, b) vreinterpretq_f32_u32(vorrq_u32( \
+	vreinterpretq_u32_f32(a), vreinterpretq_u32_f32(b)))
+#define V_ANDNOT(a, b) vreinterpretq_f32_u32(vbicq_u32( \
+	vreinterpretq_u32_f32(b), vreinterpretq_u32_f32(a)))
+#include "_simplex_simd.h"
+#endif
+
+static int
+always_available(void)
+{
+	return 1;
+}
+
+typedef struct {
+	const char *name;
+	int (*available)(void);
+	noise2_block_func noise2;
+	noise3_block_func noise3;
+} BlockKernels;
+
+// In order of preference, the best available is selected at import
+static const BlockKernels block_kernels[] = {
+	{"scalar", always_available, noise2_block_scalar, noise3_block_scalar},
+#ifdef SIMD_SSE2
+	{"sse2", always_available, noise2_block_sse2, noise3_block_sse2},
+#endif
+#ifdef SIMD_AVX
+	{"avx", avx_available, noise2_block_avx, noise3_block_avx},
+#endif
+#ifdef SIMD_NEON
+	{"neon", always_available, noise2_block_neon, noise3_block_neon},
+#endif
+	{NULL}
+};
+
+static const BlockKernels *kernels = &block_kernels[0];
+
+static void
+select_kernels(void)
+{
+	const BlockKernels *k;
+
+	for (k = block_kernels; k->name != NULL; k++) {
+		if (k->available())
+			kernels = k;
+	}
+}
+
+#define BLOCK_SIZE 256
+
+// fbm_noise2() without tiling, for n <= BLOCK_SIZE points at a time
+static void
+fbm_noise2_block(const BlockKernels *k, const PermTable *table, const OctavePlan *plan,
+	const float *x, const float *y, float *out, int n, float z)
+{
+	// Zeroed only so the compiler can tell the kernel never reads
+	// uninitialized values, only the first n are used
+	float xs[BLOCK_SIZE] = {0}, ys[BLOCK_SIZE] = {0};
+	float noise[BLOCK_SIZE];
+	int i, c;
+
+	for (c = 0; c < n; c++) {
+		xs[c] = x[c] + z;
+		ys[c] = y[c] + z;
+	}
+	k->noise2(table, xs, ys, out, n);
+	for (i = 1; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		for (c = 0; c < n; c++) {
+			xs[c] = x[c] * o->freq + z;
+			ys[c] = y[c] * o->freq + z;
+		}
+		k->noise2(table, xs, ys, noise, n);
+		for (c = 0; c < n; c++)
+			out[c] += noise[c] * o->amp;
+	}
+	for (c = 0; c < n; c++)
+		out[c] = out[c] / plan->max;
+}
+
+// fbm_noise3() for n <= BLOCK_SIZE points at a time
+static void
+fbm_noise3_block(const BlockKernels *k, const PermTable *table, const OctavePlan *plan,
+	const float *x, const float *y, const float *z, float *out, int n)
+{
+	float xs[BLOCK_SIZE], ys[BLOCK_SIZE], zs[BLOCK_SIZE], noise[BLOCK_SIZE];
+	int i, c;
+
+	k->noise3(table, x, y, z, out, n);
+	for (i = 1; i < plan->octaves; i++) {
+		const Octave *o = &plan->octave[i];
+		for (c = 0; c < n; c++) {
+			xs[c] = x[c] * o->freq;
+			ys[c] = y[c] * o->freq;
+			zs[c] = z[c] * o->freq;
+		}
+		k->noise3(table, xs, ys, zs, noise, n);
+		for (c = 0; c < n; c++)
+			out[c] += noise[c] * o->amp;
+	}
+	for (c = 0; c < n; c++)
+		out[c] = out[c] / plan->max;
+}
+
+// plan_above3() of untiled noise for n <= BLOCK_SIZE points at a time,
+// setting out to 1 or 0. The points still undecided after each octave are
+// packed together for the next one. Returns the octaves evaluated.
+static long long
+above3_block(const BlockKernels *k, const PermTable *table, const OctavePlan *plan,
+	const Threshold *t, const float *x, const float *y, const float *z, float *out, int n)
+{
+	float xs[BLOCK_SIZE], ys[BLOCK_SIZE], zs[BLOCK_SIZE], noise[BLOCK_SIZE], total[BLOCK_SIZE];
+	int index[BLOCK_SIZE];
+	int i, c, m, above;
+	long long evaluated = 0;
+
+	for (c = 0; c < n; c++) {
+		index[c] = c;
+		total[c] = 0.0f;
+	}
+	for (i = 0; i < plan->octaves && n > 0; i++) {
+		const Octave *o = &plan->octave[i];
+		evaluated += n;
+		for (c = 0; c < n; c++) {
+			xs[c] = x[index[c]] * o->freq;
+			ys[c] = y[index[c]] * o->freq;
+			zs[c] = z[index[c]] * o->freq;
+		}
+		k->noise3(table, xs, ys, zs, noise, n);
+		for (c = m = 0; c < n; c++) {
+			total[c] += noise[c] * o->amp;
+			if ((above = threshold_decided(t, plan, i, total[c])) >= 0) {
+				out[index[c]] = (float) above;
+			} else {
+				index[m] = index[c];
+				total[m] = total[c];
+				m++;
+			}
+		}
+		n = m;
+	}
+	for (c = 0; c < n; c++)
+		out[index[c]] = (float) (total[c] / plan->max > t->threshold);
+	return evaluated;
+}
+
+static PyObject *
+py_noise2(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	float x, y;
+	int octaves = 1;
+	float persistence = 0.5f;
+    float lacunarity = 2.0f;
+    float repeatx = FLT_MAX;
+    float repeaty = FLT_MAX;
+    float z = 0.0f;
+	int mode = FRACTAL_FBM;
+	float warp = 0.0f;
+	static char *kwlist[] = {"x", "y", "octaves", "persistence", "lacunarity", 
+        "repeatx", "repeaty", "base", "mode", "warp", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ff|ifffffO&f:snoise2", kwlist,
+		&x, &y, &octaves, &persistence, &lacunarity, &repeatx, &repeaty, &z,
+		fractal_mode_converter, &mode, &warp)) {
+		return NULL;
+    }
+    if (octaves <= 0) {
+        PyErr_SetString(PyExc_ValueError, "Expected octaves value > 0");
+        return NULL;
+    }
+	if (mode != FRACTAL_FBM || warp != 0.0f) {
+		const float c[2] = {x, y};
+		const float repeat[2] = {repeatx, repeaty};
+		return simplex_fractal(self_table(self), 2, c, octaves, persistence, lacunarity,
+			repeat, z, mode, warp);
+	}
+    return (PyObject *) PyFloat_FromDouble((double) fbm_noise2(self_table(self),
+        x, y, octaves, persistence, lacunarity, repeatx, repeaty, z));
+}
+
+static PyObject *
+py_noise3(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	float x, y, z;
+	int octaves = 1;
+	float persistence = 0.5f;
+    float lacunarity = 2.0f;
+	float repeat[3] = {FLT_MAX, FLT_MAX, FLT_MAX};
+	int base = 0;
+	int mode = FRACTAL_FBM;
+	float warp = 0.0f;
+
+	static char *kwlist[] = {"x", "y", "z", "octaves", "persistence", "lacunarity",
+		"repeatx", "repeaty", "repeatz", "base", "mode", "warp", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "fff|ifffffiO&f:snoise3", kwlist,
+		&x, &y, &z, &octaves, &persistence, &lacunarity,
+		&repeat[0], &repeat[1], &repeat[2], &base, fractal_mode_converter, &mode, &warp))
+		return NULL;
+	
+	if (mode != FRACTAL_FBM || warp != 0.0f) {
+		const float c[3] = {x, y, z};
+		return simplex_fractal(self_table(self), 3, c, octaves, persistence, lacunarity,
+			repeat, (float) base, mode, warp);
+	} else if (octaves > 0 && (repeat[0] != FLT_MAX || repeat[1] != FLT_MAX
+		|| repeat[2] != FLT_MAX || base != 0)) {
+		// Tiled noise
+		if (tiling3_check(repeat) < 0)
+			return NULL;
+		return (PyObject *) PyFloat_FromDouble((double) fbm_noise3_tiled(self_table(self),
+			x, y, z, octaves, persistence, lacunarity, repeat, base, NULL));
+	} else if (octaves == 1) {
+		// Single octave, return simple noise
+		return (PyObject *) PyFloat_FromDouble((double) noise3(self_table(self), x, y, z));
+	} else if (octaves > 1) {
+		return (PyObject *) PyFloat_FromDouble(
+            (double) fbm_noise3(self_table(self), x, y, z, octaves, persistence, lacunarity,
+			NULL));
+	} else {
+		PyErr_SetString(PyExc_ValueError, "Expected octaves value > 0");
+		return NULL;
+	}
+}
+
+static PyObject *
+py_noise4(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	float x, y, z, w;
+	int octaves = 1;
+	float persistence = 0.5f;
+	float lacunarity = 2.0f;
+	int base = 0;
+
+	static char *kwlist[] = {"x", "y", "z", "w", "octaves", "persistence", "lacunarity",
+		"base", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ffff|iffi:snoise4", kwlist,
+		&x, &y, &z, &w, &octaves, &persistence, &lacunarity, &base))
+		return NULL;
+	
+	if (octaves == 1) {
+		// Single octave, return simple noise
+		return (PyObject *) PyFloat_FromDouble((double) noise4(self_table(self), x, y, z, w,
+			base));
+	} else if (octaves > 1) {
+		return (PyObject *) PyFloat_FromDouble((double) fbm_noise4(self_table(self),
+			x, y, z, w, octaves, persistence, lacunarity, base));
+	} else {
+		PyErr_SetString(PyExc_ValueError, "Expected octaves value > 0");
+		return NULL;
+	}
+}
+
+static PyObject *
+py_noise2_grad(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	float x, y, value, grad[2];
+	int octaves = 1;
+	float persistence = 0.5f;
+	float lacunarity = 2.0f;
+	float z = 0.0f;
+
+	static char *kwlist[] = {"x", "y", "octaves", "persistence", "lacunarity", "base", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ff|ifff:snoise2_grad", kwlist,
+		&x, &y, &octaves, &persistence, &lacunarity, &z))
+		return NULL;
+	if (octaves <= 0) {
+		PyErr_SetString(PyExc_ValueError, "Expected octaves value > 0");
+		return NULL;
+	}
+	value = fbm_noise2_flat(self_table(self), x, y, octaves, persistence, lacunarity, z, grad);
+	return Py_BuildValue("(ddd)", (double) value, (double) grad[0], (double) grad[1]);
+}
+
+static PyObject *
+py_noise3_grad(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	float x, y, z, value, grad[3];
+	int octaves = 1;
+	float persistence = 0.5f;
+	float lacunarity = 2.0f;
+	float repeat[3] = {FLT_MAX, FLT_MAX, FLT_MAX};
+	int base = 0;
+
+	static char *kwlist[] = {"x", "y", "z", "octaves", "persistence", "lacunarity",
+		"repeatx", "repeaty", "repeatz", "base", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "fff|ifffffi:snoise3_grad", kwlist,
+		&x, &y, &z, &octaves, &persistence, &lacunarity,
+		&repeat[0], &repeat[1], &repeat[2], &base))
+		return NULL;
+	if (octaves <= 0) {
+		PyErr_SetString(PyExc_ValueError, "Expected octaves value > 0");
+		return NULL;
+	}
+	if (repeat[0] != FLT_MAX || repeat[1] != FLT_MAX || repeat[2] != FLT_MAX || base != 0) {
+		if (tiling3_check(repeat) < 0)
+			return NULL;
+		value = fbm_noise3_tiled(self_table(self), x, y, z, octaves, persistence, lacunarity,
+			repeat, base, grad);
+	} else {
+		value = fbm_noise3(self_table(self), x, y, z, octaves, persistence, lacunarity, grad);
+	}
+	return Py_BuildValue("(dddd)", (double) value,
+		(double) grad[0], (double) grad[1], (double) grad[2]);
+}
+
+// Parameters of the array and grid entry points, shared by the threads
+// evaluating them
+typedef struct {
+	int octaves;
+	float persistence;
+	float lacunarity;
+	float repeatx;
+	float repeaty;
+	float repeat3[3]; // repeatx, repeaty, repeatz of 3D noise
+	float base;
+	int perm_base; // base of 3D and 4D noise, an offset into the permutation table
+	int use_w;
+	float w;
+	int mode;
+	float warp;
+	CoordBuffer cb[4];
+	GridSpec g;
+	ValueOut out;
+	const BlockKernels *k;
+	const PermTable *table;
+	OctavePlan plan;
+	int tiled3;
+	Tiling3 *tiles; // tiling of each octave of tiled 3D noise
+	float threshold; // of the above functions
+	long long *evaluated; // the octaves evaluated by the above functions
+} SimplexBatch;
+
+#define SIMPLEX_BATCH_INIT {1, 0.5f, 2.0f, FLT_MAX, FLT_MAX, {FLT_MAX, FLT_MAX, FLT_MAX}, 0.0f, \
+	0, 0, 0.0f, FRACTAL_FBM, 0.0f}
+
+// Whether 3D noise must be evaluated with lattice tiling
+#define SIMPLEX_TILED3(b) ((b)->repeat3[0] != FLT_MAX || (b)->repeat3[1] != FLT_MAX \
+	|| (b)->repeat3[2] != FLT_MAX || (b)->perm_base != 0)
+
+// Tiled 2D noise is evaluated in 3D or 4D, which has no block kernels
+#define SIMPLEX_TILED(b) ((b)->repeatx != FLT_MAX || (b)->repeaty != FLT_MAX)
+
+// Whether the noise is plain fBm, which the block kernels evaluate
+#define SIMPLEX_PLAIN(b) ((b)->mode == FRACTAL_FBM && (b)->warp == 0.0f)
+
+// The noise of a batch at a point in a fractal mode, with its tiling
+static inline float
+simplex_fractal2(const SimplexBatch *b, int mode, float x, float y)
+{
+	if (SIMPLEX_TILED(b))
+		return plan_fractal2_tiled(&b->plan, mode, b->table, x, y, b->repeatx, b->repeaty, b->base);
+	return plan_fractal2(&b->plan, mode, b->table, x, y, b->base);
+}
+
+static inline float
+simplex_fractal3(const SimplexBatch *b, int mode, float x, float y, float z)
+{
+	if (b->use_w)
+		return plan_fractal4(&b->plan, mode, b->table, x, y, z, b->w, b->perm_base);
+	if (b->tiles != NULL)
+		return plan_fractal3_tiled(&b->plan, mode, b->tiles, b->repeat3, b->table, x, y, z);
+	return plan_fractal3(&b->plan, mode, b->table, x, y, z);
+}
+
+// The noise of a batch at a point in its fractal mode. If the batch warps
+// the domain, the point is first displaced along each axis by the batch's
+// fBm noise at an offset from it.
+static inline float
+simplex_point2(const SimplexBatch *b, float x, float y)
+{
+	if (b->warp != 0.0f) {
+		const float dx = simplex_fractal2(b, FRACTAL_FBM,
+			x + WARP_OFFSET[0][0], y + WARP_OFFSET[0][1]);
+		const float dy = simplex_fractal2(b, FRACTAL_FBM,
+			x + WARP_OFFSET[1][0], y + WARP_OFFSET[1][1]);
+		x += b->warp * dx;
+		y += b->warp * dy;
+	}
+	return simplex_fractal2(b, b->mode, x, y);
+}
+
+static inline float
+simplex_point3(const SimplexBatch *b, float x, float y, float z)
+{
+	if (b->warp != 0.0f) {
+		float d[3];
+		int c;
+		if (b->tiles != NULL) {
+			// Wrap first so that the displacements repeat exactly
+			x = tile_wrap(x, b->repeat3[0]);
+			y = tile_wrap(y, b->repeat3[1]);
+			z = tile_wrap(z, b->repeat3[2]);
+		}
+		for (c = 0; c < 3; c++) {
+			d[c] = simplex_fractal3(b, FRACTAL_FBM,
+				x + WARP_OFFSET[c][0], y + WARP_OFFSET[c][1], z + WARP_OFFSET[c][2]);
+		}
+		x += b->warp * d[0];
+		y += b->warp * d[1];
+		z += b->warp * d[2];
+	}
+	return simplex_fractal3(b, b->mode, x, y, z);
+}
+
+static void
+simplex_values2(const void *arg, Py_ssize_t start, float *out, Py_ssize_t count)
+{
+	const SimplexBatch *b = (const SimplexBatch *) arg;
+	float x[BLOCK_SIZE], y[BLOCK_SIZE];
+	Py_ssize_t i, n;
+	int c, block;
+
+	if (SIMPLEX_TILED(b) || !SIMPLEX_PLAIN(b)) {
+		for (i = 0; i < count; i++) {
+			n = start + i;
+			out[i] = simplex_point2(b, coords_at(&b->cb[0], n), coords_at(&b->cb[1], n));
+		}
+		return;
+	}
+	for (i = 0; i < count; i += block) {
+		block = count - i < BLOCK_SIZE ? (int) (count - i) : BLOCK_SIZE;
+		for (c = 0; c < block; c++) {
+			x[c] = coords_at(&b->cb[0], start + i + c);
+			y[c] = coords_at(&b->cb[1], start + i + c);
+		}
+		fbm_noise2_block(b->k, b->table, &b->plan, x, y, out + i, block, b->base);
+	}
+}
+
+static void
+simplex_values3(const void *arg, Py_ssize_t start, float *out, Py_ssize_t count)
+{
+	const SimplexBatch *b = (const SimplexBatch *) arg;
+	float x[BLOCK_SIZE], y[BLOCK_SIZE], z[BLOCK_SIZE];
+	Py_ssize_t i, n;
+	int c, block;
+
+	if (b->tiles != NULL || !SIMPLEX_PLAIN(b)) {
+		for (i = 0; i < count; i++) {
+			n = start + i;
+			out[i] = simplex_point3(b,
+				coords_at(&b->cb[0], n), coords_at(&b->cb[1], n), coords_at(&b->cb[2], n));
+		}
+		return;
+	}
+	for (i = 0; i < count; i += block) {
+		block = count - i < BLOCK_SIZE ? (int) (count - i) : BLOCK_SIZE;
+		for (c = 0; c < block; c++) {
+			x[c] = coords_at(&b->cb[0], start + i + c);
+			y[c] = coords_at(&b->cb[1], start + i + c);
+			z[c] = coords_at(&b->cb[2], start + i + c);
+		}
+		fbm_noise3_block(b->k, b->table, &b->plan, x, y, z, out + i, block);
+	}
+}
+
+// 1 where the fBm noise is above the batch threshold, 0 elsewhere
+static void
+simplex_above_values3(const void *arg, Py_ssize_t start, float *out, Py_ssize_t count)
+{
+	const SimplexBatch *b = (const SimplexBatch *) arg;
+	float x[BLOCK_SIZE], y[BLOCK_SIZE], z[BLOCK_SIZE];
+	Threshold t;
+	Py_ssize_t i, n;
+	long long evaluated = 0;
+	int c, block;
+
+	threshold_init(&t, &b->plan, b->threshold, NOISE3_BOUND);
+	if (b->tiles != NULL) {
+		for (i = 0; i < count; i++) {
+			n = start + i;
+			out[i] = (float) plan_above3(&b->plan, &t, b->tiles, b->repeat3, b->table,
+				coords_at(&b->cb[0], n), coords_at(&b->cb[1], n), coords_at(&b->cb[2], n),
+				&evaluated);
+		}
+		batch_count(b->evaluated, evaluated);
+		return;
+	}
+	for (i = 0; i < count; i += block) {
+		block = count - i < BLOCK_SIZE ? (int) (count - i) : BLOCK_SIZE;
+		for (c = 0; c < block; c++) {
+			x[c] = coords_at(&b->cb[0], start + i + c);
+			y[c] = coords_at(&b->cb[1], start + i + c);
+			z[c] = coords_at(&b->cb[2], start + i + c);
+		}
+		evaluated += above3_block(b->k, b->table, &b->plan, &t, x, y, z, out + i, block);
+	}
+	batch_count(b->evaluated, evaluated);
+}
+
+// 4D noise for points, which has no block kernels or tiling
+static void
+simplex_values4(const void *arg, Py_ssize_t start, float *out, Py_ssize_t count)
+{
+	const SimplexBatch *b = (const SimplexBatch *) arg;
+	Py_ssize_t i, n;
+
+	for (i = 0; i < count; i++) {
+		n = start + i;
+		out[i] = plan_fractal4(&b->plan, b->mode, b->table, coords_at(&b->cb[0], n),
+			coords_at(&b->cb[1], n), coords_at(&b->cb[2], n), coords_at(&b->cb[3], n),
+			b->perm_base);
+	}
+}
+
+static void
+simplex_array2(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	value_spans(&((const SimplexBatch *) arg)->out, simplex_values2, arg, start, stop);
+}
+
+static void
+simplex_array3(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	value_spans(&((const SimplexBatch *) arg)->out, simplex_values3, arg, start, stop);
+}
+
+static void
+simplex_array4(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	value_spans(&((const SimplexBatch *) arg)->out, simplex_values4, arg, start, stop);
+}
+
+static void
+simplex_above_array3(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	value_spans(&((const SimplexBatch *) arg)->out, simplex_above_values3, arg, start, stop);
+}
+
+// noise2_grad() for arrays, writing rows of (value, dx, dy)
+static void
+simplex_grad_array2(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	const SimplexBatch *b = (const SimplexBatch *) arg;
+	Py_ssize_t n;
+
+	for (n = start; n < stop; n++) {
+		float *row = b->out.data + n * 3;
+		row[0] = plan_noise2(&b->plan, b->table, coords_at(&b->cb[0], n), coords_at(&b->cb[1], n),
+			b->base, row + 1);
+	}
+}
+
+// noise3_grad() for arrays, writing rows of (value, dx, dy, dz)
+static void
+simplex_grad_array3(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	const SimplexBatch *b = (const SimplexBatch *) arg;
+	Py_ssize_t n;
+
+	for (n = start; n < stop; n++) {
+		const float x = coords_at(&b->cb[0], n);
+		const float y = coords_at(&b->cb[1], n);
+		const float z = coords_at(&b->cb[2], n);
+		float *row = b->out.data + n * 4;
+		if (b->tiles != NULL)
+			row[0] = plan_noise3_tiled(&b->plan, b->tiles, b->repeat3, b->table, x, y, z, row + 1);
+		else
+			row[0] = plan_noise3(&b->plan, b->table, x, y, z, row + 1);
+	}
+}
+
+// Evaluate n columns of a 2D grid row at y
+static inline void
+simplex_row2(const SimplexBatch *b, const float *xs, float y, float *out, Py_ssize_t n)
+{
+	float ys[BLOCK_SIZE];
+	Py_ssize_t col;
+	int c, count;
+
+	if (SIMPLEX_TILED(b) || !SIMPLEX_PLAIN(b)) {
+		for (col = 0; col < n; col++)
+			out[col] = simplex_point2(b, xs[col], y);
+		return;
+	}
+	for (c = 0; c < BLOCK_SIZE; c++)
+		ys[c] = y;
+	for (col = 0; col < n; col += count) {
+		count = n - col < BLOCK_SIZE ? (int) (n - col) : BLOCK_SIZE;
+		fbm_noise2_block(b->k, b->table, &b->plan, xs + col, ys, out + col, count, b->base);
+	}
+}
+
+static void
+simplex_grid2(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	const SimplexBatch *b = (const SimplexBatch *) arg;
+	float span[VALUE_SPAN];
+	Py_ssize_t row, col, n;
+
+	for (row = start; row < stop; row++) {
+		const float y = grid_y(&b->g, row);
+		for (col = 0; col < b->g.size[0]; col += n) {
+			float *out = grid_span(&b->g, row, col, span);
+			n = grid_span_len(&b->g, col);
+			simplex_row2(b, b->g.xs + col, y, out, n);
+			grid_store(&b->g, row, col, out, n);
+		}
+	}
+}
+
+// Evaluate n columns of a 3D grid row at y, z
+static inline void
+simplex_row3(const SimplexBatch *b, const float *xs, float y, float z, float *out, Py_ssize_t n)
+{
+	float ys[BLOCK_SIZE], zs[BLOCK_SIZE];
+	Py_ssize_t col;
+	int c, count;
+
+	if (b->use_w || b->tiles != NULL || !SIMPLEX_PLAIN(b)) {
+		for (col = 0; col < n; col++)
+			out[col] = simplex_point3(b, xs[col], y, z);
+		return;
+	}
+	for (c = 0; c < BLOCK_SIZE; c++) {
+		ys[c] = y;
+		zs[c] = z;
+	}
+	for (col = 0; col < n; col += count) {
+		count = n - col < BLOCK_SIZE ? (int) (n - col) : BLOCK_SIZE;
+		fbm_noise3_block(b->k, b->table, &b->plan, xs + col, ys, zs, out + col, count);
+	}
+}
+
+static void
+simplex_grid3(const void *arg, Py_ssize_t start, Py_ssize_t stop)
+{
+	const SimplexBatch *b = (const SimplexBatch *) arg;
+	float span[VALUE_SPAN];
+	Py_ssize_t row, col, n;
+
+	for (row = start; row < stop; row++) {
+		const float y = grid_y(&b->g, row);
+		const float z = grid_z(&b->g, row);
+		for (col = 0; col < b->g.size[0]; col += n) {
+			float *out = grid_span(&b->g, row, col, span);
+			n = grid_span_len(&b->g, col);
+			simplex_row3(b, b->g.xs + col, y, z, out, n);
+			grid_store(&b->g, row, col, out, n);
+		}
+	}
+}
+
+// Validate the common batch arguments and compute the octave plan, and the
+// octave tilings if b->tiled3 is set, returning the number of threads to use
+// or -1 on error. The plan must be freed with simplex_batch_free() after a
+// successful call.
+static int
+simplex_batch_setup(SimplexBatch *b, int threads)
+{
+	int i;
+
+	if ((threads = batch_threads(threads)) < 0)
+		return -1;
+	if (b->tiled3 && tiling3_check(b->repeat3) < 0)
+		return -1;
+	if (plan_init(&b->plan, b->octaves, b->persistence, b->lacunarity, NULL, NULL) < 0)
+		return -1;
+	b->tiles = NULL;
+	if (b->tiled3) {
+		b->tiles = PyMem_New(Tiling3, b->plan.octaves);
+		if (b->tiles == NULL) {
+			plan_free(&b->plan);
+			PyErr_NoMemory();
+			return -1;
+		}
+		for (i = 0; i < b->plan.octaves; i++)
+			tiling3_init(&b->tiles[i], b->repeat3, b->plan.octave[i].freq, b->perm_base);
+	}
+	b->k = kernels;
+	return threads;
+}
+
+static void
+simplex_batch_free(SimplexBatch *b)
+{
+	plan_free(&b->plan);
+	PyMem_Free(b->tiles);
+	b->tiles = NULL;
+}
+
+static PyObject *
+simplex_fractal(const PermTable *table, int dim, const float *c, int octaves,
+	float persistence, float lacunarity, const float *repeat, float base, int mode, float warp)
+{
+	SimplexBatch b = SIMPLEX_BATCH_INIT;
+	float value;
+
+	b.octaves = octaves;
+	b.persistence = persistence;
+	b.lacunarity = lacunarity;
+	b.mode = mode;
+	b.warp = warp;
+	b.table = table;
+	if (dim == 2) {
+		b.repeatx = repeat[0];
+		b.repeaty = repeat[1];
+		b.base = base;
+	} else {
+		b.repeat3[0] = repeat[0];
+		b.repeat3[1] = repeat[1];
+		b.repeat3[2] = repeat[2];
+		b.perm_base = (int) base;
+		b.tiled3 = SIMPLEX_TILED3(&b);
+	}
+	if (simplex_batch_setup(&b, 1) < 0)
+		return NULL;
+	value = dim == 2 ? simplex_point2(&b, c[0], c[1]) : simplex_point3(&b, c[0], c[1], c[2]);
+	simplex_batch_free(&b);
+	return PyFloat_FromDouble((double) value);
+}
+
+// Evaluate an array entry point over count coordinate buffers, writing
+// width results per coordinate
+static PyObject *
+simplex_array_run(SimplexBatch *b, batch_func func, PyObject **coords, int count, int width,
+	const ValueFormat *fmt, PyObject *out, int threads)
+{
+	static const char *names[] = {"xs", "ys", "zs"};
+	OutBuffer ob;
+
+	if ((threads = simplex_batch_setup(b, threads)) < 0)
+		return NULL;
+	if (coords_get_all(coords, b->cb, count, names) < 0) {
+		simplex_batch_free(b);
+		return NULL;
+	}
+	if ((width == 1 ? out_get_like(out, &ob, &b->out, fmt, &b->cb[0])
+		: out_get_rows(out, &ob, &b->out, &b->cb[0], width)) < 0) {
+		coords_release_all(b->cb, count);
+		simplex_batch_free(b);
+		return NULL;
+	}
+	Py_BEGIN_ALLOW_THREADS
+	batch_run(func, b, b->cb[0].len, threads);
+	Py_END_ALLOW_THREADS
+	coords_release_all(b->cb, count);
+	simplex_batch_free(b);
+	return out_finish(&ob, 0);
+}
+
+// Evaluate a grid entry point
+static PyObject *
+simplex_grid_run(SimplexBatch *b, batch_func func, PyObject *out, int threads)
+{
+	OutBuffer ob;
+
+	if ((threads = simplex_batch_setup(b, threads)) < 0)
+		return NULL;
+	if (grid_setup(&b->g, &ob, out) < 0) {
+		simplex_batch_free(b);
+		return grid_finish(&b->g, &ob, 1);
+	}
+	Py_BEGIN_ALLOW_THREADS
+	batch_run(func, b, b->g.rows, threads);
+	Py_END_ALLOW_THREADS
+	simplex_batch_free(b);
+	return grid_finish(&b->g, &ob, 0);
+}
+
+// Evaluate noise of dim dimensions at points, a buffer of shape (N, dim)
+static PyObject *
+simplex_points_run(SimplexBatch *b, PyObject *points, int dim, PyObject *repeat,
+	const ValueFormat *fmt, PyObject *out, int threads)
+{
+	static const batch_func funcs[] = {simplex_array2, simplex_array3, simplex_array4};
+	OutBuffer ob;
+
+	if (coords_get_points(points, b->cb, &dim, dim, 2, 4) < 0)
+		return NULL;
+	if (dim == 4 && ((repeat != NULL && repeat != Py_None) || b->warp != 0.0f)) {
+		PyErr_SetString(PyExc_ValueError, "4D simplex noise does not support repeat or warp");
+		coords_release_all(b->cb, 1);
+		return NULL;
+	}
+	if (dim == 2) {
+		float r[2] = {b->repeatx, b->repeaty};
+		if (points_repeat(repeat, r, 2) < 0) {
+			coords_release_all(b->cb, 1);
+			return NULL;
+		}
+		b->repeatx = r[0];
+		b->repeaty = r[1];
+	} else if (dim == 3 && points_repeat(repeat, b->repeat3, 3) < 0) {
+		coords_release_all(b->cb, 1);
+		return NULL;
+	}
+	b->tiled3 = dim == 3 && SIMPLEX_TILED3(b);
+	if ((threads = simplex_batch_setup(b, threads)) < 0) {
+		coords_release_all(b->cb, 1);
+		return NULL;
+	}
+	if (out_get_format(out, &ob, &b->out, fmt, b->cb[0].len, 1, &b->cb[0].len) < 0) {
+		coords_release_all(b->cb, 1);
+		simplex_batch_free(b);
+		return NULL;
+	}
+	Py_BEGIN_ALLOW_THREADS
+	batch_run(funcs[dim - 2], b, b->cb[0].len, threads);
+	Py_END_ALLOW_THREADS
+	coords_release_all(b->cb, 1);
+	simplex_batch_free(b);
+	return out_finish(&ob, 0);
+}
+
+static PyObject *
+py_noise2_array(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	SimplexBatch b = SIMPLEX_BATCH_INIT;
+	PyObject *coords[2];
+	ValueFormat fmt = VALUE_FORMAT_INIT;
+	PyObject *result;
+	PyObject *value_scale = NULL;
+	PyObject *value_offset = NULL;
+	PyObject *clamp = NULL;
+	PyObject *lut = NULL;
+	PyObject *out = NULL;
+	int threads = 1;
+
+	static char *kwlist[] = {"xs", "ys", "octaves", "persistence", "lacunarity",
+		"repeatx", "repeaty", "base", "mode", "warp", "dtype", "value_scale", "value_offset",
+		"clamp", "lut", "out", "threads", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|ifffffO&fO&OOOOOi:noise2_array", kwlist,
+		&coords[0], &coords[1], &b.octaves, &b.persistence, &b.lacunarity,
+		&b.repeatx, &b.repeaty, &b.base, fractal_mode_converter, &b.mode, &b.warp,
+		value_dtype_converter, &fmt.dtype, &value_scale, &value_offset, &clamp, &lut, &out,
+		&threads)
+		|| value_format_setup(&fmt, value_scale, value_offset, clamp, lut) < 0)
+		return NULL;
+	b.table = self_table(self);
+	result = simplex_array_run(&b, simplex_array2, coords, 2, 1, &fmt, out, threads);
+	value_format_free(&fmt);
+	return result;
+}
+
+static PyObject *
+py_noise3_array(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	SimplexBatch b = SIMPLEX_BATCH_INIT;
+	PyObject *coords[3];
+	ValueFormat fmt = VALUE_FORMAT_INIT;
+	PyObject *result;
+	PyObject *value_scale = NULL;
+	PyObject *value_offset = NULL;
+	PyObject *clamp = NULL;
+	PyObject *lut = NULL;
+	PyObject *out = NULL;
+	int threads = 1;
+
+	static char *kwlist[] = {"xs", "ys", "zs", "octaves", "persistence", "lacunarity",
+		"repeatx", "repeaty", "repeatz", "base", "mode", "warp", "dtype", "value_scale",
+		"value_offset", "clamp", "lut", "out", "threads", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OOO|ifffffiO&fO&OOOOOi:noise3_array", kwlist,
+		&coords[0], &coords[1], &coords[2], &b.octaves, &b.persistence, &b.lacunarity,
+		&b.repeat3[0], &b.repeat3[1], &b.repeat3[2], &b.perm_base,
+		fractal_mode_converter, &b.mode, &b.warp, value_dtype_converter, &fmt.dtype,
+		&value_scale, &value_offset, &clamp, &lut, &out, &threads)
+		|| value_format_setup(&fmt, value_scale, value_offset, clamp, lut) < 0)
+		return NULL;
+	b.table = self_table(self);
+	b.tiled3 = SIMPLEX_TILED3(&b);
+	result = simplex_array_run(&b, simplex_array3, coords, 3, 1, &fmt, out, threads);
+	value_format_free(&fmt);
+	return result;
+}
+
+static PyObject *
+py_noise2_grad_array(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	SimplexBatch b = SIMPLEX_BATCH_INIT;
+	PyObject *coords[2];
+	PyObject *out = NULL;
+	int threads = 1;
+
+	static char *kwlist[] = {"xs", "ys", "octaves", "persistence", "lacunarity", "base",
+		"out", "threads", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|ifffOi:noise2_grad_array", kwlist,
+		&coords[0], &coords[1], &b.octaves, &b.persistence, &b.lacunarity, &b.base,
+		&out, &threads))
+		return NULL;
+	b.table = self_table(self);
+	return simplex_array_run(&b, simplex_grad_array2, coords, 2, 3, NULL, out, threads);
+}
+
+static PyObject *
+py_noise3_grad_array(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	SimplexBatch b = SIMPLEX_BATCH_INIT;
+	PyObject *coords[3];
+	PyObject *out = NULL;
+	int threads = 1;
+
+	static char *kwlist[] = {"xs", "ys", "zs", "octaves", "persistence", "lacunarity",
+		"repeatx", "repeaty", "repeatz", "base", "out", "threads", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OOO|ifffffiOi:noise3_grad_array", kwlist,
+		&coords[0], &coords[1], &coords[2], &b.octaves, &b.persistence, &b.lacunarity,
+		&b.repeat3[0], &b.repeat3[1], &b.repeat3[2], &b.perm_base, &out, &threads))
+		return NULL;
+	b.table = self_table(self);
+	b.tiled3 = SIMPLEX_TILED3(&b);
+	return simplex_array_run(&b, simplex_grad_array3, coords, 3, 4, NULL, out, threads);
+}
+
+static PyObject *
+py_noise3_above(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	SimplexBatch b = SIMPLEX_BATCH_INIT;
+	float x, y, z;
+	Threshold t;
+	long long evaluated = 0;
+	int above;
+
+	static char *kwlist[] = {"x", "y", "z", "threshold", "octaves", "persistence", "lacunarity",
+		"repeatx", "repeaty", "repeatz", "base", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ffff|ifffffi:noise3_above", kwlist,
+		&x, &y, &z, &b.threshold, &b.octaves, &b.persistence, &b.lacunarity,
+		&b.repeat3[0], &b.repeat3[1], &b.repeat3[2], &b.perm_base))
+		return NULL;
+	b.table = self_table(self);
+	b.tiled3 = SIMPLEX_TILED3(&b);
+	if (simplex_batch_setup(&b, 1) < 0)
+		return NULL;
+	threshold_init(&t, &b.plan, b.threshold, NOISE3_BOUND);
+	above = plan_above3(&b.plan, &t, b.tiles, b.repeat3, b.table, x, y, z, &evaluated);
+	simplex_batch_free(&b);
+	stats_report_octaves(evaluated);
+	return PyBool_FromLong(above);
+}
+
+// Split the interval [x0, x1] of a tiled axis into at most 3 pieces within
+// [0, repeat], where tile_wrap() takes its points, allowing for points on
+// either side of the seam. Returns the number of pieces.
+static int
+wrap_pieces(double x0, double x1, double repeat, double (*piece)[2])
+{
+	const double tol = 1e-5 * (repeat + 1.0);
+	int n = 1;
+
+	if (x1 - x0 >= repeat) {
+		piece[0][0] = 0.0;
+		piece[0][1] = repeat;
+		return 1;
+	}
+	piece[0][0] = fmod(x0, repeat);
+	if (piece[0][0] < 0.0)
+		piece[0][0] += repeat;
+	piece[0][1] = piece[0][0] + (x1 - x0);
+	if (piece[0][1] > repeat - tol) {
+		piece[n][0] = 0.0;
+		piece[n++][1] = (piece[0][1] > repeat ? piece[0][1] - repeat : 0.0) + tol;
+		piece[0][1] = piece[0][1] < repeat ? piece[0][1] : repeat;
+	}
+	if (piece[0][0] < tol) {
+		piece[n][0] = repeat - tol;
+		piece[n++][1] = repeat;
+	}
+	return n;
+}
+
+static PyObject *
+py_bounds3(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	SimplexBatch b = SIMPLEX_BATCH_INIT;
+	double box[6];
+	double piece[3][3][2]; // the box along each axis, wrapped if it is tiled
+	int pieces[3];
+	Interval *octave;
+	Interval r;
+	int i, c, p;
+
+	static char *kwlist[] = {"box", "octaves", "persistence", "lacunarity",
+		"repeatx", "repeaty", "repeatz", "base", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O&|ifffffi:bounds3", kwlist,
+		bounds_box_converter, box, &b.octaves, &b.persistence, &b.lacunarity,
+		&b.repeat3[0], &b.repeat3[1], &b.repeat3[2], &b.perm_base))
+		return NULL;
+	b.table = self_table(self);
+	b.tiled3 = SIMPLEX_TILED3(&b);
+	if (simplex_batch_setup(&b, 1) < 0)
+		return NULL;
+	octave = PyMem_New(Interval, b.plan.octaves);
+	if (octave == NULL) {
+		simplex_batch_free(&b);
+		return PyErr_NoMemory();
+	}
+	for (c = 0; c < 3; c++) {
+		if (b.tiled3 && b.repeat3[c] != FLT_MAX) {
+			pieces[c] = wrap_pieces(box[c], box[c + 3], b.repeat3[c], piece[c]);
+		} else {
+			pieces[c] = 1;
+			piece[c][0][0] = box[c];
+			piece[c][0][1] = box[c + 3];
+		}
+	}
+	Py_BEGIN_ALLOW_THREADS
+	for (i = 0; i < b.plan.octaves; i++) {
+		const Tiling3 *tile = b.tiles != NULL ? &b.tiles[i] : NULL;
+		octave[i].lo = HUGE_VAL;
+		octave[i].hi = -HUGE_VAL;
+		for (p = 0; p < pieces[0] * pieces[1] * pieces[2]; p++) {
+			const int at[3] = {p % pieces[0], p / pieces[0] % pieces[1],
+				p / (pieces[0] * pieces[1])};
+			double lo[3], hi[3];
+			Interval range;
+			for (c = 0; c < 3; c++) {
+				const double scale = tile != NULL ? tile->scale[c] : b.plan.octave[i].freq;
+				lo[c] = piece[c][at[c]][0] * scale;
+				hi[c] = piece[c][at[c]][1] * scale;
+				if (lo[c] > hi[c]) {
+					const double t = lo[c];
+					lo[c] = hi[c];
+					hi[c] = t;
+				}
+			}
+			bounds_widen(lo, hi);
+			range = noise3_bounds(b.table, tile, lo, hi);
+			interval_union(&octave[i], &range);
+		}
+	}
+	Py_END_ALLOW_THREADS
+	r = plan_bounds(&b.plan, octave, NOISE3_BOUND);
+	PyMem_Free(octave);
+	simplex_batch_free(&b);
+	return Py_BuildValue("(dd)", r.lo, r.hi);
+}
+
+static PyObject *
+py_noise3_above_array(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	static const ValueFormat fmt = VALUE_FORMAT_ABOVE;
+	SimplexBatch b = SIMPLEX_BATCH_INIT;
+	PyObject *coords[3];
+	PyObject *out = NULL;
+	PyObject *result;
+	long long evaluated = 0;
+	int threads = 1;
+
+	static char *kwlist[] = {"xs", "ys", "zs", "threshold", "octaves", "persistence",
+		"lacunarity", "repeatx", "repeaty", "repeatz", "base", "out", "threads", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OOOf|ifffffiOi:noise3_above_array", kwlist,
+		&coords[0], &coords[1], &coords[2], &b.threshold, &b.octaves, &b.persistence,
+		&b.lacunarity, &b.repeat3[0], &b.repeat3[1], &b.repeat3[2], &b.perm_base, &out,
+		&threads))
+		return NULL;
+	b.table = self_table(self);
+	b.tiled3 = SIMPLEX_TILED3(&b);
+	b.evaluated = &evaluated;
+	result = simplex_array_run(&b, simplex_above_array3, coords, 3, 1, &fmt, out, threads);
+	stats_report_octaves(evaluated);
+	return result;
+}
+
+// Select the block kernels by name, for testing and benchmarking them.
+// Returns the name of the kernels in use.
+static PyObject *
+py_simd(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	const BlockKernels *k;
+	const char *name = NULL;
+
+	static char *kwlist[] = {"name", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|z:_simd", kwlist, &name))
+		return NULL;
+	if (name != NULL) {
+		for (k = block_kernels; k->name != NULL; k++) {
+			if (strcmp(k->name, name) == 0 && k->available())
+				break;
+		}
+		if (k->name == NULL) {
+			PyErr_Format(PyExc_ValueError, "SIMD kernels %s not available", name);
+			return NULL;
+		}
+		kernels = k;
+	}
+	return PyUnicode_FromString(kernels->name);
+}
+
+static PyObject *
+py_simd_available(PyObject *self, PyObject *args)
+{
+	const BlockKernels *k;
+	PyObject *names = PyList_New(0);
+
+	if (names == NULL)
+		return NULL;
+	for (k = block_kernels; k->name != NULL; k++) {
+		PyObject *name;
+		if (!k->available())
+			continue;
+		name = PyUnicode_FromString(k->name);
+		if (name == NULL || PyList_Append(names, name) < 0) {
+			Py_XDECREF(name);
+			Py_DECREF(names);
+			return NULL;
+		}
+		Py_DECREF(name);
+	}
+	return names;
+}
+
+static PyObject *
+py_sample(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	SimplexBatch b = SIMPLEX_BATCH_INIT;
+	PyObject *points;
+	PyObject *repeat = NULL;
+	ValueFormat fmt = VALUE_FORMAT_INIT;
+	PyObject *result;
+	PyObject *value_scale = NULL;
+	PyObject *value_offset = NULL;
+	PyObject *clamp = NULL;
+	PyObject *lut = NULL;
+	PyObject *out = NULL;
+	float base = 0.0f;
+	int dim = 0;
+	int threads = 1;
+
+	static char *kwlist[] = {"points", "octaves", "persistence", "lacunarity", "repeat", "base",
+		"mode", "warp", "dim", "dtype", "value_scale", "value_offset", "clamp", "lut", "out",
+		"threads", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|iffOfO&fiO&OOOOOi:sample", kwlist,
+		&points, &b.octaves, &b.persistence, &b.lacunarity, &repeat, &base,
+		fractal_mode_converter, &b.mode, &b.warp, &dim, value_dtype_converter, &fmt.dtype,
+		&value_scale, &value_offset, &clamp, &lut, &out, &threads))
+		return NULL;
+	if (dim != 0 && (dim < 2 || dim > 4)) {
+		PyErr_SetString(PyExc_ValueError, "Expected dim 2, 3 or 4");
+		return NULL;
+	}
+	if (value_format_setup(&fmt, value_scale, value_offset, clamp, lut) < 0)
+		return NULL;
+	// base offsets 2D noise along z, and the permutation table of 3D and 4D noise
+	b.base = base;
+	b.perm_base = (int) base;
+	b.table = self_table(self);
+	result = simplex_points_run(&b, points, dim, repeat, &fmt, out, threads);
+	value_format_free(&fmt);
+	return result;
+}
+
+static PyObject *
+py_grid2(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	SimplexBatch b = SIMPLEX_BATCH_INIT;
+	ValueFormat fmt = VALUE_FORMAT_INIT;
+	PyObject *result;
+	PyObject *value_scale = NULL;
+	PyObject *value_offset = NULL;
+	PyObject *clamp = NULL;
+	PyObject *lut = NULL;
+	PyObject *out = NULL;
+	int threads = 1;
+
+	static char *kwlist[] = {"width", "height", "origin", "step", "octaves", "persistence",
+		"lacunarity", "repeatx", "repeaty", "base", "mode", "warp", "dtype", "value_scale",
+		"value_offset", "clamp", "lut", "out", "threads", NULL};
+
+	b.g.ndim = 2;
+	b.g.step[0] = b.g.step[1] = 1.0;
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "nn|(dd)(dd)ifffffO&fO&OOOOOi:grid2", kwlist,
+		&b.g.size[0], &b.g.size[1], &b.g.origin[0], &b.g.origin[1], &b.g.step[0], &b.g.step[1],
+		&b.octaves, &b.persistence, &b.lacunarity, &b.repeatx, &b.repeaty, &b.base,
+		fractal_mode_converter, &b.mode, &b.warp, value_dtype_converter, &fmt.dtype,
+		&value_scale, &value_offset, &clamp, &lut, &out, &threads)
+		|| value_format_setup(&fmt, value_scale, value_offset, clamp, lut) < 0)
+		return NULL;
+	b.g.fmt = &fmt;
+	b.table = self_table(self);
+	result = simplex_grid_run(&b, simplex_grid2, out, threads);
+	value_format_free(&fmt);
+	return result;
+}
+
+static PyObject *
+py_grid3(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	SimplexBatch b = SIMPLEX_BATCH_INIT;
+	PyObject *w = Py_None;
+	ValueFormat fmt = VALUE_FORMAT_INIT;
+	PyObject *result;
+	PyObject *value_scale = NULL;
+	PyObject *value_offset = NULL;
+	PyObject *clamp = NULL;
+	PyObject *lut = NULL;
+	PyObject *out = NULL;
+	int threads = 1;
+
+	static char *kwlist[] = {"width", "height", "depth", "origin", "step", "octaves",
+		"persistence", "lacunarity", "repeatx", "repeaty", "repeatz", "base", "w", "mode",
+		"warp", "dtype", "value_scale", "value_offset", "clamp", "lut", "out", "threads", NULL};
+
+	b.g.ndim = 3;
+	b.g.step[0] = b.g.step[1] = b.g.step[2] = 1.0;
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "nnn|(ddd)(ddd)ifffffiOO&fO&OOOOOi:grid3",
+		kwlist,
+		&b.g.size[0], &b.g.size[1], &b.g.size[2], &b.g.origin[0], &b.g.origin[1], &b.g.origin[2],
+		&b.g.step[0], &b.g.step[1], &b.g.step[2], &b.octaves, &b.persistence, &b.lacunarity,
+		&b.repeat3[0], &b.repeat3[1], &b.repeat3[2], &b.perm_base, &w,
+		fractal_mode_converter, &b.mode, &b.warp, value_dtype_converter, &fmt.dtype,
+		&value_scale, &value_offset, &clamp, &lut, &out, &threads))
+		return NULL;
+	if (w != Py_None) {
+		if (b.repeat3[0] != FLT_MAX || b.repeat3[1] != FLT_MAX || b.repeat3[2] != FLT_MAX) {
+			PyErr_SetString(PyExc_ValueError, "4D noise (w) does not support repeat intervals");
+			return NULL;
+		}
+		b.use_w = 1;
+		b.w = (float) PyFloat_AsDouble(w);
+		if (b.w == -1.0f && PyErr_Occurred())
+			return NULL;
+	}
+	if (value_format_setup(&fmt, value_scale, value_offset, clamp, lut) < 0)
+		return NULL;
+	b.g.fmt = &fmt;
+	b.table = self_table(self);
+	b.tiled3 = !b.use_w && SIMPLEX_TILED3(&b);
+	result = simplex_grid_run(&b, simplex_grid3, out, threads);
+	value_format_free(&fmt);
+	return result;
+}
+
+// Parse a 3-tuple argument that may also be given as a single number for
+// all axes. Returns -1 with an exception set on error.
+static int
+volume_triple(PyObject *obj, double *v, const char *name)
+{
+	PyObject *seq;
+	int d;
+
+	if (obj == NULL)
+		return 0;
+	if (PyNumber_Check(obj) && !PySequence_Check(obj)) {
+		double x = PyFloat_AsDouble(obj);
+		if (x == -1.0 && PyErr_Occurred())
+			return -1;
+		v[0] = v[1] = v[2] = x;
+		return 0;
+	}
+	seq = PySequence_Fast(obj, name);
+	if (seq == NULL)
+		return -1;
+	if (PySequence_Fast_GET_SIZE(seq) != 3) {
+		PyErr_SetString(PyExc_ValueError, name);
+		Py_DECREF(seq);
+		return -1;
+	}
+	for (d = 0; d < 3; d++) {
+		v[d] = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(seq, d));
+		if (v[d] == -1.0 && PyErr_Occurred()) {
+			Py_DECREF(seq);
+			return -1;
+		}
+	}
+	Py_DECREF(seq);
+	return 0;
+}
+
+static PyObject *
+py_volume3(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+	SimplexBatch b = SIMPLEX_BATCH_INIT;
+	ValueFormat fmt = VALUE_FORMAT_INIT;
+	PyObject *result;
+	PyObject *shape;
+	PyObject *scale = NULL;
+	PyObject *offset = NULL;
+	PyObject *repeat = NULL;
+	PyObject *value_scale = NULL;
+	PyObject *value_offset = NULL;
+	PyObject *clamp = NULL;
+	PyObject *lut = NULL;
+	PyObject *out = NULL;
+	double size[3];
+	int threads = 1;
+	int d;
+
+	static char *kwlist[] = {"shape", "scale", "offset", "octaves", "persistence", "lacunarity",
+		"repeat", "base", "mode", "warp", "dtype", "value_scale", "value_offset", "clamp", "lut",
+		"out", "threads", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|OOiffOiO&fO&OOOOOi:volume3", kwlist,
+		&shape, &scale, &offset, &b.octaves, &b.persistence, &b.lacunarity, &repeat,
+		&b.perm_base, fractal_mode_converter, &b.mode, &b.warp,
+		value_dtype_converter, &fmt.dtype, &value_scale, &value_offset, &clamp, &lut, &out,
+		&threads))
+		return NULL;
+	// shape is (depth, height, width) like the result, the others are x, y, z
+	if (volume_triple(shape, size, "shape must be a number or (depth, height, width)") < 0)
+		return NULL;
+	b.g.ndim = 3;
+	for (d = 0; d < 3; d++) {
+		if (size[d] != floor(size[d]) || size[d] > (double) PY_SSIZE_T_MAX) {
+			PyErr_SetString(PyExc_ValueError, "shape must be whole numbers");
+			return NULL;
+		}
+		b.g.size[2 - d] = (Py_ssize_t) size[d];
+		b.g.step[d] = 1.0;
+	}
+	if (volume_triple(scale, b.g.step, "scale must be a number or (x, y, z) scales") < 0
+		|| volume_triple(offset, b.g.origin, "offset must be (x, y, z) coordinates") < 0
+		|| points_repeat(repeat, b.repeat3, 3) < 0
+		|| value_format_setup(&fmt, value_scale, value_offset, clamp, lut) < 0)
+		return NULL;
+	b.g.fmt = &fmt;
+	b.table = self_table(self);
+	b.tiled3 = SIMPLEX_TILED3(&b);
+	result = simplex_grid_run(&b, simplex_grid3, out, threads);
+	value_format_free(&fmt);
+	return result;
+}
+
+// Instrumentation counters of the entry points, named as in the noise module
+enum {
+	STAT_NOISE2,
+	STAT_NOISE3,
+	STAT_NOISE4,
+	STAT_NOISE2_GRAD,
+	STAT_NOISE3_GRAD,
+	STAT_NOISE2_ARRAY,
+	STAT_NOISE3_ARRAY,
+	STAT_NOISE2_GRAD_ARRAY,
+	STAT_NOISE3_GRAD_ARRAY,
+	STAT_NOISE3_ABOVE,
+	STAT_NOISE3_ABOVE_ARRAY,
+	STAT_BOUNDS3,
+	STAT_SAMPLE,
+	STAT_GRID2,
+	STAT_GRID3,
+	STAT_VOLUME3,
+};
+
+static StatCounter simplex_stats[] = {
+	STAT_COUNTER("snoise2", 2, 1),
+	STAT_COUNTER("snoise3", 3, 1),
+	STAT_COUNTER("snoise4", 4, 1),
+	STAT_COUNTER("snoise2_grad", 2, 3),
+	STAT_COUNTER("snoise3_grad", 3, 4),
+	STAT_COUNTER_LUT("snoise2_array", 2, 1, 14),
+	STAT_COUNTER_LUT("snoise3_array", 3, 1, 16),
+	STAT_COUNTER("snoise2_grad_array", 2, 3),
+	STAT_COUNTER("snoise3_grad_array", 3, 4),
+	STAT_COUNTER("snoise3_above", STATS_REPORTED, 1),
+	STAT_COUNTER("snoise3_above_array", STATS_REPORTED, 1),
+	STAT_COUNTER("sbounds3", 1, 1),
+	STAT_COUNTER_LUT("ssample", 1, 1, 13),
+	STAT_COUNTER_LUT("sgrid2", 4, 1, 16),
+	STAT_COUNTER_LUT("sgrid3", 5, 1, 19),
+	STAT_COUNTER_LUT("snoise3_volume", 3, 1, 14),
+	{NULL}
+};
+
+STATS_WRAP(simplex_stats, STAT_NOISE2, py_noise2)
+STATS_WRAP(simplex_stats, STAT_NOISE3, py_noise3)
+STATS_WRAP(simplex_stats, STAT_NOISE4, py_noise4)
+STATS_WRAP(simplex_stats, STAT_NOISE2_GRAD, py_noise2_grad)
+STATS_WRAP(simplex_stats, STAT_NOISE3_GRAD, py_noise3_grad)
+STATS_WRAP(simplex_stats, STAT_NOISE2_ARRAY, py_noise2_array)
+STATS_WRAP(simplex_stats, STAT_NOISE3_ARRAY, py_noise3_array)
+STATS_WRAP(simplex_stats, STAT_NOISE2_GRAD_ARRAY, py_noise2_grad_array)
+STATS_WRAP(simplex_stats, STAT_NOISE3_GRAD_ARRAY, py_noise3_grad_array)
+STATS_WRAP(simplex_stats, STAT_NOISE3_ABOVE, py_noise3_above)
+STATS_WRAP(simplex_stats, STAT_NOISE3_ABOVE_ARRAY, py_noise3_above_array)
+STATS_WRAP(simplex_stats, STAT_BOUNDS3, py_bounds3)
+STATS_WRAP(simplex_stats, STAT_SAMPLE, py_sample)
+STATS_WRAP(simplex_stats, STAT_GRID2, py_grid2)
+STATS_WRAP(simplex_stats, STAT_GRID3, py_grid3)
+STATS_WRAP(simplex_stats, STAT_VOLUME3, py_volume3)
+
+static PyObject *
+py_stats(PyObject *self, PyObject *unused)
+{
+	return stats_dict(simplex_stats);
+}
+
+static PyObject *
+py_reset_stats(PyObject *self, PyObject *unused)
+{
+	stats_reset(simplex_stats);
+	Py_RETURN_NONE;
+}
+
+static PyMethodDef simplex_functions[] = {
+	{"noise2", (PyCFunction)STATS_FUNC(py_noise2), METH_VARARGS | METH_KEYWORDS, 
+		"noise2(x, y, octaves=1, persistence=0.5, lacunarity=2.0, repeatx=None, repeaty=None, base=0.0, "
+		"mode='fbm', warp=0.0) "
+        "return simplex noise value for specified 2D coordinate.\n\n"
+		"octaves -- specifies the number of passes, defaults to 1 (simple noise).\n\n"
+		"persistence -- specifies the amplitude of each successive octave relative\n"
+		"to the one below it. Defaults to 0.5 (each higher octave's amplitude\n"
+		"is halved). Note the amplitude of the first pass is always 1.0.\n\n"
+        "lacunarity -- specifies the frequency of each successive octave relative\n"
+        "to the one below it, similar to persistence. Defaults to 2.0.\n\n"
+        "repeatx, repeaty -- specifies the interval along each axis when \n"
+		"the noise values repeat. This can be used as the tile size for creating \n"
+		"tileable textures\n\n"
+		"base -- specifies a fixed offset for the noise coordinates. Useful for\n"
+		"generating different noise textures with the same repeat interval\n\n"
+		"mode, warp -- the fractal mode and domain warping (see noise3)"},
+	{"noise3", (PyCFunction)STATS_FUNC(py_noise3), METH_VARARGS | METH_KEYWORDS, 
+		"noise3(x, y, z, octaves=1, persistence=0.5, lacunarity=2.0, repeatx=None, repeaty=None, "
+		"repeatz=None, base=0, mode='fbm', warp=0.0) return simplex noise value for\n"
+		"specified 3D coordinate\n\n"
+		"octaves -- specifies the number of passes, defaults to 1 (simple noise).\n\n"
+		"persistence -- specifies the amplitude of each successive octave relative\n"
+		"to the one below it. Defaults to 0.5 (each higher octave's amplitude\n"
+		"is halved). Note the amplitude of the first pass is always 1.0.\n\n"
+        "lacunarity -- specifies the frequency of each successive octave relative\n"
+        "to the one below it, similar to persistence. Defaults to 2.0.\n\n"
+		"repeatx, repeaty, repeatz -- specifies the interval along each axis when\n"
+		"the noise values repeat, for seamlessly tiling volumes. The simplex lattice\n"
+		"only repeats every 3 units, so the noise of each octave is stretched\n"
+		"slightly along these axes to fit a whole number of periods in the interval.\n\n"
+		"base -- specifies an offset into the permutation table. Useful for\n"
+		"generating different noise textures with the same repeat interval\n\n"
+		"mode -- how the octaves are combined: 'fbm' sums them, 'turbulence'\n"
+		"sums their absolute values for billowy noise in [0, 1], 'ridged' gives\n"
+		"ridged multifractal noise in [0, 1] with sharp crests, and 'hybrid' a\n"
+		"hybrid multifractal with smooth valleys and rough peaks.\n\n"
+		"warp -- if not 0, each coordinate is first displaced by warp times the\n"
+		"fBm noise at a fixed offset from it, warping the domain in a single pass.\n"
+		"The noise still repeats with the repeat intervals."},
+	{"noise4", (PyCFunction)STATS_FUNC(py_noise4), METH_VARARGS | METH_KEYWORDS, 
+		"noise4(x, y, z, w, octaves=1, persistence=0.5, lacunarity=2.0, base=0) return simplex "
+		"noise value for specified 4D coordinate\n\n"
+		"octaves -- specifies the number of passes, defaults to 1 (simple noise).\n\n"
+		"persistence -- specifies the amplitude of each successive octave relative\n"
+		"to the one below it. Defaults to 0.5 (each higher octave's amplitude\n"
+		"is halved). Note the amplitude of the first pass is always 1.0.\n\n"
+        "lacunarity -- specifies the frequency of each successive octave relative\n"
+        "to the one below it, similar to persistence. Defaults to 2.0.\n\n"
+		"base -- specifies an offset into the permutation table (see noise3).\n"
+		"4D noise cannot repeat along its axes, its skewed lattice has no\n"
+		"axis-aligned period."},
+	{"noise2_grad", (PyCFunction)STATS_FUNC(py_noise2_grad), METH_VARARGS | METH_KEYWORDS,
+		"noise2_grad(x, y, octaves=1, persistence=0.5, lacunarity=2.0, base=0.0) "
+		"return a tuple of the simplex noise value for specified 2D coordinate and\n"
+		"its partial derivatives (value, dx, dy), computed analytically in a single\n"
+		"evaluation. The arguments are the same as for noise2, tiling is not supported."},
+	{"noise3_grad", (PyCFunction)STATS_FUNC(py_noise3_grad), METH_VARARGS | METH_KEYWORDS,
+		"noise3_grad(x, y, z, octaves=1, persistence=0.5, lacunarity=2.0, repeatx=None, "
+		"repeaty=None, repeatz=None, base=0) return a tuple of the simplex noise value\n"
+		"for specified 3D coordinate and its partial derivatives (value, dx, dy, dz),\n"
+		"computed analytically in a single evaluation. The arguments are the same as\n"
+		"for noise3."},
+	{"sample", (PyCFunction)STATS_FUNC(py_sample), METH_VARARGS | METH_KEYWORDS,
+		"sample(points, octaves=1, persistence=0.5, lacunarity=2.0, repeat=None, base=0,\n"
+		"mode='fbm', warp=0.0, dim=0, dtype='float32', value_scale=None, value_offset=None,\n"
+		"clamp=None, lut=None, out=None, threads=1)\n\n"
+		"return simplex noise values for a buffer of scattered points of shape\n"
+		"(N, D), of C floats or doubles, as a memoryview of N values. D is\n"
+		"2 to 4, the dimension of the noise. A flat buffer of N * D coordinates\n"
+		"may be passed with dim=D.\n\n"
+		"repeat -- the interval along each axis when the noise values repeat,\n"
+		"a single interval for all axes or a sequence of D intervals. 4D noise\n"
+		"does not repeat, nor support warp.\n\n"
+		"The remaining arguments are the same as for noise2_array and\n"
+		"noise3_array."},
+	{"grid2", (PyCFunction)STATS_FUNC(py_grid2), METH_VARARGS | METH_KEYWORDS,
+		"grid2(width, height, origin=(0, 0), step=(1, 1), octaves=1, persistence=0.5, "
+		"lacunarity=2.0, repeatx=None, repeaty=None, base=0.0, mode='fbm', warp=0.0, "
+		"dtype='float32', value_scale=None, value_offset=None, clamp=None, lut=None, out=None, "
+		"threads=1) return simplex noise values sampled over a regular 2D grid.\n\n"
+		"The noise is evaluated at x = origin[0] + i * step[0] for i in range(width),\n"
+		"and likewise along y. The remaining arguments are the same as for noise2,\n"
+		"and dtype, value_scale, value_offset, clamp and lut as for noise3_array.\n\n"
+		"out -- optional writable buffer of width * height values of the dtype to\n"
+		"write the results into. If omitted, a new memoryview of shape (height,\n"
+		"width) is returned.\n\n"
+		"threads -- number of native threads to split the rows across, 0 uses\n"
+		"one thread per processor. The GIL is released while computing."},
+	{"grid3", (PyCFunction)STATS_FUNC(py_grid3), METH_VARARGS | METH_KEYWORDS,
+		"grid3(width, height, depth, origin=(0, 0, 0), step=(1, 1, 1), octaves=1, "
+		"persistence=0.5, lacunarity=2.0, repeatx=None, repeaty=None, repeatz=None, base=0, "
+		"w=None, mode='fbm', warp=0.0, dtype='float32', value_scale=None, value_offset=None, "
+		"clamp=None, lut=None, out=None, threads=1) "
+		"return simplex noise values sampled over a regular 3D grid.\n\n"
+		"w -- if specified, the grid is a slice of 4D noise at this w coordinate,\n"
+		"which cannot be combined with the repeat intervals.\n\n"
+		"The remaining arguments are the same as for grid2 and noise3. If out is\n"
+		"omitted, a new memoryview of shape (depth, height, width) is returned."},
+	{"volume3", (PyCFunction)STATS_FUNC(py_volume3), METH_VARARGS | METH_KEYWORDS,
+		"volume3(shape, scale=1.0, offset=(0, 0, 0), octaves=1, persistence=0.5, "
+		"lacunarity=2.0, repeat=None, base=0, mode='fbm', warp=0.0, dtype='float32', "
+		"value_scale=None, value_offset=None, clamp=None, lut=None, out=None, threads=1) "
+		"return a volume of 3D simplex noise, such as a 3D texture, with the\n"
+		"texel at index (z, y, x) sampled at offset + (x, y, z) * scale.\n\n"
+		"shape -- (depth, height, width) of the volume, or a single number for a\n"
+		"cube.\n\n"
+		"scale, offset -- the spacing and the origin of the samples along x, y\n"
+		"and z, scale may be a single number for all axes.\n\n"
+		"repeat -- the interval along each axis when the noise values repeat, a\n"
+		"single interval for all axes or a sequence of 3 intervals.\n\n"
+		"dtype, value_scale, value_offset, clamp, lut -- the type of the values\n"
+		"and their remapping, see noise3_array.\n\n"
+		"out -- optional writable buffer of depth * height * width values of the\n"
+		"dtype, such as a ctypes array, to write the volume into. If omitted, a\n"
+		"new memoryview of the shape is returned.\n\n"
+		"The remaining arguments are the same as for grid3."},
+	{"noise2_array", (PyCFunction)STATS_FUNC(py_noise2_array), METH_VARARGS | METH_KEYWORDS,
+		"noise2_array(xs, ys, octaves=1, persistence=0.5, lacunarity=2.0, repeatx=None, "
+		"repeaty=None, base=0.0, mode='fbm', warp=0.0, dtype='float32', value_scale=None, "
+		"value_offset=None, clamp=None, lut=None, out=None, threads=1) "
+		"return simplex noise values for arrays of 2D coordinates (see noise3_array)"},
+	{"noise3_array", (PyCFunction)STATS_FUNC(py_noise3_array), METH_VARARGS | METH_KEYWORDS,
+		"noise3_array(xs, ys, zs, octaves=1, persistence=0.5, lacunarity=2.0, repeatx=None, "
+		"repeaty=None, repeatz=None, base=0, mode='fbm', warp=0.0, dtype='float32', "
+		"value_scale=None, value_offset=None, clamp=None, lut=None, out=None, threads=1) "
+		"return simplex noise values for arrays of coordinates in a\n"
+		"single call. The remaining arguments are the same as for noise3.\n\n"
+		"xs, ys, zs -- contiguous buffers (array.array, numpy arrays, etc.) of\n"
+		"C floats or doubles, all of the same length.\n\n"
+		"dtype -- the type of the values: 'float32', 'float16', 'uint8', 'int8'\n"
+		"or 'uint16'. float16 results are returned as unsigned shorts of the\n"
+		"half float bits before Python 3.12.\n\n"
+		"value_scale, value_offset -- the values written are noise * value_scale\n"
+		"+ value_offset, for integer types clamped to the range of the type and\n"
+		"truncated like int(). By default integer types map [-1, 1] onto their\n"
+		"whole range.\n\n"
+		"clamp -- optional (low, high) range to clamp the values to after\n"
+		"value_scale and value_offset are applied.\n\n"
+		"lut -- optional colour table, a buffer of shape (N, 3) or (N, 4) of\n"
+		"uint8 RGB or RGBA colours such as returned by noise.color_ramp(). Each\n"
+		"value is replaced by the colour at its index, truncated and clamped to\n"
+		"the table, and the result has an extra axis of the colour channels. By\n"
+		"default [-1, 1] maps onto the N colours in equal intervals. Can not be\n"
+		"combined with dtype.\n\n"
+		"out -- optional writable buffer of the dtype with one element per\n"
+		"coordinate to write the results into. If omitted, a new memoryview\n"
+		"shaped like xs is returned.\n\n"
+		"threads -- number of native threads to split the work across, 0 uses\n"
+		"one thread per processor. The GIL is released while computing."},
+	{"noise2_grad_array", (PyCFunction)STATS_FUNC(py_noise2_grad_array), METH_VARARGS | METH_KEYWORDS,
+		"noise2_grad_array(xs, ys, octaves=1, persistence=0.5, lacunarity=2.0, base=0.0, "
+		"out=None, threads=1) return noise2_grad values for arrays of 2D coordinates\n"
+		"(see noise3_grad_array)"},
+	{"noise3_grad_array", (PyCFunction)STATS_FUNC(py_noise3_grad_array), METH_VARARGS | METH_KEYWORDS,
+		"noise3_grad_array(xs, ys, zs, octaves=1, persistence=0.5, lacunarity=2.0, "
+		"repeatx=None, repeaty=None, repeatz=None, base=0, out=None, threads=1) return\n"
+		"noise3_grad values for arrays of coordinates in a single call, as a float\n"
+		"memoryview of shape (len(xs), 4) with a row of (value, dx, dy, dz) per\n"
+		"coordinate. out, if specified, must have room for 4 floats per coordinate.\n"
+		"The remaining arguments are the same as for noise3_array, the noise is\n"
+		"always fBm."},
+	{"noise3_above", (PyCFunction)STATS_FUNC(py_noise3_above), METH_VARARGS | METH_KEYWORDS,
+		"noise3_above(x, y, z, threshold, octaves=1, persistence=0.5, lacunarity=2.0, "
+		"repeatx=None, repeaty=None, repeatz=None, base=0) return whether\n"
+		"noise3(x, y, z) > threshold, evaluating only as many octaves as needed to\n"
+		"decide it: once the octaves so far are further from the threshold than the\n"
+		"remaining ones can add up to, the rest are skipped. The result is always\n"
+		"the same as comparing the noise3 value. The arguments are the same as for\n"
+		"noise3, the noise is always fBm."},
+	{"noise3_above_array", (PyCFunction)STATS_FUNC(py_noise3_above_array),
+		METH_VARARGS | METH_KEYWORDS,
+		"noise3_above_array(xs, ys, zs, threshold, octaves=1, persistence=0.5, "
+		"lacunarity=2.0, repeatx=None, repeaty=None, repeatz=None, base=0, out=None, "
+		"threads=1) return\n"
+		"noise3_above for arrays of coordinates in a single call, as a uint8\n"
+		"memoryview shaped like xs of 1 where the noise is above threshold and 0\n"
+		"elsewhere. out, if specified, must be a writable buffer of uint8 with one\n"
+		"element per coordinate. The remaining arguments are the same as for\n"
+		"noise3_array."},
+	{"bounds3", (PyCFunction)STATS_FUNC(py_bounds3), METH_VARARGS | METH_KEYWORDS,
+		"bounds3(box, octaves=1, persistence=0.5, lacunarity=2.0, repeatx=None, "
+		"repeaty=None, repeatz=None, base=0) return\n"
+		"(lo, hi), bounds of the values of noise3 fBm over the box\n"
+		"((x0, y0, z0), (x1, y1, z1)). They are conservative, every value of the\n"
+		"noise in the box is within them, but not necessarily tight: they are\n"
+		"tighter for boxes spanning fewer lattice cells, and octaves whose cells\n"
+		"are much smaller than the box contribute their whole range. The other\n"
+		"arguments are the same as for noise3."},
+	{NULL}
+};
+
+// Module only functions, not methods of Simplex objects
+static PyMethodDef simplex_module_functions[] = {
+	{"_simd", (PyCFunction)py_simd, METH_VARARGS | METH_KEYWORDS,
+		"_simd(name=None) select the SIMD kernels used by the array and grid\n"
+		"functions by name, and return the name of the kernels in use"},
+	{"_simd_available", (PyCFunction)py_simd_available, METH_NOARGS,
+		"_simd_available() return the names of the SIMD kernels supported by this CPU"},
+	{"_stats", (PyCFunction)py_stats, METH_NOARGS,
+		"_stats() return a dict of (calls, samples, octaves, nanoseconds) per\n"
+		"entry point called while the instrumentation was enabled"},
+	{"_reset_stats", (PyCFunction)py_reset_stats, METH_NOARGS,
+		"_reset_stats() zero the instrumentation counters"},
+	{"_enable_stats", (PyCFunction)py_enable_stats, METH_VARARGS,
+		"_enable_stats(enabled=True) enable or disable the instrumentation\n"
+		"counters, returning whether they were enabled"},
+	{NULL}
+};
+
+PyDoc_STRVAR(simplex_type_doc,
+	"Simplex(seed=None) simplex noise functions using their own permutation\n"
+	"table.\n\n"
+	"The methods are the same as the module functions. The table is shuffled\n"
+	"from the integer seed, giving a different noise pattern for each seed and\n"
+	"the same one on every platform. If seed is None, the module functions'\n"
+	"table is used.");
+
+static PyTypeObject SimplexType = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	"noise._simplex.Simplex",          /* tp_name */
+	sizeof(PermObject),                /* tp_basicsize */
+	0,                                 /* tp_itemsize */
+	(destructor) perm_object_dealloc,  /* tp_dealloc */
+	0,                                 /* tp_print */
+	0,                                 /* tp_getattr */
+	0,                                 /* tp_setattr */
+	0,                                 /* tp_compare */
+	0,                                 /* tp_repr */
+	0,                                 /* tp_as_number */
+	0,                                 /* tp_as_sequence */
+	0,                                 /* tp_as_mapping */
+	0,                                 /* tp_hash */
+	0,                                 /* tp_call */
+	0,                                 /* tp_str */
+	0,                                 /* tp_getattro */
+	0,                                 /* tp_setattro */
+	0,                                 /* tp_as_buffer */
+	Py_TPFLAGS_DEFAULT,                /* tp_flags */
+	simplex_type_doc,                  /* tp_doc */
+	0,                                 /* tp_traverse */
+	0,                                 /* tp_clear */
+	0,                                 /* tp_richcompare */
+	0,                                 /* tp_weaklistoffset */
+	0,                                 /* tp_iter */
+	0,                                 /* tp_iternext */
+	simplex_functions,                 /* tp_methods */
+	perm_object_members,               /* tp_members */
+	perm_object_getset,                /* tp_getset */
+	0,                                 /* tp_base */
+	0,                                 /* tp_dict */
+	0,                                 /* tp_descr_get */
+	0,                                 /* tp_descr_set */
+	0,                                 /* tp_dictoffset */
+	0,                                 /* tp_init */
+	0,                                 /* tp_alloc */
+	perm_object_new,                   /* tp_new */
+};
+
+PyDoc_STRVAR(module_doc, "Native-code simplex noise functions");
+
+static void
+init_tables(void)
+{
+	perm_table_init(&default_table, PERM);
+	select_kernels();
+}
+
+static struct PyModuleDef moduledef = {
+	PyModuleDef_HEAD_INIT,
+	"_simplex",
+	module_doc,
+	-1,                 /* m_size */
+	simplex_functions,  /* m_methods */
+	NULL,               /* m_reload (unused) */
+	NULL,               /* m_traverse */
+	NULL,               /* m_clear */
+	NULL                /* m_free */
+};
+
+PyObject *
+PyInit__simplex(void)
+{
+	PyObject *module;
+
+	init_tables();
+	if (PyType_Ready(&SimplexType) < 0)
+		return NULL;
+	module = PyModule_Create(&moduledef);
+	if (module == NULL)
+		return NULL;
+	if (PyModule_AddFunctions(module, simplex_module_functions) < 0) {
+		Py_DECREF(module);
+		return NULL;
+	}
+	Py_INCREF(&SimplexType);
+	if (PyModule_AddObject(module, "Simplex", (PyObject *) &SimplexType) < 0) {
+		Py_DECREF(&SimplexType);
+		Py_DECREF(module);
+		return NULL;
+	}
+	return module;
+}
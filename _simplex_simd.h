@@ -0,0 +1,168 @@
+// Copyright (c) 2008, Casey Duncan (casey dot duncan at gmail dot com)
+// see LICENSE.txt for details
+
+// Vectorized 2D and 3D simplex noise kernels, evaluating SIMD_WIDTH points
+// per iteration. This file is a template included once per instruction set
+// by _simplex.c, which defines the vector type VF, the operations below and
+// SIMD_NAME() to suffix the function names.
+//
+// The arithmetic mirrors the scalar noise2() and noise3() operation for
+// operation, so that the results are bit-identical. Simplex corner
+// selection is done with comparison masks instead of branches. The
+// permutation table hashing has no vector equivalent for byte tables, so
+// the gradient components are looked up per lane and loaded back as
+// vectors.
+
+SIMD_FUNC void
+SIMD_NAME(noise2_block)(const PermTable *table, const float *x, const float *y, float *out, int n)
+{
+	const unsigned char *perm = table->perm;
+	const unsigned char *perm12 = table->perm12;
+	SIMD_ALIGN float gx[3][SIMD_WIDTH], gy[3][SIMD_WIDTH];
+	SIMD_ALIGN float i1s[SIMD_WIDTH], j1s[SIMD_WIDTH];
+	SIMD_ALIGN int is[SIMD_WIDTH], js[SIMD_WIDTH];
+	const VF f2 = V_SET1(F2);
+	const VF g2 = V_SET1(G2);
+	const VF g2x2 = V_SET1(G2 * 2.0f);
+	const VF one = V_SET1(1.0f);
+	const VF zero = V_SET1(0.0f);
+	const VF half = V_SET1(0.5f);
+	int b, l, c;
+
+	for (b = 0; b + SIMD_WIDTH <= n; b += SIMD_WIDTH) {
+		VF vx = V_LOAD(x + b);
+		VF vy = V_LOAD(y + b);
+		VF s = V_MUL(V_ADD(vx, vy), f2);
+		VF i = V_FLOOR(V_ADD(vx, s));
+		VF j = V_FLOOR(V_ADD(vy, s));
+		VF t = V_MUL(V_ADD(i, j), g2);
+		VF xx[3], yy[3], noise[3];
+		VF i1, j1;
+
+		xx[0] = V_SUB(vx, V_SUB(i, t));
+		yy[0] = V_SUB(vy, V_SUB(j, t));
+		i1 = V_AND(V_GT(xx[0], yy[0]), one);
+		j1 = V_AND(V_LE(xx[0], yy[0]), one);
+		xx[2] = V_SUB(V_ADD(xx[0], g2x2), one);
+		yy[2] = V_SUB(V_ADD(yy[0], g2x2), one);
+		xx[1] = V_ADD(V_SUB(xx[0], i1), g2);
+		yy[1] = V_ADD(V_SUB(yy[0], j1), g2);
+
+		V_STORE_INT(is, i);
+		V_STORE_INT(js, j);
+		V_STORE(i1s, i1);
+		V_STORE(j1s, j1);
+		for (l = 0; l < SIMD_WIDTH; l++) {
+			const int I = is[l] & 255;
+			const int J = js[l] & 255;
+			int g[3];
+			g[0] = perm12[I + perm[J]];
+			g[1] = perm12[I + (int) i1s[l] + perm[J + (int) j1s[l]]];
+			g[2] = perm12[I + 1 + perm[J + 1]];
+			for (c = 0; c <= 2; c++) {
+				gx[c][l] = GRAD3[g[c]][0];
+				gy[c][l] = GRAD3[g[c]][1];
+			}
+		}
+
+		for (c = 0; c <= 2; c++) {
+			VF f = V_SUB(V_SUB(half, V_MUL(xx[c], xx[c])), V_MUL(yy[c], yy[c]));
+			VF dot = V_ADD(V_MUL(V_LOAD(gx[c]), xx[c]), V_MUL(V_LOAD(gy[c]), yy[c]));
+			VF f4 = V_MUL(V_MUL(V_MUL(f, f), f), f);
+			noise[c] = V_AND(V_GT(f, zero), V_MUL(f4, dot));
+		}
+		V_STORE(out + b, V_MUL(V_ADD(V_ADD(noise[0], noise[1]), noise[2]), V_SET1(70.0f)));
+	}
+	for (; b < n; b++)
+		out[b] = noise2(table, x[b], y[b]);
+}
+
+SIMD_FUNC void
+SIMD_NAME(noise3_block)(const PermTable *table, const float *x, const float *y, const float *z,
+	float *out, int n)
+{
+	const unsigned char *perm = table->perm;
+	const unsigned char *perm12 = table->perm12;
+	SIMD_ALIGN float gx[4][SIMD_WIDTH], gy[4][SIMD_WIDTH], gz[4][SIMD_WIDTH];
+	SIMD_ALIGN float o[6][SIMD_WIDTH];
+	SIMD_ALIGN int is[SIMD_WIDTH], js[SIMD_WIDTH], ks[SIMD_WIDTH];
+	const VF f3 = V_SET1(F3);
+	const VF g3 = V_SET1(G3);
+	const VF g3x2 = V_SET1(2.0f * G3);
+	const VF g3x3 = V_SET1(3.0f * G3);
+	const VF one = V_SET1(1.0f);
+	const VF two = V_SET1(2.0f);
+	const VF zero = V_SET1(0.0f);
+	const VF radius = V_SET1(0.6f);
+	int b, l, c;
+
+	for (b = 0; b + SIMD_WIDTH <= n; b += SIMD_WIDTH) {
+		VF vx = V_LOAD(x + b);
+		VF vy = V_LOAD(y + b);
+		VF vz = V_LOAD(z + b);
+		VF s = V_MUL(V_ADD(V_ADD(vx, vy), vz), f3);
+		VF i = V_FLOOR(V_ADD(vx, s));
+		VF j = V_FLOOR(V_ADD(vy, s));
+		VF k = V_FLOOR(V_ADD(vz, s));
+		VF t = V_MUL(V_ADD(V_ADD(i, j), k), g3);
+		VF pos[4][3], noise[4];
+		VF xy, yz, xz, o1[3], o2[3];
+
+		pos[0][0] = V_SUB(vx, V_SUB(i, t));
+		pos[0][1] = V_SUB(vy, V_SUB(j, t));
+		pos[0][2] = V_SUB(vz, V_SUB(k, t));
+
+		// Branchless equivalent of the corner ordering in noise3()
+		xy = V_GE(pos[0][0], pos[0][1]);
+		yz = V_GE(pos[0][1], pos[0][2]);
+		xz = V_GE(pos[0][0], pos[0][2]);
+		o1[0] = V_AND(V_AND(xy, xz), one);
+		o1[1] = V_AND(V_ANDNOT(xy, yz), one);
+		o1[2] = V_SUB(V_SUB(one, o1[0]), o1[1]);
+		o2[0] = V_AND(V_OR(xy, xz), one);
+		o2[1] = V_SUB(one, V_AND(V_ANDNOT(yz, xy), one));
+		o2[2] = V_SUB(V_SUB(two, o2[0]), o2[1]);
+
+		for (c = 0; c <= 2; c++) {
+			pos[3][c] = V_ADD(V_SUB(pos[0][c], one), g3x3);
+			pos[2][c] = V_ADD(V_SUB(pos[0][c], o2[c]), g3x2);
+			pos[1][c] = V_ADD(V_SUB(pos[0][c], o1[c]), g3);
+			V_STORE(o[c], o1[c]);
+			V_STORE(o[c + 3], o2[c]);
+		}
+
+		V_STORE_INT(is, i);
+		V_STORE_INT(js, j);
+		V_STORE_INT(ks, k);
+		for (l = 0; l < SIMD_WIDTH; l++) {
+			const int I = is[l] & 255;
+			const int J = js[l] & 255;
+			const int K = ks[l] & 255;
+			const int o1x = (int) o[0][l], o1y = (int) o[1][l], o1z = (int) o[2][l];
+			const int o2x = (int) o[3][l], o2y = (int) o[4][l], o2z = (int) o[5][l];
+			int g[4];
+			g[0] = perm12[I + perm[J + perm[K]]];
+			g[1] = perm12[I + o1x + perm[J + o1y + perm[o1z + K]]];
+			g[2] = perm12[I + o2x + perm[J + o2y + perm[o2z + K]]];
+			g[3] = perm12[I + 1 + perm[J + 1 + perm[K + 1]]];
+			for (c = 0; c <= 3; c++) {
+				gx[c][l] = GRAD3[g[c]][0];
+				gy[c][l] = GRAD3[g[c]][1];
+				gz[c][l] = GRAD3[g[c]][2];
+			}
+		}
+
+		for (c = 0; c <= 3; c++) {
+			VF f = V_SUB(V_SUB(V_SUB(radius, V_MUL(pos[c][0], pos[c][0])),
+				V_MUL(pos[c][1], pos[c][1])), V_MUL(pos[c][2], pos[c][2]));
+			VF dot = V_ADD(V_ADD(V_MUL(pos[c][0], V_LOAD(gx[c])), V_MUL(pos[c][1], V_LOAD(gy[c]))),
+				V_MUL(pos[c][2], V_LOAD(gz[c])));
+			VF f4 = V_MUL(V_MUL(V_MUL(f, f), f), f);
+			noise[c] = V_AND(V_GT(f, zero), V_MUL(f4, dot));
+		}
+		V_STORE(out + b, V_MUL(V_ADD(V_ADD(V_ADD(noise[0], noise[1]), noise[2]), noise[3]),
+			V_SET1(32.0f)));
+	}
+	for (; b < n; b++)
+		out[b] = noise3(table, x[b], y[b], z[b]);
+}
@@ -0,0 +1,246 @@
+// Copyright (c) 2008, Casey Duncan (casey dot duncan at gmail dot com)
+// see LICENSE.txt for details
+
+// Opt-in instrumentation of the entry points of the native noise modules,
+// counting the calls, the samples and octaves evaluated and the wall time
+// spent in each. The counters are updated by the calling thread while it
+// holds the GIL, after the call returns. While disabled the cost is a test
+// of stats_enabled per call, and defining NOISE_NO_STATS at compile time
+// removes the instrumentation entirely. Requires Python.h.
+
+#ifdef _WIN32
+#include <windows.h>
+#else
+#include <time.h>
+#endif
+
+// The octaves_arg of an entry point that reports the octaves it evaluated
+// with stats_report_octaves(), such as the above functions that evaluate
+// fewer octaves for the samples they decide early
+#define STATS_REPORTED -2
+
+typedef struct {
+	const char *name;
+	int octaves_arg; // position of the octaves argument, -1 if there is none or
+	                 // STATS_REPORTED
+	int values;      // values returned per sample, e.g. 4 for a 3D gradient
+	int lut_arg;     // position of the lut argument, -1 if there is none
+	unsigned long long calls;
+	unsigned long long samples;
+	unsigned long long octaves;
+	unsigned long long ns;
+} StatCounter;
+
+#define STAT_COUNTER(name, octaves_arg, values) {name, octaves_arg, values, -1, 0, 0, 0, 0}
+// An entry point with a lut argument, whose colours add an axis to the result
+#define STAT_COUNTER_LUT(name, octaves_arg, values, lut_arg) \
+	{name, octaves_arg, values, lut_arg, 0, 0, 0, 0}
+
+static int stats_enabled = 0;
+
+// The octaves evaluated by the last call of an entry point reporting them.
+// It is set while holding the GIL just before the entry point returns.
+static unsigned long long stats_reported;
+
+static inline void
+stats_report_octaves(unsigned long long octaves)
+{
+	stats_reported = octaves;
+}
+
+// Monotonic clock in nanoseconds
+static unsigned long long
+stats_now(void)
+{
+#ifdef _WIN32
+	static LARGE_INTEGER freq;
+	LARGE_INTEGER now;
+
+	if (freq.QuadPart == 0)
+		QueryPerformanceFrequency(&freq);
+	QueryPerformanceCounter(&now);
+	return (unsigned long long) ((double) now.QuadPart * 1e9 / (double) freq.QuadPart);
+#else
+	struct timespec now;
+
+	clock_gettime(CLOCK_MONOTONIC, &now);
+	return (unsigned long long) now.tv_sec * 1000000000ULL + (unsigned long long) now.tv_nsec;
+#endif
+}
+
+// The argument of a call by name, or at position, NULL if it was not passed
+static PyObject *
+stats_arg(PyObject *args, PyObject *kwargs, const char *name, int position)
+{
+	PyObject *obj = NULL;
+
+	if (kwargs != NULL)
+		obj = PyDict_GetItemString(kwargs, name);
+	if (obj == NULL && PyTuple_GET_SIZE(args) > position)
+		obj = PyTuple_GET_ITEM(args, position);
+	return obj;
+}
+
+// The number of channels of the colours a call looked its values up in,
+// 1 if it has no lut argument
+static Py_ssize_t
+stats_channels(const StatCounter *c, PyObject *args, PyObject *kwargs)
+{
+	PyObject *lut;
+	Py_buffer view;
+	Py_ssize_t channels = 1;
+
+	if (c->lut_arg < 0)
+		return 1;
+	lut = stats_arg(args, kwargs, "lut", c->lut_arg);
+	if (lut == NULL || lut == Py_None)
+		return 1;
+	if (PyObject_GetBuffer(lut, &view, PyBUF_RECORDS_RO) < 0) {
+		PyErr_Clear();
+		return 1;
+	}
+	if (view.ndim == 2 && view.shape[1] > 0)
+		channels = view.shape[1];
+	PyBuffer_Release(&view);
+	return channels;
+}
+
+// The number of samples in the result of a call: 1 for a float, bool or tuple,
+// otherwise the number of values in the returned buffer, over the colour
+// channels of a lut
+static unsigned long long
+stats_samples(const StatCounter *c, PyObject *result, PyObject *args, PyObject *kwargs)
+{
+	Py_buffer view;
+	unsigned long long count;
+
+	if (PyFloat_Check(result) || PyBool_Check(result) || PyTuple_Check(result))
+		return 1;
+	if (PyObject_GetBuffer(result, &view, PyBUF_RECORDS_RO) < 0) {
+		PyErr_Clear();
+		return 0;
+	}
+	count = (unsigned long long) (view.len / view.itemsize) / c->values;
+	PyBuffer_Release(&view);
+	return count / (unsigned long long) stats_channels(c, args, kwargs);
+}
+
+// The octaves argument of a successful call
+static unsigned long long
+stats_octaves(const StatCounter *c, PyObject *args, PyObject *kwargs)
+{
+	PyObject *obj;
+	long octaves;
+
+	if (c->octaves_arg < 0)
+		return 1;
+	obj = stats_arg(args, kwargs, "octaves", c->octaves_arg);
+	if (obj == NULL)
+		return 1;
+	octaves = PyLong_AsLong(obj);
+	if (octaves == -1 && PyErr_Occurred()) {
+		PyErr_Clear();
+		return 1;
+	}
+	return octaves > 0 ? (unsigned long long) octaves : 1;
+}
+
+static inline void
+stats_add(StatCounter *c, unsigned long long start, unsigned long long samples,
+	unsigned long long octaves)
+{
+	c->ns += stats_now() - start;
+	c->calls++;
+	c->samples += samples;
+	c->octaves += octaves;
+}
+
+// Call an entry point, counting it if enabled
+static PyObject *
+stats_call(StatCounter *c, PyCFunctionWithKeywords func, PyObject *self, PyObject *args,
+	PyObject *kwargs)
+{
+	unsigned long long start;
+	PyObject *result;
+
+	if (!stats_enabled)
+		return func(self, args, kwargs);
+	start = stats_now();
+	result = func(self, args, kwargs);
+	if (result == NULL) {
+		stats_add(c, start, 0, 0);
+	} else {
+		const unsigned long long samples = stats_samples(c, result, args, kwargs);
+		stats_add(c, start, samples, c->octaves_arg == STATS_REPORTED ? stats_reported
+			: samples * stats_octaves(c, args, kwargs));
+	}
+	return result;
+}
+
+#ifdef NOISE_NO_STATS
+#define STATS_WRAP(counters, index, func)
+#define STATS_FUNC(func) func
+#else
+// Define func_stats, calling func counted by counters[index]. The method
+// tables refer to it as STATS_FUNC(func).
+#define STATS_WRAP(counters, index, func) \
+	static PyObject * \
+	func##_stats(PyObject *self, PyObject *args, PyObject *kwargs) \
+	{ \
+		return stats_call(&(counters)[index], func, self, args, kwargs); \
+	}
+#define STATS_FUNC(func) func##_stats
+#endif
+
+// Return a dict of name: (calls, samples, octaves, ns) of the counters
+// of the entry points that were called
+static PyObject *
+stats_dict(const StatCounter *counters)
+{
+	const StatCounter *c;
+	PyObject *dict = PyDict_New();
+
+	if (dict == NULL)
+		return NULL;
+	for (c = counters; c->name != NULL; c++) {
+		PyObject *item;
+		if (c->calls == 0)
+			continue;
+		item = Py_BuildValue("(KKKK)", c->calls, c->samples, c->octaves, c->ns);
+		if (item == NULL || PyDict_SetItemString(dict, c->name, item) < 0) {
+			Py_XDECREF(item);
+			Py_DECREF(dict);
+			return NULL;
+		}
+		Py_DECREF(item);
+	}
+	return dict;
+}
+
+static void
+stats_reset(StatCounter *counters)
+{
+	StatCounter *c;
+
+	for (c = counters; c->name != NULL; c++)
+		c->calls = c->samples = c->octaves = c->ns = 0;
+}
+
+static PyObject *
+py_enable_stats(PyObject *self, PyObject *args)
+{
+	int enabled = 1;
+	int previous = stats_enabled;
+
+	if (!PyArg_ParseTuple(args, "|i:_enable_stats", &enabled))
+		return NULL;
+#ifdef NOISE_NO_STATS
+	if (enabled) {
+		PyErr_SetString(PyExc_RuntimeError,
+			"noise was compiled without instrumentation (NOISE_NO_STATS)");
+		return NULL;
+	}
+#endif
+	stats_enabled = enabled;
+	return PyBool_FromLong(previous);
+}
@@ -0,0 +1,275 @@
+"""Measures the throughput of the noise functions, for comparing releases
+
+Covers perlin noise in 1 to 3 dimensions and simplex noise in 2 to 4, with
+1 to 12 octaves, tiled and untiled, called per sample from Python
+('scalar'), over arrays of coordinates ('array') and over grids ('grid'),
+with the pure python perlin.py implementation as a baseline. Each case
+reports the samples computed per second and the nanoseconds per sample.
+
+Run it against an installed (or built in place) noise package:
+
+	python benchmarks/bench.py --json noise-1.3.0.json
+	python benchmarks/bench.py --compare noise-1.2.3.json
+
+The JSON results record the noise version and platform, and --compare
+prints the speedup of each case over a previous run. Cases of functions
+an older version does not have, such as the array and grid functions
+before 1.3.0, are skipped.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from array import array
+
+import noise
+from noise import perlin
+
+OCTAVES = (1, 2, 4, 8, 12)
+
+# The repeat period of the tiled cases. Perlin noise always tiles, with a
+# period of 1024 by default, which is used for the untiled cases.
+PERIOD = 16
+
+STYLES = ('scalar', 'array', 'grid', 'python')
+
+
+class Case(object):
+	"""A benchmark of one kernel, dimension, octave count, tiling and call
+	style. run() computes samples noise values.
+	"""
+
+	def __init__(self, kernel, dim, octaves, tiled, style, samples, run):
+		self.kernel = kernel
+		self.dim = dim
+		self.octaves = octaves
+		self.tiled = tiled
+		self.style = style
+		self.samples = samples
+		self.run = run
+
+	@property
+	def name(self):
+		return '%s%dd-%s-o%d%s' % (self.kernel, self.dim, self.style, self.octaves,
+			'-tiled' if self.tiled else '')
+
+
+def coordinates(count, dim):
+	"""Return dim arrays of count float coordinates spread over the noise"""
+	return [array('f', [(i * (0.37 + 0.11 * d) + d * 3.1) % 64.0 for i in range(count)])
+		for d in range(dim)]
+
+
+def grid_shape(count, dim):
+	"""Return the (width, height[, depth]) of a grid of about count samples"""
+	side = max(int(round(count ** (1.0 / dim))), 1)
+	return (side,) * dim
+
+
+def scalar_case(func, coords, kwargs):
+	points = list(zip(*coords))
+
+	def run():
+		for p in points:
+			func(*p, **kwargs)
+	return run
+
+
+def accepts(func, args, kwargs):
+	"""Whether func can be called with these arguments, which older versions
+	of the functions may not take
+	"""
+	try:
+		func(*args, **kwargs)
+	except TypeError:
+		return False
+	return True
+
+
+def with_out(func, args, kwargs, count):
+	"""Return the keyword arguments to call func with, including an out
+	buffer of count floats if func accepts one
+	"""
+	with_out = dict(kwargs, out=array('f', bytes(count * 4)))
+	return with_out if accepts(func, args, with_out) else kwargs
+
+
+def array_case(func, coords, kwargs):
+	kwargs = with_out(func, coords, kwargs, len(coords[0]))
+
+	def run():
+		func(*coords, **kwargs)
+	return run
+
+
+def grid_case(func, shape, kwargs):
+	count = 1
+	for side in shape:
+		count *= side
+	kwargs = with_out(func, shape, dict(kwargs, step=(0.37,) * len(shape)), count)
+
+	def run():
+		func(*shape, **kwargs)
+	return run
+
+
+def tiling(kernel, dim, tiled):
+	"""Return the repeat keyword arguments of a case"""
+	if kernel == 'perlin' and dim == 1:
+		return {'repeat': PERIOD} if tiled else {}
+	if not tiled:
+		return {}
+	return dict(zip(('repeatx', 'repeaty', 'repeatz'), (PERIOD,) * dim))
+
+
+def cases(samples):
+	"""Yield all the benchmark cases. samples is the number of noise values
+	computed by the batch cases, the slower per call cases compute fewer.
+	"""
+	scalar_samples = max(samples // 16, 1)
+	# The batch functions are missing from older versions
+	batch = lambda name: getattr(noise, name, None)
+	functions = {
+		('perlin', 1): (noise.pnoise1, batch('pnoise1_array'), None),
+		('perlin', 2): (noise.pnoise2, batch('pnoise2_array'), batch('pgrid2')),
+		('perlin', 3): (noise.pnoise3, batch('pnoise3_array'), batch('pgrid3')),
+		('simplex', 2): (noise.snoise2, batch('snoise2_array'), batch('sgrid2')),
+		('simplex', 3): (noise.snoise3, batch('snoise3_array'), batch('sgrid3')),
+		('simplex', 4): (noise.snoise4, None, batch('sgrid3')),
+	}
+	for (kernel, dim), (scalar, batch, grid) in sorted(functions.items()):
+		for tiled in (False, True):
+			# 4D simplex noise does not tile
+			if tiled and dim == 4:
+				continue
+			for octaves in OCTAVES:
+				kwargs = dict(tiling(kernel, dim, tiled), octaves=octaves)
+				coords = coordinates(scalar_samples, dim)
+				# e.g. tiled 3D simplex noise, before 1.3.0
+				if not accepts(scalar, [c[0] for c in coords], kwargs):
+					continue
+				yield Case(kernel, dim, octaves, tiled, 'scalar', scalar_samples,
+					scalar_case(scalar, coords, kwargs))
+				if batch is not None:
+					yield Case(kernel, dim, octaves, tiled, 'array', samples,
+						array_case(batch, coordinates(samples, dim), kwargs))
+				if grid is not None:
+					if dim == 4:
+						# A 3D grid of 4D noise at a fixed w
+						shape = grid_shape(samples, 3)
+						kwargs['w'] = 0.5
+					else:
+						shape = grid_shape(samples, dim)
+					count = 1
+					for side in shape:
+						count *= side
+					yield Case(kernel, dim, octaves, tiled, 'grid', count,
+						grid_case(grid, shape, kwargs))
+	# The pure python implementations, single octave only
+	python_samples = max(samples // 256, 1)
+	simplex = perlin.SimplexNoise()
+	tileable = perlin.TileableNoise()
+	yield Case('simplex', 2, 1, False, 'python', python_samples,
+		scalar_case(simplex.noise2, coordinates(python_samples, 2), {}))
+	yield Case('simplex', 3, 1, False, 'python', python_samples,
+		scalar_case(simplex.noise3, coordinates(python_samples, 3), {}))
+	yield Case('perlin', 3, 1, True, 'python', python_samples,
+		scalar_case(tileable.noise3, coordinates(python_samples, 3), {'repeat': PERIOD}))
+
+
+def measure(case, repeat, min_time):
+	"""Return the best time of repeat runs of case, each run calling it
+	enough times to take at least min_time seconds
+	"""
+	case.run()
+	loops = 1
+	while True:
+		start = time.perf_counter()
+		for _ in range(loops):
+			case.run()
+		elapsed = time.perf_counter() - start
+		if elapsed >= min_time:
+			break
+		loops *= 2
+	best = elapsed
+	for _ in range(repeat - 1):
+		start = time.perf_counter()
+		for _ in range(loops):
+			case.run()
+		best = min(best, time.perf_counter() - start)
+	return best / loops
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+	parser.add_argument('-k', '--filter', action='append', default=[],
+		help='only run the cases whose name contains this, may be repeated')
+	parser.add_argument('--style', choices=STYLES, action='append',
+		help='only run cases of this call style, may be repeated')
+	parser.add_argument('--samples', type=int, default=65536,
+		help='noise values per batch case (default %(default)s)')
+	parser.add_argument('--repeat', type=int, default=5,
+		help='runs per case, the best is reported (default %(default)s)')
+	parser.add_argument('--min-time', type=float, default=0.05,
+		help='minimum seconds per run (default %(default)s)')
+	parser.add_argument('--quick', action='store_true',
+		help='fewer samples and runs, for a rough check')
+	parser.add_argument('--json', metavar='FILE', help='save the results to FILE')
+	parser.add_argument('--compare', metavar='FILE',
+		help='print the speedup over the results saved in FILE')
+	args = parser.parse_args(argv)
+	if args.quick:
+		args.samples, args.repeat, args.min_time = 4096, 2, 0.01
+
+	baseline = {}
+	if args.compare:
+		with open(args.compare) as f:
+			baseline = dict((r['name'], r) for r in json.load(f)['results'])
+
+	results = []
+	print('%-32s %14s %12s%s' % ('case', 'samples/s', 'ns/sample',
+		'  speedup' if baseline else ''))
+	for case in cases(args.samples):
+		if args.filter and not any(f in case.name for f in args.filter):
+			continue
+		if args.style and case.style not in args.style:
+			continue
+		seconds = measure(case, args.repeat, args.min_time)
+		result = {
+			'name': case.name,
+			'kernel': case.kernel,
+			'dim': case.dim,
+			'octaves': case.octaves,
+			'tiled': case.tiled,
+			'style': case.style,
+			'samples': case.samples,
+			'seconds': seconds,
+			'samples_per_sec': case.samples / seconds,
+			'ns_per_sample': seconds * 1e9 / case.samples,
+		}
+		results.append(result)
+		line = '%-32s %14.0f %12.1f' % (case.name, result['samples_per_sec'],
+			result['ns_per_sample'])
+		if case.name in baseline:
+			line += '  %6.2fx' % (baseline[case.name]['ns_per_sample'] / result['ns_per_sample'])
+		print(line)
+		sys.stdout.flush()
+
+	if args.json:
+		with open(args.json, 'w') as f:
+			json.dump({
+				'noise_version': noise.__version__,
+				'python': platform.python_version(),
+				'implementation': platform.python_implementation(),
+				'platform': platform.platform(),
+				'machine': platform.machine(),
+				'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+				'samples': args.samples,
+				'results': results,
+			}, f, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,157 @@
+# Copyright (c) 2008, Casey Duncan (casey dot duncan at gmail dot com)
+# see LICENSE.txt for details
+
+"""Caching of noise chunks -- square tiles of grid noise reused across calls"""
+
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+
+from . import grid2, grid3
+
+# Storage types of the chunks
+_DTYPES = ('float32', 'float16')
+
+# The default noise parameters of the grid functions, left out of the chunk
+# keys so that passing a default explicitly finds the same chunk
+_DEFAULTS = {'octaves': 1, 'persistence': 0.5, 'lacunarity': 2.0, 'base': 0, 'mode': 'fbm',
+	'warp': 0.0}
+_KERNEL_DEFAULTS = {'perlin': {'repeatx': 1024, 'repeaty': 1024, 'repeatz': 1024}}
+_NO_DEFAULT = object()
+
+# Output arguments of the grid functions, chunks are always float values
+_OUTPUT_ARGS = ('out', 'dtype', 'value_scale', 'value_offset', 'clamp', 'lut')
+
+
+class ChunkCache(object):
+	"""Least recently used cache of noise chunks, computed with the grid
+	functions on a miss.
+
+	Chunk (cx, cy) of 2D noise covers the chunk_size x chunk_size grid
+	starting at origin (cx * chunk_size * step[0], cy * chunk_size * step[1]),
+	so that adjacent chunks tile seamlessly, and likewise in 3D. Chunks are
+	keyed on the kernel, the full set of noise parameters and the chunk
+	index, so one cache can hold chunks of several noise layers.
+
+	chunk_size -- the width (and height, and depth) of a chunk in samples.
+
+	max_bytes -- the memory budget of the stored chunks. The least recently
+	used chunks are evicted to stay within it.
+
+	dtype -- 'float32', or 'float16' to store chunks in half the memory at
+	reduced precision. Chunks are always returned as float32.
+
+	source -- an object with grid2 and grid3 methods, such as a seeded
+	noise.Noise, defaults to the noise module functions.
+	"""
+
+	def __init__(self, chunk_size=64, max_bytes=64 << 20, dtype='float32', source=None):
+		if chunk_size <= 0:
+			raise ValueError('Expected chunk_size > 0')
+		if dtype not in _DTYPES:
+			raise ValueError('Unknown dtype %r, expected float32 or float16' % (dtype,))
+		self.chunk_size = chunk_size
+		self.max_bytes = max_bytes
+		self.dtype = dtype
+		if source is None:
+			self._grid2, self._grid3 = grid2, grid3
+		else:
+			self._grid2, self._grid3 = source.grid2, source.grid3
+		self._chunks = OrderedDict()
+		self._lock = threading.Lock()
+		self.nbytes = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get2(self, cx, cy, kernel='simplex', step=(1.0, 1.0), **kwargs):
+		"""Return chunk (cx, cy) of 2D noise as a float memoryview of shape
+		(chunk_size, chunk_size). The other arguments are passed to the grid2
+		function, threads is not part of the key and the output arguments
+		dtype, value_scale, value_offset, clamp, lut and out are not
+		supported. float32 chunks are shared with the cache and read only.
+		"""
+		size = self.chunk_size
+		origin = (cx * size * step[0], cy * size * step[1])
+		return self._get(self._grid2, (size, size), origin, kernel, step, (cx, cy), kwargs)
+
+	def get3(self, cx, cy, cz, kernel='simplex', step=(1.0, 1.0, 1.0), **kwargs):
+		"""Return chunk (cx, cy, cz) of 3D noise as a float memoryview of shape
+		(chunk_size, chunk_size, chunk_size). The other arguments are passed to
+		the grid3 function.
+		"""
+		size = self.chunk_size
+		origin = (cx * size * step[0], cy * size * step[1], cz * size * step[2])
+		return self._get(self._grid3, (size, size, size), origin, kernel, step, (cx, cy, cz),
+			kwargs)
+
+	def _get(self, grid, shape, origin, kernel, step, index, kwargs):
+		for name in _OUTPUT_ARGS:
+			if name in kwargs:
+				raise TypeError('ChunkCache chunks are float noise values, %s is not supported'
+					% name)
+		threads = kwargs.pop('threads', 1)
+		defaults = _KERNEL_DEFAULTS.get(kernel, {})
+		params = tuple(sorted((name, value) for name, value in kwargs.items()
+			if value != _DEFAULTS.get(name, defaults.get(name, _NO_DEFAULT))))
+		key = (len(shape), kernel, tuple(step), params, index)
+		with self._lock:
+			data = self._chunks.get(key)
+			if data is not None:
+				self._chunks.move_to_end(key)
+				self.hits += 1
+			else:
+				self.misses += 1
+		if data is None:
+			# Computed without the lock, the grid functions release the GIL
+			values = grid(*(shape + (origin, step)), kernel=kernel, threads=threads, **kwargs)
+			data = self._encode(values)
+			self._store(key, data)
+		return self._decode(data, shape)
+
+	def _encode(self, values):
+		if self.dtype == 'float16':
+			values = values.cast('B').cast('f')
+			return struct.pack('%de' % len(values), *values)
+		return values.tobytes()
+
+	def _decode(self, data, shape):
+		if self.dtype == 'float16':
+			data = array('f', struct.unpack('%de' % (len(data) // 2), data))
+		return memoryview(data).cast('B').cast('f', shape)
+
+	def _store(self, key, data):
+		size = len(data)
+		if size > self.max_bytes:
+			return
+		with self._lock:
+			if key in self._chunks:
+				return
+			self._chunks[key] = data
+			self.nbytes += size
+			while self.nbytes > self.max_bytes:
+				_, old = self._chunks.popitem(last=False)
+				self.nbytes -= len(old)
+				self.evictions += 1
+
+	def clear(self):
+		"""Remove all chunks, keeping the counters"""
+		with self._lock:
+			self._chunks.clear()
+			self.nbytes = 0
+
+	def stats(self):
+		"""Return a dict of the hit, miss and eviction counts, the number of
+		chunks and the bytes they use, for sizing the cache
+		"""
+		with self._lock:
+			return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+				'chunks': len(self._chunks), 'nbytes': self.nbytes, 'max_bytes': self.max_bytes}
+
+	def __len__(self):
+		return len(self._chunks)
+
+	def __repr__(self):
+		return '%s(chunk_size=%r, max_bytes=%r, dtype=%r)' % (
+			type(self).__name__, self.chunk_size, self.max_bytes, self.dtype)
@@ -4,7 +4,7 @@
 # $Id: 2dtexture.py 21 2008-05-21 07:52:29Z casey.duncan $
 
 import sys
-from noise import pnoise2, snoise2
+from noise import sgrid2
 
 if len(sys.argv) not in (2, 3) or '--help' in sys.argv or '-h' in sys.argv:
 	print('2dtexture.py FILE [OCTAVES]')
@@ -18,10 +18,12 @@ if len(sys.argv) > 2:
 else:
 	octaves = 1
 freq = 16.0 * octaves
+# The noise is quantized to bytes as it is computed, int(n * 127.0 + 128.0)
+texture = sgrid2(256, 256, step=(1 / freq, 1 / freq), octaves=octaves,
+	dtype='uint8', value_scale=127.0, value_offset=128.0)
 f.write('P2\n')
 f.write('256 256\n')
 f.write('255\n')
-for y in range(256):
-	for x in range(256):
-		f.write("%s\n" % int(snoise2(x / freq, y / freq, octaves) * 127.0 + 128.0))
+for row in texture.tolist():
+	f.write(''.join("%s\n" % v for v in row))
 f.close()
@@ -10,7 +10,7 @@ import pyglet
 from pyglet.gl import *
 import ctypes
 import noise
-from noise import pnoise3, snoise3
+from noise import pnoise3, snoise3, snoise3_volume
 
 def create_3d_texture(width, scale):
 	"""Create a grayscale 3d texture map with the specified 
@@ -24,15 +24,13 @@ def create_3d_texture(width, scale):
 	func(x, y, z) is assumed to always return a value in the 
 	range [-1, 1].
 	"""
-	coords = range(width)
 	texel = (ctypes.c_byte * width**3)()
 	half = 0 #width * scale / 2.0 
 
-	for z in coords:
-		for y in coords:
-			for x in coords:
-				v = snoise3(x * scale - half, y * scale - half, z * scale - half, octaves=4, persistence=0.25)
-				texel[x + (y * width) + (z * width**2)] = int(v * 127.0)
+	# Computed natively, texel[x + (y * width) + (z * width**2)] =
+	# int(snoise3(x * scale - half, ...) * 127.0)
+	snoise3_volume(width, scale, (-half, -half, -half), octaves=4, persistence=0.25,
+		dtype='int8', value_scale=127.0, value_offset=0.0, out=texel)
 	glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
 	glTexImage3D(GL_TEXTURE_3D, 0, GL_LUMINANCE, width, width, width, 0, 
 		GL_LUMINANCE, GL_BYTE, ctypes.byref(texel))
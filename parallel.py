@@ -0,0 +1,121 @@
+# Copyright (c) 2008, Casey Duncan (casey dot duncan at gmail dot com)
+# see LICENSE.txt for details
+
+"""Rendering of rasters across processes, for noise composed in Python
+
+The native array and grid functions release the GIL and take a threads
+argument, which is the better choice when the whole computation is native.
+Python code combining noise values holds the GIL though, so render() splits
+the raster into tiles and evaluates them in a pool of processes instead.
+The tiles are written into a shared memory buffer, nothing is pickled back
+from the workers.
+
+The noise functions are deterministic, so the result does not depend on
+the number of workers or the order the tiles are evaluated in.
+"""
+
+import multiprocessing
+import os
+from array import array
+from multiprocessing.sharedctypes import RawArray
+
+# Per worker process state, set by _init_worker
+_worker = None
+
+
+def render(func, shape, tile=256, workers=None, out=None):
+	"""Render a raster of shape (height, width) with func, evaluated one tile
+	at a time in a pool of worker processes, and return it as a float
+	memoryview of that shape.
+
+	func(x, y, out) -- computes the tile whose top left pixel is (x, y).
+	out is a float memoryview of shape (rows, columns) to write the tile
+	into, for example with the out argument of the grid functions, and may
+	return out or the grid function's result. func may instead return a
+	separate buffer or sequence of rows * columns floats. It must be
+	picklable, i.e. a module level function, for the workers to call it.
+
+	tile -- the width and height of the tiles, the tiles at the right and
+	bottom edges may be smaller.
+
+	workers -- the number of worker processes, defaults to the number of
+	processors. 1 renders in this process without a pool.
+
+	out -- optional writable buffer of width * height C floats to write the
+	raster into, which is then returned. Otherwise the result is a view of
+	the raster the tiles were rendered into, shared memory when rendered by
+	a pool, which stays allocated as long as the view (or any view derived
+	from it) is referenced. Passing out to a pool render copies the raster
+	into it at the end, so both exist at once.
+	"""
+	height, width = shape
+	if width <= 0 or height <= 0 or tile <= 0:
+		raise ValueError('Expected a non-empty shape and tile > 0')
+	if workers is None:
+		workers = os.cpu_count() or 1
+	if workers <= 0:
+		raise ValueError('Expected workers > 0')
+	if out is not None:
+		out = memoryview(out).cast('B')
+		if out.readonly or len(out) != width * height * 4:
+			raise ValueError('out must be a writable buffer of width * height floats')
+	tiles = [(x, y, min(tile, width - x), min(tile, height - y))
+		for y in range(0, height, tile) for x in range(0, width, tile)]
+	if workers == 1 or len(tiles) == 1:
+		# Render straight into out, no shared memory needed
+		if out is None:
+			out = memoryview(bytearray(width * height * 4))
+		_init_worker(out, width, func)
+		try:
+			for t in tiles:
+				_render_tile(t)
+		finally:
+			_close_worker()
+		return out.cast('f', (height, width))
+	# Allocated from the multiprocessing heap, the pool workers receive it
+	# when they start and write their tiles into it in place
+	raster = RawArray('B', width * height * 4)
+	with multiprocessing.Pool(min(workers, len(tiles)), _init_worker,
+		(raster, width, func)) as pool:
+		for _ in pool.imap_unordered(_render_tile, tiles):
+			pass
+	data = memoryview(raster).cast('B')
+	if out is None:
+		return data.cast('f', (height, width))
+	out[:] = data
+	data.release()
+	return out.cast('f', (height, width))
+
+
+def _init_worker(raster, width, func):
+	global _worker
+	_worker = (memoryview(raster).cast('B'), width, func)
+
+
+def _close_worker():
+	global _worker
+	_worker = None
+
+
+def _render_tile(t):
+	buf, width, func = _worker
+	x, y, w, h = t
+	values = array('f', bytes(w * h * 4))
+	view = memoryview(values).cast('B').cast('f', (h, w))
+	result = func(x, y, view)
+	# The out view itself, or another view of its buffer such as a grid
+	# function returns, means the tile was filled in place
+	filled = result is None or result is view or (isinstance(result, memoryview)
+		and result.obj is values)
+	view.release()
+	if not filled:
+		values = array('f', result if not isinstance(result, memoryview)
+			else result.cast('B').cast('f'))
+		if len(values) != w * h:
+			raise ValueError('func returned %d values for a %d x %d tile' % (len(values), w, h))
+	# Copy the rows of the tile into the raster
+	data = memoryview(values).cast('B')
+	row = w * 4
+	for r in range(h):
+		start = ((y + r) * width + x) * 4
+		buf[start:start + row] = data[r * row:(r + 1) * row]
@@ -1,3 +1,4 @@
+import os
 import sys
 try:
     from setuptools import setup, Extension
@@ -5,14 +6,23 @@ except ImportError:
     from distutils.core import setup, Extension
 
 if sys.platform != 'win32':
-    compile_args = ['-funroll-loops']
+    # The SIMD kernels must round exactly like the scalar code, so no
+    # contraction of multiplies and adds into fused operations
+    compile_args = ['-funroll-loops', '-ffp-contract=off']
 else:
     # XXX insert win32 flag to unroll loops here
     compile_args = []
 
+# Building with NOISE_NO_STATS=1 in the environment compiles out the
+# instrumentation counters enabled by noise.enable_stats()
+if os.environ.get('NOISE_NO_STATS'):
+    define_macros = [('NOISE_NO_STATS', '1')]
+else:
+    define_macros = []
+
 setup(
     name='noise',
-    version='1.2.3',
+    version='1.3.0',
     description='Perlin noise for Python',
     long_description='''\
 Perlin noise is ubiquitous in modern CGI. Used for procedural texturing,
@@ -52,18 +62,24 @@ See CHANGES.txt for more details
         'Operating System :: Microsoft :: Windows',
         'Operating System :: POSIX',
         'Programming Language :: C',
-        'Programming Language :: Python :: 2',
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
     ],
 
+    python_requires='>=3.8',
+
     package_dir={'noise': ''},
     packages=['noise'],
     ext_modules=[
         Extension('noise._simplex', ['_simplex.c'], 
             extra_compile_args=compile_args,
+            define_macros=define_macros,
+            depends=['_noise.h', '_batch.h', '_perm.h', '_stats.h', '_simplex_simd.h'],
         ),
         Extension('noise._perlin', ['_perlin.c'],
             extra_compile_args=compile_args,
+            define_macros=define_macros,
+            depends=['_noise.h', '_batch.h', '_perm.h', '_stats.h'],
         )
     ],
 )
@@ -6,16 +6,56 @@ http://http.developer.nvidia.com/GPUGems/gpugems_ch05.html
 
 __version__ = "$Id: shader_noise.py 37 2008-06-27 22:25:39Z casey.duncan $"
 
-from noise import pnoise3
+import noise
+from noise._perlin import Perlin, shader_texture3
 import ctypes
+import hashlib
+import mmap
+import os
+import sys
+import tempfile
 from pyglet.gl import *
 
+def cache_dir():
+	"""Return the directory ShaderNoiseTexture caches its textures in by
+	default: $NOISE_CACHE_DIR if set, otherwise a noise directory in the
+	platform's user cache directory.
+	"""
+	path = os.environ.get('NOISE_CACHE_DIR')
+	if path:
+		return path
+	if sys.platform == 'win32':
+		base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+	elif sys.platform == 'darwin':
+		base = os.path.expanduser('~/Library/Caches')
+	else:
+		base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+	return os.path.join(base, 'noise')
+
+# The layout of the cached texels, changed whenever the texels computed
+# for the same arguments change. The texels are followed by their sha256
+# digest, a damaged file is computed again.
+TEXTURE_FORMAT = 1
+_DIGEST_SIZE = 32
+
+def texture_key(freq, width):
+	"""Return the name of the cached texture of freq and width. It is a
+	digest of everything the texels depend on, so a texture computed by
+	another version of noise or texture format, or on a platform of another
+	byte order, is never reused.
+	"""
+	digest = hashlib.sha256()
+	digest.update(('shader_noise %d %d %s %d %s\n' % (
+		freq, width, noise.__version__, TEXTURE_FORMAT, sys.byteorder)).encode('ascii'))
+	digest.update(Perlin().permutation)
+	return 'shader-noise-%s.u16' % digest.hexdigest()
+
 class ShaderNoiseTexture:
 	"""tiling 3D noise texture with two channels for use by the
 	shader noise functions.
 	"""
 
-	def __init__(self, freq=8, width=32):
+	def __init__(self, freq=8, width=32, cache=True):
 		"""Generate the 3D noise texture.
 
 		freq -- frequency of generated noise over the width of the 
@@ -26,22 +66,69 @@ class ShaderNoiseTexture:
 		Using a larger width can reduce artifacts caused by linear
 		interpolation of the noise texture, at the cost of video
 		memory, and possibly slower texture access.
+
+		cache -- True to cache the texture in cache_dir(), or the path of
+		a directory to cache it in. A cached texture is memory-mapped
+		instead of being computed again. False disables the cache.
 		"""
 		self.freq = freq
 		self.width = width
-		scale = float(freq) / width
-		width2 = width**2
-		texel = (ctypes.c_ushort * (2 * width**3))()
-		for z in range(width):
-			for y in range(width):
-				for x in range(width):
-					texel[(x + (y * width) + (z * width2)) * 2] = int((pnoise3(
-						x * scale, y * scale, z * scale, 
-						repeatx=freq, repeaty=freq, repeatz=freq) + 1.0) * 32767)
-					texel[(x + (y * width) + (z * width2)) * 2 + 1] = int((pnoise3(
-						x * scale, y * scale, z * scale, 
-						repeatx=freq, repeaty=freq, repeatz=freq, base=freq + 1) + 1.0) * 32767)
-		self.data = texel
+		self.data = None
+		texel_type = ctypes.c_ushort * (2 * width**3)
+		if cache:
+			self.path = os.path.join(
+				cache_dir() if cache is True else cache, texture_key(freq, width))
+			self.data = self._map(texel_type)
+		else:
+			self.path = None
+		if self.data is None:
+			texel = texel_type()
+			# Both channels are computed natively and written straight into texel
+			shader_texture3(width, freq, texel)
+			self.data = texel
+			if self.path is not None:
+				self._store(texel)
+
+	def _map(self, texel_type):
+		"""Return the texels mapped from the cache file, or None if the file
+		is missing, is not a texture of this size or does not match the
+		digest of the texels stored after them
+		"""
+		size = ctypes.sizeof(texel_type)
+		try:
+			with open(self.path, 'rb') as f:
+				if os.fstat(f.fileno()).st_size != size + _DIGEST_SIZE:
+					return None
+				# A private mapping, ctypes needs a writable buffer
+				data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+		except (OSError, ValueError):
+			return None
+		with memoryview(data) as view:
+			valid = hashlib.sha256(view[:size]).digest() == view[size:]
+		if not valid:
+			data.close()
+			return None
+		return texel_type.from_buffer(data)
+
+	def _store(self, texel):
+		"""Write the texels and their digest to the cache file, atomically
+		so that concurrent processes never map a partial file. Errors are
+		ignored, the texture is then computed again next time.
+		"""
+		directory = os.path.dirname(self.path)
+		try:
+			os.makedirs(directory, exist_ok=True)
+			fd, temp = tempfile.mkstemp(prefix='.shader-noise-', dir=directory)
+			try:
+				with os.fdopen(fd, 'wb') as f:
+					f.write(texel)
+					f.write(hashlib.sha256(texel).digest())
+				os.replace(temp, self.path)
+			except BaseException:
+				os.unlink(temp)
+				raise
+		except OSError:
+			pass
 	
 	def load(self):
 		"""Load the noise texture data into the current texture unit"""
@@ -0,0 +1,170 @@
+# Copyright (c) 2008, Casey Duncan (casey dot duncan at gmail dot com)
+# see LICENSE.txt for details
+
+"""Streaming generation of noise rasters too large to hold in memory
+
+The raster is generated a band of rows, or a tile, at a time with the
+native grid functions, so that memory use is bounded by the band size
+whatever the size of the raster. Bands can optionally be computed ahead
+on a worker thread while the previous ones are consumed, the grid
+functions release the GIL while computing.
+"""
+
+import queue
+import struct
+import sys
+import threading
+
+from . import grid2
+
+# Formats supported by write()
+FORMATS = ('raw', 'npy', 'pfm', 'pgm')
+
+
+def bands(width, height, band_height=64, origin=(0.0, 0.0), step=(1.0, 1.0), kernel='simplex',
+	source=None, readahead=0, reverse=False, **kwargs):
+	"""Yield (y, band) for each band of band_height rows of a width x height
+	raster of 2D noise, from the top (y = 0) down, or from the bottom up if
+	reverse is true. Each band is a float memoryview of shape (rows, width),
+	the last one may have fewer rows.
+
+	origin, step, kernel -- as for the grid2 function. The other keyword
+	arguments are passed to the kernel's grid function.
+
+	source -- an object with a grid2 method, such as a seeded noise.Noise,
+	defaults to the noise module functions.
+
+	readahead -- the number of bands to compute ahead on a worker thread,
+	0 computes each band when it is requested.
+	"""
+	if width <= 0 or height <= 0 or band_height <= 0:
+		raise ValueError('Expected width, height and band_height > 0')
+	starts = range(0, height, band_height)
+	if reverse:
+		starts = reversed(starts)
+	jobs = ((0, y, width, min(band_height, height - y)) for y in starts)
+	for (x, y, w, h), band in _generate(source, jobs, origin, step, kernel, readahead, kwargs):
+		yield y, band
+
+
+def tiles(width, height, tile_size=256, origin=(0.0, 0.0), step=(1.0, 1.0), kernel='simplex',
+	source=None, readahead=0, **kwargs):
+	"""Yield (x, y, tile) for each tile_size x tile_size tile of a width x
+	height raster of 2D noise, in row-major order. Each tile is a float
+	memoryview of shape (rows, columns), the tiles at the right and bottom
+	edges may be smaller. The other arguments are the same as for bands.
+	"""
+	if width <= 0 or height <= 0 or tile_size <= 0:
+		raise ValueError('Expected width, height and tile_size > 0')
+	jobs = ((x, y, min(tile_size, width - x), min(tile_size, height - y))
+		for y in range(0, height, tile_size) for x in range(0, width, tile_size))
+	for (x, y, w, h), tile in _generate(source, jobs, origin, step, kernel, readahead, kwargs):
+		yield x, y, tile
+
+
+def write(f, width, height, format='raw', band_height=64, value_range=(-1.0, 1.0), **kwargs):
+	"""Write a width x height raster of 2D noise to f, a file name or binary
+	file object, generating it a band at a time.
+
+	format -- the file format:
+	  'raw' float32 values in native byte order, row by row
+	  'npy' a numpy .npy file of float32 values, shape (height, width)
+	  'pfm' a portable float map, single channel
+	  'pgm' an 8 bit portable gray map, binary
+
+	value_range -- the noise values mapped to black and white in pgm files,
+	values outside of it are clamped.
+
+	The other keyword arguments are passed to bands.
+	"""
+	if format not in FORMATS:
+		raise ValueError('Unknown format %r, expected one of %s' % (format, ', '.join(FORMATS)))
+	if isinstance(f, str):
+		with open(f, 'wb') as fileobj:
+			return write(fileobj, width, height, format, band_height, value_range, **kwargs)
+	little = sys.byteorder == 'little'
+	# pfm scanlines are stored from the bottom up
+	reverse = format == 'pfm'
+	if format == 'npy':
+		f.write(_npy_header('<f4' if little else '>f4', (height, width)))
+	elif format == 'pfm':
+		# A negative scale marks little-endian values
+		f.write(('Pf\n%d %d\n%s\n' % (width, height, '-1.0' if little else '1.0')).encode('ascii'))
+	elif format == 'pgm':
+		f.write(('P5\n%d %d\n255\n' % (width, height)).encode('ascii'))
+		# Quantized by the grid functions, rounding to the nearest level
+		lo, hi = value_range
+		scale = 255.0 / (hi - lo)
+		kwargs.update(dtype='uint8', value_scale=scale, value_offset=0.5 - lo * scale)
+	for y, band in bands(width, height, band_height, reverse=reverse, **kwargs):
+		if reverse:
+			data = band.cast('B')
+			row = width * 4
+			for r in range(len(data) // row - 1, -1, -1):
+				f.write(data[r * row:(r + 1) * row])
+		else:
+			f.write(band)
+
+
+def _generate(source, jobs, origin, step, kernel, readahead, kwargs):
+	"""Yield (job, values) for each (x, y, width, height) region in jobs,
+	computed with the grid function of source, readahead regions ahead.
+	"""
+	grid = source.grid2 if source is not None else grid2
+
+	def compute(job):
+		x, y, w, h = job
+		return grid(w, h, (origin[0] + x * step[0], origin[1] + y * step[1]), step,
+			kernel=kernel, **kwargs)
+
+	if readahead <= 0:
+		for job in jobs:
+			yield job, compute(job)
+		return
+	results = queue.Queue(readahead)
+	stop = threading.Event()
+
+	def put(item):
+		# Give up once the consumer stops iterating
+		while not stop.is_set():
+			try:
+				results.put(item, timeout=0.05)
+				return True
+			except queue.Full:
+				pass
+		return False
+
+	def work():
+		try:
+			for job in jobs:
+				if not put((job, compute(job), None)):
+					return
+		except Exception as e:
+			put((None, None, e))
+			return
+		put((None, None, None))
+
+	worker = threading.Thread(target=work, name='noise-readahead')
+	worker.daemon = True
+	worker.start()
+	try:
+		while True:
+			job, values, error = results.get()
+			if error is not None:
+				raise error
+			if job is None:
+				return
+			yield job, values
+	finally:
+		stop.set()
+		worker.join()
+
+
+def _npy_header(descr, shape):
+	"""Return the version 1.0 .npy header of a C order array"""
+	header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d, %d), }" % ((descr,) + shape)
+	# The header is padded with spaces to a multiple of 64 bytes, ending in a newline
+	prefix = 10
+	padding = -(prefix + len(header) + 1) % 64
+	header = header + ' ' * padding + '\n'
+	return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
@@ -74,6 +74,1384 @@ class PerlinTestCase(unittest.TestCase):
         self.assertNotEqual(pnoise3(x, y, z), pnoise3(x, y, z, base=5))
         self.assertNotEqual(pnoise3(x, y, z, base=5), pnoise3(x, y, z, base=1))
 
+    def test_perlin_tiles_across_negative_coordinates(self):
+        from noise import pnoise2, pnoise3
+        for repeat in (5, 16, 256, 1024):
+            for x, y, z in ((-0.25, 1.75, -2.875), (-7.25, -3.5, 0.625), (2.125, -11.75, -4.125)):
+                self.assertEqual(pnoise2(x, y, repeatx=repeat, repeaty=repeat),
+                    pnoise2(x + repeat, y + 2 * repeat, repeatx=repeat, repeaty=repeat))
+                self.assertEqual(
+                    pnoise3(x, y, z, repeatx=repeat, repeaty=repeat, repeatz=repeat),
+                    pnoise3(x + repeat, y + repeat, z + 3 * repeat,
+                        repeatx=repeat, repeaty=repeat, repeatz=repeat))
+
+
+class PerlinArrayTestCase(unittest.TestCase):
+
+    def coords(self, scale, count=500, typecode='f'):
+        from array import array
+        return array(typecode, [(i - count // 2) * scale for i in range(count)])
+
+    def test_perlin_1d_array_matches_scalar(self):
+        from noise import pnoise1, pnoise1_array
+        xs = self.coords(0.49)
+        for octaves in (1, 4):
+            values = pnoise1_array(xs, octaves=octaves, base=3)
+            self.assertEqual(len(values), len(xs))
+            for x, n in zip(xs, values):
+                self.assertEqual(n, pnoise1(x, octaves=octaves, base=3))
+
+    def test_perlin_2d_array_matches_scalar(self):
+        from noise import pnoise2, pnoise2_array
+        xs = self.coords(0.49)
+        ys = self.coords(-0.67, typecode='d')
+        for octaves in (1, 5):
+            values = pnoise2_array(xs, ys, octaves, 0.6, 2.1, repeatx=16)
+            for x, y, n in zip(xs, ys, values):
+                self.assertEqual(n, pnoise2(float(x), float(y), octaves, 0.6, 2.1, repeatx=16))
+
+    def test_perlin_3d_array_matches_scalar(self):
+        from noise import pnoise3, pnoise3_array
+        xs = self.coords(-0.49)
+        ys = self.coords(0.67)
+        zs = self.coords(-0.727)
+        for octaves in (1, 6):
+            values = pnoise3_array(xs, ys, zs, octaves=octaves, repeatz=8, base=2)
+            for x, y, z, n in zip(xs, ys, zs, values):
+                self.assertEqual(n, pnoise3(x, y, z, octaves=octaves, repeatz=8, base=2))
+
+    def test_perlin_array_out(self):
+        from array import array
+        from noise import pnoise2_array
+        xs = self.coords(0.3)
+        ys = self.coords(0.7)
+        out = array('f', [0.0]) * len(xs)
+        self.assertIs(pnoise2_array(xs, ys, out=out), out)
+        self.assertEqual(list(out), list(pnoise2_array(xs, ys)))
+
+    def test_perlin_array_errors(self):
+        from array import array
+        from noise import pnoise2_array
+        xs = self.coords(0.3)
+        self.assertRaises(ValueError, pnoise2_array, xs, self.coords(0.3, 10))
+        self.assertRaises(TypeError, pnoise2_array, xs, array('i', range(len(xs))))
+        self.assertRaises(ValueError, pnoise2_array, xs, xs, out=array('f', [0.0]))
+        self.assertRaises(TypeError, pnoise2_array, xs, xs, out=array('d', xs))
+        self.assertRaises(ValueError, pnoise2_array, xs, xs, octaves=0)
+
+    def test_perlin_array1_repeat(self):
+        from noise import pnoise1_array
+        xs = self.coords(0.3)
+        self.assertRaises(ValueError, pnoise1_array, xs, repeat=0)
+        self.assertRaises(ValueError, pnoise1_array, xs, repeat=-3)
+        # The repeat interval of the second octave is int(1 * 0.5)
+        self.assertRaises(ValueError, pnoise1_array, xs, octaves=2, repeat=1, lacunarity=0.5)
+
+
+class GridTestCase(unittest.TestCase):
+
+    def test_perlin_grid2_matches_scalar(self):
+        from noise import pnoise2, pgrid2
+        values = pgrid2(13, 7, (-3.25, 1.5), (0.37, -0.21), octaves=3, repeatx=8)
+        self.assertEqual(values.shape, (7, 13))
+        for j in range(7):
+            for i in range(13):
+                self.assertEqual(values[j, i], pnoise2(
+                    -3.25 + i * 0.37, 1.5 + j * -0.21, octaves=3, repeatx=8))
+
+    def test_perlin_grid3_matches_scalar(self):
+        from noise import pnoise3, pgrid3
+        values = pgrid3(6, 5, 4, (0.5, -1.25, 2.0), (0.3, 0.2, -0.7), octaves=2, base=4)
+        self.assertEqual(values.shape, (4, 5, 6))
+        for k in range(4):
+            for j in range(5):
+                for i in range(6):
+                    self.assertEqual(values[k, j, i], pnoise3(
+                        0.5 + i * 0.3, -1.25 + j * 0.2, 2.0 + k * -0.7, octaves=2, base=4))
+
+    def test_simplex_grid2_matches_scalar(self):
+        from noise import snoise2, sgrid2
+        for kwargs in ({'octaves': 4}, {'repeatx': 4.0, 'base': 2.0}, {'repeaty': 3.0}):
+            values = sgrid2(11, 9, (1.0, -2.0), (0.25, 0.4), **kwargs)
+            for j in range(9):
+                for i in range(11):
+                    self.assertEqual(values[j, i],
+                        snoise2(1.0 + i * 0.25, -2.0 + j * 0.4, **kwargs))
+
+    def test_simplex_grid3_matches_scalar(self):
+        from noise import snoise3, snoise4, sgrid3
+        values = sgrid3(5, 4, 3, (0.1, 0.2, 0.3), (0.5, 0.6, 0.7), octaves=3)
+        slice4 = sgrid3(5, 4, 3, (0.1, 0.2, 0.3), (0.5, 0.6, 0.7), w=1.5)
+        for k in range(3):
+            for j in range(4):
+                for i in range(5):
+                    x, y, z = 0.1 + i * 0.5, 0.2 + j * 0.6, 0.3 + k * 0.7
+                    self.assertEqual(values[k, j, i], snoise3(x, y, z, octaves=3))
+                    self.assertEqual(slice4[k, j, i], snoise4(x, y, z, 1.5))
+
+    def test_many_octave_grids_match_scalar(self):
+        from noise import pnoise2, pnoise3, snoise2, snoise3, pgrid2, pgrid3, sgrid2, sgrid3
+        step = (0.71, 0.53, 0.29)
+        kwargs = {'octaves': 12, 'persistence': 0.7, 'lacunarity': 1.9}
+        for grid, noise, extra in ((pgrid2, pnoise2, {'repeatx': 6}),
+                                   (sgrid2, snoise2, {'repeaty': 5.0})):
+            values = grid(9, 4, (0, 0), step[:2], **dict(kwargs, **extra))
+            for j in range(4):
+                for i in range(9):
+                    self.assertEqual(values[j, i],
+                        noise(i * step[0], j * step[1], **dict(kwargs, **extra)))
+        for grid, noise, extra in ((pgrid3, pnoise3, {'repeatz': 3}), (sgrid3, snoise3, {})):
+            values = grid(9, 3, 2, (0, 0, 0), step, **dict(kwargs, **extra))
+            for k in range(2):
+                for j in range(3):
+                    for i in range(9):
+                        self.assertEqual(values[k, j, i], noise(
+                            i * step[0], j * step[1], k * step[2], **dict(kwargs, **extra)))
+
+    def test_grid_kernel_dispatch(self):
+        from noise import grid2, grid3, sgrid2, pgrid3
+        self.assertEqual(grid2(8, 8, step=(0.1, 0.1)).tolist(),
+            sgrid2(8, 8, (0, 0), (0.1, 0.1)).tolist())
+        self.assertEqual(grid3(4, 4, 4, (1, 2, 3), kernel='perlin', octaves=2).tolist(),
+            pgrid3(4, 4, 4, (1, 2, 3), octaves=2).tolist())
+        self.assertRaises(ValueError, grid2, 8, 8, kernel='value')
+
+    def test_grid_out(self):
+        from array import array
+        from noise import sgrid2
+        out = array('f', [0.0]) * 48
+        self.assertIs(sgrid2(8, 6, out=out), out)
+        self.assertEqual(list(out), [v for row in sgrid2(8, 6).tolist() for v in row])
+        self.assertRaises(ValueError, sgrid2, 8, 5, out=out)
+
+    def test_grid_empty_and_invalid(self):
+        from noise import pgrid2, sgrid3
+        self.assertEqual(len(pgrid2(0, 5)), 0)
+        self.assertEqual(len(sgrid3(3, 0, 2)), 0)
+        self.assertRaises(ValueError, pgrid2, -1, 5)
+        self.assertRaises(ValueError, sgrid3, 2, 2, 2, octaves=0)
+
+
+class ThreadedBatchTestCase(unittest.TestCase):
+
+    def test_threaded_grids_match_single_thread(self):
+        from noise import pgrid2, pgrid3, sgrid2, sgrid3
+        for grid, args in ((pgrid2, (67, 31)), (sgrid2, (67, 31)),
+                           (pgrid3, (13, 7, 5)), (sgrid3, (13, 7, 5))):
+            expected = grid(*args, octaves=3).tolist()
+            for threads in (0, 2, 3, 64):
+                self.assertEqual(grid(*args, octaves=3, threads=threads).tolist(), expected)
+
+    def test_threaded_arrays_match_single_thread(self):
+        from array import array
+        from noise import pnoise3_array
+        xs = array('d', [i * 0.173 for i in range(1001)])
+        expected = pnoise3_array(xs, xs, xs, octaves=4).tolist()
+        for threads in (0, 4, 5000):
+            self.assertEqual(pnoise3_array(xs, xs, xs, octaves=4, threads=threads).tolist(),
+                expected)
+
+    def test_invalid_threads(self):
+        from noise import pgrid2, sgrid3
+        self.assertRaises(ValueError, pgrid2, 4, 4, threads=-1)
+        self.assertRaises(ValueError, sgrid3, 4, 4, 4, threads=-2)
+
+
+class SimplexSIMDTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from noise import _simplex
+        self.kernels = _simplex._simd()
+
+    def tearDown(self):
+        from noise import _simplex
+        _simplex._simd(self.kernels)
+
+    def coords(self, scale, count=1003):
+        from array import array
+        return array('f', [((i * 7919) % count - count // 2) * scale for i in range(count)])
+
+    def test_simplex_arrays_match_scalar(self):
+        from noise import _simplex, snoise2, snoise3, snoise2_array, snoise3_array
+        xs = self.coords(0.173)
+        ys = self.coords(-0.291)
+        zs = self.coords(0.25)
+        expected2 = [snoise2(x, y, octaves=3, base=1.5) for x, y in zip(xs, ys)]
+        expected3 = [snoise3(x, y, z, octaves=2) for x, y, z in zip(xs, ys, zs)]
+        tiled = [snoise2(x, y, repeatx=5.0, repeaty=3.0) for x, y in zip(xs, ys)]
+        for kernels in _simplex._simd_available():
+            _simplex._simd(kernels)
+            self.assertEqual(snoise2_array(xs, ys, octaves=3, base=1.5).tolist(), expected2)
+            self.assertEqual(snoise3_array(xs, ys, zs, octaves=2).tolist(), expected3)
+            self.assertEqual(snoise2_array(xs, ys, repeatx=5.0, repeaty=3.0).tolist(), tiled)
+
+    def test_simplex_kernels_identical_on_lattice(self):
+        # Coordinates on and between lattice points exercise every tie
+        # in the simplex corner selection
+        from array import array
+        from itertools import product
+        from noise import _simplex, snoise3_array, sgrid2
+        points = list(product([i * 0.25 for i in range(-6, 7)], repeat=3))
+        xs, ys, zs = (array('f', axis) for axis in zip(*points))
+        results = []
+        for kernels in _simplex._simd_available():
+            _simplex._simd(kernels)
+            results.append((snoise3_array(xs, ys, zs).tolist(),
+                sgrid2(37, 5, (-2.0, -1.0), (1.0 / 3, 0.5)).tolist()))
+        self.assertEqual(results.count(results[0]), len(results))
+
+    def test_select_kernels(self):
+        from noise import _simplex
+        self.assertIn('scalar', _simplex._simd_available())
+        self.assertEqual(_simplex._simd('scalar'), 'scalar')
+        self.assertRaises(ValueError, _simplex._simd, 'mmx')
+
+
+class SeededNoiseTestCase(unittest.TestCase):
+
+    def test_default_seed_matches_module_functions(self):
+        import noise
+        n = noise.Noise()
+        for x, y, z in ((0.1, 0.2, 0.3), (-4.5, 7.25, 1.0), (100.3, -0.7, 3.3)):
+            self.assertEqual(n.snoise2(x, y, octaves=3), noise.snoise2(x, y, octaves=3))
+            self.assertEqual(n.snoise3(x, y, z), noise.snoise3(x, y, z))
+            self.assertEqual(n.snoise4(x, y, z, 0.5), noise.snoise4(x, y, z, 0.5))
+            self.assertEqual(n.pnoise1(x, base=2), noise.pnoise1(x, base=2))
+            self.assertEqual(n.pnoise2(x, y, repeatx=8), noise.pnoise2(x, y, repeatx=8))
+            self.assertEqual(n.pnoise3(x, y, z, octaves=4), noise.pnoise3(x, y, z, octaves=4))
+        self.assertEqual(n.grid2(5, 4, kernel='perlin').tolist(), noise.pgrid2(5, 4).tolist())
+
+    def test_seeds_differ_and_repeat(self):
+        import noise
+        a, b, c = noise.Noise(1), noise.Noise(2), noise.Noise(1)
+        self.assertEqual(sorted(a.perlin.permutation), list(range(256)))
+        self.assertEqual(a.perlin.permutation, a.simplex.permutation)
+        self.assertNotEqual(a.perlin.permutation, b.perlin.permutation)
+        self.assertEqual(a.perlin.permutation, c.perlin.permutation)
+        self.assertNotEqual(a.sgrid2(8, 8).tolist(), b.sgrid2(8, 8).tolist())
+        self.assertEqual(a.pgrid3(4, 4, 4).tolist(), c.pgrid3(4, 4, 4).tolist())
+        self.assertNotEqual(noise.Noise(-1).perlin.permutation, a.perlin.permutation)
+        self.assertEqual(noise.Noise(2**64 + 1).perlin.permutation, a.perlin.permutation)
+
+    def test_seeded_batch_matches_scalar(self):
+        from array import array
+        import noise
+        n = noise.Noise(12345)
+        xs = array('f', [i * 0.37 - 20 for i in range(300)])
+        ys = array('f', [i * -0.21 + 3 for i in range(300)])
+        values = n.snoise2_array(xs, ys, octaves=2)
+        for x, y, v in zip(xs, ys, values):
+            self.assertEqual(v, n.snoise2(x, y, octaves=2))
+        values = n.pnoise3_array(xs, ys, xs, repeatx=16)
+        for x, y, v in zip(xs, ys, values):
+            self.assertEqual(v, n.pnoise3(x, y, x, repeatx=16))
+        grid = n.sgrid3(4, 3, 2, step=(0.3, 0.3, 0.3))
+        self.assertEqual(grid[1, 2, 3], n.snoise3(0.9, 0.6, 0.3))
+
+    def test_invalid_seed(self):
+        from noise import _perlin, _simplex
+        self.assertRaises(TypeError, _perlin.Perlin, 1.5)
+        self.assertRaises(TypeError, _simplex.Simplex, '1')
+        self.assertEqual(_simplex.Simplex(7).seed, 7)
+        self.assertFalse(hasattr(_simplex.Simplex(), '_simd'))
+
+
+class PerlinFBMTestCase(unittest.TestCase):
+
+    def test_matches_module_functions(self):
+        from noise import PerlinFBM, pnoise1, pnoise2, pnoise3
+        fbm = PerlinFBM(7, 0.6, 2.1, repeat=(16, 32, 8), base=3)
+        for x, y, z in ((0.1, 0.2, 0.3), (-4.5, 7.25, 1.0), (100.3, -0.7, 3.3)):
+            self.assertEqual(fbm(x), pnoise1(x, 7, 0.6, 2.1, 16, 3))
+            self.assertEqual(fbm(x, y), pnoise2(x, y, 7, 0.6, 2.1, 16, 32, 3))
+            self.assertEqual(fbm(x, y, z), pnoise3(x, y, z, 7, 0.6, 2.1, 16, 32, 8, 3))
+        fbm = PerlinFBM()
+        self.assertEqual(fbm(1.5, 2.5, 3.5), pnoise3(1.5, 2.5, 3.5))
+        self.assertEqual(fbm(2, 3), pnoise2(2, 3))
+
+    def test_seeded(self):
+        from noise import Noise, PerlinFBM
+        self.assertEqual(PerlinFBM(3, repeat=64, seed=5)(0.3, 0.4, 0.5),
+            Noise(5).pnoise3(0.3, 0.4, 0.5, octaves=3, repeatx=64, repeaty=64, repeatz=64))
+
+    def test_attributes_and_errors(self):
+        from noise import PerlinFBM
+        fbm = PerlinFBM(4, repeat=(8, 16))
+        self.assertEqual(fbm.octaves, 4)
+        self.assertEqual(fbm.repeat, (8.0, 16.0, 1024.0))
+        self.assertRaises(TypeError, fbm)
+        self.assertRaises(TypeError, fbm, 1, 2, 3, 4)
+        self.assertRaises(TypeError, fbm, 1, y=2)
+        self.assertRaises(TypeError, fbm, 'x')
+        self.assertRaises(ValueError, PerlinFBM, 0)
+        self.assertRaises(ValueError, PerlinFBM, repeat=())
+        self.assertRaises(ValueError, PerlinFBM, repeat=0)
+        self.assertRaises(ValueError, PerlinFBM, repeat=(8, -1))
+        self.assertRaises(ValueError, PerlinFBM, repeat=0.5)
+        self.assertRaises(ValueError, PerlinFBM, 3, lacunarity=0.25, repeat=2)
+        self.assertRaises(TypeError, PerlinFBM, seed=1.0)
+
+
+class SimplexTilingTestCase(unittest.TestCase):
+
+    def test_simplex_3d_tiles(self):
+        from noise import snoise3
+        for repeat, octaves in ((6, 1), (16, 3), (10.5, 4)):
+            kw = dict(octaves=octaves, repeatx=repeat, repeaty=repeat, repeatz=repeat)
+            for x, y, z in ((0.25, 1.5, -2.75), (-7.5, 3.25, 11.0), (5.0, -0.5, 0.125)):
+                n = snoise3(x, y, z, **kw)
+                self.assertEqual(n, snoise3(x + repeat, y, z, **kw))
+                self.assertEqual(n, snoise3(x, y - repeat, z, **kw))
+                self.assertEqual(n, snoise3(x, y, z + 2 * repeat, **kw))
+
+    def test_simplex_3d_tiles_single_axis(self):
+        from noise import snoise3
+        for x in (0.75, -3.25, 9.0):
+            self.assertEqual(snoise3(x, 1.5, 2.5, repeatz=9), snoise3(x, 1.5, 11.5, repeatz=9))
+            self.assertNotEqual(snoise3(x, 1.5, 2.5, repeatz=9), snoise3(x, 10.5, 2.5, repeatz=9))
+
+    def test_simplex_base(self):
+        from noise import snoise3, snoise4
+        self.assertNotEqual(snoise3(0.3, 1.2, 2.5, base=1), snoise3(0.3, 1.2, 2.5))
+        self.assertEqual(snoise3(0.3, 1.2, 2.5, base=256), snoise3(0.3, 1.2, 2.5, base=0))
+        self.assertNotEqual(snoise4(0.1, 0.2, 0.3, 0.4, base=3), snoise4(0.1, 0.2, 0.3, 0.4))
+        self.assertEqual(snoise4(0.1, 0.2, 0.3, 0.4, base=0), snoise4(0.1, 0.2, 0.3, 0.4))
+
+    def test_tiled_batch_matches_scalar(self):
+        from array import array
+        from noise import snoise3, snoise3_array, sgrid3
+        kw = dict(octaves=3, repeatx=12, repeaty=9, base=2)
+        xs = array('f', [i * 0.37 - 20 for i in range(300)])
+        ys = array('f', [i * -0.21 + 3 for i in range(300)])
+        values = snoise3_array(xs, ys, xs, **kw)
+        for x, y, v in zip(xs, ys, values):
+            self.assertEqual(v, snoise3(x, y, x, **kw))
+        grid = sgrid3(4, 3, 2, step=(0.5, 0.5, 0.5), **kw)
+        self.assertEqual(grid[1, 2, 3], snoise3(1.5, 1.0, 0.5, **kw))
+
+    def test_tiling_errors(self):
+        from noise import snoise3, sgrid3
+        self.assertRaises(ValueError, snoise3, 1, 2, 3, repeatx=0)
+        self.assertRaises(ValueError, sgrid3, 2, 2, 2, repeatz=-4)
+        self.assertRaises(ValueError, sgrid3, 2, 2, 2, repeatx=4, w=1.0)
+
+
+class GradientTestCase(unittest.TestCase):
+
+    def assertGradient(self, func, grad_func, point, **kwargs):
+        h = 1e-3
+        g = grad_func(*point, **kwargs)
+        self.assertEqual(g[0], func(*point, **kwargs))
+        for i in range(len(point)):
+            a, b = list(point), list(point)
+            a[i] += h
+            b[i] -= h
+            estimate = (func(*a, **kwargs) - func(*b, **kwargs)) / (2 * h)
+            self.assertAlmostEqual(g[i + 1], estimate, delta=0.01)
+
+    def test_simplex_gradients(self):
+        from noise import snoise2, snoise2_grad, snoise3, snoise3_grad
+        for p in ((0.3, 1.7, -2.2), (-4.1, 6.35, 0.8), (10.6, -3.3, 5.05)):
+            self.assertGradient(snoise2, snoise2_grad, p[:2])
+            self.assertGradient(snoise2, snoise2_grad, p[:2], octaves=4, base=1.5)
+            self.assertGradient(snoise3, snoise3_grad, p)
+            self.assertGradient(snoise3, snoise3_grad, p, octaves=3, persistence=0.7)
+            self.assertGradient(snoise3, snoise3_grad, p, octaves=2, repeatx=8, repeatz=10.5)
+
+    def test_perlin_gradients(self):
+        from noise import pnoise3, pnoise3_grad
+        for p in ((0.3, 1.7, -2.2), (-4.1, 6.35, 0.8), (10.6, -3.3, 5.05)):
+            self.assertGradient(pnoise3, pnoise3_grad, p)
+            self.assertGradient(pnoise3, pnoise3_grad, p, octaves=4, repeatx=8, base=3)
+
+    def test_gradient_arrays_match_scalar(self):
+        from array import array
+        import noise
+        xs = array('f', [i * 0.37 - 20 for i in range(100)])
+        ys = array('d', [i * -0.21 + 3 for i in range(100)])
+        rows = noise.snoise2_grad_array(xs, ys, octaves=2).tolist()
+        for x, y, row in zip(xs, ys, rows):
+            self.assertEqual(tuple(row), noise.snoise2_grad(x, y, octaves=2))
+        rows = noise.snoise3_grad_array(xs, ys, xs, repeaty=12, threads=2).tolist()
+        for x, y, row in zip(xs, ys, rows):
+            self.assertEqual(tuple(row), noise.snoise3_grad(x, y, x, repeaty=12))
+        out = array('f', [0.0] * 400)
+        noise.pnoise3_grad_array(xs, ys, xs, octaves=3, out=out)
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            self.assertEqual(tuple(out[i * 4:i * 4 + 4]), noise.pnoise3_grad(x, y, x, octaves=3))
+        self.assertRaises(ValueError, noise.pnoise3_grad_array, xs, xs, xs, out=array('f', [0.0] * 100))
+        self.assertRaises(ValueError, noise.snoise3_grad, 1, 2, 3, octaves=0)
+
+
+class FractalModeTestCase(unittest.TestCase):
+
+    modes = ('fbm', 'turbulence', 'ridged', 'hybrid')
+
+    def test_fbm_mode_is_default(self):
+        from noise import pnoise1, pnoise2, pnoise3, snoise2, snoise3
+        for i in range(50):
+            x, y, z = i * 0.37 - 9, i * -0.53 + 4, i * 0.19
+            self.assertEqual(pnoise1(x, octaves=3, mode='fbm'), pnoise1(x, octaves=3))
+            self.assertEqual(pnoise2(x, y, octaves=3, mode='fbm'), pnoise2(x, y, octaves=3))
+            self.assertEqual(pnoise3(x, y, z, octaves=3, mode='fbm'), pnoise3(x, y, z, octaves=3))
+            self.assertEqual(snoise2(x, y, octaves=3, mode='fbm'), snoise2(x, y, octaves=3))
+            self.assertEqual(snoise3(x, y, z, octaves=3, mode='fbm'), snoise3(x, y, z, octaves=3))
+
+    def test_mode_ranges(self):
+        from noise import pnoise3, snoise2, snoise3
+        for mode in ('turbulence', 'ridged'):
+            for i in range(200):
+                x, y, z = i * 0.37 - 9, i * -0.53 + 4, i * 0.19
+                for value in (pnoise3(x, y, z, octaves=4, mode=mode),
+                        snoise2(x, y, octaves=4, mode=mode),
+                        snoise3(x, y, z, octaves=4, mode=mode)):
+                    self.assertTrue(0.0 <= value <= 1.0, (mode, value))
+
+    def test_single_octave_modes(self):
+        from noise import pnoise3, snoise3
+        for i in range(50):
+            x, y, z = i * 0.37 - 9, i * -0.53 + 4, i * 0.19
+            for f in (pnoise3, snoise3):
+                n = f(x, y, z)
+                self.assertAlmostEqual(f(x, y, z, mode='turbulence'), abs(n), places=6)
+                self.assertAlmostEqual(f(x, y, z, mode='ridged'), (1 - abs(n)) ** 2, places=6)
+                self.assertAlmostEqual(f(x, y, z, mode='hybrid'), n, places=5)
+
+    def test_batch_matches_scalar(self):
+        from array import array
+        import noise
+        xs = array('f', [i * 0.37 - 9 for i in range(60)])
+        ys = array('f', [i * -0.53 + 4 for i in range(60)])
+        for mode in self.modes:
+            for warp in (0.0, 0.6):
+                kw = dict(octaves=3, mode=mode, warp=warp)
+                values = noise.pnoise1_array(xs, **kw)
+                for x, v in zip(xs, values):
+                    self.assertEqual(v, noise.pnoise1(x, **kw))
+                values = noise.pnoise3_array(xs, ys, xs, repeaty=8, **kw)
+                for x, y, v in zip(xs, ys, values):
+                    self.assertEqual(v, noise.pnoise3(x, y, x, repeaty=8, **kw))
+                values = noise.snoise2_array(xs, ys, repeatx=6, threads=2, **kw)
+                for x, y, v in zip(xs, ys, values):
+                    self.assertEqual(v, noise.snoise2(x, y, repeatx=6, **kw))
+                values = noise.snoise3_array(xs, ys, xs, **kw)
+                for x, y, v in zip(xs, ys, values):
+                    self.assertEqual(v, noise.snoise3(x, y, x, **kw))
+                grid = noise.pgrid2(4, 3, origin=(0.5, -1), step=(0.25, 0.5), **kw).tolist()
+                for j, row in enumerate(grid):
+                    for i, v in enumerate(row):
+                        self.assertEqual(v, noise.pnoise2(0.5 + i * 0.25, -1 + j * 0.5, **kw))
+                grid = noise.sgrid3(4, 3, 2, origin=(0.5, -1, 2), step=(0.25, 0.5, 1), repeatz=4,
+                    **kw).tolist()
+                for k, plane in enumerate(grid):
+                    for j, row in enumerate(plane):
+                        for i, v in enumerate(row):
+                            self.assertEqual(v, noise.snoise3(
+                                0.5 + i * 0.25, -1 + j * 0.5, 2 + k, repeatz=4, **kw))
+                f = noise.PerlinFBM(octaves=3, mode=mode, warp=warp)
+                self.assertEqual(f(1.25, 0.5), noise.pnoise2(1.25, 0.5, **kw))
+                self.assertEqual(f.mode, mode)
+
+    def test_warp(self):
+        from noise import pnoise2, pnoise3, snoise3
+        self.assertNotEqual(pnoise2(0.3, 0.6, octaves=2, warp=0.5), pnoise2(0.3, 0.6, octaves=2))
+        self.assertNotEqual(snoise3(0.3, 0.6, 0.9, warp=0.5), snoise3(0.3, 0.6, 0.9))
+        for i in range(50):
+            x, y, z = i * 0.25 - 6, i * -0.5 + 4, i * 0.125
+            # Perlin's warped coordinates are periodic up to rounding
+            self.assertAlmostEqual(pnoise3(x, y, z, octaves=3, repeatx=4, mode='ridged', warp=0.8),
+                pnoise3(x + 4, y, z, octaves=3, repeatx=4, mode='ridged', warp=0.8), places=5)
+            self.assertEqual(snoise3(x, y, z, octaves=2, repeatx=4, mode='hybrid', warp=0.8),
+                snoise3(x + 4, y, z, octaves=2, repeatx=4, mode='hybrid', warp=0.8))
+
+    def test_invalid_mode(self):
+        import noise
+        self.assertRaises(ValueError, noise.pnoise2, 1, 2, mode='billow')
+        self.assertRaises(ValueError, noise.snoise3_array, [1.0], [1.0], [1.0], mode=None)
+        self.assertRaises(ValueError, noise.PerlinFBM, mode='Ridged')
+
+
+class ChunkCacheTestCase(unittest.TestCase):
+
+    def test_chunks_match_grid(self):
+        from noise import sgrid2, pgrid3
+        from noise.cache import ChunkCache
+        cache = ChunkCache(chunk_size=8)
+        chunk = cache.get2(2, -1, octaves=3, repeatx=32.0)
+        expected = sgrid2(8, 8, (16.0, -8.0), octaves=3, repeatx=32.0)
+        self.assertEqual(chunk.shape, (8, 8))
+        self.assertEqual(chunk.tolist(), expected.tolist())
+        chunk = cache.get3(1, 0, 1, kernel='perlin', step=(0.5, 0.5, 0.25), base=2)
+        expected = pgrid3(8, 8, 8, (4.0, 0.0, 2.0), (0.5, 0.5, 0.25), base=2)
+        self.assertEqual(chunk.tolist(), expected.tolist())
+
+    def test_hits_and_keys(self):
+        from noise.cache import ChunkCache
+        cache = ChunkCache(chunk_size=4)
+        first = cache.get2(0, 0, octaves=2)
+        self.assertEqual(cache.get2(0, 0, octaves=2, threads=2).tolist(), first.tolist())
+        cache.get2(0, 0, octaves=3)
+        cache.get2(0, 0, kernel='perlin', octaves=2)
+        cache.get2(1, 0, octaves=2)
+        cache.get3(0, 0, 0, octaves=2)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['chunks']), (1, 5, 5))
+        self.assertEqual(stats['nbytes'], 4 * 16 * 4 + 4 * 64)
+
+    def test_default_keys(self):
+        from noise.cache import ChunkCache
+        cache = ChunkCache(chunk_size=4)
+        cache.get2(0, 0)
+        cache.get2(0, 0, octaves=1, persistence=0.5, mode='fbm')
+        cache.get2(0, 0, kernel='perlin', repeatx=1024)
+        cache.get2(0, 0, kernel='perlin', base=0)
+        cache.get2(0, 0, octaves=2)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (2, 3, 3))
+
+    def test_lru_eviction(self):
+        from noise.cache import ChunkCache
+        cache = ChunkCache(chunk_size=4, max_bytes=3 * 64)
+        for cx in range(3):
+            cache.get2(cx, 0)
+        cache.get2(0, 0)
+        cache.get2(3, 0)
+        self.assertEqual((len(cache), cache.evictions, cache.nbytes), (3, 1, 3 * 64))
+        cache.get2(0, 0)
+        cache.get2(1, 0)
+        self.assertEqual((cache.hits, cache.misses), (2, 5))
+        cache.clear()
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+    def test_float16(self):
+        from noise import Noise
+        from noise.cache import ChunkCache
+        source = Noise(7)
+        cache = ChunkCache(chunk_size=8, dtype='float16', source=source)
+        chunk = cache.get2(1, 1, octaves=4)
+        self.assertEqual(cache.nbytes, 8 * 8 * 2)
+        self.assertEqual(chunk.format, 'f')
+        expected = source.grid2(8, 8, (8.0, 8.0), octaves=4).tolist()
+        for row, expected_row in zip(chunk.tolist(), expected):
+            for value, e in zip(row, expected_row):
+                self.assertAlmostEqual(value, e, delta=1e-3)
+        self.assertEqual(cache.get2(1, 1, octaves=4).tolist(), chunk.tolist())
+
+    def test_errors(self):
+        from noise.cache import ChunkCache
+        self.assertRaises(ValueError, ChunkCache, dtype='float64')
+        self.assertRaises(ValueError, ChunkCache, chunk_size=0)
+        cache = ChunkCache(chunk_size=4)
+        self.assertRaises(TypeError, cache.get2, 0, 0, out=bytearray(64))
+        self.assertRaises(TypeError, cache.get2, 0, 0, dtype='uint8')
+        self.assertRaises(TypeError, cache.get3, 0, 0, 0, value_scale=2.0)
+        self.assertRaises(TypeError, cache.get2, 0, 0, clamp=(0.0, 1.0))
+        self.assertRaises(TypeError, cache.get2, 0, 0, value_offset=1.0)
+        self.assertRaises(TypeError, cache.get2, 0, 0, lut=bytearray(768))
+        self.assertRaises(ValueError, cache.get2, 0, 0, kernel='value')
+
+
+class TileStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        import os, tempfile
+        fd, self.path = tempfile.mkstemp(suffix='.nts')
+        os.close(fd)
+
+    def tearDown(self):
+        import os
+        os.remove(self.path)
+
+    def test_tiles_match_grid(self):
+        from noise import pgrid2
+        from noise.tilestore import TileStore
+        with TileStore.create(self.path, (3, 2), tile_size=8, kernel='perlin',
+                origin=(1.0, -2.0), step=(0.5, 0.25), octaves=3, repeatx=16.0) as store:
+            self.assertEqual(store.missing(), 6)
+            tile = store.tile(2, 1)
+            self.assertEqual(tile.shape, (8, 8))
+            self.assertTrue(store.has_tile(2, 1))
+            self.assertFalse(store.has_tile(1, 1))
+            self.assertEqual(tile.tolist(), pgrid2(8, 8, (9.0, 0.0), (0.5, 0.25),
+                octaves=3, repeatx=16.0).tolist())
+            del tile
+        with TileStore(self.path) as store:
+            self.assertEqual(store.kernel, 'perlin')
+            self.assertEqual(store.params['octaves'], 3)
+            self.assertEqual(store.missing(), 5)
+            tile = store.tile(2, 1)
+            self.assertTrue(tile.readonly)
+            # Missing tiles of read only stores are computed, not stored
+            self.assertEqual(store.tile(0, 0).tolist(), pgrid2(8, 8, (1.0, -2.0), (0.5, 0.25),
+                octaves=3, repeatx=16.0).tolist())
+            self.assertEqual(store.missing(), 5)
+            self.assertRaises(ValueError, store.fill)
+            del tile
+
+    def test_fill_seeded(self):
+        from noise import Noise
+        from noise.tilestore import TileStore
+        with TileStore.create(self.path, (2, 2), tile_size=4, seed=5, mode='ridged') as store:
+            store.fill(threads=2)
+            self.assertEqual(store.missing(), 0)
+        expected = Noise(5).grid2(8, 8, mode='ridged').tolist()
+        with TileStore(self.path) as store:
+            for ty in range(2):
+                for tx in range(2):
+                    rows = store.tile(tx, ty).tolist()
+                    for j, row in enumerate(rows):
+                        self.assertEqual(row, expected[ty * 4 + j][tx * 4:tx * 4 + 4])
+
+    def test_errors(self):
+        from noise.tilestore import TileStore
+        self.assertRaises(TypeError, TileStore.create, self.path, (1, 1), repeatz=4)
+        self.assertRaises(ValueError, TileStore.create, self.path, (1, 1), kernel='value')
+        self.assertRaises(ValueError, TileStore.create, self.path, (0, 1))
+        with open(self.path, 'wb') as f:
+            f.write(b'not a tile store')
+        self.assertRaises(ValueError, TileStore, self.path)
+        with TileStore.create(self.path, (2, 1), tile_size=4) as store:
+            self.assertRaises(IndexError, store.tile, 2, 0)
+            self.assertRaises(IndexError, store.tile, 0, -1)
+
+
+class StreamTestCase(unittest.TestCase):
+
+    def test_bands_match_grid(self):
+        from noise import sgrid2, stream
+        expected = sgrid2(50, 37, (0.5, 1.0), (0.1, 0.2), octaves=3).tolist()
+        for readahead in (0, 2):
+            rows = []
+            for y, band in stream.bands(50, 37, 8, (0.5, 1.0), (0.1, 0.2), octaves=3,
+                    readahead=readahead):
+                self.assertEqual(y, len(rows))
+                rows.extend(band.tolist())
+            self.assertEqual(rows, expected)
+        starts = [y for y, band in stream.bands(10, 37, 8, reverse=True)]
+        self.assertEqual(starts, [32, 24, 16, 8, 0])
+
+    def test_tiles_match_grid(self):
+        from noise import Noise, stream
+        source = Noise(3)
+        expected = source.pgrid2(50, 37, octaves=2).tolist()
+        count = 0
+        for x, y, tile in stream.tiles(50, 37, 16, kernel='perlin', source=source, octaves=2,
+                readahead=1):
+            h, w = tile.shape
+            self.assertEqual(tile.tolist(), [row[x:x + w] for row in expected[y:y + h]])
+            count += 1
+        self.assertEqual(count, 12)
+
+    def test_write_formats(self):
+        import io, struct, sys
+        from noise import sgrid2, stream
+        expected = sgrid2(20, 11, octaves=2)
+        data = {}
+        for format in stream.FORMATS:
+            f = io.BytesIO()
+            stream.write(f, 20, 11, format, band_height=4, octaves=2)
+            data[format] = f.getvalue()
+        self.assertEqual(data['raw'], expected.tobytes())
+        self.assertTrue(data['npy'].startswith(b'\x93NUMPY\x01\x00'))
+        self.assertEqual((len(data['npy']) - 20 * 11 * 4) % 64, 0)
+        self.assertEqual(data['npy'][-20 * 11 * 4:], data['raw'])
+        header = 'Pf\n20 11\n%s\n' % ('-1.0' if sys.byteorder == 'little' else '1.0')
+        self.assertTrue(data['pfm'].startswith(header.encode('ascii')))
+        rows = [data['raw'][i * 80:(i + 1) * 80] for i in range(11)]
+        self.assertEqual(data['pfm'][len(header):], b''.join(reversed(rows)))
+        pixels = data['pgm'][len(b'P5\n20 11\n255\n'):]
+        self.assertEqual(len(pixels), 220)
+        for v, p in zip(struct.unpack('220f', data['raw']), bytearray(pixels)):
+            self.assertAlmostEqual((v + 1) * 127.5, p, delta=0.51)
+
+    def test_errors(self):
+        from noise import stream
+        self.assertRaises(ValueError, list, stream.bands(0, 10))
+        self.assertRaises(ValueError, list, stream.bands(10, 10, readahead=1, octaves=0))
+        self.assertRaises(ValueError, stream.write, None, 10, 10, 'png')
+        band = stream.bands(10, 1000, 1, readahead=3)
+        next(band)
+        band.close()
+
+
+def _render_grid_tile(x, y, out):
+    from noise import sgrid2
+    h, w = out.shape
+    sgrid2(w, h, (x * 0.1, y * 0.1), (0.1, 0.1), octaves=3, out=out)
+
+
+def _render_returned_tile(x, y, out):
+    from noise import sgrid2
+    h, w = out.shape
+    return sgrid2(w, h, (x * 0.1, y * 0.1), (0.1, 0.1), octaves=3, out=out)
+
+
+def _render_python_tile(x, y, out):
+    from noise import pnoise2, snoise2
+    h, w = out.shape
+    return [snoise2((x + i) * 0.1, (y + j) * 0.1, octaves=3) * 0.5
+        + pnoise2((x + i) * 0.1, (y + j) * 0.1) * 0.5 for j in range(h) for i in range(w)]
+
+
+class ParallelRenderTestCase(unittest.TestCase):
+
+    def test_render_independent_of_workers(self):
+        from noise import parallel, sgrid2
+        expected = sgrid2(70, 45, (0, 0), (0.1, 0.1), octaves=3).tolist()
+        for workers in (1, 2, 3):
+            values = parallel.render(_render_grid_tile, (45, 70), tile=16, workers=workers)
+            self.assertEqual(values.shape, (45, 70))
+            self.assertEqual(values.tolist(), expected)
+
+    def test_render_returned_out(self):
+        from noise import parallel
+        expected = parallel.render(_render_grid_tile, (20, 30), tile=8, workers=1).tolist()
+        for workers in (1, 2):
+            values = parallel.render(_render_returned_tile, (20, 30), tile=8, workers=workers)
+            self.assertEqual(values.tolist(), expected)
+
+    def test_render_returned_values(self):
+        from array import array
+        from noise import parallel
+        single = parallel.render(_render_python_tile, (20, 30), tile=8, workers=1)
+        out = array('f', [0.0] * 600)
+        values = parallel.render(_render_python_tile, (20, 30), tile=12, workers=2, out=out)
+        self.assertEqual(values.tolist(), single.tolist())
+        self.assertEqual(list(out), [v for row in single.tolist() for v in row])
+
+    def test_errors(self):
+        from noise import parallel
+        self.assertRaises(ValueError, parallel.render, _render_grid_tile, (0, 10))
+        self.assertRaises(ValueError, parallel.render, _render_grid_tile, (10, 10), workers=0)
+        self.assertRaises(ValueError, parallel.render, _render_grid_tile, (10, 10),
+            out=bytearray(10))
+
+
+class ShaderTextureTestCase(unittest.TestCase):
+
+    def texels(self, freq, width):
+        # The python loop ShaderNoiseTexture used before shader_texture3
+        from noise import pnoise3
+        scale = float(freq) / width
+        texels = []
+        for z in range(width):
+            for y in range(width):
+                for x in range(width):
+                    for base in (0, freq + 1):
+                        texels.append(int((pnoise3(x * scale, y * scale, z * scale,
+                            repeatx=freq, repeaty=freq, repeatz=freq, base=base) + 1.0) * 32767))
+        return texels
+
+    def test_matches_noise3(self):
+        from noise._perlin import shader_texture3
+        for freq, width in ((4, 8), (3, 7)):
+            values = shader_texture3(width, freq)
+            self.assertEqual(values.shape, (width, width, width, 2))
+            self.assertEqual(list(values.cast('B').cast('H')), self.texels(freq, width))
+
+    def test_ctypes_out(self):
+        import ctypes
+        from noise._perlin import shader_texture3
+        texel = (ctypes.c_ushort * (2 * 8**3))()
+        shader_texture3(8, 4, texel, threads=3)
+        self.assertEqual(list(texel), self.texels(4, 8))
+
+    def test_errors(self):
+        import ctypes
+        from noise._perlin import shader_texture3
+        self.assertRaises(ValueError, shader_texture3, 0, 4)
+        self.assertRaises(ValueError, shader_texture3, 8, 0)
+        self.assertRaises(ValueError, shader_texture3, 8, 4, (ctypes.c_ushort * 10)())
+        self.assertRaises(ValueError, shader_texture3, 2, 4, (ctypes.c_float * 16)())
+
+
+class ShaderNoiseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        import sys, tempfile, types
+        import noise
+        # pyglet is only needed to load the texture into OpenGL
+        self.modules = dict((name, sys.modules.get(name))
+            for name in ('pyglet', 'pyglet.gl', 'noise.shader_noise'))
+        try:
+            import pyglet.gl
+        except ImportError:
+            sys.modules['pyglet'] = types.ModuleType('pyglet')
+            sys.modules['pyglet.gl'] = types.ModuleType('pyglet.gl')
+        sys.modules.pop('noise.shader_noise', None)
+        from noise import shader_noise
+        self.shader_noise = shader_noise
+        self.computed = []
+        compute = shader_noise.shader_texture3
+
+        def counted(width, freq, *args):
+            self.computed.append((width, freq))
+            return compute(width, freq, *args)
+        shader_noise.shader_texture3 = counted
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil, sys
+        import noise
+        shutil.rmtree(self.dir)
+        for name, module in self.modules.items():
+            if module is not None:
+                sys.modules[name] = module
+            else:
+                sys.modules.pop(name, None)
+        if self.modules['noise.shader_noise'] is None:
+            del noise.shader_noise
+
+    def test_texture_key(self):
+        key = self.shader_noise.texture_key
+        self.assertEqual(key(4, 8), key(4, 8))
+        self.assertEqual(len(set([key(4, 8), key(8, 8), key(4, 16)])), 3)
+        self.assertTrue(key(4, 8).startswith('shader-noise-'))
+
+    def test_cache_hit(self):
+        import os
+        from noise._perlin import shader_texture3
+        texture = self.shader_noise.ShaderNoiseTexture(4, 8, cache=self.dir)
+        self.assertEqual(self.computed, [(8, 4)])
+        self.assertEqual(os.path.dirname(texture.path), self.dir)
+        cached = self.shader_noise.ShaderNoiseTexture(4, 8, cache=self.dir)
+        self.assertEqual(self.computed, [(8, 4)])
+        expected = list(shader_texture3(8, 4).cast('B').cast('H'))
+        self.assertEqual(list(cached.data), expected)
+        self.assertEqual(list(texture.data), expected)
+        self.shader_noise.ShaderNoiseTexture(4, 8, cache=False)
+        self.assertEqual(len(self.computed), 2)
+
+    def test_damaged_file(self):
+        from noise._perlin import shader_texture3
+        expected = list(shader_texture3(8, 4).cast('B').cast('H'))
+        path = self.shader_noise.ShaderNoiseTexture(4, 8, cache=self.dir).path
+        with open(path, 'rb') as f:
+            data = f.read()
+        flipped = data[:100] + bytes([data[100] ^ 1]) + data[101:]
+        for damaged in (data[:-1], data[:1024], b'', flipped):
+            with open(path, 'wb') as f:
+                f.write(damaged)
+            del self.computed[:]
+            texture = self.shader_noise.ShaderNoiseTexture(4, 8, cache=self.dir)
+            self.assertEqual(self.computed, [(8, 4)])
+            self.assertEqual(list(texture.data), expected)
+            # Replaced by the recomputed texture
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), data)
+
+
+class StatsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        import noise
+        self.was_enabled = noise.enable_stats()
+        noise.reset_stats()
+
+    def tearDown(self):
+        import noise
+        noise.enable_stats(self.was_enabled)
+        noise.reset_stats()
+
+    def test_counts(self):
+        from array import array
+        import noise
+        noise.pnoise3(0.5, 1.5, 2.5, 4)
+        noise.pnoise3(0.5, 1.5, 2.5, octaves=2)
+        noise.sgrid2(8, 4, octaves=3, threads=2)
+        xs = array('f', [0.5, 1.5, 2.5])
+        noise.snoise2_grad_array(xs, xs, octaves=2)
+        noise.Noise(7).snoise2(0.5, 1.5)
+        noise.PerlinFBM(octaves=5)(0.5, 1.5)
+        stats = noise.stats()
+        self.assertEqual(sorted(stats),
+            ['PerlinFBM', 'pnoise3', 'sgrid2', 'snoise2', 'snoise2_grad_array'])
+        self.assertEqual((stats['pnoise3']['calls'], stats['pnoise3']['samples'],
+            stats['pnoise3']['octaves']), (2, 2, 6))
+        self.assertEqual((stats['sgrid2']['samples'], stats['sgrid2']['octaves']), (32, 96))
+        self.assertEqual((stats['snoise2_grad_array']['samples'],
+            stats['snoise2_grad_array']['octaves']), (3, 6))
+        self.assertEqual(stats['snoise2']['samples'], 1)
+        self.assertEqual(stats['PerlinFBM']['octaves'], 5)
+        for counters in stats.values():
+            self.assertTrue(counters['seconds'] >= 0.0)
+
+    def test_lut_counts(self):
+        import ctypes
+        from array import array
+        import noise
+        rgb = noise.color_ramp([(0.0, (0, 0, 0)), (1.0, (1.0, 1.0, 1.0))], size=16)
+        rgba = noise.color_ramp([(0.0, (0, 0, 0, 0)), (1.0, (1.0, 1.0, 1.0, 1.0))])
+        noise.sgrid2(10, 10, lut=rgb)
+        noise.snoise3_volume(4, lut=rgba)
+        out = (ctypes.c_ubyte * 24)()
+        noise.pnoise1_array(array('f', [0.1 * i for i in range(6)]), lut=rgba, out=out)
+        stats = noise.stats()
+        self.assertEqual(stats['sgrid2']['samples'], 100)
+        self.assertEqual(stats['snoise3_volume']['samples'], 64)
+        self.assertEqual(stats['pnoise1_array']['samples'], 6)
+
+    def test_above_octaves(self):
+        from array import array
+        import noise
+        xs = array('f', [0.37 * i for i in range(100)])
+        cases = (('pnoise3_above_array', {}), ('snoise3_above_array', {}),
+            ('snoise3_above_array', dict(repeatx=8.0)))
+        for name, kwargs in cases:
+            above_array = getattr(noise, name)
+            noise.reset_stats()
+            above_array(xs, xs, xs, 0.2, octaves=8, threads=2, **kwargs)
+            octaves = noise.stats()[name]['octaves']
+            self.assertTrue(100 < octaves < 800, (name, kwargs, octaves))
+            # Decided by the first octave, or never before the last
+            noise.reset_stats()
+            above_array(xs, xs, xs, 5.0, octaves=8, **kwargs)
+            above_array(xs, xs, xs, float('nan'), octaves=8, **kwargs)
+            self.assertEqual(noise.stats()[name]['octaves'], 900)
+        noise.reset_stats()
+        noise.snoise3_above(0.5, 0.5, 0.5, 5.0, octaves=8)
+        noise.pnoise3_above(0.5, 0.5, 0.5, 0.9, octaves=8)
+        stats = noise.stats()
+        self.assertEqual(stats['snoise3_above']['octaves'], 1)
+        self.assertTrue(stats['pnoise3_above']['octaves'] < 8)
+
+    def test_failed_calls(self):
+        import noise
+        self.assertRaises(TypeError, noise.snoise3, 'x', 1.0, 1.0)
+        stats = noise.stats()
+        self.assertEqual((stats['snoise3']['calls'], stats['snoise3']['samples']), (1, 0))
+
+    def test_disabled_and_reset(self):
+        import noise
+        noise.pnoise1(0.5)
+        noise.reset_stats()
+        self.assertEqual(noise.stats(), {})
+        self.assertTrue(noise.enable_stats(False))
+        noise.pnoise1(0.5)
+        self.assertEqual(noise.stats(), {})
+
+
+class SampleTestCase(unittest.TestCase):
+
+    def points(self, count, dim, typecode='f'):
+        from array import array
+        return array(typecode, [((i * 7919 + d * 104729) % 1000) * 0.137 - 60.0
+            for i in range(count) for d in range(dim)])
+
+    def test_matches_scalar(self):
+        import noise
+        from array import array
+        scalars = {'simplex2': noise.snoise2, 'simplex3': noise.snoise3,
+            'simplex4': noise.snoise4, 'perlin1': noise.pnoise1, 'perlin2': noise.pnoise2,
+            'perlin3': noise.pnoise3}
+        for kernel, func in scalars.items():
+            dim = int(kernel[-1])
+            for typecode in 'fd':
+                points = self.points(50, dim, typecode)
+                values = noise.sample(points, kernel, octaves=3)
+                self.assertEqual(len(values), 50)
+                coords = array('f', points)
+                expected = array('f', [func(*coords[i * dim:(i + 1) * dim], octaves=3)
+                    for i in range(50)])
+                self.assertEqual(list(values), list(expected), kernel)
+
+    def test_matches_arrays(self):
+        import noise
+        points = self.points(200, 3)
+        xs, ys, zs = points[0::3], points[1::3], points[2::3]
+        self.assertEqual(
+            list(noise.sample(points, 'simplex3', repeat=(8, 16, 4), octaves=2,
+                mode='ridged', warp=0.3, threads=3)),
+            list(noise.snoise3_array(xs, ys, zs, repeatx=8, repeaty=16, repeatz=4, octaves=2,
+                mode='ridged', warp=0.3)))
+        self.assertEqual(
+            list(noise.sample(points, 'perlin3', repeat=8, base=2)),
+            list(noise.pnoise3_array(xs, ys, zs, repeatx=8, repeaty=8, repeatz=8, base=2)))
+        points = points[:400]
+        self.assertEqual(
+            list(noise.sample(points, 'simplex2', repeat=(8, 4), base=1.5)),
+            list(noise.snoise2_array(points[0::2], points[1::2], repeatx=8, repeaty=4,
+                base=1.5)))
+
+    def test_shaped_points_and_out(self):
+        import noise
+        from array import array
+        points = self.points(40, 3)
+        shaped = memoryview(points).cast('B').cast('f', (40, 3))
+        out = array('f', [0.0] * 40)
+        self.assertTrue(noise.ssample(shaped, out=out) is out)
+        self.assertEqual(list(out), list(noise.sample(points)))
+        seeded = noise.Noise(5)
+        self.assertEqual(seeded.sample(points, 'perlin3')[0],
+            seeded.pnoise3(points[0], points[1], points[2]))
+
+    def test_errors(self):
+        import noise
+        from array import array
+        points = self.points(10, 3)
+        shaped = memoryview(points).cast('B').cast('f', (10, 3))
+        self.assertRaises(ValueError, noise.sample, shaped, 'simplex2')
+        self.assertRaises(ValueError, noise.sample, array('f', [1, 2]), 'simplex3')
+        self.assertRaises(ValueError, noise.ssample, points)
+        self.assertRaises(ValueError, noise.sample, points, 'simplex4')
+        self.assertRaises(ValueError, noise.sample, self.points(10, 4), 'simplex4', repeat=2)
+        self.assertRaises(ValueError, noise.sample, points, 'simplex5')
+        self.assertRaises(ValueError, noise.sample, points, repeat=(1, 2))
+        self.assertRaises(ValueError, noise.psample, points, repeat=0)
+        self.assertRaises(ValueError, noise.psample, points, repeat=(4, -1, 4))
+        self.assertRaises(ValueError, noise.psample, points, dim=1, repeat=0)
+        self.assertRaises(ValueError, noise.psample, points, dim=1, repeat=0.5)
+        self.assertRaises(TypeError, noise.sample, array('i', [1, 2, 3]))
+
+
+class VolumeTestCase(unittest.TestCase):
+
+    def test_matches_grid3(self):
+        from noise import snoise3, snoise3_volume, sgrid3
+        values = snoise3_volume((3, 4, 5), (0.3, 0.2, 0.1), (1, 2, 3), octaves=2)
+        self.assertEqual(values.shape, (3, 4, 5))
+        self.assertEqual(values.tolist(),
+            sgrid3(5, 4, 3, (1, 2, 3), (0.3, 0.2, 0.1), octaves=2).tolist())
+        self.assertEqual(values.tolist()[2][3][4],
+            snoise3(1 + 4 * 0.3, 2 + 3 * 0.2, 3 + 2 * 0.1, octaves=2))
+        self.assertEqual(snoise3_volume(4, 0.3, repeat=2, mode='ridged').tolist(),
+            sgrid3(4, 4, 4, step=(0.3, 0.3, 0.3), repeatx=2, repeaty=2, repeatz=2,
+                mode='ridged').tolist())
+
+    def test_int8_ctypes(self):
+        # The texture of examples/animate_tex.py
+        import ctypes
+        from noise import snoise3, snoise3_volume
+        width, scale = 10, 1 / 5.0
+        texel = (ctypes.c_byte * width**3)()
+        snoise3_volume(width, scale, octaves=4, persistence=0.25, dtype='int8',
+            value_scale=127.0, value_offset=0.0, out=texel, threads=2)
+        self.assertEqual(list(texel), [int(snoise3(x * scale, y * scale, z * scale,
+            octaves=4, persistence=0.25) * 127.0)
+            for z in range(width) for y in range(width) for x in range(width)])
+
+    def test_integer_range(self):
+        from array import array
+        from noise import snoise3_volume, sgrid3
+        floats = array('f', sgrid3(300, 2, 2, step=(0.05, 0.05, 0.05)).cast('B').cast('f'))
+        for dtype, lo, hi in (('uint8', 0, 255), ('uint16', 0, 65535), ('int8', -128, 127)):
+            values = snoise3_volume((2, 2, 300), 0.05, dtype=dtype)
+            self.assertEqual(values.shape, (2, 2, 300))
+            flat = list(values.cast('B').cast(values.format))
+            self.assertTrue(lo <= min(flat) and max(flat) <= hi)
+            # Monotonic in the noise value
+            order = sorted(range(len(flat)), key=lambda i: floats[i])
+            ranked = [flat[i] for i in order]
+            self.assertEqual(ranked, sorted(ranked))
+        clamped = snoise3_volume((1, 1, 50), 0.1, dtype='uint8', value_scale=1000.0,
+            value_offset=128.0)
+        row = clamped.tolist()[0][0]
+        self.assertEqual((min(row), max(row)), (0, 255))
+
+    def test_errors(self):
+        import ctypes
+        from noise import snoise3_volume
+        self.assertRaises(ValueError, snoise3_volume, 4, dtype='float64')
+        self.assertRaises(TypeError, snoise3_volume, 4, dtype='uint8',
+            out=(ctypes.c_float * 64)())
+        self.assertRaises(ValueError, snoise3_volume, 4, dtype='uint8',
+            out=(ctypes.c_ubyte * 63)())
+        self.assertRaises(ValueError, snoise3_volume, (1, 2))
+        self.assertRaises(ValueError, snoise3_volume, 2.5)
+
+
+class QuantizedOutputTestCase(unittest.TestCase):
+
+    def calls(self):
+        """Yield (function, args, kwargs) of the batch functions"""
+        from array import array
+        import noise
+        xs = array('f', [i * 0.37 - 20.0 for i in range(300)])
+        ys = array('f', [i * 0.11 + 3.0 for i in range(300)])
+        zs = array('f', [i * 0.23 for i in range(300)])
+        points = array('d', [c for p in zip(xs, ys, zs) for c in p])
+        kwargs = dict(octaves=3)
+        yield noise.pnoise1_array, (xs,), kwargs
+        yield noise.pnoise2_array, (xs, ys), kwargs
+        yield noise.pnoise3_array, (xs, ys, zs), dict(kwargs, mode='ridged')
+        yield noise.snoise2_array, (xs, ys), kwargs
+        yield noise.snoise3_array, (xs, ys, zs), dict(kwargs, repeatx=8)
+        yield noise.pgrid2, (300, 2, (0.5, 0.5), (0.1, 0.2)), kwargs
+        yield noise.pgrid3, (300, 2, 2, (0.5, 0.5, 0.5), (0.1, 0.2, 0.3)), kwargs
+        yield noise.sgrid2, (300, 2, (0.5, 0.5), (0.1, 0.2)), dict(kwargs, warp=0.5)
+        yield noise.sgrid3, (300, 2, 2, (0.5, 0.5, 0.5), (0.1, 0.2, 0.3)), kwargs
+        yield noise.sgrid3, (300, 2, 2, (0.5, 0.5, 0.5), (0.1, 0.2, 0.3)), dict(kwargs, w=0.5)
+        yield noise.psample, (points,), dict(kwargs, dim=3)
+        yield noise.ssample, (points,), dict(kwargs, dim=3)
+
+    def values(self, result):
+        return list(result.cast('B').cast(result.format))
+
+    def test_integer_types(self):
+        import struct
+        for func, args, kwargs in self.calls():
+            floats = self.values(func(*args, **kwargs))
+            # value_scale is a power of two, so that the only rounding is of the sum
+            f32 = lambda v: struct.unpack('f', struct.pack('f', v))[0]
+            for dtype, lo, hi in (('uint8', 0, 255), ('int8', -128, 127), ('uint16', 0, 65535)):
+                result = func(*args, dtype=dtype, value_scale=64.0, value_offset=100.0, **kwargs)
+                self.assertEqual(result.format, {'uint8': 'B', 'int8': 'b', 'uint16': 'H'}[dtype])
+                self.assertEqual(self.values(result),
+                    [int(min(max(f32(v * 64.0 + 100.0), lo), hi)) for v in floats])
+            # By default [-1, 1] maps onto the whole range
+            result = self.values(func(*args, dtype='uint16', **kwargs))
+            self.assertEqual(result, [int(f32(f32(v * 32767.5) + 32767.5)) for v in floats])
+
+    def test_float_types(self):
+        import struct, sys
+        for func, args, kwargs in self.calls():
+            floats = self.values(func(*args, **kwargs))
+            clamped = func(*args, clamp=(-0.25, 0.5), **kwargs)
+            self.assertEqual(clamped.format, 'f')
+            self.assertEqual(self.values(clamped), [min(max(v, -0.25), 0.5) for v in floats])
+            half = func(*args, dtype='float16', **kwargs)
+            self.assertEqual(half.format, 'e' if sys.version_info >= (3, 12) else 'H')
+            self.assertEqual(half.tobytes(), struct.pack('%de' % len(floats), *floats))
+
+    def test_float16_rounding(self):
+        import struct
+        from noise import sgrid2
+        values = [0.0, 1.0, -2.5, 1e-3, 1.0 + 2.0 ** -11, 1.0 + 3 * 2.0 ** -11, 65504.0,
+            65519.0, 2.0 ** -24, 3 * 2.0 ** -26, 2.0 ** -26, 6.1e-5, -7e-6, 1e5, -1e9]
+        for v in values:
+            expected = struct.pack('e', v) if abs(v) < 65520.0 else (
+                b'\x00\x7c' if v > 0 else b'\x00\xfc')
+            if struct.pack('H', 1) != b'\x01\x00':
+                expected = expected[::-1]
+            self.assertEqual(sgrid2(1, 1, dtype='float16', value_scale=0.0,
+                value_offset=v).tobytes(), expected, v)
+
+    def test_shapes_and_out(self):
+        import ctypes
+        from array import array
+        import noise
+        xs = array('f', [0.1 * i for i in range(12)])
+        self.assertEqual(noise.pgrid3(4, 3, 2, dtype='int8').shape, (2, 3, 4))
+        shaped = memoryview(xs).cast('B').cast('f', (3, 4))
+        self.assertEqual(noise.snoise2_array(shaped, shaped, dtype='uint8').shape, (3, 4))
+        out = (ctypes.c_ubyte * 12)()
+        result = noise.pnoise2_array(xs, xs, octaves=2, dtype='uint8', out=out, threads=3)
+        self.assertIs(result, out)
+        self.assertEqual(list(out), noise.pnoise2_array(xs, xs, octaves=2, dtype='uint8').tolist())
+        # float16 values may be written to any buffer of unsigned shorts
+        halves = array('H', bytes(24))
+        noise.sgrid2(12, 1, step=(0.1, 0.1), dtype='float16', out=halves)
+        self.assertEqual(halves.tobytes(), noise.sgrid2(12, 1, step=(0.1, 0.1),
+            dtype='float16').tobytes())
+        self.assertEqual(len(noise.ssample(array('f'), dim=2, dtype='uint16')), 0)
+        # clamp is narrowed to the range of integer types
+        narrowed = noise.sgrid2(200, 1, step=(0.05, 0.05), dtype='uint8', value_offset=0.0,
+            clamp=(-10.0, 20.0))
+        self.assertEqual((min(narrowed.tolist()[0]), max(narrowed.tolist()[0])), (0, 20))
+
+    def test_errors(self):
+        import ctypes
+        from array import array
+        import noise
+        xs = array('f', [0.1, 0.2])
+        self.assertRaises(ValueError, noise.snoise2_array, xs, xs, dtype='int32')
+        self.assertRaises(TypeError, noise.pgrid2, 2, 1, dtype='uint8', out=array('f', [0, 0]))
+        self.assertRaises(TypeError, noise.sgrid2, 2, 1, dtype='int8', out=(ctypes.c_ubyte * 2)())
+        self.assertRaises(TypeError, noise.pnoise1_array, xs, clamp=1.0)
+        self.assertRaises(TypeError, noise.pnoise1_array, xs, clamp=(0.0, 1.0, 2.0))
+        self.assertRaises(ValueError, noise.pnoise1_array, xs, clamp=(1.0, 0.0))
+        # Gradients are always floats
+        self.assertRaises(TypeError, noise.snoise3_grad_array, xs, xs, xs, dtype='uint8')
+
+
+class ColorLookupTestCase(unittest.TestCase):
+
+    def ramp(self):
+        from noise import color_ramp
+        return color_ramp([(-0.5, (0.0, 0.0, 0.5)), (0.0, (0.9, 0.8, 0.5)),
+            (0.3, (0.1, 0.6, 0.1)), (0.7, (1.0, 1.0, 1.0))])
+
+    def test_lookup(self):
+        import struct
+        lut = self.ramp()
+        colors = lut.tolist()
+        f32 = lambda v: struct.unpack('f', struct.pack('f', v))[0]
+        for func, args, kwargs in QuantizedOutputTestCase.calls(self):
+            floats = func(*args, **kwargs)
+            result = func(*args, lut=lut, **kwargs)
+            self.assertEqual(result.format, 'B')
+            self.assertEqual(result.shape, floats.shape + (3,))
+            # By default [-1, 1] maps onto the whole table
+            expected = [colors[int(min(max(f32(v * 128.0 + 128.0), 0), 255))]
+                for v in floats.cast('B').cast('f')]
+            self.assertEqual(result.tobytes(), bytes(c for rgb in expected for c in rgb))
+
+    def test_rgba_and_out(self):
+        import ctypes
+        from array import array
+        import noise
+        lut = noise.color_ramp([(-1.0, (0.0, 0.0, 0.0, 0.0)), (1.0, (1.0, 1.0, 1.0, 1.0))], 16)
+        self.assertEqual(lut.shape, (16, 4))
+        self.assertEqual(noise.pgrid3(4, 3, 2, lut=lut).shape, (2, 3, 4, 4))
+        xs = array('f', [0.1 * i for i in range(12)])
+        out = (ctypes.c_ubyte * 48)()
+        result = noise.snoise2_array(xs, xs, octaves=2, lut=lut, out=out, threads=3)
+        self.assertIs(result, out)
+        self.assertEqual(bytes(out), noise.snoise2_array(xs, xs, octaves=2, lut=lut).tobytes())
+        # value_scale and value_offset map noise values to table indices
+        first = noise.sgrid2(5, 5, lut=lut, value_scale=0.0, value_offset=-3.0)
+        self.assertEqual(first.tobytes(), bytes(lut.tolist()[0]) * 25)
+        last = noise.sgrid2(5, 5, lut=lut, value_scale=0.0, value_offset=1e9)
+        self.assertEqual(last.tobytes(), bytes(lut.tolist()[15]) * 25)
+        # Any buffer of rows of 3 or 4 bytes is a table
+        table = memoryview(bytes(range(30))).cast('B', (10, 3))
+        self.assertEqual(noise.sgrid2(1, 1, lut=table, value_scale=0.0,
+            value_offset=4.5).tobytes(), bytes([12, 13, 14]))
+
+    def test_color_ramp(self):
+        from noise import color_ramp
+        gray = [(-1.0, (0.0, 0.0, 0.0)), (1.0, (1.0, 1.0, 1.0))]
+        self.assertEqual(color_ramp(gray, 4).tolist(), [[c] * 3 for c in (32, 96, 159, 223)])
+        self.assertEqual(color_ramp(gray, 4, blend='step').tolist(), [[0] * 3] * 4)
+        self.assertEqual(color_ramp(gray, 4, blend='smooth').tolist(),
+            [[c] * 3 for c in (11, 81, 174, 244)])
+        # Constant beyond the end stops
+        self.assertEqual(color_ramp([(0.0, (1.0, 0.5, 0.0))], 2).tolist(),
+            [[255, 128, 0]] * 2)
+        self.assertEqual(self.ramp().shape, (256, 3))
+        self.assertRaises(ValueError, color_ramp, gray, blend='cubic')
+        self.assertRaises(ValueError, color_ramp, gray, 0)
+        self.assertRaises(ValueError, color_ramp, [])
+        self.assertRaises(ValueError, color_ramp, [(0.0, (1.0, 1.0))])
+        self.assertRaises(ValueError, color_ramp, [(0.0, (0, 0, 0)), (0.5, (1, 1, 1, 1))])
+        self.assertRaises(ValueError, color_ramp, gray[::-1])
+
+    def test_errors(self):
+        from array import array
+        import noise
+        lut = self.ramp()
+        self.assertRaises(ValueError, noise.sgrid2, 2, 2, lut=lut, dtype='uint8')
+        self.assertRaises(ValueError, noise.sgrid2, 2, 2, lut=lut.cast('B'))
+        self.assertRaises(ValueError, noise.sgrid2, 2, 2, lut=lut.cast('B').cast('B', (128, 6)))
+        self.assertRaises(ValueError, noise.sgrid2, 2, 2, lut=array('f', [0.0] * 6))
+        self.assertRaises(TypeError, noise.pgrid2, 2, 1, lut=lut, out=array('f', [0, 0]))
+        self.assertRaises(TypeError, noise.pgrid2, 2, 1, lut=1)
+
+
+class AboveTestCase(unittest.TestCase):
+
+    def functions(self):
+        """Yield (noise3, noise3_above, noise3_above_array, kwargs)"""
+        import noise
+        seeded = noise.Noise(7)
+        for kwargs in ({}, dict(base=3)):
+            yield noise.pnoise3, noise.pnoise3_above, noise.pnoise3_above_array, kwargs
+            yield noise.snoise3, noise.snoise3_above, noise.snoise3_above_array, kwargs
+        yield (noise.pnoise3, noise.pnoise3_above, noise.pnoise3_above_array,
+            dict(repeatx=8, repeaty=4, repeatz=16))
+        yield (noise.snoise3, noise.snoise3_above, noise.snoise3_above_array,
+            dict(repeatx=8.0, repeaty=4.0, repeatz=16.0))
+        yield seeded.snoise3, seeded.snoise3_above, seeded.snoise3_above_array, {}
+
+    def test_matches_noise(self):
+        import struct
+        from array import array
+        f32 = lambda v: struct.unpack('f', struct.pack('f', v))[0]
+        points = [((i * 7919) % 601 * 0.083 - 25.0, (i * 104729) % 379 * 0.121 - 20.0,
+            i * 0.047) for i in range(500)]
+        xs, ys, zs = (array('f', axis) for axis in zip(*points))
+        for noise3, above, above_array, kwargs in self.functions():
+            for octaves, persistence in ((1, 0.5), (8, 0.5), (5, 1.3), (4, -0.6), (2, -1.0)):
+                kwargs = dict(kwargs, octaves=octaves, persistence=persistence)
+                values = [f32(noise3(x, y, z, **kwargs)) for x, y, z in points]
+                # Including thresholds equal to some of the values
+                for threshold in [-0.4, 0.0, 0.3, 1.5, float('nan')] + values[::97]:
+                    expected = [v > threshold for v in values]
+                    self.assertEqual([above(x, y, z, threshold, **kwargs)
+                        for x, y, z in points], expected, (noise3, kwargs, threshold))
+                    self.assertEqual(above_array(xs, ys, zs, threshold, threads=2,
+                        **kwargs).tolist(), [int(e) for e in expected])
+
+    def test_out(self):
+        import ctypes
+        from array import array
+        import noise
+        xs = array('f', [0.37 * i for i in range(12)])
+        shaped = memoryview(xs).cast('B').cast('f', (3, 4))
+        result = noise.snoise3_above_array(shaped, shaped, shaped, 0.1, octaves=4)
+        self.assertEqual((result.format, result.shape), ('B', (3, 4)))
+        out = (ctypes.c_ubyte * 12)()
+        self.assertIs(noise.pnoise3_above_array(xs, xs, xs, -0.1, octaves=4, out=out), out)
+        self.assertEqual(list(out), [int(noise.pnoise3_above(x, x, x, -0.1, octaves=4))
+            for x in xs])
+        self.assertRaises(TypeError, noise.pnoise3_above_array, xs, xs, xs, 0.0,
+            out=array('f', xs))
+        self.assertRaises(ValueError, noise.snoise3_above, 0.0, 0.0, 0.0, 0.0, octaves=0)
+        self.assertRaises(ValueError, noise.snoise3_above_array, xs, xs, xs[:2], 0.0)
+
+
+class BoundsTestCase(unittest.TestCase):
+
+    def functions(self):
+        """Yield (noise3, bounds3, kwargs)"""
+        import noise
+        seeded = noise.Noise(7)
+        for kwargs in ({}, dict(base=3)):
+            yield noise.pnoise3, noise.pbounds3, kwargs
+            yield noise.snoise3, noise.sbounds3, kwargs
+        yield noise.pnoise3, noise.pbounds3, dict(repeatx=8, repeaty=4, repeatz=16)
+        yield noise.snoise3, noise.sbounds3, dict(repeatx=8.0, repeaty=4.0, repeatz=16.0)
+        yield seeded.snoise3, seeded.sbounds3, {}
+        yield seeded.pnoise3, seeded.pbounds3, {}
+
+    def test_contains_noise(self):
+        for noise3, bounds3, kwargs in self.functions():
+            for octaves, persistence in ((1, 0.5), (4, 0.5), (3, -0.7)):
+                kwargs = dict(kwargs, octaves=octaves, persistence=persistence)
+                for size in (0.0, 0.05, 0.7, 3.0):
+                    for b in range(4):
+                        origin = (b * 5.3 - 9.0, b * -2.9 + 1.7, b * 0.61)
+                        box = (origin, tuple(v + size * (1.0 + 0.3 * c)
+                            for c, v in enumerate(origin)))
+                        lo, hi = bounds3(box, **kwargs)
+                        self.assertTrue(lo <= hi, (lo, hi))
+                        if persistence > 0:
+                            self.assertTrue(-1.05 <= lo and hi <= 1.05, (lo, hi))
+                        for i in range(11):
+                            for j in range(11):
+                                p = [box[0][c] + (box[1][c] - box[0][c]) * t
+                                    for c, t in enumerate((i / 10.0, j / 10.0, (i * j % 7) / 6.0))]
+                                value = noise3(*p, **kwargs)
+                                self.assertTrue(lo <= value <= hi,
+                                    (bounds3, box, p, kwargs, lo, value, hi))
+
+    def test_tight(self):
+        import noise
+        for noise3, bounds3 in ((noise.pnoise3, noise.pbounds3), (noise.snoise3, noise.sbounds3)):
+            value = noise3(0.3, 0.4, 0.5, octaves=3)
+            lo, hi = bounds3(((0.3, 0.4, 0.5), (0.3, 0.4, 0.5)), octaves=3)
+            self.assertTrue(lo <= value <= hi and hi - lo < 0.01, (lo, value, hi))
+            # A box much larger than the lattice cells has the whole range
+            lo, hi = bounds3(((0.0, 0.0, 0.0), (100.0, 100.0, 100.0)), octaves=3)
+            self.assertTrue(lo <= -0.9 and hi >= 0.9)
+
+    def test_kernel(self):
+        import noise
+        box = ((0.1, 0.2, 0.3), (0.4, 0.5, 0.6))
+        self.assertEqual(noise.bounds3(box, octaves=2), noise.sbounds3(box, octaves=2))
+        self.assertEqual(noise.bounds3(box, 'perlin', base=2), noise.pbounds3(box, base=2))
+        self.assertEqual(noise.Noise().bounds3(box, 'perlin'), noise.pbounds3(box))
+        self.assertNotEqual(noise.Noise(7).bounds3(box), noise.sbounds3(box))
+        self.assertRaises(ValueError, noise.bounds3, box, 'cubic')
+
+    def test_invalid(self):
+        import noise
+        for bounds3 in (noise.pbounds3, noise.sbounds3):
+            self.assertRaises(TypeError, bounds3, ((0.0, 0.0), (1.0, 1.0)))
+            self.assertRaises(TypeError, bounds3, 1.0)
+            self.assertRaises(ValueError, bounds3, ((0.0, 1.0, 0.0), (1.0, 0.0, 1.0)))
+            self.assertRaises(ValueError, bounds3, ((0.0, 0.0, float('nan')), (1.0, 1.0, 1.0)))
+            self.assertRaises(ValueError, bounds3, ((0.0, 0.0, 0.0), (1.0, 1.0, 1.0)), octaves=0)
+
 
 class SimplexTestCase(unittest.TestCase):
 
@@ -0,0 +1,212 @@
+# Copyright (c) 2008, Casey Duncan (casey dot duncan at gmail dot com)
+# see LICENSE.txt for details
+
+"""Memory-mapped on-disk stores of precomputed 2D noise tiles
+
+A tile store file has a header recording the noise parameters, an index
+of the tiles present and a fixed-size slot of float32 values per tile:
+
+	magic        8 bytes, b'NOISETS\\0'
+	version      uint32, 1
+	header size  uint32, the length of the JSON header
+	header       JSON object of the kernel, noise parameters and layout
+	index        1 byte per tile, nonzero once the tile is computed
+	tiles        tile_size * tile_size float32 values per tile, row-major,
+	             starting at the next 4096 byte boundary
+
+The integers are little-endian, the floats are in the byte order recorded
+in the header. The tile slots are allocated when the store is created, as
+a sparse file on file systems that support it, so that missing tiles take
+no space until they are computed.
+"""
+
+import json
+import mmap
+import struct
+import sys
+import threading
+
+from . import Noise, grid2
+
+MAGIC = b'NOISETS\0'
+VERSION = 1
+
+_PREFIX = struct.Struct('<8sII')
+_ALIGN = 4096
+
+# The grid2 arguments recorded in the header
+_PARAMS = ('octaves', 'persistence', 'lacunarity', 'repeatx', 'repeaty', 'base', 'mode', 'warp')
+
+
+class TileStore(object):
+	"""A tile store file opened for reading ('r') or reading and writing
+	('r+'). Tiles are returned as float memoryviews of shape (tile_size,
+	tile_size) onto the memory-mapped file, without copying.
+
+	A tile that has not been computed yet is computed on demand with the
+	native grid functions. It is written to the store if it is writable,
+	otherwise it is returned from memory.
+	"""
+
+	def __init__(self, path, mode='r'):
+		if mode not in ('r', 'r+'):
+			raise ValueError("Expected mode 'r' or 'r+', got %r" % (mode,))
+		self.path = path
+		self.writable = mode == 'r+'
+		self._file = open(path, mode + 'b')
+		try:
+			magic, version, size = _PREFIX.unpack(self._file.read(_PREFIX.size))
+			if magic != MAGIC:
+				raise ValueError('%s is not a noise tile store' % (path,))
+			if version != VERSION:
+				raise ValueError('Unsupported tile store version %d' % version)
+			header = json.loads(self._file.read(size).decode('utf-8'))
+			if header['byteorder'] != sys.byteorder:
+				raise ValueError('Tile store byte order %s does not match this platform'
+					% header['byteorder'])
+			self._mmap = mmap.mmap(self._file.fileno(), 0,
+				access=mmap.ACCESS_WRITE if self.writable else mmap.ACCESS_READ)
+		except Exception:
+			self._file.close()
+			raise
+		self.header = header
+		self.kernel = header['kernel']
+		self.params = header['params']
+		self.tile_size = header['tile_size']
+		self.tiles = tuple(header['tiles'])
+		self.origin = tuple(header['origin'])
+		self.step = tuple(header['step'])
+		self.seed = header['seed']
+		self._index_offset, self._data_offset = _layout(size, self.tiles)
+		self._tile_bytes = self.tile_size * self.tile_size * 4
+		self._source = Noise(self.seed) if self.seed is not None else None
+		self._lock = threading.Lock()
+
+	@classmethod
+	def create(cls, path, tiles, tile_size=256, kernel='simplex', origin=(0.0, 0.0),
+		step=(1.0, 1.0), seed=None, **params):
+		"""Create an empty store of tiles[0] x tiles[1] tiles at path,
+		replacing any existing file, and return it opened for writing.
+
+		origin, step -- the coordinates of the first sample and the spacing
+		of the samples, as for the grid functions.
+
+		seed -- if not None, the noise is computed with noise.Noise(seed).
+
+		The other keyword arguments are the grid2 noise parameters: octaves,
+		persistence, lacunarity, repeatx, repeaty, base, mode and warp.
+		"""
+		unknown = set(params) - set(_PARAMS)
+		if unknown:
+			raise TypeError('Unknown noise parameters: %s' % ', '.join(sorted(unknown)))
+		if tile_size <= 0 or tiles[0] <= 0 or tiles[1] <= 0:
+			raise ValueError('Expected tile_size and tiles > 0')
+		params.setdefault('octaves', 1)
+		params.setdefault('persistence', 0.5)
+		params.setdefault('lacunarity', 2.0)
+		params.setdefault('base', 0)
+		header = json.dumps({
+			'kernel': kernel,
+			'params': params,
+			'tile_size': tile_size,
+			'tiles': list(tiles),
+			'origin': list(origin),
+			'step': list(step),
+			'seed': seed,
+			'byteorder': sys.byteorder,
+		}, sort_keys=True).encode('utf-8')
+		index_offset, data_offset = _layout(len(header), tiles)
+		# Check the parameters before creating the file
+		(Noise(seed).grid2 if seed is not None else grid2)(1, 1, kernel=kernel, **params)
+		with open(path, 'wb') as f:
+			f.write(_PREFIX.pack(MAGIC, VERSION, len(header)))
+			f.write(header)
+			f.truncate(data_offset + tiles[0] * tiles[1] * tile_size * tile_size * 4)
+		return cls(path, 'r+')
+
+	def _slot(self, tx, ty):
+		if not (0 <= tx < self.tiles[0] and 0 <= ty < self.tiles[1]):
+			raise IndexError('Tile (%d, %d) outside of the %d x %d store'
+				% (tx, ty, self.tiles[0], self.tiles[1]))
+		return ty * self.tiles[0] + tx
+
+	def has_tile(self, tx, ty):
+		"""Return True if tile (tx, ty) has been computed"""
+		return self._mmap[self._index_offset + self._slot(tx, ty)] != 0
+
+	def tile(self, tx, ty, threads=1):
+		"""Return tile (tx, ty) as a float memoryview of shape (tile_size,
+		tile_size), computing it first if it is missing. The view is read
+		only unless the store is writable.
+		"""
+		slot = self._slot(tx, ty)
+		if self._mmap[self._index_offset + slot] == 0:
+			if not self.writable:
+				return self._compute(tx, ty, None, threads)
+			with self._lock:
+				if self._mmap[self._index_offset + slot] == 0:
+					self._compute(tx, ty, self._view(slot), threads)
+					self._mmap[self._index_offset + slot] = 1
+		return self._view(slot)
+
+	def _view(self, slot):
+		start = self._data_offset + slot * self._tile_bytes
+		size = self.tile_size
+		return memoryview(self._mmap)[start:start + self._tile_bytes].cast('f', (size, size))
+
+	def _compute(self, tx, ty, out, threads):
+		size = self.tile_size
+		origin = (self.origin[0] + tx * size * self.step[0],
+			self.origin[1] + ty * size * self.step[1])
+		grid = self._source.grid2 if self._source is not None else grid2
+		return grid(size, size, origin, self.step, kernel=self.kernel, out=out, threads=threads,
+			**self.params)
+
+	def fill(self, threads=1):
+		"""Compute all missing tiles, making the store complete"""
+		if not self.writable:
+			raise ValueError('Tile store %s is read only' % (self.path,))
+		for ty in range(self.tiles[1]):
+			for tx in range(self.tiles[0]):
+				self.tile(tx, ty, threads)
+
+	def missing(self):
+		"""Return the number of tiles not computed yet"""
+		count = self.tiles[0] * self.tiles[1]
+		index = self._mmap[self._index_offset:self._index_offset + count]
+		return index.count(b'\0')
+
+	def flush(self):
+		"""Write the computed tiles to disk"""
+		if self.writable:
+			self._mmap.flush()
+
+	def close(self):
+		"""Flush and close the store. Tiles returned by it must not be used
+		after closing.
+		"""
+		if self._mmap is not None:
+			self.flush()
+			try:
+				self._mmap.close()
+			except BufferError:
+				# Tiles are still referenced, the mapping is released with them
+				pass
+			self._mmap = None
+			self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def __repr__(self):
+		return '%s(%r, %r)' % (type(self).__name__, self.path, 'r+' if self.writable else 'r')
+
+
+def _layout(header_size, tiles):
+	"""Return the offsets of the index and the tile data"""
+	index_offset = _PREFIX.size + header_size
+	data_offset = index_offset + tiles[0] * tiles[1]
+	return index_offset, (data_offset + _ALIGN - 1) // _ALIGN * _ALIGN